@@ -7,13 +7,15 @@ Main command-line interface for the Time-Shift Proxmox VM Solution
 import sys
 import os
 import argparse
+import asyncio
 import json
+import logging
 from datetime import datetime, timedelta
 
-# Add lib directory to path
+# Add lib directory to path (and the repository root for lib.* imports)
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib'))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..'))
 
-from proxmox_api import ProxmoxAPI
 from time_ops import TimeOperations
 from network_tools import NetworkValidator
 
@@ -24,13 +26,27 @@ def main():
     parser.add_argument('--vm-id', type=int, help='Proxmox VM ID')
     parser.add_argument('--target-date', help='Target date (YYYY-MM-DD)')
     parser.add_argument('--idrac-ip', help='iDRAC IP address to access')
-    parser.add_argument('--action', choices=['shift', 'restore', 'validate'],
+    parser.add_argument('--action', choices=['shift', 'restore', 'validate', 'prune'],
                        default='shift', help='Action to perform')
+    parser.add_argument('--no-snapshot', action='store_true',
+                       help='Shift without a pre-shift snapshot of --vm-id')
+    parser.add_argument('--dry-run', action='store_true',
+                       help='Show the snapshots prune would delete without deleting them')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Verbose output')
+    parser.add_argument('--daemon', action='store_true',
+                       help='Run the time-shifting HTTPS reverse proxy')
+    parser.add_argument('--port', type=int, default=8090,
+                       help='Proxy listen port (daemon mode)')
+    parser.add_argument('--bind', default='0.0.0.0',
+                       help='Proxy listen address (daemon mode)')
     
     args = parser.parse_args()
     
+    if args.daemon:
+        run_daemon(args)
+        return
+    
     # Load configuration
     try:
         with open(args.config, 'r') as f:
@@ -43,7 +59,6 @@ def main():
         sys.exit(1)
     
     # Initialize components
-    proxmox = ProxmoxAPI(config.get('proxmox', {}))
     time_ops = TimeOperations()
     network = NetworkValidator()
     
@@ -52,6 +67,12 @@ def main():
             print("Error: --target-date is required for shift action")
             sys.exit(1)
         
+        # Snapshot the VM first so the shift can be rolled back
+        if args.vm_id and not args.no_snapshot:
+            if not asyncio.run(take_preshift_snapshot(proxmox_config(config), args.vm_id)):
+                print("Failed to snapshot the VM; not shifting time (use --no-snapshot to skip)")
+                sys.exit(1)
+        
         # Perform time shift operation
         result = time_ops.shift_time(args.target_date)
         if result:
@@ -81,6 +102,94 @@ def main():
         else:
             print(f"Failed to connect to iDRAC at {args.idrac_ip}")
             sys.exit(1)
+            
+    elif args.action == 'prune':
+        run_prune(args, config)
+
+def proxmox_config(config):
+    """Proxmox client configuration, exiting if the config file has none"""
+    if not config.get('proxmox'):
+        print("Error: the configuration file has no 'proxmox' section")
+        sys.exit(1)
+    proxmox = dict(config['proxmox'])
+    proxmox.setdefault('ticket_cache', True)
+    return proxmox
+
+async def take_preshift_snapshot(proxmox, vm_id):
+    """Snapshot a VM under a managed pre-shift name; True if it succeeded"""
+    from lib.proxmox_api_async import ProxmoxAPIAsync
+    from lib.snapshot_retention import SnapshotManager
+    
+    async with ProxmoxAPIAsync(proxmox) as api:
+        result = await SnapshotManager(api).create([vm_id], kind='preshift')
+    for error in result.errors.values():
+        print(f"Error: snapshot of VM {vm_id} failed: {error.message}")
+    if result.ok:
+        print(f"Created pre-shift snapshot of VM {vm_id}")
+    return result.ok
+
+def retention_policy(config):
+    """Snapshot retention policy of the config file, exiting on unknown settings"""
+    from dataclasses import fields
+    from lib.snapshot_retention import RetentionPolicy
+    
+    settings = config.get('snapshot_retention') or {}
+    known = [f.name for f in fields(RetentionPolicy)]
+    unknown = sorted(set(settings) - set(known))
+    if unknown:
+        print(f"Error: unknown snapshot_retention settings: {', '.join(unknown)} "
+              f"(expected {', '.join(known)})")
+        sys.exit(1)
+    return RetentionPolicy(**settings)
+
+def run_prune(args, config):
+    """Delete managed snapshots the retention policy no longer keeps"""
+    from lib.proxmox_api_async import ProxmoxAPIAsync
+    from lib.snapshot_retention import SnapshotManager
+    
+    proxmox = proxmox_config(config)
+    policy = retention_policy(config)
+    
+    async def prune():
+        async with ProxmoxAPIAsync(proxmox) as api:
+            return await SnapshotManager(api, policy).prune([args.vm_id] if args.vm_id else None,
+                                                            dry_run=args.dry_run)
+    
+    result = asyncio.run(prune())
+    if args.dry_run:
+        print(result.plan.format_table())
+        return
+    
+    print(f"Deleted {len(result.deleted)} of {len(result.plan.delete)} snapshots")
+    for snapshot, message in result.failed:
+        print(f"  VM {snapshot.vm_id} {snapshot.name}: {message}")
+    if not result.ok or result.plan.errors:
+        sys.exit(1)
+
+def run_daemon(args):
+    """Run the time-shifting reverse proxy until interrupted"""
+    from timeshift_proxy import run_proxy
+    
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    # The proxy still serves /health without a config so the container stays up
+    proxy_config = {}
+    try:
+        with open(args.config, 'r') as f:
+            proxy_config = json.load(f).get('proxy', {})
+    except FileNotFoundError:
+        print(f"Warning: Configuration file {args.config} not found, starting with no backends")
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON in configuration file: {e}")
+        sys.exit(1)
+    
+    try:
+        asyncio.run(run_proxy(proxy_config, host=args.bind, port=args.port))
+    except KeyboardInterrupt:
+        print("Proxy stopped")
 
 if __name__ == '__main__':
     main()
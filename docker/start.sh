@@ -10,7 +10,8 @@ touch /app/logs/timeshift.log
 
 # Start the time-shift proxy service
 echo "🚀 Starting time-shift proxy on port 8090..."
-python3 /app/bin/time-shift-cli.py --daemon --port 8090 &
+python3 /app/bin/time-shift-cli.py --daemon --port 8090 \
+    --config /app/etc/time-shift-config.json >> /app/logs/timeshift.log 2>&1 &
 
 # Keep container running
 tail -f /app/logs/timeshift.log
\ No newline at end of file
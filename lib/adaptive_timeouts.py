@@ -0,0 +1,189 @@
+"""
+Adaptive Timeouts Module - Per-host probe timeouts and dead-host quarantine
+Tracks smoothed RTT per host (RFC 6298 style) and backs off hosts that keep failing
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_FILE = Path.home() / ".time-shift" / "probe_state.json"
+
+# Timeout multiplier per probe phase, applied to the host's RTO
+PHASE_FACTORS = {
+    'connect': 1.0,
+    'handshake': 2.0,
+}
+
+
+@dataclass
+class HostState:
+    """RTT estimate and failure history of one host"""
+    srtt: Optional[float] = None
+    rttvar: Optional[float] = None
+    rto: Optional[float] = None
+    failures: int = 0
+    quarantined_until: float = 0.0
+    last_seen: float = 0.0
+
+
+class HostTimeoutTracker:
+    """Per-host RTO estimation with exponential backoff for dead hosts"""
+
+    def __init__(self, state_file: Optional[str] = None, initial_timeout: float = 3.0,
+                 min_timeout: float = 0.2, max_timeout: float = 10.0,
+                 failure_threshold: int = 3, base_backoff: float = 300.0,
+                 max_backoff: float = 86400.0):
+        """
+        Initialize the tracker
+
+        Args:
+            state_file: JSON file the state is loaded from and saved to
+                (None keeps the state in memory only)
+            initial_timeout: Timeout for hosts without RTT samples
+            min_timeout: Lower bound of any computed timeout
+            max_timeout: Upper bound of any computed timeout
+            failure_threshold: Consecutive failures before a host is quarantined
+            base_backoff: First quarantine duration in seconds
+            max_backoff: Longest quarantine duration in seconds
+        """
+        self.state_file = Path(state_file) if state_file else None
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.hosts: Dict[str, HostState] = {}
+        self._lock = threading.Lock()
+
+        if self.state_file:
+            self.load()
+
+    def _clamp(self, value: float) -> float:
+        return max(self.min_timeout, min(self.max_timeout, value))
+
+    def timeout(self, host: str, phase: str = 'connect') -> float:
+        """
+        Timeout to use for a probe phase against a host
+
+        Args:
+            host: Target host
+            phase: 'connect' or 'handshake'
+
+        Returns:
+            Timeout in seconds
+        """
+        state = self.hosts.get(host)
+        rto = state.rto if state and state.rto is not None else self.initial_timeout
+        return self._clamp(rto * PHASE_FACTORS.get(phase, 1.0))
+
+    def record_rtt(self, host: str, rtt: float):
+        """
+        Feed a successful RTT sample (SRTT/RTTVAR update from RFC 6298)
+
+        Args:
+            host: Target host
+            rtt: Measured round-trip time in seconds
+        """
+        with self._lock:
+            state = self.hosts.setdefault(host, HostState())
+            if state.srtt is None:
+                state.srtt = rtt
+                state.rttvar = rtt / 2
+            else:
+                state.rttvar = 0.75 * state.rttvar + 0.25 * abs(state.srtt - rtt)
+                state.srtt = 0.875 * state.srtt + 0.125 * rtt
+            state.rto = self._clamp(state.srtt + max(0.01, 4 * state.rttvar))
+            state.last_seen = time.time()
+
+    def record_timeout(self, host: str):
+        """Double the host's RTO after a timed-out attempt (Karn backoff)"""
+        with self._lock:
+            state = self.hosts.setdefault(host, HostState())
+            current = state.rto if state.rto is not None else self.initial_timeout
+            state.rto = self._clamp(current * 2)
+
+    def record_result(self, host: str, ok: bool):
+        """
+        Record the outcome of a full probe
+
+        Consecutive failures past the threshold quarantine the host for an
+        exponentially growing period; any success clears the history.
+
+        Args:
+            host: Target host
+            ok: Whether the host answered
+        """
+        with self._lock:
+            state = self.hosts.setdefault(host, HostState())
+            if ok:
+                state.failures = 0
+                state.quarantined_until = 0.0
+                return
+
+            state.failures += 1
+            if state.failures >= self.failure_threshold:
+                exponent = state.failures - self.failure_threshold
+                backoff = min(self.max_backoff, self.base_backoff * (2 ** min(exponent, 32)))
+                state.quarantined_until = time.time() + backoff
+                logger.warning(f"Quarantining {host} for {backoff:.0f}s after "
+                               f"{state.failures} consecutive failures")
+
+    def is_quarantined(self, host: str) -> bool:
+        """Whether a host is still inside its backoff period"""
+        state = self.hosts.get(host)
+        return bool(state and state.quarantined_until > time.time())
+
+    def quarantined_until(self, host: str) -> Optional[float]:
+        """Epoch time the host's quarantine expires, or None"""
+        return self.hosts[host].quarantined_until if self.is_quarantined(host) else None
+
+    def quarantined(self) -> Dict[str, float]:
+        """All currently quarantined hosts and their expiry times"""
+        now = time.time()
+        return {host: state.quarantined_until for host, state in self.hosts.items()
+                if state.quarantined_until > now}
+
+    def release(self, host: str):
+        """Clear a host's failure history and quarantine"""
+        with self._lock:
+            if host in self.hosts:
+                self.hosts[host].failures = 0
+                self.hosts[host].quarantined_until = 0.0
+
+    def load(self):
+        """Load state saved by a previous run"""
+        try:
+            with open(self.state_file, 'r') as f:
+                data = json.load(f)
+            self.hosts = {host: HostState(**values) for host, values in data.get('hosts', {}).items()}
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, TypeError) as e:
+            logger.error(f"Ignoring unreadable probe state {self.state_file}: {e}")
+
+    def save(self):
+        """Atomically persist state for the next run"""
+        if not self.state_file:
+            return
+        with self._lock:
+            data: Dict[str, Any] = {'hosts': {host: asdict(state) for host, state in self.hosts.items()}}
+
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.state_file.parent, prefix='.probe_state')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            logger.error(f"Failed to save probe state: {e}")
@@ -0,0 +1,190 @@
+"""
+Bulk Operations Module - Bounded-concurrency operations over many VMs
+Limits requests in flight globally and per node, collects partial results
+with structured per-VM errors, and can stream results as they complete
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# (vm_id, node) -> result of the operation for that VM
+VMCall = Callable[[int, Optional[str]], Awaitable[Any]]
+
+
+@dataclass
+class VMError:
+    """Why an operation failed for one VM"""
+    vm_id: int
+    operation: str
+    message: str
+    node: Optional[str] = None
+    status: Optional[int] = None  # HTTP status, when the API rejected the call
+    error_type: str = 'error'
+
+    @classmethod
+    def from_exception(cls, vm_id: int, operation: str, node: Optional[str],
+                       error: BaseException) -> 'VMError':
+        return cls(vm_id=vm_id, operation=operation, node=node,
+                   message=str(error) or error.__class__.__name__,
+                   status=getattr(error, 'status', None), error_type=error.__class__.__name__)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'vm_id': self.vm_id, 'operation': self.operation, 'node': self.node,
+                'status': self.status, 'error_type': self.error_type, 'message': self.message}
+
+
+@dataclass
+class VMResult:
+    """Outcome of an operation for one VM"""
+    vm_id: int
+    node: Optional[str] = None
+    result: Any = None
+    error: Optional[VMError] = None
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BulkResult:
+    """Partial results of a bulk operation"""
+    operation: str
+    results: Dict[int, Any] = field(default_factory=dict)
+    errors: Dict[int, VMError] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    @property
+    def succeeded(self) -> List[int]:
+        return sorted(self.results)
+
+    @property
+    def failed(self) -> List[int]:
+        return sorted(self.errors)
+
+    def add(self, item: VMResult):
+        if item.ok:
+            self.results[item.vm_id] = item.result
+        else:
+            self.errors[item.vm_id] = item.error
+
+    def summary(self) -> Dict[str, Any]:
+        return {'operation': self.operation, 'succeeded': len(self.results), 'failed': len(self.errors),
+                'elapsed_s': round(self.elapsed, 3),
+                'errors': [self.errors[vm_id].to_dict() for vm_id in self.failed]}
+
+
+class BulkOperation:
+    """
+    One operation applied to many VMs
+
+    Await it for a BulkResult once every VM is done, or iterate it with
+    'async for' to receive VMResults as they complete.
+    """
+
+    def __init__(self, operation: str, vm_ids: Iterable[int], call: VMCall,
+                 node_for: Callable[[int], Awaitable[Optional[str]]],
+                 concurrency: int = 10, per_node: Optional[int] = 4,
+                 on_error: Optional[Callable[[int], None]] = None):
+        """
+        Args:
+            operation: Name used in errors and logs ('start', 'status', ...)
+            vm_ids: VMs to operate on (duplicates are dropped)
+            call: Coroutine function run once per VM with (vm_id, node)
+            node_for: Coroutine function resolving the node of a VM
+            concurrency: Most calls in flight overall
+            per_node: Most calls in flight per node (None for no per-node limit)
+            on_error: Called with the VM ID after a failure
+        """
+        self.operation = operation
+        self.vm_ids = list(dict.fromkeys(vm_ids))
+        self.call = call
+        self.node_for = node_for
+        self.concurrency = max(1, concurrency)
+        self.per_node = per_node
+        self.on_error = on_error
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def _run_one(self, vm_id: int, limit: asyncio.Semaphore,
+                       node_limits: Dict[Optional[str], asyncio.Semaphore]) -> VMResult:
+        node = None
+        started = time.monotonic()
+        try:
+            node = await self.node_for(vm_id)
+            node_limit = node_limits.get(node)
+            if node_limit is None and self.per_node:
+                node_limit = node_limits.setdefault(node, asyncio.Semaphore(self.per_node))
+
+            # Node slot first, so VMs queued for a busy node do not hold global slots
+            if node_limit is None:
+                result = await self._call_limited(vm_id, node, limit)
+            else:
+                async with node_limit:
+                    result = await self._call_limited(vm_id, node, limit)
+            return VMResult(vm_id, node, result=result, duration=time.monotonic() - started)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.on_error:
+                self.on_error(vm_id)
+            logger.debug(f"Bulk {self.operation} failed for VM {vm_id}: {e}")
+            return VMResult(vm_id, node, error=VMError.from_exception(vm_id, self.operation, node, e),
+                            duration=time.monotonic() - started)
+
+    async def _call_limited(self, vm_id: int, node: Optional[str], limit: asyncio.Semaphore) -> Any:
+        async with limit:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                return await self.call(vm_id, node)
+            finally:
+                self.in_flight -= 1
+
+    def __aiter__(self) -> AsyncIterator[VMResult]:
+        return self.stream()
+
+    async def stream(self) -> AsyncIterator[VMResult]:
+        """
+        Yield VMResults as they complete
+
+        To stop early and cancel the remaining calls at once, close the
+        stream with 'await results.aclose()' (e.g. in a finally block).
+        """
+        limit = asyncio.Semaphore(self.concurrency)
+        node_limits: Dict[Optional[str], asyncio.Semaphore] = {}
+        tasks = [asyncio.ensure_future(self._run_one(vm_id, limit, node_limits)) for vm_id in self.vm_ids]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The consumer may stop early; do not leave requests running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self) -> BulkResult:
+        """Run every call and collect the results"""
+        bulk = BulkResult(self.operation)
+        started = time.monotonic()
+        async for item in self.stream():
+            bulk.add(item)
+        bulk.elapsed = time.monotonic() - started
+
+        if bulk.errors:
+            logger.warning(f"Bulk {self.operation}: {len(bulk.errors)} of {len(self.vm_ids)} VMs failed")
+        return bulk
+
+    def __await__(self):
+        return self.run().__await__()
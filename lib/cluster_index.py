@@ -0,0 +1,267 @@
+"""
+Cluster Index Module - In-memory index of Proxmox cluster resources
+Built from a single /cluster/resources call, with lookups by VM ID, name,
+node, tag and status, and incremental refreshes that only re-index what changed
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Resource types that are guests (and so carry a vmid)
+GUEST_TYPES = frozenset(['qemu', 'lxc'])
+
+# Fields the lookups depend on; changes elsewhere (cpu, mem, uptime) are
+# stored but do not count as changes or touch the lookup tables
+INDEXED_FIELDS = ('type', 'name', 'node', 'status', 'tags', 'template')
+
+# Proxmox accepts ';', ',' and spaces between tags
+_TAG_SEPARATORS = re.compile(r'[;,\s]+')
+
+
+def parse_tags(tags: Any) -> List[str]:
+    """Split a Proxmox tag string ('prod;web') into a list"""
+    if not tags:
+        return []
+    if isinstance(tags, (list, tuple, set)):
+        return [str(t) for t in tags if t]
+    return [t for t in _TAG_SEPARATORS.split(str(tags)) if t]
+
+
+class ClusterIndex:
+    """Lookup tables over the guests, nodes and storage of one cluster"""
+
+    def __init__(self, refresh_interval: float = 30.0):
+        """
+        Initialize an empty index
+
+        Args:
+            refresh_interval: Seconds after a refresh before the index counts as stale
+        """
+        self.refresh_interval = refresh_interval
+        self.resources: Dict[str, Dict[str, Any]] = {}  # keyed by resource id, e.g. 'qemu/100'
+        self.refreshed_at: Optional[float] = None
+        self.generation = 0
+
+        self._by_vmid: Dict[int, str] = {}
+        self._by_name: Dict[str, Set[int]] = {}
+        self._by_node: Dict[str, Set[int]] = {}
+        self._by_tag: Dict[str, Set[int]] = {}
+        self._by_status: Dict[str, Set[int]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._by_vmid)
+
+    def __contains__(self, vmid: int) -> bool:
+        return int(vmid) in self._by_vmid
+
+    @property
+    def loaded(self) -> bool:
+        return self.refreshed_at is not None
+
+    def age(self) -> float:
+        """Seconds since the last refresh (infinite if never loaded)"""
+        if self.refreshed_at is None:
+            return float('inf')
+        return time.monotonic() - self.refreshed_at
+
+    def is_stale(self, max_age: Optional[float] = None) -> bool:
+        """Whether the index is older than max_age (default: refresh_interval)"""
+        return self.age() >= (self.refresh_interval if max_age is None else max_age)
+
+    def invalidate(self):
+        """Mark the index stale so the next access refreshes it; lookups keep working"""
+        self.refreshed_at = None
+
+    def apply(self, resources: Iterable[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """
+        Merge a /cluster/resources listing into the index
+
+        Entries whose indexed fields are unchanged are updated in place
+        without touching the lookup tables; only new, removed and changed
+        entries are re-indexed.
+
+        Args:
+            resources: The 'data' list returned by /cluster/resources
+
+        Returns:
+            Dict with 'added', 'removed' and 'changed' resource ids
+        """
+        diff = {'added': [], 'removed': [], 'changed': []}
+
+        with self._lock:
+            seen = set()
+            for resource in resources:
+                rid = resource.get('id') or self._resource_id(resource)
+                if rid is None:
+                    continue
+                seen.add(rid)
+                current = self.resources.get(rid)
+
+                if current is None:
+                    diff['added'].append(rid)
+                elif any(current.get(f) != resource.get(f) for f in INDEXED_FIELDS):
+                    diff['changed'].append(rid)
+                    self._unindex(current)
+                else:
+                    current.update(resource)
+                    continue
+
+                entry = dict(resource)
+                entry['id'] = rid
+                self.resources[rid] = entry
+                self._index(entry)
+
+            for rid in [rid for rid in self.resources if rid not in seen]:
+                diff['removed'].append(rid)
+                self._unindex(self.resources.pop(rid))
+
+            self.refreshed_at = time.monotonic()
+            if any(diff.values()):
+                self.generation += 1
+
+        if any(diff.values()):
+            logger.debug(f"Cluster index: {len(diff['added'])} added, {len(diff['changed'])} changed, "
+                         f"{len(diff['removed'])} removed")
+        return diff
+
+    @staticmethod
+    def _resource_id(resource: Dict[str, Any]) -> Optional[str]:
+        if resource.get('type') in GUEST_TYPES and resource.get('vmid') is not None:
+            return f"{resource['type']}/{resource['vmid']}"
+        if resource.get('type') == 'node' and resource.get('node'):
+            return f"node/{resource['node']}"
+        return None
+
+    def _index(self, entry: Dict[str, Any]):
+        if entry.get('type') not in GUEST_TYPES or entry.get('vmid') is None:
+            return
+        vmid = int(entry['vmid'])
+        self._by_vmid[vmid] = entry['id']
+        for table, keys in self._keys(entry):
+            for key in keys:
+                table.setdefault(key, set()).add(vmid)
+
+    def _unindex(self, entry: Dict[str, Any]):
+        if entry.get('type') not in GUEST_TYPES or entry.get('vmid') is None:
+            return
+        vmid = int(entry['vmid'])
+        if self._by_vmid.get(vmid) == entry['id']:
+            del self._by_vmid[vmid]
+        for table, keys in self._keys(entry):
+            for key in keys:
+                members = table.get(key)
+                if members is not None:
+                    members.discard(vmid)
+                    if not members:
+                        del table[key]
+
+    def _keys(self, entry: Dict[str, Any]):
+        return [
+            (self._by_name, [entry['name']] if entry.get('name') else []),
+            (self._by_node, [entry['node']] if entry.get('node') else []),
+            (self._by_tag, parse_tags(entry.get('tags'))),
+            (self._by_status, [entry['status']] if entry.get('status') else []),
+        ]
+
+    def _entries(self, vmids: Iterable[int]) -> List[Dict[str, Any]]:
+        return [self.resources[self._by_vmid[v]] for v in sorted(vmids) if v in self._by_vmid]
+
+    def get(self, vmid: int) -> Optional[Dict[str, Any]]:
+        """Resource entry for a guest, or None"""
+        rid = self._by_vmid.get(int(vmid))
+        return self.resources.get(rid) if rid else None
+
+    def node_for(self, vmid: int) -> Optional[str]:
+        """Node a guest currently runs on, or None if unknown"""
+        entry = self.get(vmid)
+        return entry.get('node') if entry else None
+
+    def vmid_for(self, name: str) -> Optional[int]:
+        """
+        VM ID for a guest name
+
+        Returns:
+            The VM ID, or None if no guest (or more than one guest) has that name
+        """
+        vmids = self._by_name.get(name, set())
+        if len(vmids) != 1:
+            if vmids:
+                logger.warning(f"Guest name '{name}' is ambiguous: {sorted(vmids)}")
+            return None
+        return next(iter(vmids))
+
+    def by_name(self, name: str) -> List[Dict[str, Any]]:
+        """Guests with a given name (names are not unique in Proxmox)"""
+        with self._lock:
+            return self._entries(self._by_name.get(name, ()))
+
+    def on_node(self, node: str) -> List[Dict[str, Any]]:
+        """Guests on a node"""
+        with self._lock:
+            return self._entries(self._by_node.get(node, ()))
+
+    def with_tag(self, tag: str) -> List[Dict[str, Any]]:
+        """Guests carrying a tag"""
+        with self._lock:
+            return self._entries(self._by_tag.get(tag, ()))
+
+    def with_status(self, status: str) -> List[Dict[str, Any]]:
+        """Guests in a state such as 'running' or 'stopped'"""
+        with self._lock:
+            return self._entries(self._by_status.get(status, ()))
+
+    def query(self, node: Optional[str] = None, tag: Optional[str] = None,
+              status: Optional[str] = None, name: Optional[str] = None,
+              guest_type: Optional[str] = None, templates: bool = False) -> List[Dict[str, Any]]:
+        """
+        Guests matching every given criterion
+
+        Args:
+            node: Node name
+            tag: Tag the guest must carry
+            status: Guest status
+            name: Guest name
+            guest_type: 'qemu' or 'lxc'
+            templates: Include templates
+
+        Returns:
+            Matching resource entries ordered by VM ID
+        """
+        with self._lock:
+            selected = set(self._by_vmid)
+            for table, key in ((self._by_node, node), (self._by_tag, tag),
+                               (self._by_status, status), (self._by_name, name)):
+                if key is not None:
+                    selected &= table.get(key, set())
+
+            return [
+                entry for entry in self._entries(selected)
+                if (guest_type is None or entry.get('type') == guest_type)
+                and (templates or not entry.get('template'))
+            ]
+
+    def vms(self) -> List[Dict[str, Any]]:
+        """Every guest, templates included, ordered by VM ID"""
+        with self._lock:
+            return self._entries(self._by_vmid)
+
+    def nodes(self) -> List[Dict[str, Any]]:
+        """Node entries ordered by name"""
+        with self._lock:
+            return sorted((r for r in self.resources.values() if r.get('type') == 'node'),
+                          key=lambda r: r.get('node', ''))
+
+    def of_type(self, resource_type: str) -> List[Dict[str, Any]]:
+        """Every resource of a type such as 'storage' or 'sdn'"""
+        with self._lock:
+            return [r for r in self.resources.values() if r.get('type') == resource_type]
+
+    def tags(self) -> List[str]:
+        """All tags in use"""
+        return sorted(self._by_tag)
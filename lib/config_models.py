@@ -8,6 +8,12 @@ from pydantic import BaseModel, Field, validator, IPvAnyAddress
 from enum import Enum
 from datetime import datetime
 import ipaddress
+import re
+
+try:
+    from lib.validators import api_token_from_config
+except ImportError:  # imported with lib/ on sys.path
+    from validators import api_token_from_config
 
 
 class LogLevel(str, Enum):
@@ -39,10 +45,21 @@ class ProxmoxConfig(BaseModel):
     host: Union[IPvAnyAddress, str] = Field(..., description="Proxmox host IP or hostname")
     port: int = Field(default=8006, ge=1, le=65535, description="Proxmox API port")
     username: str = Field(..., min_length=1, description="Proxmox username")
-    password: str = Field(..., min_length=1, description="Proxmox password")
+    password: Optional[str] = Field(default=None, min_length=1, description="Proxmox password (not needed with an API token)")
     node: str = Field(..., min_length=1, description="Proxmox node name")
     verify_ssl: bool = Field(default=False, description="Verify SSL certificates")
     timeout: int = Field(default=30, ge=5, le=300, description="API timeout in seconds")
+    ticket_cache: bool = Field(default=True, description="Reuse authentication tickets across runs")
+    ticket_renewal: bool = Field(default=True, description="Renew the ticket in the background before it expires")
+    ticket_renew_before: int = Field(default=900, ge=360, le=3600, description="Seconds before expiry the ticket is renewed")
+    api_token: Optional[str] = Field(default=None, description="API token as user@realm!tokenid=secret")
+    token_id: Optional[str] = Field(default=None, description="API token ID (user@realm!tokenid, or just tokenid)")
+    token_secret: Optional[str] = Field(default=None, description="API token secret")
+    cluster_index: bool = Field(default=False, description="Route per-VM calls using /cluster/resources")
+    index_refresh: int = Field(default=30, ge=1, le=3600, description="Cluster index refresh interval in seconds")
+    exec_timeout: int = Field(default=60, ge=1, le=3600, description="Seconds a guest-agent command may run")
+    response_cache: Union[bool, Dict[str, float]] = Field(default=False, description="Cache idempotent GETs (True, or TTL seconds per endpoint class)")
+    rate_limit: Union[bool, Dict[str, Dict[str, float]]] = Field(default=False, description="Adaptive read/write request budgets (True, or overrides per budget)")
     
     @validator('username')
     def validate_username(cls, v):
@@ -54,12 +71,26 @@ class ProxmoxConfig(BaseModel):
     @validator('password')
     def validate_password_strength(cls, v):
         """Basic password strength validation"""
+        if v is None:
+            return v
         if len(v) < 8:
             raise ValueError('Password must be at least 8 characters long')
         if v.lower() in ['password', '12345678', 'admin123']:
             raise ValueError('Password is too weak')
         return v
     
+    @validator('token_secret', always=True)
+    def validate_credentials(cls, v, values):
+        """Require either a password or a complete API token"""
+        if values.get('api_token') or values.get('token_id'):
+            if values.get('token_id') and not values.get('api_token') and not v:
+                raise ValueError('token_secret is required with token_id')
+            # Same parsing as the Proxmox clients; raises ValueError if malformed
+            api_token_from_config(dict(values, token_secret=v))
+        elif not values.get('password'):
+            raise ValueError('Either password, api_token or token_id/token_secret is required')
+        return v
+    
     class Config:
         """Pydantic configuration"""
         schema_extra = {
@@ -70,11 +101,25 @@ class ProxmoxConfig(BaseModel):
                 "password": "secure_password_123",
                 "node": "proxmox-node-01",
                 "verify_ssl": False,
-                "timeout": 30
+                "timeout": 30,
+                "ticket_cache": True
             }
         }
 
 
+class ProxmoxClusterConfig(ProxmoxConfig):
+    """One of several Proxmox VE clusters managed together"""
+    name: str = Field(..., min_length=1, max_length=32, description="Cluster name, unique within the configuration")
+    query_timeout: float = Field(default=10.0, gt=0, le=300, description="Seconds a cross-cluster query waits for this cluster")
+    
+    @validator('name')
+    def validate_cluster_name(cls, v):
+        """Validate cluster name format"""
+        if not re.match(r'^[a-zA-Z0-9_.-]+$', v):
+            raise ValueError('Cluster name can only contain letters, numbers, dots, underscores, and hyphens')
+        return v
+
+
 class VMConfig(BaseModel):
     """Virtual Machine configuration"""
     name: str = Field(..., min_length=1, max_length=15, description="VM name")
@@ -173,7 +218,7 @@ class TimeConfig(BaseModel):
 
 
 class IDRACConfig(BaseModel):
-        """iDRAC connection configuration
+    """iDRAC connection configuration
     
     Dell iDRAC standard default credentials:
     - Username: root
@@ -264,7 +309,8 @@ class SecurityConfig(BaseModel):
 
 class TimeShiftConfig(BaseModel):
     """Main configuration model"""
-    proxmox: ProxmoxConfig
+    proxmox: Optional[ProxmoxConfig] = Field(default=None, description="Single cluster (named 'default' among clusters)")
+    clusters: List[ProxmoxClusterConfig] = Field(default_factory=list, description="Further Proxmox clusters")
     vm: VMConfig
     network: NetworkConfig
     time: TimeConfig
@@ -277,6 +323,31 @@ class TimeShiftConfig(BaseModel):
     created_at: Optional[datetime] = Field(default_factory=datetime.now, description="Configuration creation time")
     updated_at: Optional[datetime] = Field(default=None, description="Last update time")
     
+    @validator('clusters', always=True)
+    def validate_clusters(cls, v, values):
+        """Require at least one cluster, each with a unique name"""
+        if not v and not values.get('proxmox'):
+            raise ValueError('Either proxmox or clusters is required')
+        names = [cluster.name for cluster in v]
+        if values.get('proxmox'):
+            names.append('default')
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate cluster names: {', '.join(duplicates)}")
+        return v
+    
+    def cluster_configs(self) -> List[ProxmoxClusterConfig]:
+        """
+        Every configured cluster
+        
+        Returns:
+            The proxmox block (named 'default') followed by the clusters list
+        """
+        configs = list(self.clusters)
+        if self.proxmox is not None:
+            configs.insert(0, ProxmoxClusterConfig(name='default', **self.proxmox.dict()))
+        return configs
+    
     class Config:
         """Pydantic configuration"""
         validate_assignment = True
@@ -415,9 +486,13 @@ def validate_config_security(config: TimeShiftConfig) -> List[str]:
     """
     warnings = []
     
+    proxmox_configs = ([config.proxmox] if config.proxmox else []) + list(config.clusters)
+    
     # Check for weak passwords
-    if config.proxmox.password in ['password', 'admin', 'change_me']:
-        warnings.append("Proxmox password appears to be weak or default")
+    for proxmox in proxmox_configs:
+        if proxmox.password in ['password', 'admin', 'change_me']:
+            warnings.append("Proxmox password appears to be weak or default")
+            break
     
     if config.idrac.default_password:
         if config.idrac.default_password == 'calvin' or config.idrac.default_username == 'root':
@@ -426,7 +501,7 @@ def validate_config_security(config: TimeShiftConfig) -> List[str]:
             warnings.append("iDRAC password is too short (minimum 8 characters)")
     
     # Check SSL settings
-    if not config.proxmox.verify_ssl:
+    if any(not proxmox.verify_ssl for proxmox in proxmox_configs):
         warnings.append("SSL verification disabled for Proxmox")
     
     if not config.idrac.ssl_verify:
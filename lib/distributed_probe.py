@@ -0,0 +1,277 @@
+"""
+Distributed Probe Module - Run connectivity probes from inside Proxmox guests
+Fans the probe suite out to VMs through the QEMU guest agent and merges the
+answers into a source x target reachability matrix
+"""
+
+import asyncio
+import base64
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from cryptography import x509
+
+from lib.guest_exec import ExecResult, GuestExecutor
+
+logger = logging.getLogger(__name__)
+
+CERT_TIME_FORMAT = '%b %d %H:%M:%S %Y GMT'
+
+# Runs inside the guest with only the Python standard library. Prints one JSON
+# list with a result per target; certificates are returned as base64 DER and
+# decoded on the controller so guests need no extra packages.
+GUEST_PROBE_SCRIPT = r'''
+import base64, json, socket, ssl, subprocess, sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+targets = json.loads(sys.argv[1])
+timeout = float(sys.argv[2])
+ping_count = int(sys.argv[3])
+
+def probe(target):
+    host, port = target["host"], int(target.get("port", 443))
+    result = {"host": host, "ping": False, "port_open": False, "rtt": None, "cert": None}
+    if ping_count:
+        try:
+            ping = subprocess.run(["ping", "-c", str(ping_count), "-W", str(max(1, int(timeout))), host],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                  timeout=ping_count + timeout)
+            result["ping"] = ping.returncode == 0
+        except Exception:
+            pass
+    try:
+        started = time.monotonic()
+        sock = socket.create_connection((host, port), timeout=timeout)
+        result["rtt"] = time.monotonic() - started
+        result["port_open"] = True
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        with context.wrap_socket(sock, server_hostname=host) as tls:
+            result["cert"] = base64.b64encode(tls.getpeercert(binary_form=True)).decode()
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+with ThreadPoolExecutor(max_workers=16) as executor:
+    print(json.dumps(list(executor.map(probe, targets))))
+'''
+
+
+def _decode_certificate(encoded: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Turn a base64 DER certificate from a guest into NetworkValidator's layout"""
+    if not encoded:
+        return None
+    try:
+        cert = x509.load_der_x509_certificate(base64.b64decode(encoded))
+    except ValueError as e:
+        logger.warning(f"Undecodable certificate from guest: {e}")
+        return None
+
+    if hasattr(cert, 'not_valid_after_utc'):
+        not_before, not_after = cert.not_valid_before_utc, cert.not_valid_after_utc
+    else:
+        not_before = cert.not_valid_before.replace(tzinfo=timezone.utc)
+        not_after = cert.not_valid_after.replace(tzinfo=timezone.utc)
+    now = datetime.now(timezone.utc)
+    return {
+        'not_before': not_before.strftime(CERT_TIME_FORMAT),
+        'not_after': not_after.strftime(CERT_TIME_FORMAT),
+        'expired': not_after < now,
+        'not_yet_valid': not_before > now,
+    }
+
+
+class ReachabilityMatrix:
+    """Probe results indexed by (source, target)"""
+
+    def __init__(self):
+        self.sources: List[str] = []
+        self.targets: List[str] = []
+        self.cells: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.errors: Dict[str, str] = {}
+
+    def _add_source(self, source: str):
+        if source not in self.sources:
+            self.sources.append(source)
+
+    def add_results(self, source: str, results: Dict[str, Dict[str, Any]]):
+        """
+        Merge one source's results
+
+        Args:
+            source: Probe origin (e.g. 'vm:101' or 'local')
+            results: Per-target results in test_connectivity_suite layout
+        """
+        self._add_source(source)
+        for target, result in results.items():
+            if target not in self.targets:
+                self.targets.append(target)
+            self.cells[(source, target)] = result
+
+    def add_error(self, source: str, error: str):
+        """Record a source that could not run the probe suite"""
+        self._add_source(source)
+        self.errors[source] = error
+
+    def get(self, source: str, target: str) -> Optional[Dict[str, Any]]:
+        return self.cells.get((source, target))
+
+    def reachable(self, source: str, target: str) -> bool:
+        """Whether the target's port answered from the source"""
+        cell = self.get(source, target)
+        return bool(cell and cell.get('port_open'))
+
+    def sources_for(self, target: str) -> List[str]:
+        """Sources the target is reachable from"""
+        return [source for source in self.sources if self.reachable(source, target)]
+
+    def unreachable_targets(self) -> List[str]:
+        """Targets no source could reach"""
+        return [target for target in self.targets if not self.sources_for(target)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable form: {source: {target: result}} plus errors"""
+        return {
+            'sources': list(self.sources),
+            'targets': list(self.targets),
+            'matrix': {
+                source: {target: self.cells[(source, target)]
+                         for target in self.targets if (source, target) in self.cells}
+                for source in self.sources
+            },
+            'errors': dict(self.errors),
+        }
+
+    def format_table(self) -> str:
+        """Text table with one row per source and one column per target"""
+        width = max([len(t) for t in self.targets] + [8])
+        source_width = max([len(s) for s in self.sources] + [6])
+        lines = [' ' * source_width + '  ' + '  '.join(t.ljust(width) for t in self.targets)]
+        for source in self.sources:
+            if source in self.errors:
+                lines.append(f"{source.ljust(source_width)}  error: {self.errors[source]}")
+                continue
+            cells = []
+            for target in self.targets:
+                cell = self.get(source, target)
+                if cell is None:
+                    text = '-'
+                elif cell.get('port_open'):
+                    text = '✓'
+                    if cell.get('rtt') is not None:
+                        text += f" {cell['rtt'] * 1000:.0f}ms"
+                    if (cell.get('ssl_cert') or {}).get('expired'):
+                        text += ' exp'
+                else:
+                    text = '✗'
+                cells.append(text.ljust(width))
+            lines.append(f"{source.ljust(source_width)}  " + '  '.join(cells))
+        return '\n'.join(lines)
+
+
+class DistributedProber:
+    """Runs the probe suite inside several VMs via the guest agent"""
+
+    def __init__(self, api, python: str = 'python3', timeout: float = 5.0,
+                 exec_timeout: float = 120.0, poll_interval: float = 0.1,
+                 max_poll_interval: float = 2.0, concurrency: int = 16):
+        """
+        Initialize the prober
+
+        Args:
+            api: Connected ProxmoxAPIAsync instance
+            python: Python interpreter inside the guests
+            timeout: Per-target connect timeout used by the guests
+            exec_timeout: Maximum time to wait for one guest to finish
+            poll_interval: First exec-status polling interval
+            max_poll_interval: Polling interval ceiling (interval grows by 1.5x)
+            concurrency: Maximum guests probed at once
+        """
+        self.api = api
+        self.python = python
+        self.timeout = timeout
+        self.exec_timeout = exec_timeout
+        self.executor = GuestExecutor(api, poll_interval=poll_interval, max_poll_interval=max_poll_interval,
+                                      timeout=exec_timeout, concurrency=concurrency)
+
+    def _argv(self, targets: List[Dict[str, Any]], ping_count: int) -> List[str]:
+        return [self.python, '-c', GUEST_PROBE_SCRIPT, json.dumps(targets), str(self.timeout), str(ping_count)]
+
+    def _parse(self, result: ExecResult) -> Dict[str, Dict[str, Any]]:
+        """Turn the guest's JSON output into per-target results, raising on failure"""
+        if result.error:
+            raise RuntimeError(result.error)
+        if result.timed_out:
+            raise asyncio.TimeoutError(f"guest command still running after {self.exec_timeout}s")
+        if result.exitcode:
+            raise RuntimeError(f"probe exited with {result.exitcode}: {result.stderr.strip()[-200:]}")
+        try:
+            raw_results = json.loads(result.stdout)
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"unparseable probe output: {e}")
+
+        timestamp = datetime.now().isoformat()
+        results = {}
+        for raw in raw_results:
+            results[raw['host']] = {
+                'ping': raw.get('ping', False),
+                'port_open': raw.get('port_open', False),
+                'ssl_cert': _decode_certificate(raw.get('cert')),
+                'timestamp': timestamp,
+                'rtt': raw.get('rtt'),
+                'duration': result.duration,
+            }
+        return results
+
+    async def probe_from_vm(self, vm_id: int, targets: List[Dict[str, Any]],
+                            ping_count: int = 1) -> Dict[str, Dict[str, Any]]:
+        """
+        Run the probe suite inside one VM
+
+        Args:
+            vm_id: Source VM ID
+            targets: Target dicts with 'host' and optional 'port'
+            ping_count: Ping packets per target (0 disables ping)
+
+        Returns:
+            Per-target results in test_connectivity_suite layout
+
+        Raises:
+            RuntimeError: If the guest agent cannot run the suite
+            asyncio.TimeoutError: If the suite does not finish in time
+        """
+        return self._parse(await self.executor.run(vm_id, self._argv(targets, ping_count)))
+
+    async def probe(self, vm_ids: List[int], targets: List[Dict[str, Any]], ping_count: int = 1,
+                    local_results: Optional[Dict[str, Dict[str, Any]]] = None) -> ReachabilityMatrix:
+        """
+        Run the probe suite in several VMs concurrently
+
+        Args:
+            vm_ids: Source VM IDs
+            targets: Target dicts with 'host' and optional 'port'
+            ping_count: Ping packets per target
+            local_results: Optional results from NetworkValidator on this
+                machine, merged in as source 'local'
+
+        Returns:
+            ReachabilityMatrix with one row per VM (failed VMs recorded as errors)
+        """
+        matrix = ReachabilityMatrix()
+        if local_results is not None:
+            matrix.add_results('local', local_results)
+
+        outcomes = await self.executor.run_many(vm_ids, self._argv(targets, ping_count))
+
+        for vm_id in vm_ids:
+            source = f"vm:{vm_id}"
+            try:
+                matrix.add_results(source, self._parse(outcomes[vm_id]))
+            except (RuntimeError, asyncio.TimeoutError) as e:
+                logger.error(f"Distributed probe from VM {vm_id} failed: {e}")
+                matrix.add_error(source, str(e) or type(e).__name__)
+
+        return matrix
@@ -0,0 +1,319 @@
+"""
+Guest Exec Module - Run commands in VMs through the QEMU guest agent
+Starts a command with agent/exec, polls agent/exec-status adaptively until
+it exits and returns its stdout, stderr and exit code; runs one command
+across many VMs concurrently, and batches several commands into one exec
+"""
+
+import asyncio
+import logging
+import re
+import secrets
+import shlex
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Union
+
+from lib.bulk_operations import BulkOperation
+
+logger = logging.getLogger(__name__)
+
+# A str command is a script for this interpreter; a list is an argv run as is
+Command = Union[str, Sequence[str]]
+
+DEFAULT_SHELL = ('/bin/sh', '-c')
+
+
+class GuestExecError(RuntimeError):
+    """A guest command could not be run, timed out or exited non-zero"""
+
+    def __init__(self, message: str, result: Optional['ExecResult'] = None):
+        super().__init__(message)
+        self.result = result
+
+
+@dataclass
+class ExecResult:
+    """Outcome of one guest command"""
+    vm_id: int
+    argv: List[str]
+    exitcode: Optional[int] = None
+    stdout: str = ''
+    stderr: str = ''
+    pid: Optional[int] = None
+    duration: float = 0.0
+    polls: int = 0
+    timed_out: bool = False
+    truncated: bool = False  # the agent cut stdout or stderr off at its size limit
+    signal: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.timed_out and self.exitcode == 0
+
+    def check(self) -> 'ExecResult':
+        """Return self if the command succeeded, else raise GuestExecError"""
+        if self.error:
+            raise GuestExecError(self.error, self)
+        if self.timed_out:
+            raise GuestExecError(f"guest command still running after {self.duration:.1f}s", self)
+        if self.exitcode != 0:
+            detail = self.stderr.strip()[-200:]
+            how = f"signal {self.signal}" if self.signal else f"exit code {self.exitcode}"
+            raise GuestExecError(f"guest command failed with {how}: {detail}", self)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'vm_id': self.vm_id, 'argv': self.argv, 'exitcode': self.exitcode, 'stdout': self.stdout,
+                'stderr': self.stderr, 'duration': round(self.duration, 3), 'timed_out': self.timed_out,
+                'truncated': self.truncated, 'error': self.error}
+
+
+def build_argv(command: Command, interpreter: Sequence[str] = DEFAULT_SHELL) -> List[str]:
+    """argv for a command: lists are used as is, strings run through the interpreter"""
+    if isinstance(command, str):
+        return [*interpreter, command]
+    argv = [str(arg) for arg in command]
+    if not argv:
+        raise ValueError("Empty command")
+    return argv
+
+
+def batch_script(commands: Sequence[Command], marker: str, stop_on_error: bool = False) -> str:
+    """
+    POSIX shell script running several commands and delimiting their output
+
+    Each command's stdout and stderr are framed by '<marker>:begin:<i>' and
+    '<marker>:end:<i>' lines on the matching stream, with the exit code
+    appended to the stdout end line. Commands read no stdin.
+    """
+    lines = [f"M={marker}"]
+    for index, command in enumerate(commands):
+        quoted = command if isinstance(command, str) else ' '.join(shlex.quote(str(a)) for a in command)
+        lines += [
+            f"printf '%s:begin:{index}\\n' \"$M\"; printf '%s:begin:{index}\\n' \"$M\" >&2",
+            f"( {quoted}\n) </dev/null",
+            "rc=$?",
+            f"printf '\\n%s:end:{index}:%d\\n' \"$M\" \"$rc\"; printf '\\n%s:end:{index}\\n' \"$M\" >&2",
+        ]
+        if stop_on_error:
+            lines.append('[ "$rc" -eq 0 ] || exit "$rc"')
+    return '\n'.join(lines) + '\n'
+
+
+def split_batch_output(stdout: str, stderr: str, marker: str, count: int) -> List[Dict[str, Any]]:
+    """Recover per-command stdout, stderr and exit code from a batch_script run"""
+    m = re.escape(marker)
+    parts = [{'stdout': '', 'stderr': '', 'exitcode': None, 'ran': False} for _ in range(count)]
+    for match in re.finditer(rf"^{m}:begin:(\d+)\n(.*?)\n{m}:end:\1:(-?\d+)$", stdout, re.S | re.M):
+        part = parts[int(match.group(1))]
+        part.update(stdout=match.group(2), exitcode=int(match.group(3)), ran=True)
+    for match in re.finditer(rf"^{m}:begin:(\d+)\n(.*?)\n{m}:end:\1$", stderr, re.S | re.M):
+        parts[int(match.group(1))]['stderr'] = match.group(2)
+    return parts
+
+
+class GuestExecutor:
+    """Runs guest-agent commands to completion for a ProxmoxAPIAsync client"""
+
+    def __init__(self, api, poll_interval: float = 0.05, max_poll_interval: float = 2.0,
+                 backoff: float = 1.5, timeout: float = 60.0, concurrency: int = 16,
+                 interpreter: Sequence[str] = DEFAULT_SHELL, max_learned: int = 256):
+        """
+        Initialize the executor
+
+        Args:
+            api: ProxmoxAPIAsync-compatible client (execute_vm_command, get_vm_exec_status, node_for)
+            poll_interval: Shortest delay between exec-status polls
+            max_poll_interval: Longest delay between polls
+            backoff: Factor the delay grows by while the command runs
+            timeout: Default seconds a command may run
+            concurrency: Most VMs running commands at once in run_many
+            interpreter: argv prefix for string commands (a script as last argument)
+            max_learned: Most programs whose runtime is remembered
+        """
+        self.api = api
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.interpreter = tuple(interpreter)
+        self.max_learned = max_learned
+        # Smoothed runtime per program, so the first poll lands near the expected exit
+        self._expected: Dict[str, float] = {}
+
+    def _first_delay(self, key: str) -> float:
+        expected = self._expected.get(key)
+        if expected is None:
+            return self.poll_interval
+        return min(self.max_poll_interval, max(self.poll_interval, 0.8 * expected))
+
+    def _learn(self, key: str, duration: float):
+        previous = self._expected.pop(key, None)
+        if previous is None and len(self._expected) >= self.max_learned:
+            # Forget the program run least recently
+            del self._expected[next(iter(self._expected))]
+        self._expected[key] = duration if previous is None else 0.7 * previous + 0.3 * duration
+
+    async def run(self, vm_id: int, command: Command, stdin: Optional[str] = None,
+                  timeout: Optional[float] = None, key: Optional[str] = None) -> ExecResult:
+        """
+        Run a command in a VM and wait for it to exit
+
+        The guest agent has no way to kill a command, so one that times out
+        keeps running in the guest; only the wait is abandoned.
+
+        Args:
+            vm_id: VM ID
+            command: argv list, or a script string for the interpreter
+            stdin: Data passed to the command's standard input
+            timeout: Seconds to wait (default: the executor's timeout)
+            key: Name the runtime is learned under (default: the program, or
+                 the start of the script)
+
+        Returns:
+            ExecResult; check .ok, or call .check() to raise on failure
+        """
+        argv = build_argv(command, self.interpreter)
+        timeout = self.timeout if timeout is None else timeout
+        result = ExecResult(vm_id=vm_id, argv=argv)
+        started = time.monotonic()
+
+        exec_result = await self.api.execute_vm_command(vm_id, argv, stdin)
+        if not exec_result or 'pid' not in exec_result:
+            result.error = 'guest agent exec failed'
+            return result
+        result.pid = exec_result['pid']
+
+        if key is None:
+            key = argv[0] if len(argv) < 3 or argv[:2] != list(self.interpreter) else argv[2][:64]
+        deadline = started + timeout
+        delay = self._first_delay(key)
+        while True:
+            now = time.monotonic()
+            if now + delay > deadline:
+                # One last look at the deadline rather than sleeping past it
+                delay = max(0.0, deadline - now)
+            await asyncio.sleep(delay)
+
+            status = await self.api.get_vm_exec_status(vm_id, result.pid)
+            result.polls += 1
+            if status is None:
+                result.error = 'exec-status request failed'
+                break
+            if status.get('exited'):
+                result.exitcode = status.get('exitcode')
+                result.signal = status.get('signal')
+                result.stdout = status.get('out-data', '')
+                result.stderr = status.get('err-data', '')
+                result.truncated = bool(status.get('out-truncated') or status.get('err-truncated'))
+                result.duration = time.monotonic() - started
+                self._learn(key, result.duration)
+                return result
+            if time.monotonic() >= deadline:
+                result.timed_out = True
+                break
+            delay = min(self.max_poll_interval, delay * self.backoff) if delay else self.poll_interval
+
+        result.duration = time.monotonic() - started
+        if result.timed_out:
+            logger.warning(f"Guest command in VM {vm_id} still running after {timeout}s")
+        return result
+
+    def _bulk(self, vm_ids: Iterable[int], call, concurrency: Optional[int]) -> BulkOperation:
+        # Commands are cheap for the node; the limit is on guests busy at once
+        return BulkOperation('exec', vm_ids, call, self.api.node_for,
+                             concurrency=concurrency or self.concurrency, per_node=None)
+
+    async def run_many(self, vm_ids: Iterable[int], command: Command, stdin: Optional[str] = None,
+                       timeout: Optional[float] = None, concurrency: Optional[int] = None) -> Dict[int, ExecResult]:
+        """
+        Run one command in many VMs concurrently, each with its own timeout
+
+        Returns:
+            ExecResult per VM ID, in the order given
+        """
+        vm_ids = list(dict.fromkeys(vm_ids))
+        results = {}
+        async for result in self.as_completed(vm_ids, command, stdin, timeout, concurrency):
+            results[result.vm_id] = result
+        return {vm_id: results[vm_id] for vm_id in vm_ids}
+
+    async def as_completed(self, vm_ids: Iterable[int], command: Command, stdin: Optional[str] = None,
+                           timeout: Optional[float] = None,
+                           concurrency: Optional[int] = None) -> AsyncIterator[ExecResult]:
+        """Run one command in many VMs and yield each ExecResult as its VM finishes"""
+        async def call(vm_id: int, node: Optional[str]) -> ExecResult:
+            return await self.run(vm_id, command, stdin, timeout)
+
+        operation = self._bulk(vm_ids, call, concurrency)
+        stream = operation.stream()
+        try:
+            async for item in stream:
+                if item.ok:
+                    yield item.result
+                else:
+                    yield ExecResult(vm_id=item.vm_id, argv=build_argv(command, self.interpreter),
+                                     error=item.error.message, duration=item.duration)
+        finally:
+            await stream.aclose()
+
+    async def run_batch(self, vm_id: int, commands: Sequence[Command], timeout: Optional[float] = None,
+                        stop_on_error: bool = False) -> List[ExecResult]:
+        """
+        Run several commands in one VM with a single exec round trip
+
+        The commands run one after another in a POSIX shell wrapper (so the
+        guest needs /bin/sh); string commands are shell snippets.
+
+        Args:
+            vm_id: VM ID
+            commands: argv lists or shell snippets
+            timeout: Seconds the whole batch may run
+            stop_on_error: Skip the remaining commands after one fails
+
+        Returns:
+            One ExecResult per command, in order. Skipped commands have
+            error 'skipped'; if the batch fails or times out, every result
+            carries that outcome.
+        """
+        commands = list(commands)
+        if not commands:
+            return []
+        marker = f"__TIMESHIFT_{secrets.token_hex(8)}"
+        argvs = [build_argv(c, DEFAULT_SHELL) for c in commands]
+        # Learned under the commands: the script differs in its random marker every time
+        batch = await self.run(vm_id, ['/bin/sh', '-c', batch_script(commands, marker, stop_on_error)],
+                               timeout=timeout, key=f"batch:{argvs!r}"[:256])
+
+        if batch.error or batch.timed_out:
+            return [ExecResult(vm_id=vm_id, argv=argv, pid=batch.pid, duration=batch.duration,
+                               polls=batch.polls, timed_out=batch.timed_out, error=batch.error)
+                    for argv in argvs]
+
+        results = []
+        for argv, part in zip(argvs, split_batch_output(batch.stdout, batch.stderr, marker, len(commands))):
+            results.append(ExecResult(
+                vm_id=vm_id, argv=argv, exitcode=part['exitcode'], stdout=part['stdout'], stderr=part['stderr'],
+                pid=batch.pid, duration=batch.duration, polls=batch.polls, truncated=batch.truncated,
+                error=None if part['ran'] else ('skipped' if not batch.truncated else 'output truncated'),
+            ))
+        return results
+
+    async def run_batch_many(self, vm_ids: Iterable[int], commands: Sequence[Command],
+                             timeout: Optional[float] = None, stop_on_error: bool = False,
+                             concurrency: Optional[int] = None) -> Dict[int, List[ExecResult]]:
+        """Run the same batch of commands in many VMs concurrently (see run_batch)"""
+        vm_ids = list(dict.fromkeys(vm_ids))
+
+        async def call(vm_id: int, node: Optional[str]) -> List[ExecResult]:
+            return await self.run_batch(vm_id, commands, timeout, stop_on_error)
+
+        bulk = await self._bulk(vm_ids, call, concurrency).run()
+        results = dict(bulk.results)
+        for vm_id, error in bulk.errors.items():
+            results[vm_id] = [ExecResult(vm_id=vm_id, argv=build_argv(c, DEFAULT_SHELL), error=error.message)
+                              for c in commands]
+        return {vm_id: results[vm_id] for vm_id in vm_ids}
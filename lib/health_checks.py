@@ -492,10 +492,19 @@ class HealthCheckFramework:
             pass
         return None
     
-    def get_summary(self) -> Dict[str, Any]:
-        """Get health check summary"""
+    def get_summary(self, probe_store=None) -> Dict[str, Any]:
+        """
+        Get health check summary
+        
+        Args:
+            probe_store: Optional ProbeResultStore whose fleet connectivity
+                figures are included under the "fleet" key
+        """
         if not self.results:
-            return {"status": "unknown", "message": "No health checks have been run"}
+            summary = {"status": "unknown", "message": "No health checks have been run"}
+            if probe_store is not None:
+                summary["fleet"] = probe_store.summary()
+            return summary
             
         # Count by status
         status_counts = {status: 0 for status in HealthStatus}
@@ -512,12 +521,17 @@ class HealthCheckFramework:
         else:
             overall_status = HealthStatus.HEALTHY
             
-        return {
+        summary = {
             "status": overall_status.value,
             "total_checks": len(self.results),
             "status_counts": {k.value: v for k, v in status_counts.items() if v > 0},
             "timestamp": datetime.now().isoformat(),
         }
+        
+        if probe_store is not None:
+            summary["fleet"] = probe_store.summary()
+            
+        return summary
 
 
 # Standalone health check functions for backward compatibility
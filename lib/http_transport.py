@@ -0,0 +1,287 @@
+"""
+HTTP Transport Module - Resilient pooled transport for synchronous clients
+Adds timeouts, a sized connection pool, idempotent-only retries with jittered
+backoff, per-endpoint circuit breakers and optional adaptive rate limiting
+on top of requests
+"""
+
+import logging
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Methods that may be replayed after a failure without side effects
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# Responses worth retrying (for idempotent methods only)
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+# Responses counted against an endpoint's circuit breaker
+SERVER_ERROR_STATUSES = frozenset([500, 502, 503, 504])
+
+# Numeric path segments (VM IDs, PIDs) are folded so one breaker covers an endpoint
+_NUMERIC_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request while an endpoint's breaker is open"""
+    pass
+
+
+def endpoint_key(method, url):
+    """
+    Circuit breaker key for a request
+
+    Args:
+        method (str): HTTP method
+        url (str): Request URL
+
+    Returns:
+        str: Key such as 'GET 10.0.0.5:8006/api2/json/nodes/pve/qemu/{id}/status/current'
+    """
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.netloc}{_NUMERIC_SEGMENT.sub('/{id}', parts.path)}"
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one endpoint"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        Initialize the breaker
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the breaker
+            reset_timeout (float): Seconds before an open breaker lets a trial request through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """
+        Whether a request may be sent now
+
+        Returns:
+            bool: True when closed, or for the single trial request when half-open
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        """
+        Count a failure
+
+        Returns:
+            bool: True if this failure tripped the breaker open
+        """
+        with self._lock:
+            self.failures += 1
+            tripped = self.trial_in_flight or (
+                self.opened_at is None and self.failures >= self.failure_threshold
+            )
+            if tripped:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+            return tripped
+
+
+class ResilientTransport:
+    """requests.Session wrapper with timeouts, retries and circuit breakers"""
+
+    def __init__(self, timeout=30, connect_timeout=None, pool_connections=4, pool_maxsize=10,
+                 max_retries=3, backoff_base=0.2, backoff_max=5.0, breaker_threshold=5,
+                 breaker_reset=30.0, verify=True, rate_limiter=None, on_unauthorized=None):
+        """
+        Initialize the transport
+
+        Args:
+            timeout (float): Read timeout in seconds
+            connect_timeout (float): Connect timeout (default: min(timeout, 10))
+            pool_connections (int): Number of per-host pools to cache
+            pool_maxsize (int): Connections kept alive per host
+            max_retries (int): Retries after the first attempt (idempotent methods only)
+            backoff_base (float): Backoff scale; attempt n sleeps up to base * 2**n
+            backoff_max (float): Longest backoff sleep
+            breaker_threshold (int): Consecutive failures that open an endpoint's breaker
+            breaker_reset (float): Seconds an open breaker rejects requests
+            verify (bool): Verify TLS certificates
+            rate_limiter (RateLimiter): Budget every attempt waits for and adapts (default: none)
+            on_unauthorized (callable): Called as on_unauthorized(method, url) on a 401;
+                                        if it returns True (e.g. after logging in again)
+                                        the request is sent once more
+        """
+        self.timeout = (connect_timeout if connect_timeout is not None else min(timeout, 10), timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.verify = verify
+        self.rate_limiter = rate_limiter
+        self.on_unauthorized = on_unauthorized
+
+        # Retries are handled here so they can respect method idempotency and breakers
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session = requests.Session()
+        self.session.verify = verify
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.breakers = {}
+        self._breakers_lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'retries': 0,
+            'failures': 0,
+            'breaker_trips': 0,
+            'breaker_rejections': 0
+        }
+
+        self.logger = logging.getLogger(__name__)
+
+    def breaker_for(self, method, url):
+        """Return (creating if needed) the circuit breaker for an endpoint"""
+        key = endpoint_key(method, url)
+        with self._breakers_lock:
+            if key not in self.breakers:
+                self.breakers[key] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return self.breakers[key]
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _can_retry(self, method, error=None, response=None):
+        if method in IDEMPOTENT_METHODS:
+            if response is not None:
+                return response.status_code in RETRY_STATUSES
+            return True
+        # A connect timeout means the request never reached the server
+        return isinstance(error, requests.exceptions.ConnectTimeout)
+
+    def _trip(self, breaker, key):
+        if breaker.record_failure():
+            self.stats['breaker_trips'] += 1
+            self.logger.warning(f"Circuit opened for {key}")
+
+    def _record_outcome(self, method, status=None, error=None):
+        if self.rate_limiter is None:
+            return
+        if error is not None and not isinstance(error, (requests.exceptions.Timeout,
+                                                        requests.exceptions.ConnectionError)):
+            # e.g. an invalid URL says nothing about the server's load
+            return
+        self.rate_limiter.record(method, status=status, error=error)
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request through the pool
+
+        Args:
+            method (str): HTTP method
+            url (str): Request URL
+            **kwargs: Passed to requests (a 'timeout' overrides the default,
+                a 'max_retries' the transport's retry budget)
+
+        Returns:
+            requests.Response: The final response (status is not checked)
+
+        Raises:
+            CircuitOpenError: If the endpoint's breaker is open
+            requests.exceptions.RequestException: If every attempt failed
+        """
+        method = method.upper()
+        max_retries = kwargs.pop('max_retries', self.max_retries)
+        kwargs.setdefault('timeout', self.timeout)
+        # Passed per request: REQUESTS_CA_BUNDLE would otherwise override session.verify
+        kwargs.setdefault('verify', self.verify)
+        breaker = self.breaker_for(method, url)
+        key = endpoint_key(method, url)
+        send = getattr(self.session, method.lower(), None)
+
+        attempt = 0
+        reauthenticated = False
+        while True:
+            if not breaker.allow():
+                self.stats['breaker_rejections'] += 1
+                raise CircuitOpenError(f"Circuit open for {key}")
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait(method)
+            self.stats['requests'] += 1
+            try:
+                if send is not None:
+                    response = send(url, **kwargs)
+                else:
+                    response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self._record_outcome(method, error=e)
+                self.stats['failures'] += 1
+                self._trip(breaker, key)
+                if attempt >= max_retries or not self._can_retry(method, error=e):
+                    raise
+                self.logger.warning(f"{key} failed ({e}), retrying")
+            else:
+                self._record_outcome(method, status=response.status_code)
+                if response.status_code in SERVER_ERROR_STATUSES:
+                    self.stats['failures'] += 1
+                    self._trip(breaker, key)
+                else:
+                    breaker.record_success()
+
+                # A 401 is refused before the request is acted on, so even a POST may be resent
+                if (response.status_code == 401 and self.on_unauthorized is not None
+                        and not reauthenticated and self.on_unauthorized(method, url)):
+                    reauthenticated = True
+                    response.close()
+                    continue
+
+                if attempt >= max_retries or not self._can_retry(method, response=response):
+                    return response
+                self.logger.warning(f"{key} returned {response.status_code}, retrying")
+                response.close()
+
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+            self.stats['retries'] += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        self.session.close()
@@ -295,11 +295,17 @@ class ProxmoxPlugin(IntegrationPlugin):
             }
         )
     
+    def _api_config(self) -> Dict[str, Any]:
+        """Client settings: the proxmox block of a full configuration, or the plugin config itself"""
+        api_config = dict(self.config.get('proxmox') or self.config)
+        api_config.setdefault('ticket_cache', True)
+        return api_config
+    
     async def initialize(self) -> bool:
         # Import Proxmox API module
         try:
             from lib.proxmox_api import ProxmoxAPI
-            self.api = ProxmoxAPI(self.config)
+            self.api = ProxmoxAPI(self._api_config())
             return True
         except Exception:
             return False
@@ -314,9 +320,29 @@ class ProxmoxPlugin(IntegrationPlugin):
         elif action == "backup":
             return await self._backup_vm(**kwargs)
             
-    async def _deploy_vm(self, **kwargs):
-        # VM deployment logic
-        return {"status": "deployed", "vmid": 100}
+    async def _deploy_vm(self, name: str = "time-shift-vm", cores: Optional[int] = None,
+                         memory: Optional[int] = None, disk: Optional[int] = None, count: int = 1,
+                         template: Optional[Any] = None, linked: bool = True, wait_agent: bool = True,
+                         **kwargs):
+        """Clone, configure, start and await count VMs from the template (see DeployPipeline)"""
+        from lib.proxmox_api_async import ProxmoxAPIAsync
+        from lib.vm_deploy import DeployPipeline, VMSpec
+        from lib.multi_cluster import TIMESHIFT_TAG
+        
+        template = template or (self.config.get('vm') or {}).get('template') or self.config.get('template')
+        if not template:
+            return {"status": "failed", "error": "No template configured (vm.template)"}
+        
+        names = [name] if count == 1 else [f"{name}-{i}" for i in range(1, count + 1)]
+        specs = [VMSpec(vm_name, cores=cores, memory=memory, disk=disk, tags=[TIMESHIFT_TAG]) for vm_name in names]
+        async with ProxmoxAPIAsync(self._api_config()) as api:
+            pipeline = DeployPipeline(api, template, linked=linked, wait_agent=wait_agent,
+                                      **{k: v for k, v in kwargs.items() if k in ('storage', 'agent_timeout')})
+            report = await pipeline.deploy(specs)
+        
+        vmids = [result.vm_id for result in report.deployed]
+        status = "deployed" if report.ok else "partial" if vmids else "failed"
+        return {"status": status, "vmid": vmids[0] if vmids else None, "vmids": vmids, **report.summary()}
     
     async def _manage_vm(self, **kwargs):
         # VM management logic
@@ -532,27 +558,48 @@ class GitPlugin(IntegrationPlugin):
 class MonitoringPlugin(IntegrationPlugin):
     """System monitoring plugin"""
     
+    def __init__(self, config: Dict[str, Any] = None):
+        super().__init__(config)
+        self.api = None
+        self.collector = None
+    
     def get_metadata(self) -> PluginMetadata:
         return PluginMetadata(
             name="monitoring",
             version="1.0.0",
             author="Time Shift Team",
             description="System and application monitoring",
-            capabilities=["metrics", "alerts", "logs", "traces"],
+            capabilities=["metrics", "history", "alerts", "logs", "traces"],
             config_schema={
                 "prometheus_url": {"type": "string"},
                 "grafana_url": {"type": "string"},
                 "alert_webhook": {"type": "string"},
+                "proxmox": {"type": "object"},
+                "rrd_backfill": {"type": "string", "default": "day"},
             }
         )
     
     async def initialize(self) -> bool:
         # Initialize monitoring connections
+        if self.config.get("proxmox"):
+            try:
+                from lib.proxmox_api_async import ProxmoxAPIAsync
+                from lib.rrd_metrics import MetricStore, RRDCollector
+                self.api = ProxmoxAPIAsync(self.config["proxmox"])
+                self.collector = RRDCollector(self.api, MetricStore())
+            except Exception:
+                return False
         return True
     
+    async def cleanup(self):
+        if self.api is not None:
+            await self.api.close()
+    
     async def execute(self, action: str, **kwargs) -> Any:
         if action == "metrics":
             return await self._collect_metrics(**kwargs)
+        elif action == "history":
+            return await self._metric_history(**kwargs)
         elif action == "alerts":
             return await self._check_alerts(**kwargs)
         elif action == "logs":
@@ -563,11 +610,32 @@ class MonitoringPlugin(IntegrationPlugin):
     async def _collect_metrics(self, **kwargs):
         # Metrics collection logic
         import psutil
-        return {
+        metrics = {
             "cpu_percent": psutil.cpu_percent(),
             "memory_percent": psutil.virtual_memory().percent,
             "disk_usage": psutil.disk_usage('/').percent
         }
+        
+        if self.collector is not None:
+            # VM and node history from Proxmox rrddata, backfilled on the first run
+            vm_ids = kwargs.get("vm_ids")
+            backfill = self.config.get("rrd_backfill", "day")
+            if backfill and not len(self.collector.store):
+                await self.collector.collect(backfill, vm_ids)
+            run = await self.collector.collect(kwargs.get("timeframe", "hour"), vm_ids)
+            metrics["proxmox"] = dict(run, cpu=self.collector.store.latest("cpu"))
+        return metrics
+    
+    async def _metric_history(self, resource: str = "", field: str = "cpu", start: float = None,
+                              end: float = None, step: float = None, **kwargs):
+        # Downsampled history of one metric, e.g. resource="qemu/100"
+        if self.collector is None:
+            return {"status": "error", "error": "Proxmox metrics not configured"}
+        try:
+            buckets = self.collector.store.query(resource, field, start, end, step)
+        except KeyError as e:
+            return {"status": "error", "error": str(e.args[0])}
+        return {"status": "ok", "resource": resource, "field": field, **buckets.to_dict()}
     
     async def _check_alerts(self, **kwargs):
         # Alert checking logic
@@ -0,0 +1,174 @@
+"""
+JSON Stream Module - Incremental decoding of large API listings
+Yields the items of one top-level array member (Proxmox's 'data') from a
+stream of byte chunks without holding the whole document in memory
+"""
+
+import codecs
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator, List, Tuple
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DECODER = json.JSONDecoder()
+_DELIMITERS = frozenset(' \t\n\r,]}')
+
+# Consumed text is dropped from the buffer once this much has piled up
+_COMPACT_AT = 1 << 16
+
+
+class JSONStreamError(ValueError):
+    """The stream is not a JSON object with the expected array member"""
+
+
+class _TextBuffer:
+    """Decoded text of a byte stream, read on demand"""
+
+    def __init__(self, chunks: AsyncIterable[bytes]):
+        self.chunks = chunks.__aiter__()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    async def fill(self):
+        """Append the next chunk (multi-byte characters may span chunks)"""
+        if self.eof:
+            return
+        try:
+            chunk = await self.chunks.__anext__()
+        except StopAsyncIteration:
+            self.eof = True
+            self.text += self.utf8.decode(b'', final=True)
+            return
+        if self.pos > _COMPACT_AT:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        self.text += self.utf8.decode(chunk)
+
+    async def peek(self) -> str:
+        """Next non-whitespace character, or '' at the end of the stream"""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if self.eof:
+                return ''
+            await self.fill()
+
+    async def expect(self, chars: str) -> str:
+        """Consume the next character, which must be one of chars"""
+        char = await self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else 'end of stream'
+            raise JSONStreamError(f"Expected one of {chars!r}, found {found}")
+        self.pos += 1
+        return char
+
+    async def value(self) -> Any:
+        """Decode the next complete JSON value"""
+        await self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+                # A number may continue in the next chunk ('1' of '12', '-1' of '-1.5e3')
+                complete = not isinstance(value, (int, float)) or self.text[end:end + 1] in _DELIMITERS
+                if self.eof or (end < len(self.text) and complete):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise JSONStreamError(f"Invalid or truncated JSON: {e}") from e
+            await self.fill()
+
+    def items(self) -> Tuple[List[Any], bool]:
+        """
+        Decode the array items already complete in the buffer
+
+        Runs without awaiting, so a chunk holding many small items costs
+        one pass. An item counts as complete once the ',' or ']' after it
+        has arrived.
+
+        Returns:
+            (items, True if the closing ']' was consumed)
+        """
+        items = []
+        text = self.text
+        while True:
+            pos = _WHITESPACE.match(text, self.pos).end()
+            try:
+                value, end = _DECODER.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise JSONStreamError(f"Invalid or truncated JSON at offset {pos} of the buffer")
+                return items, False
+            separator = _WHITESPACE.match(text, end).end()
+            char = text[separator:separator + 1]
+            if char not in (',', ']'):
+                # Either more of the item is still to come ('-1' of '-1.5'), or it is malformed
+                if self.eof:
+                    raise JSONStreamError(f"Expected ',' or ']' after an array item, found {char or 'end of stream'!r}")
+                return items, False
+            items.append(value)
+            self.pos = separator + 1
+            if char == ']':
+                return items, True
+
+    async def drain(self):
+        """Read the rest of the stream, so the connection can be reused"""
+        async for _ in self.chunks:
+            pass
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes], member: str = 'data') -> AsyncIterator[Any]:
+    """
+    Yield the items of a top-level array member as they arrive
+
+    Only one item is decoded at a time, so memory use depends on the
+    largest item rather than on the size of the document. Members before
+    the array are decoded and skipped; the rest of the document is read
+    but not decoded.
+
+    Args:
+        chunks: Byte chunks of a JSON object, e.g. response.content.iter_chunked()
+        member: Name of the array member
+
+    Yields:
+        Decoded array items; nothing if the member is missing or null
+
+    Raises:
+        JSONStreamError: If the document is malformed or the member is not an array
+    """
+    buffer = _TextBuffer(chunks)
+    await buffer.expect('{')
+    if await buffer.peek() == '}':
+        return
+
+    while True:
+        key = await buffer.value()
+        if not isinstance(key, str):
+            raise JSONStreamError(f"Expected an object key, found {key!r}")
+        await buffer.expect(':')
+
+        if key == member:
+            if await buffer.peek() != '[':
+                if await buffer.value() is not None:
+                    raise JSONStreamError(f"'{member}' is not an array")
+            else:
+                buffer.pos += 1
+                if await buffer.peek() == ']':
+                    buffer.pos += 1
+                else:
+                    while True:
+                        items, closed = buffer.items()
+                        for item in items:
+                            yield item
+                        if closed:
+                            break
+                        await buffer.fill()
+            await buffer.drain()
+            return
+
+        await buffer.value()
+        if await buffer.expect(',}') == '}':
+            return
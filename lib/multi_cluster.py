@@ -0,0 +1,283 @@
+"""
+Multi-Cluster Module - One pooled client per Proxmox cluster
+Fans queries out to every cluster concurrently and merges the answers,
+with a per-cluster timeout so one slow or unreachable site only drops
+its own part of the result
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from lib.proxmox_api_async import ProxmoxAPIAsync, ProxmoxAPIError
+
+logger = logging.getLogger(__name__)
+
+# Tag carried by the VMs this tool manages
+TIMESHIFT_TAG = 'time-shift'
+
+# (cluster name, client) -> answer of that cluster
+ClusterCall = Callable[[str, ProxmoxAPIAsync], Awaitable[Any]]
+
+
+@dataclass
+class ClusterResult:
+    """Answer of one cluster to a fanned-out query"""
+    cluster: str
+    result: Any = None
+    error: Optional[str] = None
+    timed_out: bool = False
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class FanOutResult:
+    """Merged answers of every cluster, partial when some clusters failed"""
+    operation: str
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    timed_out: List[str] = field(default_factory=list)
+    durations: Dict[str, float] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def add(self, item: ClusterResult):
+        self.durations[item.cluster] = item.duration
+        if item.ok:
+            self.results[item.cluster] = item.result
+        else:
+            self.errors[item.cluster] = item.error
+            if item.timed_out:
+                self.timed_out.append(item.cluster)
+
+    def merged(self) -> List[Any]:
+        """List answers of the clusters that answered, concatenated in cluster order"""
+        items = []
+        for result in self.results.values():
+            items.extend(result or [])
+        return items
+
+    def summary(self) -> Dict[str, Any]:
+        return {'operation': self.operation, 'answered': sorted(self.results), 'failed': sorted(self.errors),
+                'timed_out': sorted(self.timed_out), 'elapsed_s': round(self.elapsed, 3),
+                'durations_s': {name: round(d, 3) for name, d in self.durations.items()},
+                'errors': dict(sorted(self.errors.items()))}
+
+
+class MultiClusterManager:
+    """
+    Pooled async clients for several clusters
+
+    Each cluster keeps its own ProxmoxAPIAsync (connection pool, ticket,
+    cluster index), so repeated queries reuse connections and logins.
+    """
+
+    def __init__(self, clusters: Iterable[Any], default_timeout: float = 10.0):
+        """
+        Args:
+            clusters: ProxmoxClusterConfig models, or client config dicts with a 'name'
+                      (and optionally a 'query_timeout')
+            default_timeout: Query timeout of clusters that do not set one
+
+        Raises:
+            ValueError: If there are no clusters or two share a name
+        """
+        self.clients: Dict[str, ProxmoxAPIAsync] = {}
+        self.timeouts: Dict[str, float] = {}
+
+        for cluster in clusters:
+            config = cluster.dict() if hasattr(cluster, 'dict') else dict(cluster)
+            name = config.pop('name', None)
+            if not name:
+                raise ValueError("Every cluster needs a name")
+            if name in self.clients:
+                raise ValueError(f"Duplicate cluster name: {name}")
+            self.timeouts[name] = config.pop('query_timeout', None) or default_timeout
+            if config.get('host') is not None:
+                config['host'] = str(config['host'])
+            self.clients[name] = ProxmoxAPIAsync(config)
+
+        if not self.clients:
+            raise ValueError("At least one cluster is required")
+
+    @classmethod
+    def from_config(cls, config: Any, default_timeout: float = 10.0) -> 'MultiClusterManager':
+        """
+        Manager for every cluster of a TimeShiftConfig
+
+        Args:
+            config: TimeShiftConfig
+            default_timeout: Query timeout of clusters that do not set one
+        """
+        return cls(config.cluster_configs(), default_timeout)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def connect(self):
+        """Create the connection pool of every cluster"""
+        for api in self.clients.values():
+            await api.connect()
+
+    async def close(self):
+        """Close every cluster's connection pool"""
+        await asyncio.gather(*(api.close() for api in self.clients.values()), return_exceptions=True)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.clients)
+
+    def client(self, name: str) -> ProxmoxAPIAsync:
+        """
+        Client of one cluster
+
+        Raises:
+            KeyError: If no cluster has that name
+        """
+        try:
+            return self.clients[name]
+        except KeyError:
+            raise KeyError(f"Unknown cluster: {name}") from None
+
+    def _selected(self, clusters: Optional[Iterable[str]]) -> List[str]:
+        if clusters is None:
+            return self.names
+        names = list(dict.fromkeys(clusters))
+        for name in names:
+            self.client(name)
+        return names
+
+    async def _run_one(self, operation: str, name: str, call: ClusterCall,
+                       timeout: Optional[float]) -> ClusterResult:
+        limit = timeout if timeout is not None else self.timeouts[name]
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(call(name, self.clients[name]), limit)
+            return ClusterResult(name, result=result, duration=time.monotonic() - started)
+
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Cluster {name} did not answer {operation} within {limit:g}s")
+            return ClusterResult(name, error=f"No answer within {limit:g}s", timed_out=True,
+                                 duration=time.monotonic() - started)
+        except Exception as e:
+            logger.warning(f"Cluster {name} failed {operation}: {e}")
+            return ClusterResult(name, error=str(e) or e.__class__.__name__, duration=time.monotonic() - started)
+
+    async def as_completed(self, operation: str, call: ClusterCall, clusters: Optional[Iterable[str]] = None,
+                           timeout: Optional[float] = None) -> AsyncIterator[ClusterResult]:
+        """
+        Run a call on every cluster, yielding answers as they arrive
+
+        Args:
+            operation: Name used in errors and logs
+            call: Coroutine function run once per cluster with (name, client)
+            clusters: Cluster names (default: all)
+            timeout: Seconds to wait for each cluster (default: its query_timeout)
+
+        Yields:
+            ClusterResult per cluster, fastest first
+        """
+        tasks = [asyncio.ensure_future(self._run_one(operation, name, call, timeout))
+                 for name in self._selected(clusters)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def fan_out(self, operation: str, call: ClusterCall, clusters: Optional[Iterable[str]] = None,
+                      timeout: Optional[float] = None) -> FanOutResult:
+        """
+        Run a call on every cluster concurrently and collect the answers
+
+        Returns once every cluster has answered, failed or timed out, so
+        the wait is bounded by the largest per-cluster timeout.
+
+        Args:
+            operation: Name used in errors and logs
+            call: Coroutine function run once per cluster with (name, client)
+            clusters: Cluster names (default: all)
+            timeout: Seconds to wait for each cluster (default: its query_timeout)
+
+        Returns:
+            FanOutResult with answers keyed by cluster name, in cluster order
+        """
+        names = self._selected(clusters)
+        started = time.monotonic()
+        items = await asyncio.gather(*(self._run_one(operation, name, call, timeout) for name in names))
+
+        result = FanOutResult(operation)
+        for item in items:
+            result.add(item)
+        result.elapsed = time.monotonic() - started
+        return result
+
+    @staticmethod
+    async def _index(api: ProxmoxAPIAsync, force: bool = False):
+        if not await api.refresh_index(force=force):
+            raise ProxmoxAPIError("Cluster resources are unavailable")
+        return api.cluster_index
+
+    def query_vms(self, clusters: Optional[Iterable[str]] = None, timeout: Optional[float] = None,
+                  fresh: bool = False, **criteria) -> Awaitable[FanOutResult]:
+        """
+        Guests matching criteria in every cluster
+
+        Args:
+            clusters: Cluster names (default: all)
+            timeout: Seconds to wait for each cluster (default: its query_timeout)
+            fresh: Reload each cluster index instead of using one within its refresh interval
+            **criteria: ClusterIndex.query filters (node, tag, status, name, guest_type, templates)
+
+        Returns:
+            FanOutResult whose merged() entries carry a 'cluster' key
+        """
+        async def call(name: str, api: ProxmoxAPIAsync) -> List[Dict[str, Any]]:
+            index = await self._index(api, force=fresh)
+            return [dict(entry, cluster=name) for entry in index.query(**criteria)]
+
+        return self.fan_out('query', call, clusters, timeout)
+
+    def find_vm(self, name: str, clusters: Optional[Iterable[str]] = None,
+                timeout: Optional[float] = None) -> Awaitable[FanOutResult]:
+        """
+        Guests with a name in every cluster (names are unique in no cluster, let alone across them)
+
+        Args:
+            name: Guest name
+            clusters: Cluster names (default: all)
+            timeout: Seconds to wait for each cluster (default: its query_timeout)
+        """
+        return self.query_vms(clusters, timeout, name=name, templates=True)
+
+    def timeshift_status(self, tag: str = TIMESHIFT_TAG, clusters: Optional[Iterable[str]] = None,
+                         timeout: Optional[float] = None) -> Awaitable[FanOutResult]:
+        """
+        Current status of every tagged VM in every cluster
+
+        Uses one fresh /cluster/resources listing per cluster, which
+        carries status, uptime, CPU and memory of each guest.
+
+        Args:
+            tag: Tag marking time-shift VMs
+            clusters: Cluster names (default: all)
+            timeout: Seconds to wait for each cluster (default: its query_timeout)
+        """
+        return self.query_vms(clusters, timeout, fresh=True, tag=tag, guest_type='qemu')
@@ -7,21 +7,75 @@ import socket
 import ssl
 import subprocess
 import logging
+import math
+import time
 import requests
 import urllib3
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 import json
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+
+try:
+    from lib.http_transport import ResilientTransport
+except ImportError:  # imported from bin/ with lib/ on sys.path
+    from http_transport import ResilientTransport
 
 # Disable SSL warnings for connections to systems with expired certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Attribute names as reported by ssl.SSLSocket.getpeercert()
+CERT_NAME_ATTRIBUTES = {
+    NameOID.COMMON_NAME: 'commonName',
+    NameOID.ORGANIZATION_NAME: 'organizationName',
+    NameOID.ORGANIZATIONAL_UNIT_NAME: 'organizationalUnitName',
+    NameOID.COUNTRY_NAME: 'countryName',
+    NameOID.STATE_OR_PROVINCE_NAME: 'stateOrProvinceName',
+    NameOID.LOCALITY_NAME: 'localityName',
+    NameOID.EMAIL_ADDRESS: 'emailAddress',
+}
+
+CERT_TIME_FORMAT = '%b %d %H:%M:%S %Y GMT'
+
+
+def _cert_name_to_dict(name):
+    """Convert an x509 Name into the dict layout used by getpeercert()"""
+    return {
+        CERT_NAME_ATTRIBUTES.get(attr.oid, attr.oid.dotted_string): attr.value
+        for attr in name
+    }
+
+
+def _cert_validity(cert):
+    """Return a certificate's (not_before, not_after) as aware UTC datetimes"""
+    if hasattr(cert, 'not_valid_after_utc'):
+        return cert.not_valid_before_utc, cert.not_valid_after_utc
+    return (cert.not_valid_before.replace(tzinfo=timezone.utc),
+            cert.not_valid_after.replace(tzinfo=timezone.utc))
+
 class NetworkValidator:
     """Network connectivity and SSL certificate validation utilities"""
     
-    def __init__(self):
-        """Initialize NetworkValidator"""
+    def __init__(self, timeout_tracker=None, transport=None):
+        """
+        Initialize NetworkValidator
+        
+        Args:
+            timeout_tracker (HostTimeoutTracker): Optional per-host adaptive
+                timeouts and quarantine; without it every probe uses self.timeout
+            transport (ResilientTransport): Optional shared HTTP transport
+        """
         self.logger = logging.getLogger(__name__)
         self.timeout = 10
+        self.timeouts = timeout_tracker
+        self.transport = transport or ResilientTransport(timeout=self.timeout, verify=False)
+    
+    def _timeout_for(self, host, phase='connect'):
+        """Timeout for a probe phase, adaptive when a tracker is configured"""
+        if self.timeouts is None:
+            return self.timeout
+        return self.timeouts.timeout(host, phase)
     
     def ping_host(self, host, count=4):
         """
@@ -34,12 +88,20 @@ class NetworkValidator:
         Returns:
             bool: True if ping successful, False otherwise
         """
+        command = ['ping', '-c', str(count), host]
+        timeout = self.timeout
+        if self.timeouts is not None:
+            # Bound the per-reply wait by the host's RTO instead of ping's default
+            wait = self._timeout_for(host)
+            command[3:3] = ['-W', str(max(1, math.ceil(wait)))]
+            timeout = count + wait
+        
         try:
             result = subprocess.run(
-                ['ping', '-c', str(count), host],
+                command,
                 capture_output=True,
                 text=True,
-                timeout=self.timeout
+                timeout=timeout
             )
             
             if result.returncode == 0:
@@ -67,11 +129,16 @@ class NetworkValidator:
         Returns:
             bool: True if port is open, False otherwise
         """
+        started = time.monotonic()
         try:
-            with socket.create_connection((host, port), timeout=self.timeout):
+            with socket.create_connection((host, port), timeout=self._timeout_for(host)):
+                if self.timeouts is not None:
+                    self.timeouts.record_rtt(host, time.monotonic() - started)
                 self.logger.info(f"Port {port} is open on {host}")
                 return True
         except (socket.timeout, socket.error) as e:
+            if self.timeouts is not None and isinstance(e, socket.timeout):
+                self.timeouts.record_timeout(host)
             self.logger.warning(f"Port {port} is closed on {host}: {e}")
             return False
     
@@ -91,18 +158,24 @@ class NetworkValidator:
             context.check_hostname = False
             context.verify_mode = ssl.CERT_NONE
             
-            with socket.create_connection((host, port), timeout=self.timeout) as sock:
+            with socket.create_connection((host, port), timeout=self._timeout_for(host)) as sock:
+                sock.settimeout(self._timeout_for(host, 'handshake'))
                 with context.wrap_socket(sock, server_hostname=host) as ssock:
-                    cert = ssock.getpeercert()
+                    # getpeercert() returns an empty dict when verification is
+                    # disabled, so decode the DER certificate ourselves
+                    cert = x509.load_der_x509_certificate(ssock.getpeercert(binary_form=True))
+                    not_before, not_after = _cert_validity(cert)
+                    now = datetime.now(timezone.utc)
                     
                     cert_info = {
-                        'subject': dict(x[0] for x in cert['subject']),
-                        'issuer': dict(x[0] for x in cert['issuer']),
-                        'version': cert['version'],
-                        'serial_number': cert['serialNumber'],
-                        'not_before': cert['notBefore'],
-                        'not_after': cert['notAfter'],
-                        'expired': datetime.strptime(cert['notAfter'], '%b %d %H:%M:%S %Y %Z') < datetime.now()
+                        'subject': _cert_name_to_dict(cert.subject),
+                        'issuer': _cert_name_to_dict(cert.issuer),
+                        'version': cert.version.value + 1,
+                        'serial_number': format(cert.serial_number, 'X'),
+                        'not_before': not_before.strftime(CERT_TIME_FORMAT),
+                        'not_after': not_after.strftime(CERT_TIME_FORMAT),
+                        'expired': not_after < now,
+                        'not_yet_valid': not_before > now
                     }
                     
                     self.logger.info(f"Retrieved SSL certificate for {host}")
@@ -112,7 +185,8 @@ class NetworkValidator:
             self.logger.error(f"Failed to get SSL certificate info: {e}")
             return None
     
-    def validate_idrac_connection(self, idrac_ip, username=None, password=None):
+    def validate_idrac_connection(self, idrac_ip, username=None, password=None, port=443,
+                                  precheck=True):
         """
         Validate connection to Dell iDRAC interface
         
@@ -120,34 +194,40 @@ class NetworkValidator:
             idrac_ip (str): iDRAC IP address
             username (str): Optional username (default: root)
             password (str): Optional password (default: calvin - Dell standard)
+            port (int): HTTPS port of the web interface (default 443)
+            precheck (bool): Ping and check the port first; callers that
+                already did pass False
             
         Returns:
             bool: True if connection successful, False otherwise
         """
-        # Test basic connectivity first
-        if not self.ping_host(idrac_ip, count=2):
-            self.logger.error(f"Cannot ping iDRAC at {idrac_ip}")
-            return False
-        
-        # Test HTTPS port
-        if not self.check_port_open(idrac_ip, 443):
-            self.logger.error(f"HTTPS port 443 not accessible on {idrac_ip}")
-            return False
+        if precheck:
+            # Test basic connectivity first
+            if not self.ping_host(idrac_ip, count=2):
+                self.logger.error(f"Cannot ping iDRAC at {idrac_ip}")
+                return False
+            
+            # Test HTTPS port
+            if not self.check_port_open(idrac_ip, port):
+                self.logger.error(f"HTTPS port {port} not accessible on {idrac_ip}")
+                return False
         
-        # Try to access iDRAC web interface
+        # Try to access iDRAC web interface; one attempt bounded by the host's
+        # handshake timeout, so a BMC that accepts TCP but hangs fails fast
         try:
-            url = f"https://{idrac_ip}"
-            response = requests.get(
+            url = f"https://{idrac_ip}" if port == 443 else f"https://{idrac_ip}:{port}"
+            response = self.transport.get(
                 url,
-                timeout=self.timeout,
-                verify=False  # Ignore SSL certificate issues
+                timeout=self._timeout_for(idrac_ip, 'handshake'),
+                verify=False,  # Ignore SSL certificate issues
+                max_retries=0
             )
             
             if response.status_code in [200, 401, 403]:
                 self.logger.info(f"iDRAC web interface accessible at {idrac_ip}")
                 
                 # Get certificate info
-                cert_info = self.get_ssl_certificate_info(idrac_ip)
+                cert_info = self.get_ssl_certificate_info(idrac_ip, port)
                 if cert_info:
                     if cert_info['expired']:
                         self.logger.warning(f"iDRAC SSL certificate is expired")
@@ -163,43 +243,106 @@ class NetworkValidator:
             self.logger.error(f"Failed to connect to iDRAC web interface: {e}")
             return False
     
-    def test_connectivity_suite(self, targets):
+    def test_connectivity_suite(self, targets, max_workers=1, ping_count=4, store=None,
+                                skip_quarantined=False):
         """
         Run comprehensive connectivity tests against multiple targets
         
         Args:
             targets (list): List of target dictionaries with 'host' and optional 'port'
+            max_workers (int): Number of targets probed concurrently
+            ping_count (int): Number of ping packets per target
+            store (ProbeResultStore): Optional columnar store the results are appended to
+            skip_quarantined (bool): Leave quarantined hosts out of the results
+                instead of reporting them as fast-failed
             
         Returns:
             dict: Test results for each target
         """
-        results = {}
+        if skip_quarantined and self.timeouts is not None:
+            targets = [t for t in targets if not self.timeouts.is_quarantined(t['host'])]
         
-        for target in targets:
-            host = target['host']
-            port = target.get('port', 443)
-            
-            self.logger.info(f"Testing connectivity to {host}:{port}")
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                probed = list(executor.map(lambda t: self._probe_target(t, ping_count), targets))
+        else:
+            probed = [self._probe_target(target, ping_count) for target in targets]
+        
+        results = {target['host']: result for target, result in zip(targets, probed)}
+        
+        if store is not None:
+            store.extend(results)
+        
+        if self.timeouts is not None:
+            self.timeouts.save()
+        
+        return results
+    
+    def _probe_target(self, target, ping_count=4):
+        """
+        Run the connectivity probes for a single target
+        
+        Args:
+            target (dict): Target dictionary with 'host' and optional 'port'/'type'
+            ping_count (int): Number of ping packets
             
-            results[host] = {
-                'ping': self.ping_host(host),
-                'port_open': self.check_port_open(host, port),
-                'ssl_cert': self.get_ssl_certificate_info(host, port),
-                'timestamp': datetime.now().isoformat()
+        Returns:
+            dict: Probe results for the target
+        """
+        host = target['host']
+        port = target.get('port', 443)
+        started = time.monotonic()
+        
+        quarantined_until = self.timeouts.quarantined_until(host) if self.timeouts is not None else None
+        if quarantined_until is not None:
+            retry_after = datetime.fromtimestamp(quarantined_until)
+            self.logger.info(f"Skipping quarantined host {host} until {retry_after.isoformat()}")
+            return {
+                'ping': False,
+                'port_open': False,
+                'ssl_cert': None,
+                'timestamp': datetime.now().isoformat(),
+                'rtt': None,
+                'quarantined': True,
+                'retry_after': retry_after.isoformat(),
+                'duration': time.monotonic() - started
             }
-            
-            # Special handling for iDRAC interfaces
-            if target.get('type') == 'idrac':
-                results[host]['idrac_accessible'] = self.validate_idrac_connection(host)
         
-        return results
+        self.logger.info(f"Testing connectivity to {host}:{port}")
+        
+        ping = self.ping_host(host, count=ping_count)
+        
+        connect_started = time.monotonic()
+        port_open = self.check_port_open(host, port)
+        rtt = time.monotonic() - connect_started if port_open else None
+        
+        result = {
+            'ping': ping,
+            'port_open': port_open,
+            'ssl_cert': self.get_ssl_certificate_info(host, port) if port_open else None,
+            'timestamp': datetime.now().isoformat(),
+            'rtt': rtt
+        }
+        
+        # Special handling for iDRAC interfaces
+        if target.get('type') == 'idrac':
+            result['idrac_accessible'] = port_open and self.validate_idrac_connection(host, port=port,
+                                                                                     precheck=False)
+        
+        if self.timeouts is not None:
+            # A BMC whose web interface does not answer counts as down
+            self.timeouts.record_result(host, port_open and result.get('idrac_accessible', True))
+        
+        result['duration'] = time.monotonic() - started
+        return result
     
     def generate_connectivity_report(self, results, output_file=None):
         """
         Generate a human-readable connectivity report
         
         Args:
-            results (dict): Results from test_connectivity_suite
+            results (dict or ProbeResultStore): Results from test_connectivity_suite,
+                or a columnar store holding them (latest result per host is reported)
             output_file (str): Optional file path to save report
             
         Returns:
@@ -211,16 +354,41 @@ class NetworkValidator:
         report_lines.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         report_lines.append("")
         
-        for host, tests in results.items():
+        if hasattr(results, 'iter_latest'):
+            summary = results.summary()
+            report_lines.append(f"Hosts: {summary['hosts']} ({summary['results']} results)")
+            report_lines.append(f"Port Up: {summary['port_up_ratio']:.1%}")
+            rtt = summary['rtt']
+            report_lines.append(
+                f"RTT p50/p90/p99: {rtt['p50'] * 1000:.1f}/{rtt['p90'] * 1000:.1f}/{rtt['p99'] * 1000:.1f} ms"
+            )
+            report_lines.append("")
+            entries = ((row.host, row) for row in results.iter_latest())
+        else:
+            entries = results.items()
+        
+        for host, tests in entries:
+            if hasattr(tests, 'cert_not_after'):
+                report_lines.extend(self._format_store_row(tests))
+                continue
+            
             report_lines.append(f"Target: {host}")
             report_lines.append("-" * 20)
             
             report_lines.append(f"  Ping: {'✓' if tests['ping'] else '✗'}")
             report_lines.append(f"  Port Open: {'✓' if tests['port_open'] else '✗'}")
             
+            if tests.get('quarantined'):
+                report_lines.append(f"  Quarantined Until: {tests['retry_after']}")
+            
             if tests.get('ssl_cert'):
                 cert = tests['ssl_cert']
-                status = "EXPIRED" if cert['expired'] else "VALID"
+                if cert['expired']:
+                    status = "EXPIRED"
+                elif cert.get('not_yet_valid'):
+                    status = "NOT YET VALID"
+                else:
+                    status = "VALID"
                 report_lines.append(f"  SSL Certificate: {status}")
                 report_lines.append(f"    Expires: {cert['not_after']}")
             else:
@@ -240,6 +408,40 @@ class NetworkValidator:
         
         return report
     
+    def _format_store_row(self, row):
+        """
+        Format one ProbeResultStore row for the connectivity report
+        
+        Args:
+            row (ProbeRow): Row decoded from the store
+            
+        Returns:
+            list: Report lines
+        """
+        lines = [f"Target: {row.host}", "-" * 20]
+        lines.append(f"  Ping: {'✓' if row.ping else '✗'}")
+        lines.append(f"  Port Open: {'✓' if row.port_open else '✗'}")
+        
+        if row.ssl_cert:
+            if row.cert_expired:
+                status = "EXPIRED"
+            elif row.cert_not_yet_valid:
+                status = "NOT YET VALID"
+            else:
+                status = "VALID"
+            lines.append(f"  SSL Certificate: {status}")
+            if row.cert_not_after == row.cert_not_after:  # NaN check
+                expires = datetime.fromtimestamp(row.cert_not_after, timezone.utc)
+                lines.append(f"    Expires: {expires.strftime(CERT_TIME_FORMAT)}")
+        else:
+            lines.append(f"  SSL Certificate: Not Available")
+        
+        if row.idrac_tested:
+            lines.append(f"  iDRAC Access: {'✓' if row.idrac_accessible else '✗'}")
+        
+        lines.append("")
+        return lines
+    
     def dns_lookup(self, hostname):
         """
         Perform DNS lookup for hostname
@@ -0,0 +1,272 @@
+"""
+Probe Result Store - Columnar storage for fleet connectivity results
+Keeps repeated probe runs across thousands of hosts in compact typed arrays
+"""
+
+import math
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without NumPy
+    np = None
+
+CERT_TIME_FORMAT = '%b %d %H:%M:%S %Y GMT'
+
+# Boolean columns stored as bitsets, one bit per row
+FLAG_COLUMNS = ('ping', 'port_open', 'ssl_cert', 'cert_expired', 'cert_not_yet_valid',
+                'idrac_tested', 'idrac_accessible')
+
+
+class ProbeRow(NamedTuple):
+    """One decoded row of the store"""
+    host: str
+    timestamp: float
+    rtt: float
+    ping: bool
+    port_open: bool
+    ssl_cert: bool
+    cert_expired: bool
+    cert_not_yet_valid: bool
+    cert_not_after: float
+    idrac_tested: bool
+    idrac_accessible: bool
+
+
+class Bitset:
+    """Growable bitset backed by a bytearray"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.length = 0
+
+    def append(self, value: bool):
+        if self.length % 8 == 0:
+            self.data.append(0)
+        if value:
+            self.data[self.length >> 3] |= 1 << (self.length & 7)
+        self.length += 1
+
+    def __getitem__(self, index: int) -> bool:
+        return bool(self.data[index >> 3] & (1 << (index & 7)))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def count(self) -> int:
+        """Number of set bits"""
+        if np is not None:
+            return int(self.to_numpy().sum())
+        return sum(bin(byte).count('1') for byte in self.data)
+
+    def to_numpy(self):
+        """Unpack into a NumPy boolean array"""
+        bits = np.unpackbits(np.frombuffer(bytes(self.data), dtype=np.uint8), bitorder='little')
+        return bits[:self.length].astype(bool)
+
+
+def _percentile(values: Sequence[float], pct: float) -> float:
+    """Linear-interpolated percentile used when NumPy is unavailable"""
+    ordered = sorted(values)
+    if not ordered:
+        return math.nan
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class ProbeResultStore:
+    """Array-backed store of connectivity probe results"""
+
+    def __init__(self):
+        """Initialize an empty store"""
+        self.hosts: List[str] = []
+        self.host_ids: Dict[str, int] = {}
+
+        self.host_column = array('I')
+        self.timestamps = array('d')
+        self.rtts = array('d')
+        self.cert_not_after = array('d')
+        self.flags: Dict[str, Bitset] = {name: Bitset() for name in FLAG_COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.host_column)
+
+    def intern_host(self, host: str) -> int:
+        """Return the numeric id for a host, adding it to the host table"""
+        host_id = self.host_ids.get(host)
+        if host_id is None:
+            host_id = len(self.hosts)
+            self.hosts.append(host)
+            self.host_ids[host] = host_id
+        return host_id
+
+    def append(self, host: str, result: Dict[str, Any]):
+        """
+        Append one probe result
+
+        Args:
+            host: Target host
+            result: Per-host result from NetworkValidator.test_connectivity_suite
+        """
+        timestamp = result.get('timestamp')
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp).timestamp()
+        elif timestamp is None:
+            timestamp = time.time()
+
+        rtt = result.get('rtt')
+        cert = result.get('ssl_cert') or {}
+        not_after = math.nan
+        if cert.get('not_after'):
+            not_after = datetime.strptime(cert['not_after'], CERT_TIME_FORMAT).replace(
+                tzinfo=timezone.utc).timestamp()
+
+        self.host_column.append(self.intern_host(host))
+        self.timestamps.append(timestamp)
+        self.rtts.append(math.nan if rtt is None else float(rtt))
+        self.cert_not_after.append(not_after)
+
+        self.flags['ping'].append(bool(result.get('ping')))
+        self.flags['port_open'].append(bool(result.get('port_open')))
+        self.flags['ssl_cert'].append(bool(cert))
+        self.flags['cert_expired'].append(bool(cert.get('expired')))
+        self.flags['cert_not_yet_valid'].append(bool(cert.get('not_yet_valid')))
+        self.flags['idrac_tested'].append(result.get('idrac_accessible') is not None)
+        self.flags['idrac_accessible'].append(bool(result.get('idrac_accessible')))
+
+    def extend(self, results: Dict[str, Dict[str, Any]]):
+        """Append every host from a test_connectivity_suite result dict"""
+        for host, result in results.items():
+            self.append(host, result)
+
+    def row(self, index: int) -> ProbeRow:
+        """Decode a single row"""
+        return ProbeRow(
+            host=self.hosts[self.host_column[index]],
+            timestamp=self.timestamps[index],
+            rtt=self.rtts[index],
+            cert_not_after=self.cert_not_after[index],
+            **{name: self.flags[name][index] for name in FLAG_COLUMNS},
+        )
+
+    def latest_indices(self) -> List[int]:
+        """Row index of the most recent result for each host, in host-table order"""
+        latest = [-1] * len(self.hosts)
+        if np is not None and len(self):
+            ids = np.frombuffer(self.host_column, dtype=np.uint32)
+            # First occurrence in the reversed column is each host's last row
+            _, first = np.unique(ids[::-1], return_index=True)
+            return (len(ids) - 1 - first).tolist()
+
+        for index, host_id in enumerate(self.host_column):
+            latest[host_id] = index
+        return [i for i in latest if i >= 0]
+
+    def iter_latest(self) -> Iterator[ProbeRow]:
+        """Yield the most recent row for every host"""
+        for index in self.latest_indices():
+            yield self.row(index)
+
+    def up_ratio(self, column: str = 'port_open', latest_only: bool = False) -> float:
+        """
+        Share of rows where a boolean column is set
+
+        Args:
+            column: One of FLAG_COLUMNS
+            latest_only: Only consider each host's most recent result
+
+        Returns:
+            Ratio between 0 and 1 (NaN when empty)
+        """
+        bits = self.flags[column]
+        if not len(bits):
+            return math.nan
+
+        if latest_only:
+            indices = self.latest_indices()
+            if np is not None:
+                return float(bits.to_numpy()[indices].mean())
+            return sum(bits[i] for i in indices) / len(indices)
+
+        return bits.count() / len(bits)
+
+    def host_up_ratios(self, column: str = 'port_open') -> Dict[str, float]:
+        """Per-host share of results where a boolean column is set"""
+        if not len(self):
+            return {}
+
+        if np is not None:
+            ids = np.frombuffer(self.host_column, dtype=np.uint32)
+            totals = np.bincount(ids, minlength=len(self.hosts))
+            ups = np.bincount(ids, weights=self.flags[column].to_numpy(), minlength=len(self.hosts))
+            ratios = ups / np.maximum(totals, 1)
+            return {host: float(ratios[i]) for i, host in enumerate(self.hosts)}
+
+        totals = [0] * len(self.hosts)
+        ups = [0] * len(self.hosts)
+        bits = self.flags[column]
+        for index, host_id in enumerate(self.host_column):
+            totals[host_id] += 1
+            ups[host_id] += bits[index]
+        return {host: ups[i] / totals[i] for i, host in enumerate(self.hosts) if totals[i]}
+
+    def rtt_percentiles(self, percentiles: Iterable[float] = (50, 90, 99)) -> Dict[str, float]:
+        """
+        RTT percentiles over all rows with a measured RTT
+
+        Args:
+            percentiles: Percentiles to compute
+
+        Returns:
+            Dict like {'p50': 0.012, 'p99': 0.2} in seconds
+        """
+        percentiles = list(percentiles)
+        if np is not None:
+            rtts = np.frombuffer(self.rtts, dtype=np.float64)
+            rtts = rtts[~np.isnan(rtts)]
+            if not rtts.size:
+                return {f"p{p:g}": math.nan for p in percentiles}
+            values = np.percentile(rtts, percentiles)
+            return {f"p{p:g}": float(v) for p, v in zip(percentiles, values)}
+
+        rtts = [r for r in self.rtts if not math.isnan(r)]
+        return {f"p{p:g}": _percentile(rtts, p) for p in percentiles}
+
+    def summary(self) -> Dict[str, Any]:
+        """Compact fleet summary for reports and health output"""
+        return {
+            'hosts': len(self.hosts),
+            'results': len(self),
+            'port_up_ratio': self.up_ratio('port_open', latest_only=True),
+            'ping_up_ratio': self.up_ratio('ping', latest_only=True),
+            'expired_cert_ratio': self.up_ratio('cert_expired', latest_only=True),
+            'rtt': self.rtt_percentiles(),
+        }
+
+    def to_results(self) -> Dict[str, Dict[str, Any]]:
+        """Rebuild the latest result per host in test_connectivity_suite layout"""
+        results = {}
+        for row in self.iter_latest():
+            result = {
+                'ping': row.ping,
+                'port_open': row.port_open,
+                'ssl_cert': None,
+                'timestamp': datetime.fromtimestamp(row.timestamp).isoformat(),
+                'rtt': None if math.isnan(row.rtt) else row.rtt,
+            }
+            if row.ssl_cert:
+                result['ssl_cert'] = {
+                    'expired': row.cert_expired,
+                    'not_yet_valid': row.cert_not_yet_valid,
+                    'not_after': datetime.fromtimestamp(row.cert_not_after, timezone.utc).strftime(
+                        CERT_TIME_FORMAT) if not math.isnan(row.cert_not_after) else None,
+                }
+            if row.idrac_tested:
+                result['idrac_accessible'] = row.idrac_accessible
+            results[row.host] = result
+        return results
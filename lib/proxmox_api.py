@@ -4,10 +4,27 @@ Handles all interactions with the Proxmox Virtual Environment API
 """
 
 import requests
+import threading
 import urllib3
+import time
 from datetime import datetime
 import logging
 
+try:
+    from lib.cluster_index import ClusterIndex
+    from lib.http_transport import ResilientTransport
+    from lib.rate_limiter import RateLimiter
+    from lib.task_waiter import TaskHandle
+    from lib.ticket_cache import TicketCache, ticket_expiry
+    from lib.validators import api_token_from_config
+except ImportError:  # imported from bin/ with lib/ on sys.path
+    from cluster_index import ClusterIndex
+    from http_transport import ResilientTransport
+    from rate_limiter import RateLimiter
+    from task_waiter import TaskHandle
+    from ticket_cache import TicketCache, ticket_expiry
+    from validators import api_token_from_config
+
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -27,13 +44,44 @@ class ProxmoxAPI:
         self.password = config.get('password')
         self.node = config.get('node')
         self.verify_ssl = config.get('verify_ssl', False)
+        self.timeout = config.get('timeout', 30)
         
         self.base_url = f"https://{self.host}:{self.port}/api2/json"
-        self.session = requests.Session()
-        self.session.verify = self.verify_ssl
+        
+        # Adaptive request budgets sparing pveproxy's workers: True for the
+        # defaults, or a dict of per-budget overrides (see RateLimiter)
+        limit = config.get('rate_limit', False)
+        self.rate_limiter = RateLimiter(limit if isinstance(limit, dict) else None) if limit else None
+        self.transport = ResilientTransport(
+            timeout=self.timeout,
+            connect_timeout=config.get('connect_timeout'),
+            pool_maxsize=config.get('pool_size', 10),
+            max_retries=config.get('max_retries', 3),
+            verify=self.verify_ssl,
+            rate_limiter=self.rate_limiter,
+            on_unauthorized=self._reauthenticate
+        )
+        self.session = self.transport.session
         
         self.ticket = None
         self.csrf_token = None
+        self.ticket_expiry = None
+        self._auth_lock = threading.Lock()
+        
+        # API tokens authenticate every request statelessly: no ticket, no CSRF
+        self.token_id, self.token_secret = api_token_from_config(config) or (None, None)
+        if self.token_id:
+            self.username = self.username or self.token_id.split('!')[0]
+            self.session.headers['Authorization'] = f"PVEAPIToken={self.token_id}={self.token_secret}"
+        
+        # Tickets persisted across processes (see TicketCache)
+        use_cache = config.get('ticket_cache', False) and not self.token_id
+        self.ticket_cache = TicketCache() if use_cache else None
+        
+        # Per-VM calls are routed to the node the index says the VM is on;
+        # without a fixed node the index is kept fresh automatically
+        self.cluster_index = ClusterIndex(config.get('index_refresh', 30))
+        self.auto_index = config.get('cluster_index', not self.node)
         
         self.logger = logging.getLogger(__name__)
     
@@ -41,6 +89,82 @@ class ProxmoxAPI:
         """
         Authenticate with Proxmox and get ticket/CSRF token
         
+        A cached ticket from an earlier process is reused when the ticket
+        cache is enabled; otherwise only one process at a time logs in.
+        
+        Returns:
+            bool: True if authentication successful, False otherwise
+        """
+        if self.token_id:
+            # The Authorization header set at construction is all that is needed
+            return True
+        
+        if self.ticket_cache is None:
+            return self._login()
+        
+        key = TicketCache.key(self.host, self.port, self.username)
+        if self._use_cached_ticket(key):
+            return True
+        
+        with self.ticket_cache.lock(key):
+            # Another process may have logged in while we waited for the lock
+            if self._use_cached_ticket(key):
+                return True
+            if not self._login():
+                return False
+            self.ticket_cache.store(key, self.ticket, self.csrf_token, self.ticket_expiry.timestamp())
+            return True
+    
+    def _reauthenticate(self, method, url):
+        """
+        Transport hook for a 401: drop the rejected ticket and log in again
+        
+        Returns:
+            bool: True if the request should be sent again with a new ticket
+        """
+        rejected = self.ticket
+        if self.token_id or rejected is None or url.endswith('/access/ticket'):
+            return False
+        
+        with self._auth_lock:
+            if self.ticket != rejected:
+                # Another thread has already replaced it
+                return True
+            self.logger.warning("Proxmox rejected the ticket, re-authenticating")
+            self.ticket = None
+            if self.ticket_cache is not None:
+                key = TicketCache.key(self.host, self.port, self.username)
+                cached = self.ticket_cache.load(key)
+                # Unless another process has already stored a newer one
+                if cached and cached['ticket'] == rejected:
+                    self.ticket_cache.invalidate(key)
+            return self.authenticate()
+    
+    def _use_cached_ticket(self, key):
+        """Apply a still-valid cached ticket, returning True if one was found"""
+        cached = self.ticket_cache.load(key)
+        if not cached:
+            return False
+        self._set_ticket(cached['ticket'], cached['csrf_token'], cached['expires'])
+        self.logger.info("Reusing cached Proxmox ticket")
+        return True
+    
+    def _set_ticket(self, ticket, csrf_token, expires):
+        """Install a ticket and CSRF token on the session"""
+        self.ticket = ticket
+        self.csrf_token = csrf_token
+        self.ticket_expiry = datetime.fromtimestamp(expires)
+        
+        # Set authentication headers
+        self.session.headers.update({
+            'CSRFPreventionToken': self.csrf_token
+        })
+        self.session.cookies.set('PVEAuthCookie', self.ticket)
+    
+    def _login(self):
+        """
+        Request a new ticket from /access/ticket
+        
         Returns:
             bool: True if authentication successful, False otherwise
         """
@@ -50,21 +174,14 @@ class ProxmoxAPI:
         }
         
         try:
-            response = self.session.post(
+            response = self.transport.post(
                 f"{self.base_url}/access/ticket",
                 data=auth_data
             )
             response.raise_for_status()
             
             data = response.json()['data']
-            self.ticket = data['ticket']
-            self.csrf_token = data['CSRFPreventionToken']
-            
-            # Set authentication headers
-            self.session.headers.update({
-                'CSRFPreventionToken': self.csrf_token
-            })
-            self.session.cookies.set('PVEAuthCookie', self.ticket)
+            self._set_ticket(data['ticket'], data['CSRFPreventionToken'], ticket_expiry(data['ticket']))
             
             self.logger.info("Successfully authenticated with Proxmox")
             return True
@@ -88,8 +205,8 @@ class ProxmoxAPI:
                 return None
         
         try:
-            response = self.session.get(
-                f"{self.base_url}/nodes/{self.node}/qemu/{vm_id}/status/current"
+            response = self.transport.get(
+                self._vm_url(vm_id, "status/current")
             )
             response.raise_for_status()
             
@@ -97,6 +214,7 @@ class ProxmoxAPI:
             
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Failed to get VM status: {e}")
+            self._route_failed(vm_id)
             return None
     
     def start_vm(self, vm_id):
@@ -107,24 +225,25 @@ class ProxmoxAPI:
             vm_id (int): VM ID
             
         Returns:
-            bool: True if successful, False otherwise
+            TaskHandle: Handle for the start task (see wait_task) or None if failed
         """
         if not self.ticket:
             if not self.authenticate():
-                return False
+                return None
         
         try:
-            response = self.session.post(
-                f"{self.base_url}/nodes/{self.node}/qemu/{vm_id}/status/start"
+            response = self.transport.post(
+                self._vm_url(vm_id, "status/start")
             )
             response.raise_for_status()
             
             self.logger.info(f"VM {vm_id} start command sent")
-            return True
+            return TaskHandle.from_upid(response.json()['data'], vm_id)
             
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Failed to start VM: {e}")
-            return False
+            self._route_failed(vm_id)
+            return None
     
     def stop_vm(self, vm_id):
         """
@@ -134,24 +253,25 @@ class ProxmoxAPI:
             vm_id (int): VM ID
             
         Returns:
-            bool: True if successful, False otherwise
+            TaskHandle: Handle for the stop task (see wait_task) or None if failed
         """
         if not self.ticket:
             if not self.authenticate():
-                return False
+                return None
         
         try:
-            response = self.session.post(
-                f"{self.base_url}/nodes/{self.node}/qemu/{vm_id}/status/stop"
+            response = self.transport.post(
+                self._vm_url(vm_id, "status/stop")
             )
             response.raise_for_status()
             
             self.logger.info(f"VM {vm_id} stop command sent")
-            return True
+            return TaskHandle.from_upid(response.json()['data'], vm_id)
             
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Failed to stop VM: {e}")
-            return False
+            self._route_failed(vm_id)
+            return None
     
     def execute_vm_command(self, vm_id, command):
         """
@@ -173,8 +293,8 @@ class ProxmoxAPI:
                 'command': command
             }
             
-            response = self.session.post(
-                f"{self.base_url}/nodes/{self.node}/qemu/{vm_id}/agent/exec",
+            response = self.transport.post(
+                self._vm_url(vm_id, "agent/exec"),
                 data=data
             )
             response.raise_for_status()
@@ -183,6 +303,7 @@ class ProxmoxAPI:
             
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Failed to execute command in VM: {e}")
+            self._route_failed(vm_id)
             return None
     
     def create_vm_snapshot(self, vm_id, snapshot_name):
@@ -194,11 +315,11 @@ class ProxmoxAPI:
             snapshot_name (str): Name for the snapshot
             
         Returns:
-            bool: True if successful, False otherwise
+            TaskHandle: Handle for the snapshot task (see wait_task) or None if failed
         """
         if not self.ticket:
             if not self.authenticate():
-                return False
+                return None
         
         try:
             data = {
@@ -206,18 +327,164 @@ class ProxmoxAPI:
                 'description': f"Time-shift snapshot created at {datetime.now()}"
             }
             
-            response = self.session.post(
-                f"{self.base_url}/nodes/{self.node}/qemu/{vm_id}/snapshot",
+            response = self.transport.post(
+                self._vm_url(vm_id, "snapshot"),
                 data=data
             )
             response.raise_for_status()
             
-            self.logger.info(f"Snapshot '{snapshot_name}' created for VM {vm_id}")
-            return True
+            self.logger.info(f"Snapshot '{snapshot_name}' started for VM {vm_id}")
+            return TaskHandle.from_upid(response.json()['data'], vm_id)
             
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Failed to create snapshot: {e}")
-            return False
+            self._route_failed(vm_id)
+            return None
+    
+    def list_vm_snapshots(self, vm_id):
+        """
+        List a VM's snapshots
+        
+        Args:
+            vm_id (int): VM ID
+            
+        Returns:
+            list: Snapshots ('name', 'snaptime', 'description', 'parent'), without
+                  the 'current' pseudo-entry, or None if failed
+        """
+        if not self.ticket:
+            if not self.authenticate():
+                return None
+        
+        try:
+            response = self.transport.get(
+                self._vm_url(vm_id, "snapshot")
+            )
+            response.raise_for_status()
+            
+            return [s for s in response.json()['data'] if s.get('name') != 'current']
+            
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Failed to list snapshots: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    def rollback_vm_snapshot(self, vm_id, snapshot_name):
+        """
+        Roll a VM back to a snapshot
+        
+        Args:
+            vm_id (int): VM ID
+            snapshot_name (str): Snapshot to roll back to
+            
+        Returns:
+            TaskHandle: Handle for the rollback task (see wait_task) or None if failed
+        """
+        if not self.ticket:
+            if not self.authenticate():
+                return None
+        
+        try:
+            response = self.transport.post(
+                self._vm_url(vm_id, f"snapshot/{snapshot_name}/rollback")
+            )
+            response.raise_for_status()
+            
+            self.logger.info(f"Rollback of VM {vm_id} to '{snapshot_name}' started")
+            return TaskHandle.from_upid(response.json()['data'], vm_id)
+            
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Failed to roll back snapshot: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    def delete_vm_snapshot(self, vm_id, snapshot_name):
+        """
+        Delete a VM snapshot
+        
+        Args:
+            vm_id (int): VM ID
+            snapshot_name (str): Snapshot to delete
+            
+        Returns:
+            TaskHandle: Handle for the delete task (see wait_task) or None if failed
+        """
+        if not self.ticket:
+            if not self.authenticate():
+                return None
+        
+        try:
+            response = self.transport.delete(
+                self._vm_url(vm_id, f"snapshot/{snapshot_name}")
+            )
+            response.raise_for_status()
+            
+            self.logger.info(f"Deletion of snapshot '{snapshot_name}' of VM {vm_id} started")
+            return TaskHandle.from_upid(response.json()['data'], vm_id)
+            
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Failed to delete snapshot: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    def get_task_status(self, task):
+        """
+        Get the status of a task on the node that runs it
+        
+        Args:
+            task (TaskHandle or str): Task handle or UPID
+            
+        Returns:
+            dict: Task status ('status', 'exitstatus', ...) or None if failed
+        """
+        if isinstance(task, str):
+            task = TaskHandle.from_upid(task)
+        
+        if not self.ticket:
+            if not self.authenticate():
+                return None
+        
+        try:
+            response = self.transport.get(
+                f"{self.base_url}/nodes/{task.node}/tasks/{task.upid}/status"
+            )
+            response.raise_for_status()
+            
+            return response.json()['data']
+            
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Failed to get task status: {e}")
+            return None
+    
+    def wait_task(self, task, timeout=300, poll_interval=0.5, max_poll_interval=5.0):
+        """
+        Block until a task finishes, polling with exponential backoff
+        
+        Args:
+            task (TaskHandle): Handle returned by start_vm, stop_vm or create_vm_snapshot
+            timeout (float): Longest wait in seconds
+            poll_interval (float): First delay between polls
+            max_poll_interval (float): Longest delay between polls
+            
+        Returns:
+            TaskHandle: The handle; task.done is False if the timeout was reached
+        """
+        deadline = time.monotonic() + timeout
+        interval = poll_interval
+        
+        while not task.done:
+            status = self.get_task_status(task)
+            if status is not None and task.update(status):
+                break
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.logger.warning(f"Task {task.upid} still running after {timeout}s")
+                break
+            time.sleep(min(interval, remaining))
+            interval = min(max_poll_interval, interval * 1.5)
+        
+        return task
     
     def list_vms(self):
         """
@@ -231,7 +498,7 @@ class ProxmoxAPI:
                 return None
         
         try:
-            response = self.session.get(
+            response = self.transport.get(
                 f"{self.base_url}/nodes/{self.node}/qemu"
             )
             response.raise_for_status()
@@ -241,3 +508,100 @@ class ProxmoxAPI:
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Failed to list VMs: {e}")
             return None
+    
+    def get_cluster_resources(self, resource_type=None):
+        """
+        List every resource in the cluster in one call
+        
+        Args:
+            resource_type (str): Optional filter ('vm', 'node', 'storage', 'sdn')
+            
+        Returns:
+            list: Resource entries from /cluster/resources or None if failed
+        """
+        if not self.ticket:
+            if not self.authenticate():
+                return None
+        
+        try:
+            response = self.transport.get(
+                f"{self.base_url}/cluster/resources",
+                params={'type': resource_type} if resource_type else None
+            )
+            response.raise_for_status()
+            
+            return response.json()['data']
+            
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Failed to list cluster resources: {e}")
+            return None
+    
+    def refresh_index(self, force=False, max_age=None):
+        """
+        Refresh the cluster index if it is stale
+        
+        Args:
+            force (bool): Refresh even if the index is fresh
+            max_age (float): Staleness threshold (default: the index refresh interval)
+            
+        Returns:
+            bool: True if the index is usable, False if a needed refresh failed
+        """
+        if not force and not self.cluster_index.is_stale(max_age):
+            return True
+        
+        resources = self.get_cluster_resources()
+        if resources is None:
+            return False
+        
+        self.cluster_index.apply(resources)
+        return True
+    
+    def find_vm(self, name):
+        """
+        Resolve a VM name to its ID through the cluster index
+        
+        Args:
+            name (str): VM name
+            
+        Returns:
+            int: VM ID, or None if not found or ambiguous
+        """
+        if self.auto_index or not self.cluster_index.loaded:
+            self.refresh_index()
+        return self.cluster_index.vmid_for(name)
+    
+    def node_for(self, vm_id):
+        """
+        Node that per-VM calls for vm_id are sent to
+        
+        Args:
+            vm_id (int): VM ID
+            
+        Returns:
+            str: Node from the cluster index, falling back to the configured node
+        """
+        if self.auto_index:
+            self.refresh_index()
+            if vm_id not in self.cluster_index:
+                # Possibly created since the last refresh; bounded to one reload a second
+                self.refresh_index(max_age=1.0)
+        
+        return self.cluster_index.node_for(vm_id) or self.node
+    
+    def _vm_url(self, vm_id, path):
+        return f"{self.base_url}/nodes/{self.node_for(vm_id)}/qemu/{vm_id}/{path}"
+    
+    def _route_failed(self, vm_id):
+        """The VM may have migrated: reload the index before the next routed call"""
+        if vm_id in self.cluster_index:
+            self.cluster_index.invalidate()
+    
+    @property
+    def rate_limit_stats(self):
+        """Rate, queued requests and counters per budget plus recent throttle events (empty if disabled)"""
+        return self.rate_limiter.snapshot() if self.rate_limiter is not None else {}
+    
+    def close(self):
+        """Close pooled connections"""
+        self.transport.close()
@@ -4,15 +4,40 @@ Handles all interactions with the Proxmox Virtual Environment API
 """
 
 import aiohttp
+import asyncio
 import json
+import re
 import ssl
+from collections import Counter
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import logging
-from typing import Optional, Dict, Any, List
-from lib.validators import validate_ip_address, validate_port, validate_username
+from typing import Optional, Dict, Any, AsyncIterator, Iterable, List, Union
+from lib.validators import validate_ip_address, validate_hostname, validate_port, validate_username, api_token_from_config
+from lib.ticket_cache import TicketCache, ticket_expiry
+from lib.cluster_index import ClusterIndex
+from lib.task_waiter import TaskHandle, TaskWaiter
+from lib.bulk_operations import BulkOperation
+from lib.response_cache import ResponseCache
+from lib.guest_exec import Command, ExecResult, GuestExecutor
+from lib.json_stream import iter_json_array
+from lib.vm_watcher import VMChange, VMWatcher
+from lib.rate_limiter import RateLimiter
 
 logger = logging.getLogger(__name__)
 
+# Writes that change a VM and so stale its cached reads: status actions, config,
+# resize, clone, snapshots and the VM itself (destroy). Guest agent calls don't.
+STATE_CHANGING_PATH = re.compile(r'/qemu/\d+(/(status/\w+|config|resize|clone|snapshot(/.*)?))?$')
+
+
+class ProxmoxAPIError(aiohttp.ClientError):
+    """Raised by API helpers when a request cannot be made or is rejected"""
+    
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
 
 class ProxmoxAPIAsync:
     """Async Proxmox API client with connection pooling"""
@@ -24,9 +49,20 @@ class ProxmoxAPIAsync:
         Args:
             config: Proxmox configuration parameters
         """
-        self.host = validate_ip_address(config.get('host')) if '.' in str(config.get('host', '')) else config.get('host')
+        host = config.get('host')
+        if not host:
+            self.host = host
+        elif re.fullmatch(r'[\d.]+|[0-9a-fA-F:]*:[0-9a-fA-F:.]*', str(host)):
+            self.host = validate_ip_address(host)
+        else:
+            # Hostnames such as pve1.example.com
+            self.host = validate_hostname(host)
         self.port = validate_port(config.get('port', 8006))
-        self.username = validate_username(config.get('username'))
+        
+        # API tokens authenticate every request statelessly: no ticket, no CSRF
+        self.token_id, self.token_secret = api_token_from_config(config) or (None, None)
+        username = config.get('username') or (self.token_id.split('!')[0] if self.token_id else None)
+        self.username = validate_username(username)
         self.password = config.get('password')
         self.node = config.get('node')
         self.verify_ssl = config.get('verify_ssl', False)
@@ -42,6 +78,56 @@ class ProxmoxAPIAsync:
         self.csrf_token = None
         self.ticket_expiry = None
         
+        # Tickets persisted across processes (see TicketCache)
+        use_cache = config.get('ticket_cache', False) and not self.token_id
+        self.ticket_cache = TicketCache() if use_cache else None
+        
+        # Concurrent callers share one login; a background task renews the
+        # ticket this many seconds before it expires (see _renew_ticket)
+        self._auth_task: Optional[asyncio.Task] = None
+        self._renew_task: Optional[asyncio.Task] = None
+        self._stale_ticket = None
+        self.ticket_renewal = config.get('ticket_renewal', True)
+        self.renew_before = config.get('ticket_renew_before', 900)
+        # Failed renewals are retried after 1s, doubling up to renew_retry
+        self.renew_retry_min = 1.0
+        self.renew_retry = 30.0
+        self.auth_stats: Counter = Counter()
+        
+        # Per-VM calls are routed to the node the index says the VM is on;
+        # without a fixed node the index is kept fresh automatically
+        self.cluster_index = ClusterIndex(config.get('index_refresh', 30))
+        self.auto_index = config.get('cluster_index', not self.node)
+        # Created on first use, inside the loop it serves (see refresh_index)
+        self._index_lock: Optional[asyncio.Lock] = None
+        
+        # One shared poller for every task this client waits on
+        self.task_waiter = TaskWaiter(self, on_complete=self._task_completed)
+        
+        # Read-through GET cache: True for the default TTLs, or a dict of
+        # per-endpoint-class TTL overrides (see ResponseCache)
+        cache = config.get('response_cache', False)
+        self.response_cache = ResponseCache(cache if isinstance(cache, dict) else None) if cache else None
+        
+        # Adaptive request budgets sparing pveproxy's workers: True for the
+        # defaults, or a dict of per-budget overrides (see RateLimiter)
+        limit = config.get('rate_limit', False)
+        self.rate_limiter = RateLimiter(limit if isinstance(limit, dict) else None) if limit else None
+        
+        # Connection pool and bulk operation limits
+        self.pool_size = config.get('pool_size', 10)
+        self.pool_per_host = config.get('pool_per_host', 5)
+        self.bulk_concurrency = config.get('bulk_concurrency', self.pool_size)
+        self.bulk_per_node = config.get('bulk_per_node', 4)
+        
+        # Guest-agent commands run to completion (see run_vm_command)
+        self.guest_exec = GuestExecutor(self, timeout=config.get('exec_timeout', 60),
+                                        concurrency=self.bulk_concurrency)
+        
+        # One shared change feed of guest state for every watch_vms caller
+        self.vm_watcher = VMWatcher(self, min_interval=config.get('watch_min_interval', 1.0),
+                                    max_interval=config.get('watch_max_interval', 30.0))
+        
         # SSL context
         self.ssl_context = ssl.create_default_context()
         if not self.verify_ssl:
@@ -61,16 +147,25 @@ class ProxmoxAPIAsync:
         """Create connection pool and session"""
         if not self.session:
             self.connector = aiohttp.TCPConnector(
-                limit=10,  # Connection pool size
-                limit_per_host=5,
+                limit=self.pool_size,  # Connection pool size
+                limit_per_host=self.pool_per_host,
                 ttl_dns_cache=300,
                 ssl=self.ssl_context
             )
-            self.session = aiohttp.ClientSession(connector=self.connector)
+            headers = {}
+            if self.token_id:
+                headers['Authorization'] = f"PVEAPIToken={self.token_id}={self.token_secret}"
+            self.session = aiohttp.ClientSession(connector=self.connector, headers=headers)
             logger.info("Created async session with connection pooling")
     
     async def close(self):
         """Close session and connection pool"""
+        await self.vm_watcher.close()
+        await self.task_waiter.close()
+        if self._renew_task is not None:
+            self._renew_task.cancel()
+            await asyncio.gather(self._renew_task, return_exceptions=True)
+            self._renew_task = None
         if self.session:
             await self.session.close()
             self.session = None
@@ -81,38 +176,157 @@ class ProxmoxAPIAsync:
         """
         Authenticate with Proxmox and get ticket/CSRF token
         
+        A cached ticket from an earlier process is reused when the ticket
+        cache is enabled; otherwise only one process at a time logs in.
+        Concurrent callers in this process share a single login.
+        
         Returns:
             bool: True if authentication successful
         """
+        if self._auth_task is None:
+            self._auth_task = asyncio.ensure_future(self._authenticate())
+            self._auth_task.add_done_callback(self._auth_finished)
+        # A cancelled waiter must not cancel the login the others wait for
+        return await asyncio.shield(self._auth_task)
+    
+    def _auth_finished(self, task: asyncio.Task):
+        if self._auth_task is task:
+            self._auth_task = None
+    
+    async def _authenticate(self) -> bool:
+        """Log in, or adopt a ticket cached by another process"""
         if not self.session:
             await self.connect()
-            
+        
+        if self.token_id:
+            # The Authorization header set on the session is all that is needed
+            return True
+        
+        if self.ticket_cache is None:
+            return await self._login()
+        
+        loop = asyncio.get_running_loop()
+        key = TicketCache.key(self.host, self.port, self.username)
+        if await self._use_cached_ticket(key):
+            return True
+        
+        # Blocking lock and storage calls run in the default executor
+        fd = await loop.run_in_executor(None, self.ticket_cache.acquire, key)
+        try:
+            # Another process may have logged in while we waited for the lock
+            if await self._use_cached_ticket(key):
+                return True
+            if not await self._login():
+                return False
+            await loop.run_in_executor(
+                None, self.ticket_cache.store, key, self.ticket, self.csrf_token,
+                self.ticket_expiry.timestamp()
+            )
+            return True
+        finally:
+            self.ticket_cache.release(fd)
+    
+    async def _use_cached_ticket(self, key: str) -> bool:
+        """Apply a still-valid cached ticket, returning True if one was found"""
+        cached = await asyncio.get_running_loop().run_in_executor(None, self.ticket_cache.load, key)
+        if not cached or cached['ticket'] == self._stale_ticket:
+            return False
+        self._set_ticket(cached['ticket'], cached['csrf_token'], cached['expires'])
+        logger.info("Reusing cached Proxmox ticket")
+        return True
+    
+    def _set_ticket(self, ticket: str, csrf_token: str, expires: float):
+        """Install a ticket and CSRF token on the session"""
+        self.ticket = ticket
+        self.csrf_token = csrf_token
+        self.ticket_expiry = datetime.fromtimestamp(expires)
+        
+        self.session.headers.update({
+            'CSRFPreventionToken': self.csrf_token
+        })
+        self.session.cookie_jar.update_cookies(
+            {'PVEAuthCookie': self.ticket}
+        )
+        
+        if self.ticket_renewal and (self._renew_task is None or self._renew_task.done()):
+            self._renew_task = asyncio.ensure_future(self._renew_ticket())
+    
+    async def _renew_ticket(self):
+        """
+        Log in again ahead of ticket expiry, so requests never wait for a login
+        
+        Failed attempts back off exponentially. Once the ticket has expired
+        renewal stops; the next request logs in, which restarts it.
+        """
+        retry = self.renew_retry_min
+        while self.session is not None and self.ticket_expiry is not None:
+            remaining = (self.ticket_expiry - datetime.now()).total_seconds()
+            if remaining > self.renew_before:
+                await asyncio.sleep(remaining - self.renew_before)
+                continue
+            if remaining <= 0:
+                logger.warning("Proxmox ticket expired before it could be renewed")
+                return
+            self._stale_ticket = self.ticket
+            if await self.authenticate():
+                self.auth_stats['renewals'] += 1
+                logger.info("Renewed Proxmox ticket ahead of expiry")
+                retry = self.renew_retry_min
+            else:
+                self.auth_stats['renewal_failures'] += 1
+                await asyncio.sleep(min(retry, remaining))
+                retry = min(retry * 2, self.renew_retry)
+    
+    async def _reauthenticate(self, rejected_ticket: Optional[str]) -> bool:
+        """Replace a ticket the server rejected, unless another caller already has"""
+        if self.ticket is not None and self.ticket != rejected_ticket:
+            return True
+        self._stale_ticket = rejected_ticket
+        self.auth_stats['reauths'] += 1
+        logger.warning("Proxmox rejected the ticket, re-authenticating")
+        return await self.authenticate()
+    
+    async def _retry_unauthorized(self, send) -> Any:
+        """
+        Run a request coroutine function, logging in again and repeating it once on a 401
+        
+        A 401 means Proxmox refused the request before acting on it, so
+        repeating even a POST is safe. API tokens are not retried.
+        """
+        ticket = self.ticket
+        try:
+            return await send()
+        except aiohttp.ClientError as e:
+            if getattr(e, 'status', None) != 401 or self.token_id:
+                raise
+        # send() logs in first when there was no ticket yet
+        if not await self._reauthenticate(ticket or self.ticket):
+            raise ProxmoxAPIError("Re-authentication failed", status=401)
+        return await send()
+    
+    async def _login(self) -> bool:
+        """
+        Request a new ticket from /access/ticket
+        
+        Returns:
+            bool: True if authentication successful
+        """
         auth_data = {
             'username': self.username,
             'password': self.password
         }
         
         try:
-            async with self.session.post(
+            async with self._send(
+                'POST',
                 f"{self.base_url}/access/ticket",
                 data=auth_data
             ) as response:
                 response.raise_for_status()
                 
                 data = (await response.json())['data']
-                self.ticket = data['ticket']
-                self.csrf_token = data['CSRFPreventionToken']
-                
-                # Tickets typically expire after 2 hours
-                self.ticket_expiry = datetime.now() + timedelta(hours=2)
-                
-                # Update session headers
-                self.session.headers.update({
-                    'CSRFPreventionToken': self.csrf_token
-                })
-                self.session.cookie_jar.update_cookies(
-                    {'PVEAuthCookie': self.ticket}
-                )
+                self._set_ticket(data['ticket'], data['CSRFPreventionToken'], ticket_expiry(data['ticket']))
+                self.auth_stats['logins'] += 1
                 
                 logger.info("Successfully authenticated with Proxmox")
                 return True
@@ -123,6 +337,11 @@ class ProxmoxAPIAsync:
     
     async def ensure_authenticated(self) -> bool:
         """Ensure we have valid authentication"""
+        if self.token_id:
+            if not self.session:
+                await self.connect()
+            return True
+        
         if not self.ticket or not self.ticket_expiry:
             return await self.authenticate()
         
@@ -133,6 +352,160 @@ class ProxmoxAPIAsync:
             
         return True
     
+    async def _api_request(self, method: str, path: str, data: Any = None,
+                           params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Perform an authenticated API request
+        
+        Args:
+            method: HTTP method
+            path: API path below /api2/json
+            data: Optional form data (dict or list of key/value pairs)
+            params: Optional query parameters
+            
+        Returns:
+            The 'data' member of the response
+            
+        Raises:
+            aiohttp.ClientError: If authentication or the request fails
+        """
+        if method.upper() == 'GET' and self.response_cache is not None:
+            return await self.response_cache.get(path, params, lambda: self._request(method, path, data, params))
+        
+        try:
+            return await self._request(method, path, data, params)
+        finally:
+            if method.upper() != 'GET' and STATE_CHANGING_PATH.search(path):
+                self._invalidate_path(path)
+    
+    async def _request(self, method: str, path: str, data: Any = None,
+                       params: Optional[Dict[str, Any]] = None) -> Any:
+        """Send one request to the API, bypassing the response cache"""
+        async def send():
+            if not await self.ensure_authenticated():
+                raise ProxmoxAPIError("Not authenticated with Proxmox")
+            
+            async with self._send(
+                method,
+                f"{self.base_url}{path}",
+                data=data,
+                params=params
+            ) as response:
+                if response.status >= 400:
+                    raise ProxmoxAPIError(await self._error_message(response), status=response.status)
+                return (await response.json())['data']
+        
+        return await self._retry_unauthorized(send)
+    
+    async def stream(self, path: str, params: Optional[Dict[str, Any]] = None,
+                     chunk_size: int = 1 << 16) -> AsyncIterator[Any]:
+        """
+        Yield the items of a listing's 'data' array while the response downloads
+        
+        Unlike _api_request, the body is never held in memory as a whole,
+        so peak memory stays flat however large the listing is. The
+        response cache is bypassed.
+        
+        Args:
+            path: API path below /api2/json
+            params: Optional query parameters
+            chunk_size: Bytes read from the connection at a time
+            
+        Yields:
+            Decoded items, in response order
+            
+        Raises:
+            aiohttp.ClientError: If authentication or the request fails
+            JSONStreamError: If the body is not a Proxmox listing
+        """
+        async def send() -> aiohttp.ClientResponse:
+            if not await self.ensure_authenticated():
+                raise ProxmoxAPIError("Not authenticated with Proxmox")
+            
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire('GET')
+            try:
+                response = await self.session.get(f"{self.base_url}{path}", params=params)
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                self._record_outcome('GET', error=e)
+                raise
+            self._record_outcome('GET', status=response.status)
+            if response.status >= 400:
+                try:
+                    raise ProxmoxAPIError(await self._error_message(response), status=response.status)
+                finally:
+                    response.release()
+            return response
+        
+        async with await self._retry_unauthorized(send) as response:
+            async for item in iter_json_array(response.content.iter_chunked(chunk_size)):
+                yield item
+    
+    @asynccontextmanager
+    async def _send(self, method: str, url: str, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Send one HTTP request within the rate limit, adapting the limit to its outcome"""
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(method)
+        try:
+            async with getattr(self.session, method.lower())(url, **kwargs) as response:
+                self._record_outcome(method, status=response.status)
+                yield response
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            self._record_outcome(method, error=e)
+            raise
+    
+    def _record_outcome(self, method: str, status: Optional[int] = None,
+                        error: Optional[BaseException] = None):
+        if self.rate_limiter is not None:
+            self.rate_limiter.record(method, status=status, error=error)
+    
+    @staticmethod
+    async def _error_message(response: aiohttp.ClientResponse) -> str:
+        """Proxmox's explanation of a failed request, e.g. '500 VM 100 is not running'"""
+        message = response.reason or ''
+        try:
+            body = await response.text()
+            try:
+                parsed = json.loads(body)
+                detail = parsed.get('message') or parsed.get('errors')
+            except (ValueError, AttributeError):
+                detail = body
+            if detail:
+                message = str(detail).strip()[:500]
+        except aiohttp.ClientError:
+            pass
+        return f"{response.status} {message}".strip()
+    
+    async def _cached_get(self, path: str, fetch) -> Any:
+        """Run a GET fetch through the response cache when it is enabled"""
+        if self.response_cache is None:
+            return await fetch()
+        return await self.response_cache.get(path, None, fetch)
+    
+    def _invalidate_vm(self, vm_id: Optional[int]):
+        if self.response_cache is not None and vm_id is not None:
+            self.response_cache.invalidate_vm(vm_id)
+    
+    def _invalidate_path(self, path: str):
+        if self.response_cache is not None:
+            self.response_cache.invalidate_path(path)
+    
+    def _task_completed(self, task: TaskHandle):
+        """A finished task has changed its VM: drop what was cached about it and look again soon"""
+        self._invalidate_vm(task.vm_id)
+        if self.vm_watcher.subscribers:
+            self.vm_watcher.wake()
+    
+    @property
+    def rate_limit_stats(self) -> Dict[str, Any]:
+        """Rate, queued requests and counters per budget plus recent throttle events (empty if disabled)"""
+        return self.rate_limiter.snapshot() if self.rate_limiter is not None else {}
+    
+    @property
+    def cache_stats(self) -> Dict[str, int]:
+        """Response cache hit, miss and coalesced counters (empty if disabled)"""
+        return dict(self.response_cache.stats) if self.response_cache is not None else {}
+    
     async def get_vm_status(self, vm_id: int) -> Optional[Dict[str, Any]]:
         """
         Get VM status information
@@ -147,17 +520,21 @@ class ProxmoxAPIAsync:
             return None
         
         try:
-            async with self.session.get(
-                f"{self.base_url}/nodes/{self.node}/qemu/{vm_id}/status/current"
-            ) as response:
-                response.raise_for_status()
-                return (await response.json())['data']
+            path = await self._vm_path(vm_id, "status/current")
+            
+            async def fetch():
+                async with self._send('GET', f"{self.base_url}{path}") as response:
+                    response.raise_for_status()
+                    return (await response.json())['data']
+            
+            return await self._cached_get(path, lambda: self._retry_unauthorized(fetch))
                 
         except aiohttp.ClientError as e:
             logger.error(f"Failed to get VM status: {e}")
+            self._route_failed(vm_id)
             return None
     
-    async def start_vm(self, vm_id: int) -> bool:
+    async def start_vm(self, vm_id: int) -> Optional[TaskHandle]:
         """
         Start a VM
         
@@ -165,24 +542,30 @@ class ProxmoxAPIAsync:
             vm_id: VM ID
             
         Returns:
-            True if successful
+            Handle for the start task (see wait_task) or None if failed
         """
         if not await self.ensure_authenticated():
-            return False
+            return None
         
         try:
-            async with self.session.post(
-                f"{self.base_url}/nodes/{self.node}/qemu/{vm_id}/status/start"
-            ) as response:
-                response.raise_for_status()
-                logger.info(f"VM {vm_id} start command sent")
-                return True
+            url = await self._vm_url(vm_id, "status/start")
+            
+            async def send():
+                async with self._send('POST', url) as response:
+                    response.raise_for_status()
+                    return (await response.json())['data']
+            
+            upid = await self._retry_unauthorized(send)
+            self._invalidate_vm(vm_id)
+            logger.info(f"VM {vm_id} start command sent")
+            return TaskHandle.from_upid(upid, vm_id)
                 
         except aiohttp.ClientError as e:
             logger.error(f"Failed to start VM: {e}")
-            return False
+            self._route_failed(vm_id)
+            return None
     
-    async def stop_vm(self, vm_id: int) -> bool:
+    async def stop_vm(self, vm_id: int) -> Optional[TaskHandle]:
         """
         Stop a VM
         
@@ -190,52 +573,345 @@ class ProxmoxAPIAsync:
             vm_id: VM ID
             
         Returns:
-            True if successful
+            Handle for the stop task (see wait_task) or None if failed
         """
         if not await self.ensure_authenticated():
-            return False
+            return None
         
         try:
-            async with self.session.post(
-                f"{self.base_url}/nodes/{self.node}/qemu/{vm_id}/status/stop"
-            ) as response:
-                response.raise_for_status()
-                logger.info(f"VM {vm_id} stop command sent")
-                return True
+            url = await self._vm_url(vm_id, "status/stop")
+            
+            async def send():
+                async with self._send('POST', url) as response:
+                    response.raise_for_status()
+                    return (await response.json())['data']
+            
+            upid = await self._retry_unauthorized(send)
+            self._invalidate_vm(vm_id)
+            logger.info(f"VM {vm_id} stop command sent")
+            return TaskHandle.from_upid(upid, vm_id)
                 
         except aiohttp.ClientError as e:
             logger.error(f"Failed to stop VM: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    async def shutdown_vm(self, vm_id: int, timeout: Optional[int] = None) -> Optional[TaskHandle]:
+        """
+        Shut a VM down cleanly through ACPI or the guest agent
+        
+        Args:
+            vm_id: VM ID
+            timeout: Seconds Proxmox waits for the guest before giving up
+            
+        Returns:
+            Handle for the shutdown task (see wait_task) or None if failed
+        """
+        try:
+            return await self._vm_task(vm_id, 'shutdown', timeout)
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to shut down VM: {e}")
+            self._route_failed(vm_id)
+            return None
+
+    async def suspend_vm(self, vm_id: int) -> Optional[TaskHandle]:
+        """
+        Pause a running VM in memory (resume_vm continues it instantly)
+
+        Args:
+            vm_id: VM ID
+
+        Returns:
+            Handle for the suspend task (see wait_task) or None if failed
+        """
+        try:
+            return await self._vm_task(vm_id, 'suspend')
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to suspend VM: {e}")
+            self._route_failed(vm_id)
+            return None
+
+    async def resume_vm(self, vm_id: int) -> Optional[TaskHandle]:
+        """
+        Resume a paused VM
+
+        Args:
+            vm_id: VM ID
+
+        Returns:
+            Handle for the resume task (see wait_task) or None if failed
+        """
+        try:
+            return await self._vm_task(vm_id, 'resume')
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to resume VM: {e}")
+            self._route_failed(vm_id)
+            return None
+
+    async def get_vm_config(self, vm_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get a VM's configuration
+        
+        Args:
+            vm_id: VM ID
+            
+        Returns:
+            VM configuration (cores, memory, disks, ...) or None if failed
+        """
+        try:
+            return await self._api_request('GET', await self._vm_path(vm_id, "config"))
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to get VM config: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    async def next_vmid(self, vm_id: Optional[int] = None) -> Optional[int]:
+        """
+        Ask the cluster for a free VM ID
+        
+        Proxmox only reports the ID as free without reserving it, so
+        callers creating VMs concurrently keep their own reservations
+        (see VMIDAllocator).
+        
+        Args:
+            vm_id: Check this ID instead of asking for the lowest free one
+            
+        Returns:
+            A free VM ID, or None if vm_id is taken or the call failed
+        """
+        try:
+            params = {'vmid': vm_id} if vm_id is not None else None
+            return int(await self._request('GET', "/cluster/nextid", params=params))
+        except aiohttp.ClientError as e:
+            logger.info(f"No free VM ID: {e}")
+            return None
+    
+    async def clone_vm(self, vm_id: int, new_id: int, name: Optional[str] = None, full: bool = False,
+                       target: Optional[str] = None, storage: Optional[str] = None) -> Optional[TaskHandle]:
+        """
+        Clone a VM or template
+        
+        Linked clones share the template's base disks and are created in
+        seconds, but need a template on storage with linked-clone support.
+        
+        Args:
+            vm_id: Source VM or template ID
+            new_id: ID of the clone
+            name: Name of the clone
+            full: Copy every disk instead of linking to the template's
+            target: Node to create the clone on (default: the source's node)
+            storage: Storage for the disks of a full clone (default: the source's)
+            
+        Returns:
+            Handle for the clone task (see wait_task) or None if failed
+        """
+        try:
+            return await self.submit_clone(vm_id, new_id, name, full, target, storage)
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to clone VM: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    async def submit_clone(self, vm_id: int, new_id: int, name: Optional[str] = None, full: bool = False,
+                           target: Optional[str] = None, storage: Optional[str] = None) -> TaskHandle:
+        """
+        Start a clone like clone_vm, raising instead of returning None
+        
+        Returns:
+            Handle for the clone task (see wait_task)
+            
+        Raises:
+            aiohttp.ClientError: If the request fails; a ProxmoxAPIError carries
+                                 Proxmox's reason, e.g. that linked clones are unsupported
+        """
+        data = {'newid': new_id, 'full': int(full)}
+        if name:
+            data['name'] = name
+        if target:
+            data['target'] = target
+        if storage and full:
+            data['storage'] = storage
+        path = await self._vm_path(vm_id, "clone")
+        task = TaskHandle.from_upid(await self._api_request('POST', path, data=data), new_id)
+        # The clone is listed from now on; reload before routing calls to it
+        self.cluster_index.invalidate()
+        logger.info(f"{'Full' if full else 'Linked'} clone of VM {vm_id} to {new_id} started")
+        return task
+    
+    async def update_vm_config(self, vm_id: int, options: Dict[str, Any]) -> bool:
+        """
+        Change a VM's configuration (cores, memory, name, tags, ...)
+        
+        Args:
+            vm_id: VM ID
+            options: Configuration keys and values
+            
+        Returns:
+            True if the configuration was changed
+        """
+        try:
+            await self._api_request('PUT', await self._vm_path(vm_id, "config"), data=options)
+            self._invalidate_vm(vm_id)
+            return True
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to update VM config: {e}")
+            self._route_failed(vm_id)
             return False
     
-    async def execute_vm_command(self, vm_id: int, command: str) -> Optional[Dict[str, Any]]:
+    async def resize_vm_disk(self, vm_id: int, disk: str, size: str,
+                             timeout: Optional[float] = None) -> bool:
         """
-        Execute command in VM (requires qemu-guest-agent)
+        Grow a VM disk (Proxmox cannot shrink disks)
         
         Args:
             vm_id: VM ID
-            command: Command to execute
+            disk: Disk key, e.g. 'scsi0'
+            size: New size ('40G') or growth ('+8G')
+            timeout: Seconds to wait when the resize runs as a task
             
         Returns:
-            Command execution result or None if failed
+            True if the disk was resized
         """
-        if not await self.ensure_authenticated():
+        try:
+            result = await self._api_request('PUT', await self._vm_path(vm_id, "resize"),
+                                             data={'disk': disk, 'size': size})
+            # Newer Proxmox versions resize in a task
+            if isinstance(result, str) and result.startswith('UPID:'):
+                task = await self.wait_task(TaskHandle.from_upid(result, vm_id), timeout)
+                if not task.ok:
+                    raise ProxmoxAPIError(f"Resize task failed: {task.exitstatus}")
+            self._invalidate_vm(vm_id)
+            return True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Failed to resize VM disk: {e}")
+            self._route_failed(vm_id)
+            return False
+    
+    async def destroy_vm(self, vm_id: int, purge: bool = True) -> Optional[TaskHandle]:
+        """
+        Delete a stopped VM and its disks
+        
+        Args:
+            vm_id: VM ID
+            purge: Also remove the VM from backup jobs, replication and HA resources
+            
+        Returns:
+            Handle for the destroy task (see wait_task) or None if failed
+        """
+        params = {'purge': 1, 'destroy-unreferenced-disks': 1} if purge else None
+        try:
+            path = (await self._vm_path(vm_id, "")).rstrip('/')
+            task = TaskHandle.from_upid(await self._api_request('DELETE', path, params=params), vm_id)
+            self._invalidate_vm(vm_id)
+            # The VM leaves the listing; reload before routing calls to its ID
+            self.cluster_index.invalidate()
+            logger.info(f"Destruction of VM {vm_id} started")
+            return task
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to destroy VM: {e}")
+            self._route_failed(vm_id)
             return None
+    
+    async def ping_guest_agent(self, vm_id: int) -> bool:
+        """
+        Check that a VM's QEMU guest agent answers
         
+        Args:
+            vm_id: VM ID
+            
+        Returns:
+            True if the agent responded
+        """
         try:
-            data = {'command': command}
+            await self._api_request('POST', await self._vm_path(vm_id, "agent/ping"))
+            return True
+        except aiohttp.ClientError as e:
+            logger.debug(f"Guest agent of VM {vm_id} not answering: {e}")
+            return False
+    
+    async def _vm_task(self, vm_id: int, action: str, timeout: Optional[int] = None,
+                       node: Optional[str] = None) -> TaskHandle:
+        """POST status/<action> and return the task handle; raises on failure"""
+        data = {'timeout': timeout} if timeout is not None else None
+        path = await self._vm_path(vm_id, f"status/{action}", node)
+        return TaskHandle.from_upid(await self._api_request('POST', path, data=data), vm_id)
+    
+    async def execute_vm_command(self, vm_id: int, command: Union[str, List[str]],
+                                 input_data: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Execute command in VM (requires qemu-guest-agent)
+        
+        Args:
+            vm_id: VM ID
+            command: Command to execute, or program plus arguments as a list
+            input_data: Optional data passed to the command's stdin
             
-            async with self.session.post(
-                f"{self.base_url}/nodes/{self.node}/qemu/{vm_id}/agent/exec",
-                data=data
-            ) as response:
-                response.raise_for_status()
-                return (await response.json())['data']
-                
+        Returns:
+            Command execution result (holding the guest 'pid') or None if failed
+        """
+        if isinstance(command, str):
+            data = [('command', command)]
+        else:
+            data = [('command', arg) for arg in command]
+        if input_data is not None:
+            data.append(('input-data', input_data))
+        
+        try:
+            return await self._api_request(
+                'POST', f"/nodes/{await self.node_for(vm_id)}/qemu/{vm_id}/agent/exec", data=data
+            )
         except aiohttp.ClientError as e:
             logger.error(f"Failed to execute command in VM: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    async def get_vm_exec_status(self, vm_id: int, pid: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the status of a command started with execute_vm_command
+        
+        Args:
+            vm_id: VM ID
+            pid: Guest process ID returned by execute_vm_command
+            
+        Returns:
+            Exec status ('exited', 'exitcode', 'out-data', 'err-data') or None if failed
+        """
+        try:
+            return await self._api_request(
+                'GET', f"/nodes/{await self.node_for(vm_id)}/qemu/{vm_id}/agent/exec-status", params={'pid': pid}
+            )
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to get exec status in VM: {e}")
+            self._route_failed(vm_id)
             return None
     
-    async def create_vm_snapshot(self, vm_id: int, snapshot_name: str) -> bool:
+    async def run_vm_command(self, vm_id: int, command: Command, stdin: Optional[str] = None,
+                             timeout: Optional[float] = None) -> ExecResult:
+        """
+        Run a command in a VM through the guest agent and wait for it to exit
+        
+        Args:
+            vm_id: VM ID
+            command: argv list, or a shell script as a string
+            stdin: Data passed to the command's standard input
+            timeout: Seconds to wait (default: exec_timeout from the config)
+            
+        Returns:
+            ExecResult with stdout, stderr and exit code; see ExecResult.check
+        """
+        return await self.guest_exec.run(vm_id, command, stdin, timeout)
+    
+    async def run_vm_commands(self, vm_ids: Iterable[int], command: Command, stdin: Optional[str] = None,
+                              timeout: Optional[float] = None) -> Dict[int, ExecResult]:
+        """
+        Run one command in many VMs concurrently, each with its own timeout
+        
+        Returns:
+            ExecResult per VM ID
+        """
+        return await self.guest_exec.run_many(vm_ids, command, stdin, timeout)
+    
+    async def create_vm_snapshot(self, vm_id: int, snapshot_name: str) -> Optional[TaskHandle]:
         """
         Create VM snapshot
         
@@ -244,10 +920,10 @@ class ProxmoxAPIAsync:
             snapshot_name: Name for the snapshot
             
         Returns:
-            True if successful
+            Handle for the snapshot task (see wait_task) or None if failed
         """
         if not await self.ensure_authenticated():
-            return False
+            return None
         
         try:
             data = {
@@ -255,17 +931,211 @@ class ProxmoxAPIAsync:
                 'description': f"Time-shift snapshot created at {datetime.now()}"
             }
             
-            async with self.session.post(
-                f"{self.base_url}/nodes/{self.node}/qemu/{vm_id}/snapshot",
-                data=data
-            ) as response:
-                response.raise_for_status()
-                logger.info(f"Snapshot '{snapshot_name}' created for VM {vm_id}")
-                return True
+            url = await self._vm_url(vm_id, "snapshot")
+            
+            async def send():
+                async with self._send('POST', url, data=data) as response:
+                    response.raise_for_status()
+                    return (await response.json())['data']
+            
+            upid = await self._retry_unauthorized(send)
+            self._invalidate_vm(vm_id)
+            logger.info(f"Snapshot '{snapshot_name}' started for VM {vm_id}")
+            return TaskHandle.from_upid(upid, vm_id)
                 
         except aiohttp.ClientError as e:
             logger.error(f"Failed to create snapshot: {e}")
-            return False
+            self._route_failed(vm_id)
+            return None
+    
+    async def list_vm_snapshots(self, vm_id: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        List a VM's snapshots
+        
+        Args:
+            vm_id: VM ID
+            
+        Returns:
+            Snapshots ('name', 'snaptime', 'description', 'parent'), without the
+            'current' pseudo-entry, or None if failed
+        """
+        try:
+            return await self._snapshots(vm_id)
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to list snapshots: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    async def rollback_vm_snapshot(self, vm_id: int, snapshot_name: str) -> Optional[TaskHandle]:
+        """
+        Roll a VM back to a snapshot
+        
+        Args:
+            vm_id: VM ID
+            snapshot_name: Snapshot to roll back to
+            
+        Returns:
+            Handle for the rollback task (see wait_task) or None if failed
+        """
+        try:
+            path = await self._vm_path(vm_id, f"snapshot/{snapshot_name}/rollback")
+            task = TaskHandle.from_upid(await self._api_request('POST', path), vm_id)
+            logger.info(f"Rollback of VM {vm_id} to '{snapshot_name}' started")
+            return task
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to roll back snapshot: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    async def delete_vm_snapshot(self, vm_id: int, snapshot_name: str) -> Optional[TaskHandle]:
+        """
+        Delete a VM snapshot
+        
+        Args:
+            vm_id: VM ID
+            snapshot_name: Snapshot to delete
+            
+        Returns:
+            Handle for the delete task (see wait_task) or None if failed
+        """
+        try:
+            task = await self._delete_snapshot(vm_id, snapshot_name)
+            logger.info(f"Deletion of snapshot '{snapshot_name}' of VM {vm_id} started")
+            return task
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to delete snapshot: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    async def _snapshots(self, vm_id: int, node: Optional[str] = None) -> List[Dict[str, Any]]:
+        """GET the snapshot list without the 'current' entry; raises on failure"""
+        snapshots = await self._api_request('GET', await self._vm_path(vm_id, "snapshot", node))
+        return [s for s in snapshots if s.get('name') != 'current']
+    
+    async def _delete_snapshot(self, vm_id: int, snapshot_name: str, node: Optional[str] = None) -> TaskHandle:
+        """DELETE a snapshot and return the task handle; raises on failure"""
+        path = await self._vm_path(vm_id, f"snapshot/{snapshot_name}", node)
+        return TaskHandle.from_upid(await self._api_request('DELETE', path), vm_id)
+    
+    async def get_vm_rrddata(self, vm_id: int, timeframe: str = 'hour',
+                             cf: str = 'AVERAGE') -> Optional[List[Dict[str, Any]]]:
+        """
+        Get a VM's RRD statistics (cpu, mem, netin, diskread, ...)
+        
+        Args:
+            vm_id: VM ID
+            timeframe: 'hour', 'day', 'week', 'month' or 'year'
+            cf: Consolidation function, 'AVERAGE' or 'MAX'
+            
+        Returns:
+            Rows with a 'time' member, oldest first, or None if failed
+        """
+        try:
+            return await self._api_request(
+                'GET', await self._vm_path(vm_id, "rrddata"), params={'timeframe': timeframe, 'cf': cf}
+            )
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to get VM rrddata: {e}")
+            self._route_failed(vm_id)
+            return None
+    
+    async def stream_vm_rrddata(self, vm_id: int, timeframe: str = 'hour',
+                                cf: str = 'AVERAGE') -> AsyncIterator[Dict[str, Any]]:
+        """Yield a VM's RRD rows as they are decoded (see get_vm_rrddata and stream)"""
+        path = await self._vm_path(vm_id, "rrddata")
+        async for row in self.stream(path, params={'timeframe': timeframe, 'cf': cf}):
+            yield row
+    
+    async def get_node_rrddata(self, node: str, timeframe: str = 'hour',
+                               cf: str = 'AVERAGE') -> Optional[List[Dict[str, Any]]]:
+        """
+        Get a node's RRD statistics (cpu, memused, loadavg, iowait, ...)
+        
+        Args:
+            node: Node name
+            timeframe: 'hour', 'day', 'week', 'month' or 'year'
+            cf: Consolidation function, 'AVERAGE' or 'MAX'
+            
+        Returns:
+            Rows with a 'time' member, oldest first, or None if failed
+        """
+        try:
+            return await self._api_request(
+                'GET', f"/nodes/{node}/rrddata", params={'timeframe': timeframe, 'cf': cf}
+            )
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to get node rrddata: {e}")
+            return None
+    
+    async def get_task_status(self, task: Union[TaskHandle, str]) -> Optional[Dict[str, Any]]:
+        """
+        Get the status of a task on the node that runs it
+        
+        Args:
+            task: Task handle or UPID
+            
+        Returns:
+            Task status ('status', 'exitstatus', ...) or None if failed
+        """
+        if isinstance(task, str):
+            task = TaskHandle.from_upid(task)
+        
+        try:
+            return await self._api_request('GET', f"/nodes/{task.node}/tasks/{task.upid}/status")
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to get task status: {e}")
+            return None
+    
+    async def list_cluster_tasks(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        List recent and running tasks across the cluster in one call
+        
+        Returns:
+            Task entries from /cluster/tasks or None if failed
+        """
+        try:
+            return await self._api_request('GET', "/cluster/tasks")
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to list cluster tasks: {e}")
+            return None
+    
+    def stream_cluster_tasks(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield /cluster/tasks entries as they are decoded (see stream)"""
+        return self.stream("/cluster/tasks")
+    
+    async def wait_task(self, task: TaskHandle, timeout: Optional[float] = None,
+                        poll_interval: Optional[float] = None,
+                        max_poll_interval: Optional[float] = None) -> TaskHandle:
+        """
+        Wait for a task to finish
+        
+        Args:
+            task: Handle returned by start_vm, stop_vm or create_vm_snapshot
+            timeout: Seconds to wait (default: forever)
+            poll_interval: First delay between polls (default: the waiter's)
+            max_poll_interval: Longest delay between polls (default: the waiter's)
+            
+        Returns:
+            The handle; check task.ok for success
+            
+        Raises:
+            asyncio.TimeoutError: If the task is still running at the timeout
+        """
+        return await self.task_waiter.wait(task, timeout, poll_interval, max_poll_interval)
+    
+    def wait_tasks(self, tasks: Iterable[TaskHandle],
+                   timeout: Optional[float] = None) -> AsyncIterator[TaskHandle]:
+        """
+        Yield tasks as they finish, polling them together
+        
+        Args:
+            tasks: Task handles
+            timeout: Seconds to wait for all of them (default: forever)
+            
+        Returns:
+            Async iterator of finished handles in completion order
+        """
+        return self.task_waiter.as_completed(tasks, timeout)
     
     async def list_vms(self) -> Optional[List[Dict[str, Any]]]:
         """
@@ -278,35 +1148,266 @@ class ProxmoxAPIAsync:
             return None
         
         try:
-            async with self.session.get(
-                f"{self.base_url}/nodes/{self.node}/qemu"
-            ) as response:
-                response.raise_for_status()
-                return (await response.json())['data']
+            path = f"/nodes/{self.node}/qemu"
+            
+            async def fetch():
+                async with self._send('GET', f"{self.base_url}{path}") as response:
+                    response.raise_for_status()
+                    return (await response.json())['data']
+            
+            return await self._cached_get(path, lambda: self._retry_unauthorized(fetch))
                 
         except aiohttp.ClientError as e:
             logger.error(f"Failed to list VMs: {e}")
             return None
     
+    async def get_cluster_resources(self, resource_type: Optional[str] = None,
+                                    fresh: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """
+        List every resource in the cluster in one call
+        
+        Args:
+            resource_type: Optional filter ('vm', 'node', 'storage', 'sdn')
+            fresh: Bypass the response cache
+            
+        Returns:
+            Resource entries from /cluster/resources or None if failed
+        """
+        request = self._request if fresh else self._api_request
+        try:
+            return await request(
+                'GET', "/cluster/resources", params={'type': resource_type} if resource_type else None
+            )
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to list cluster resources: {e}")
+            return None
+    
+    def stream_cluster_resources(self, resource_type: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield /cluster/resources entries as they are decoded (see stream)
+        
+        Args:
+            resource_type: Optional filter ('vm', 'node', 'storage', 'sdn')
+        """
+        return self.stream("/cluster/resources", params={'type': resource_type} if resource_type else None)
+    
+    async def refresh_index(self, force: bool = False, max_age: Optional[float] = None) -> bool:
+        """
+        Refresh the cluster index if it is stale
+        
+        Concurrent callers share one /cluster/resources request.
+        
+        Args:
+            force: Refresh even if the index is fresh
+            max_age: Staleness threshold (default: the index refresh interval)
+            
+        Returns:
+            True if the index is usable, False if a needed refresh failed
+        """
+        if not force and not self.cluster_index.is_stale(max_age):
+            return True
+        
+        generation = self.cluster_index.refreshed_at
+        if self._index_lock is None:
+            self._index_lock = asyncio.Lock()
+        async with self._index_lock:
+            # Refreshed by another task while we waited
+            if self.cluster_index.refreshed_at != generation and not self.cluster_index.is_stale(max_age):
+                return True
+            
+            # The index is a cache of its own; never build it from a cached listing
+            resources = await self.get_cluster_resources(fresh=True)
+            if resources is None:
+                return False
+            
+            self.cluster_index.apply(resources)
+            return True
+    
+    def watch_vms(self, vm_ids: Optional[Iterable[int]] = None, events: Optional[Iterable[str]] = None,
+                  initial: bool = False) -> AsyncIterator[VMChange]:
+        """
+        Yield guest changes as they happen (see VMWatcher.subscribe)
+        
+        Every caller shares one /cluster/resources poller, which also keeps
+        the cluster index fresh; tasks this client waits on trigger a poll
+        as they finish.
+        
+        Args:
+            vm_ids: Only these guests (default: all)
+            events: Only these events, e.g. ['started', 'stopped', 'migrated']
+            initial: First yield every known guest as 'added'
+        """
+        return self.vm_watcher.subscribe(vm_ids, events, initial)
+    
+    async def find_vm(self, name: str) -> Optional[int]:
+        """
+        Resolve a VM name to its ID through the cluster index
+        
+        Args:
+            name: VM name
+            
+        Returns:
+            VM ID, or None if not found or ambiguous
+        """
+        if self.auto_index or not self.cluster_index.loaded:
+            await self.refresh_index()
+        return self.cluster_index.vmid_for(name)
+    
+    async def node_for(self, vm_id: int) -> Optional[str]:
+        """
+        Node that per-VM calls for vm_id are sent to
+        
+        Args:
+            vm_id: VM ID
+            
+        Returns:
+            Node from the cluster index, falling back to the configured node
+        """
+        if self.auto_index:
+            await self.refresh_index()
+            if vm_id not in self.cluster_index:
+                # Possibly created since the last refresh; bounded to one reload a second
+                await self.refresh_index(max_age=1.0)
+        
+        return self.cluster_index.node_for(vm_id) or self.node
+    
+    async def _vm_url(self, vm_id: int, path: str) -> str:
+        return f"{self.base_url}{await self._vm_path(vm_id, path)}"
+    
+    async def _vm_path(self, vm_id: int, path: str, node: Optional[str] = None) -> str:
+        node = node or await self.node_for(vm_id)
+        if not node:
+            raise ProxmoxAPIError(f"VM {vm_id} is not in the cluster index and no node is configured")
+        return f"/nodes/{node}/qemu/{vm_id}/{path}"
+    
+    def _route_failed(self, vm_id: int):
+        """The VM may have migrated: reload the index before the next routed call"""
+        if vm_id in self.cluster_index:
+            self.cluster_index.invalidate()
+    
     async def batch_vm_status(self, vm_ids: List[int]) -> Dict[int, Optional[Dict[str, Any]]]:
         """
-        Get status for multiple VMs concurrently
+        Get status for multiple VMs concurrently (within the bulk limits)
         
         Args:
             vm_ids: List of VM IDs
             
         Returns:
-            Dict mapping VM ID to status
+            Dict mapping VM ID to status (None where the call failed)
+        """
+        bulk = await self._bulk('status', vm_ids, lambda vm_id, node: self.get_vm_status(vm_id))
+        return {vm_id: bulk.results.get(vm_id) for vm_id in vm_ids}
+    
+    def _bulk(self, operation: str, vm_ids: Iterable[int], call, concurrency: Optional[int] = None,
+              per_node: Optional[int] = None) -> BulkOperation:
+        return BulkOperation(
+            operation, vm_ids, call, self.node_for,
+            concurrency=concurrency or self.bulk_concurrency,
+            per_node=per_node if per_node is not None else self.bulk_per_node,
+            on_error=self._route_failed
+        )
+    
+    def _bulk_task(self, operation: str, vm_ids: Iterable[int], submit, wait: bool,
+                   timeout: Optional[float], concurrency: Optional[int], per_node: Optional[int]) -> BulkOperation:
+        """Bulk operation whose calls start tasks, optionally waiting for them"""
+        async def call(vm_id: int, node: str) -> TaskHandle:
+            task = await submit(vm_id, node)
+            if wait:
+                # The VM keeps its concurrency slot until its task finishes
+                await self.task_waiter.wait(task, timeout)
+                if not task.ok:
+                    raise ProxmoxAPIError(f"Task {task.upid} failed: {task.exitstatus}")
+            return task
+        
+        return self._bulk(operation, vm_ids, call, concurrency, per_node)
+    
+    def bulk_status(self, vm_ids: Iterable[int], concurrency: Optional[int] = None,
+                    per_node: Optional[int] = None) -> BulkOperation:
         """
-        import asyncio
+        Get the current status of many VMs
+        
+        Like every bulk_* method this returns a BulkOperation: await it for a
+        BulkResult (results and structured errors keyed by VM ID), or iterate
+        it with 'async for' to stream VMResults as they complete.
         
-        tasks = [self.get_vm_status(vm_id) for vm_id in vm_ids]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        Args:
+            vm_ids: VM IDs
+            concurrency: Most requests in flight (default: bulk_concurrency)
+            per_node: Most requests in flight per node (default: bulk_per_node, 0 for no limit)
+        """
+        async def call(vm_id: int, node: str):
+            return await self._api_request('GET', await self._vm_path(vm_id, "status/current", node))
         
-        return {
-            vm_id: result if not isinstance(result, Exception) else None
-            for vm_id, result in zip(vm_ids, results)
+        return self._bulk('status', vm_ids, call, concurrency, per_node)
+    
+    def bulk_config(self, vm_ids: Iterable[int], concurrency: Optional[int] = None,
+                    per_node: Optional[int] = None) -> BulkOperation:
+        """Read the configuration of many VMs (see bulk_status)"""
+        async def call(vm_id: int, node: str):
+            return await self._api_request('GET', await self._vm_path(vm_id, "config", node))
+        
+        return self._bulk('config', vm_ids, call, concurrency, per_node)
+    
+    def bulk_list_snapshots(self, vm_ids: Iterable[int], concurrency: Optional[int] = None,
+                            per_node: Optional[int] = None) -> BulkOperation:
+        """List the snapshots of many VMs (see bulk_status)"""
+        return self._bulk('snapshots', vm_ids, lambda vm_id, node: self._snapshots(vm_id, node),
+                          concurrency, per_node)
+    
+    def bulk_rrddata(self, vm_ids: Iterable[int], timeframe: str = 'hour', cf: str = 'AVERAGE',
+                     concurrency: Optional[int] = None, per_node: Optional[int] = None) -> BulkOperation:
+        """Read the RRD statistics of many VMs (see bulk_status)"""
+        params = {'timeframe': timeframe, 'cf': cf}
+        
+        async def call(vm_id: int, node: str):
+            return await self._api_request('GET', await self._vm_path(vm_id, "rrddata", node), params=params)
+        
+        return self._bulk('rrddata', vm_ids, call, concurrency, per_node)
+    
+    def bulk_start(self, vm_ids: Iterable[int], wait: bool = False, timeout: Optional[float] = None,
+                   concurrency: Optional[int] = None, per_node: Optional[int] = None) -> BulkOperation:
+        """
+        Start many VMs (see bulk_status)
+        
+        Args:
+            vm_ids: VM IDs
+            wait: Wait for each start task and report failed tasks as errors
+            timeout: Longest wait per task when waiting
+            concurrency: Most operations in flight
+            per_node: Most operations in flight per node
+        """
+        return self._bulk_task('start', vm_ids, lambda vm_id, node: self._vm_task(vm_id, 'start', node=node),
+                               wait, timeout, concurrency, per_node)
+    
+    def bulk_stop(self, vm_ids: Iterable[int], wait: bool = False, timeout: Optional[float] = None,
+                  concurrency: Optional[int] = None, per_node: Optional[int] = None) -> BulkOperation:
+        """Stop many VMs (see bulk_start)"""
+        return self._bulk_task('stop', vm_ids, lambda vm_id, node: self._vm_task(vm_id, 'stop', node=node),
+                               wait, timeout, concurrency, per_node)
+    
+    def bulk_shutdown(self, vm_ids: Iterable[int], guest_timeout: Optional[int] = None, wait: bool = False,
+                      timeout: Optional[float] = None, concurrency: Optional[int] = None,
+                      per_node: Optional[int] = None) -> BulkOperation:
+        """Shut many VMs down cleanly (see bulk_start); guest_timeout is passed to Proxmox"""
+        return self._bulk_task(
+            'shutdown', vm_ids, lambda vm_id, node: self._vm_task(vm_id, 'shutdown', guest_timeout, node),
+            wait, timeout, concurrency, per_node
+        )
+    
+    def bulk_snapshot(self, vm_ids: Iterable[int], snapshot_name: str, description: Optional[str] = None,
+                      wait: bool = False, timeout: Optional[float] = None, concurrency: Optional[int] = None,
+                      per_node: Optional[int] = None) -> BulkOperation:
+        """Snapshot many VMs under one name (see bulk_start)"""
+        data = {
+            'snapname': snapshot_name,
+            'description': description or f"Time-shift snapshot created at {datetime.now()}"
         }
+        
+        async def submit(vm_id: int, node: str) -> TaskHandle:
+            path = await self._vm_path(vm_id, "snapshot", node)
+            return TaskHandle.from_upid(await self._api_request('POST', path, data=data), vm_id)
+        
+        return self._bulk_task('snapshot', vm_ids, submit, wait, timeout, concurrency, per_node)
 
 
 # Migration helper to convert from sync to async
@@ -326,8 +1427,11 @@ def migrate_to_async(sync_api: 'ProxmoxAPI') -> ProxmoxAPIAsync:
         'username': sync_api.username,
         'password': sync_api.password,
         'node': sync_api.node,
-        'verify_ssl': sync_api.verify_ssl
+        'verify_ssl': sync_api.verify_ssl,
+        'cluster_index': getattr(sync_api, 'auto_index', False)
     }
+    if getattr(sync_api, 'token_id', None):
+        config['api_token'] = f"{sync_api.token_id}={sync_api.token_secret}"
     return ProxmoxAPIAsync(config)
 
 
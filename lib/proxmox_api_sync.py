@@ -0,0 +1,313 @@
+"""
+Proxmox API Module - Blocking facade over the async client
+Runs ProxmoxAPIAsync on a background event loop thread so synchronous
+callers get its connection pooling, ticket handling and concurrency
+through the same method signatures as ProxmoxAPI
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from lib.guest_exec import Command, ExecResult
+from lib.task_waiter import TaskHandle
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoop:
+    """An asyncio event loop running in a daemon thread"""
+
+    def __init__(self, name: str = 'proxmox-api-loop'):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """Start the loop thread if it is not running yet"""
+        with self._lock:
+            if not self.running:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+                self.thread.start()
+            return self.loop
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the loop and block for its result
+
+        Args:
+            coro: Coroutine to run
+            timeout: Seconds to wait (default: forever); the coroutine is cancelled on timeout
+
+        Raises:
+            RuntimeError: If called from the loop thread itself
+            TimeoutError: If the timeout passes first
+        """
+        if threading.current_thread() is self.thread:
+            coro.close()
+            raise RuntimeError("Blocking call made from the background loop thread")
+
+        future = asyncio.run_coroutine_threadsafe(coro, self.start())
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Call did not finish within {timeout}s")
+
+    def stop(self):
+        """Stop the loop and join its thread"""
+        with self._lock:
+            if not self.running:
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.thread = None
+            self.loop = None
+
+
+def _delegate(name: str) -> property:
+    """Read-only view of an attribute of the wrapped async client"""
+    return property(lambda self: getattr(self.async_api, name), doc=f"ProxmoxAPIAsync.{name}")
+
+
+class ProxmoxAPISync:
+    """Blocking Proxmox API client backed by ProxmoxAPIAsync"""
+
+    host = _delegate('host')
+    port = _delegate('port')
+    username = _delegate('username')
+    password = _delegate('password')
+    node = _delegate('node')
+    verify_ssl = _delegate('verify_ssl')
+    base_url = _delegate('base_url')
+    ticket = _delegate('ticket')
+    csrf_token = _delegate('csrf_token')
+    ticket_expiry = _delegate('ticket_expiry')
+    token_id = _delegate('token_id')
+    token_secret = _delegate('token_secret')
+    ticket_cache = _delegate('ticket_cache')
+    auth_stats = _delegate('auth_stats')
+    cluster_index = _delegate('cluster_index')
+    auto_index = _delegate('auto_index')
+    response_cache = _delegate('response_cache')
+    cache_stats = _delegate('cache_stats')
+    rate_limiter = _delegate('rate_limiter')
+    rate_limit_stats = _delegate('rate_limit_stats')
+
+    def __init__(self, config: Dict[str, Any], loop: Optional[BackgroundLoop] = None,
+                 call_timeout: Optional[float] = None):
+        """
+        Initialize the facade
+
+        The loop thread starts, and the async client is built on it, on
+        first use, so constructing a client that is never used costs
+        nothing. Building it on the loop binds the asyncio primitives it
+        creates to that loop, which Python 3.8 and 3.9 require.
+
+        Args:
+            config: Proxmox configuration parameters (as for ProxmoxAPI)
+            loop: Background loop to share with other facades (default: a private one)
+            call_timeout: Longest a single blocking call may take (default: no limit)
+        """
+        self._config = config
+        self._async_api: Optional[ProxmoxAPIAsync] = None
+        self._client_lock = threading.Lock()
+        self.background = loop or BackgroundLoop()
+        self._owns_loop = loop is None
+        self.call_timeout = call_timeout
+        self.concurrency = config.get('pool_size', 10)
+
+    @property
+    def async_api(self) -> ProxmoxAPIAsync:
+        """The wrapped async client, built on the loop thread on first use"""
+        if self._async_api is None:
+            with self._client_lock:
+                if self._async_api is None:
+                    self._async_api = self.background.run(self._make_client())
+        return self._async_api
+
+    async def _make_client(self) -> ProxmoxAPIAsync:
+        return ProxmoxAPIAsync(self._config)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        return self.background.run(coro, timeout if timeout is not None else self.call_timeout)
+
+    def authenticate(self) -> bool:
+        """Authenticate with Proxmox (see ProxmoxAPI.authenticate)"""
+        return self._run(self.async_api.authenticate())
+
+    def get_vm_status(self, vm_id: int) -> Optional[Dict[str, Any]]:
+        """Get VM status information, or None if failed"""
+        return self._run(self.async_api.get_vm_status(vm_id))
+
+    def start_vm(self, vm_id: int) -> Optional[TaskHandle]:
+        """Start a VM, returning its task handle or None if failed"""
+        return self._run(self.async_api.start_vm(vm_id))
+
+    def stop_vm(self, vm_id: int) -> Optional[TaskHandle]:
+        """Stop a VM, returning its task handle or None if failed"""
+        return self._run(self.async_api.stop_vm(vm_id))
+
+    def execute_vm_command(self, vm_id: int, command: Union[str, List[str]]) -> Optional[Dict[str, Any]]:
+        """Execute a command in a VM through the guest agent, or None if failed"""
+        return self._run(self.async_api.execute_vm_command(vm_id, command))
+
+    def run_vm_command(self, vm_id: int, command: Command, stdin: Optional[str] = None,
+                       timeout: Optional[float] = None) -> ExecResult:
+        """Run a command in a VM and block until it exits (see ProxmoxAPIAsync.run_vm_command)"""
+        # The executor enforces the timeout, not call_timeout
+        return self.background.run(self.async_api.run_vm_command(vm_id, command, stdin, timeout))
+
+    def create_vm_snapshot(self, vm_id: int, snapshot_name: str) -> Optional[TaskHandle]:
+        """Create a VM snapshot, returning its task handle or None if failed"""
+        return self._run(self.async_api.create_vm_snapshot(vm_id, snapshot_name))
+
+    def list_vm_snapshots(self, vm_id: int) -> Optional[List[Dict[str, Any]]]:
+        """List a VM's snapshots, or None if failed"""
+        return self._run(self.async_api.list_vm_snapshots(vm_id))
+
+    def rollback_vm_snapshot(self, vm_id: int, snapshot_name: str) -> Optional[TaskHandle]:
+        """Roll a VM back to a snapshot, returning its task handle or None if failed"""
+        return self._run(self.async_api.rollback_vm_snapshot(vm_id, snapshot_name))
+
+    def delete_vm_snapshot(self, vm_id: int, snapshot_name: str) -> Optional[TaskHandle]:
+        """Delete a VM snapshot, returning its task handle or None if failed"""
+        return self._run(self.async_api.delete_vm_snapshot(vm_id, snapshot_name))
+
+    def list_vms(self) -> Optional[List[Dict[str, Any]]]:
+        """List all VMs on the node, or None if failed"""
+        return self._run(self.async_api.list_vms())
+
+    def get_cluster_resources(self, resource_type: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """List every resource in the cluster, or None if failed"""
+        return self._run(self.async_api.get_cluster_resources(resource_type))
+
+    def refresh_index(self, force: bool = False, max_age: Optional[float] = None) -> bool:
+        """Refresh the cluster index if it is stale"""
+        return self._run(self.async_api.refresh_index(force, max_age))
+
+    def find_vm(self, name: str) -> Optional[int]:
+        """Resolve a VM name to its ID through the cluster index"""
+        return self._run(self.async_api.find_vm(name))
+
+    def node_for(self, vm_id: int) -> Optional[str]:
+        """Node that per-VM calls for vm_id are sent to"""
+        return self._run(self.async_api.node_for(vm_id))
+
+    def get_task_status(self, task: Union[TaskHandle, str]) -> Optional[Dict[str, Any]]:
+        """Get the status of a task, or None if failed"""
+        return self._run(self.async_api.get_task_status(task))
+
+    def wait_task(self, task: TaskHandle, timeout: float = 300, poll_interval: Optional[float] = None,
+                  max_poll_interval: Optional[float] = None) -> TaskHandle:
+        """
+        Block until a task finishes
+
+        Polling goes through the async client's shared TaskWaiter, so tasks
+        waited on from several threads are batched together.
+
+        Args:
+            task: Handle returned by start_vm, stop_vm or create_vm_snapshot
+            timeout: Longest wait in seconds
+            poll_interval: First delay between polls (default: the waiter's)
+            max_poll_interval: Longest delay between polls (default: the waiter's)
+
+        Returns:
+            The handle; task.done is False if the timeout was reached
+        """
+        try:
+            # The waiter enforces the timeout, not call_timeout
+            return self.background.run(
+                self.async_api.wait_task(task, timeout, poll_interval, max_poll_interval))
+        except asyncio.TimeoutError:
+            logger.warning(f"Task {task.upid} still running after {timeout}s")
+            return task
+
+    def wait_tasks(self, tasks: Iterable[TaskHandle], timeout: Optional[float] = None) -> Iterator[TaskHandle]:
+        """
+        Yield tasks as they finish
+
+        Args:
+            tasks: Task handles
+            timeout: Seconds to wait for all of them (default: forever)
+
+        Raises:
+            asyncio.TimeoutError: If tasks are still running at the timeout
+        """
+        completions = self.async_api.wait_tasks(list(tasks), timeout)
+        try:
+            while True:
+                try:
+                    yield self._run(completions.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(completions.aclose())
+
+    def map(self, method: Union[str, Callable], *iterables: Iterable,
+            concurrency: Optional[int] = None, return_exceptions: bool = False) -> List[Any]:
+        """
+        Run one client call per set of arguments, concurrently, and block for all results
+
+        Example:
+            statuses = api.map('get_vm_status', vm_ids)
+            tasks = api.map(api.create_vm_snapshot, vm_ids, names)
+
+        Args:
+            method: Name of a client method, a bound method of this facade, or an
+                async function called as fn(async_api, *args)
+            *iterables: Argument iterables, zipped like the builtin map()
+            concurrency: Most calls in flight (default: the connection pool size)
+            return_exceptions: Return exceptions in the result list instead of raising
+
+        Returns:
+            Results in the order of the arguments
+        """
+        if isinstance(method, str) or getattr(method, '__self__', None) is self:
+            name = method if isinstance(method, str) else method.__name__
+            target = getattr(self.async_api, name)
+
+            def call(*args):
+                return target(*args)
+        else:
+            def call(*args):
+                return method(self.async_api, *args)
+
+        argument_sets = list(zip(*iterables))
+        return self._run(self._map(call, argument_sets, concurrency or self.concurrency, return_exceptions))
+
+    async def _map(self, call: Callable[..., Awaitable], argument_sets: List[tuple], concurrency: int,
+                   return_exceptions: bool) -> List[Any]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(args):
+            async with semaphore:
+                return await call(*args)
+
+        # Authenticate once up front rather than once per concurrent call
+        await self.async_api.ensure_authenticated()
+        return await asyncio.gather(*(bounded(args) for args in argument_sets),
+                                    return_exceptions=return_exceptions)
+
+    def close(self):
+        """Close the async client's session and stop a private loop thread"""
+        if self._async_api is not None and self.background.running:
+            self._run(self._async_api.close())
+        if self._owns_loop:
+            self.background.stop()
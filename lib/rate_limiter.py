@@ -0,0 +1,208 @@
+"""
+Rate Limiter Module - Adaptive client-side rate limiting for pveproxy
+Token buckets with separate read and write budgets whose rates adapt
+AIMD-style: halved on overload responses and timeouts, raised linearly
+while requests succeed. Works from threads and from any event loop
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Methods that only read; everything else draws on the write budget
+READ_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+# Responses meaning pveproxy (or the node it proxies to) is overloaded.
+# Proxmox answers ordinary API errors ('VM 100 is locked') with 500, so
+# 500 does not count; 596 is pveproxy's own proxy timeout.
+OVERLOAD_STATUSES = frozenset([429, 502, 503, 504, 596])
+
+# Requests per second; burst is how many may be sent back to back after a quiet spell
+DEFAULT_BUDGETS = {
+    'read': {'rate': 20.0, 'burst': 20, 'min_rate': 1.0, 'max_rate': 100.0},
+    'write': {'rate': 5.0, 'burst': 5, 'min_rate': 0.5, 'max_rate': 20.0},
+}
+
+
+def budget_for(method: str) -> str:
+    """'read' or 'write' budget of an HTTP method"""
+    return 'read' if method.upper() in READ_METHODS else 'write'
+
+
+class TokenBucket:
+    """
+    Token bucket for one budget whose rate adapts AIMD-style
+
+    Callers reserve a token and are told how long to wait for it, so
+    waiting happens outside the lock, in a thread or a coroutine alike,
+    and callers are served in the order they arrived.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None, min_rate: Optional[float] = None,
+                 max_rate: Optional[float] = None, increase: float = 1.0, decrease: float = 0.5,
+                 cooldown: float = 1.0):
+        """
+        Initialize the bucket
+
+        Args:
+            rate: Starting rate in requests per second
+            burst: Tokens the bucket holds (default: one second at the starting rate)
+            min_rate: Lowest rate backoff may reach (default: rate / 20)
+            max_rate: Highest rate ramp-up may reach (default: rate * 5)
+            increase: Requests per second added for each second of successful traffic
+            decrease: Factor the rate is multiplied by on overload
+            cooldown: Seconds after a decrease during which further overloads
+                      (answers to requests already in flight) do not decrease again
+        """
+        self.rate = float(rate)
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.max_rate = max_rate if max_rate is not None else rate * 5
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+
+        self.tokens = float(self.burst)
+        self.queued = 0
+        self._updated = time.monotonic()
+        self._decreased_at = float('-inf')
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'throttled': 0, 'waited': 0.0, 'peak_queued': 0,
+                      'overloads': 0, 'backoffs': 0}
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        Take a token, possibly one not yet refilled
+
+        Returns:
+            Seconds to wait before sending; call done_waiting() afterwards if non-zero
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            self.stats['requests'] += 1
+            if self.tokens >= 0:
+                return 0.0
+            delay = -self.tokens / self.rate
+            self.queued += 1
+            self.stats['throttled'] += 1
+            self.stats['waited'] += delay
+            self.stats['peak_queued'] = max(self.stats['peak_queued'], self.queued)
+            return delay
+
+    def done_waiting(self):
+        with self._lock:
+            self.queued -= 1
+
+    def record_success(self):
+        """Additive increase: increase requests/s per second of successful traffic"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def record_overload(self) -> Optional[float]:
+        """
+        Multiplicative decrease, at most once per cooldown
+
+        Returns:
+            The rate before the decrease, or None if still cooling down
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.stats['overloads'] += 1
+            if now - self._decreased_at < self.cooldown:
+                return None
+            self._refill(now)
+            previous = self.rate
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # No saved-up burst right after the server pushed back
+            self.tokens = min(self.tokens, 0.0)
+            self._decreased_at = now
+            self.stats['backoffs'] += 1
+            return previous
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {'rate': round(self.rate, 3), 'tokens': round(self.tokens, 3), 'queued': self.queued,
+                    **{name: round(value, 3) if isinstance(value, float) else value
+                       for name, value in self.stats.items()}}
+
+
+class RateLimiter:
+    """Adaptive read and write budgets for one Proxmox API endpoint"""
+
+    def __init__(self, budgets: Optional[Dict[str, Dict[str, Any]]] = None, events: int = 100):
+        """
+        Initialize the limiter
+
+        Args:
+            budgets: TokenBucket overrides per budget, e.g. {'write': {'rate': 2}}
+            events: Recent throttle events kept for inspection
+        """
+        budgets = budgets or {}
+        unknown = set(budgets) - set(DEFAULT_BUDGETS)
+        if unknown:
+            raise ValueError(f"Unknown rate limit budgets: {sorted(unknown)}")
+        self.buckets = {name: TokenBucket(**dict(defaults, **budgets.get(name, {})))
+                        for name, defaults in DEFAULT_BUDGETS.items()}
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=events)
+
+    def bucket(self, method: str) -> TokenBucket:
+        return self.buckets[budget_for(method)]
+
+    async def acquire(self, method: str):
+        """Wait in a coroutine until a request with this method may be sent"""
+        bucket = self.bucket(method)
+        delay = bucket.reserve()
+        if delay:
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                bucket.done_waiting()
+
+    def wait(self, method: str):
+        """Block the calling thread until a request with this method may be sent"""
+        bucket = self.bucket(method)
+        delay = bucket.reserve()
+        if delay:
+            try:
+                time.sleep(delay)
+            finally:
+                bucket.done_waiting()
+
+    def record(self, method: str, status: Optional[int] = None, error: Optional[BaseException] = None):
+        """
+        Adapt the budget to a request's outcome
+
+        Args:
+            method: HTTP method of the request
+            status: Response status, if a response arrived
+            error: Timeout or connection error, if none did
+        """
+        budget = budget_for(method)
+        bucket = self.buckets[budget]
+        if error is None and status not in OVERLOAD_STATUSES:
+            bucket.record_success()
+            return
+
+        previous = bucket.record_overload()
+        if previous is not None:
+            reason = f"HTTP {status}" if error is None else type(error).__name__
+            self.events.append({'at': time.time(), 'budget': budget, 'reason': reason,
+                                'previous_rate': round(previous, 3), 'rate': round(bucket.rate, 3)})
+            logger.warning(f"Proxmox {budget} rate lowered from {previous:.1f}/s to {bucket.rate:.1f}/s ({reason})")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current rate, tokens, queue length and counters per budget, with recent throttle events"""
+        return {**{name: bucket.snapshot() for name, bucket in self.buckets.items()},
+                'events': list(self.events)}
@@ -0,0 +1,387 @@
+"""
+Redfish Client Module - Pooled Redfish access for Dell iDRAC/BMC fleets
+Logs in once per BMC and reuses the X-Auth-Token session over keep-alive connections
+"""
+
+import asyncio
+import ssl
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Iterable
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_PATH = "/redfish/v1/SessionService/Sessions"
+IDRAC_SYSTEM_PATH = "/redfish/v1/Systems/System.Embedded.1"
+IDRAC_MANAGER_PATH = "/redfish/v1/Managers/iDRAC.Embedded.1"
+FIRMWARE_INVENTORY_PATH = "/redfish/v1/UpdateService/FirmwareInventory"
+SEL_ENTRIES_PATH = f"{IDRAC_MANAGER_PATH}/LogServices/Sel/Entries"
+HTTPS_CERTIFICATES_PATH = f"{IDRAC_MANAGER_PATH}/NetworkProtocol/HTTPS/Certificates"
+
+
+class RedfishError(Exception):
+    """Raised when a Redfish request cannot be completed"""
+    pass
+
+
+@dataclass
+class RedfishSession:
+    """Authenticated Redfish session for a single BMC"""
+    token: str
+    location: Optional[str] = None
+    created: float = field(default_factory=time.monotonic)
+    requests: int = 0
+
+    def should_recycle(self, max_age: float, max_requests: int) -> bool:
+        """Check whether the session is old or busy enough to be replaced"""
+        return (time.monotonic() - self.created >= max_age or
+                self.requests >= max_requests)
+
+
+class RedfishClient:
+    """Async Redfish client with per-BMC session reuse and fleet fan-out"""
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Initialize Redfish client
+
+        Args:
+            config: Redfish configuration parameters. Supports 'username',
+                'password', 'port', 'scheme', 'verify_ssl', 'timeout',
+                'per_host_limit', 'fleet_concurrency', 'session_max_age',
+                'session_max_requests' and per-host 'credentials' overrides.
+        """
+        self.username = config.get('username', '')
+        self.password = config.get('password', '')
+        self.credentials: Dict[str, Dict[str, str]] = config.get('credentials', {})
+        self.port = config.get('port', 443)
+        self.scheme = config.get('scheme', 'https')
+        self.verify_ssl = config.get('verify_ssl', False)
+        self.timeout = config.get('timeout', 30)
+
+        # iDRAC only allows a handful of concurrent sessions/requests per BMC
+        self.per_host_limit = config.get('per_host_limit', 2)
+        self.fleet_concurrency = config.get('fleet_concurrency', 64)
+        self.session_max_age = config.get('session_max_age', 900)
+        self.session_max_requests = config.get('session_max_requests', 1000)
+
+        self.connector = None
+        self.session = None
+
+        self.sessions: Dict[str, RedfishSession] = {}
+        self._login_locks: Dict[str, asyncio.Lock] = {}
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        self.stats = {
+            'logins': 0,
+            'logouts': 0,
+            'requests': 0,
+            'reauth_retries': 0,
+        }
+
+        self.ssl_context = ssl.create_default_context()
+        if not self.verify_ssl:
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE
+
+    async def __aenter__(self):
+        """Async context manager entry"""
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit"""
+        await self.close()
+
+    async def connect(self):
+        """Create the keep-alive connection pool"""
+        if not self.session:
+            self.connector = aiohttp.TCPConnector(
+                limit=self.fleet_concurrency * self.per_host_limit,
+                limit_per_host=self.per_host_limit,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+                ssl=self.ssl_context if self.scheme == 'https' else False
+            )
+            self.session = aiohttp.ClientSession(
+                connector=self.connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            logger.info("Created Redfish session pool")
+
+    async def close(self):
+        """Log out of every BMC and close the connection pool"""
+        if self.session:
+            await asyncio.gather(
+                *(self._logout(host, session) for host, session in list(self.sessions.items())),
+                return_exceptions=True
+            )
+            self.sessions.clear()
+            await self.session.close()
+            self.session = None
+            self.connector = None
+            logger.info("Closed Redfish session pool")
+
+    def _base_url(self, host: str) -> str:
+        """Build the base URL for a BMC"""
+        return f"{self.scheme}://{host}:{self.port}"
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        """Get the semaphore limiting concurrent requests to one BMC"""
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_semaphores[host]
+
+    def _host_credentials(self, host: str) -> Dict[str, str]:
+        """Resolve credentials for a BMC, honouring per-host overrides"""
+        creds = self.credentials.get(host, {})
+        return {
+            'UserName': creds.get('username', self.username),
+            'Password': creds.get('password', self.password),
+        }
+
+    async def _login(self, host: str) -> RedfishSession:
+        """
+        Create a Redfish session on a BMC
+
+        Args:
+            host: BMC address
+
+        Returns:
+            RedfishSession with the X-Auth-Token
+
+        Raises:
+            RedfishError: If the login is rejected
+        """
+        async with self.session.post(
+            f"{self._base_url(host)}{SESSIONS_PATH}",
+            json=self._host_credentials(host)
+        ) as response:
+            if response.status not in (200, 201):
+                raise RedfishError(f"Redfish login to {host} failed with HTTP {response.status}")
+
+            token = response.headers.get('X-Auth-Token')
+            if not token:
+                raise RedfishError(f"Redfish login to {host} returned no X-Auth-Token")
+
+            self.stats['logins'] += 1
+            logger.info(f"Opened Redfish session on {host}")
+            return RedfishSession(token=token, location=response.headers.get('Location'))
+
+    async def _logout(self, host: str, session: RedfishSession):
+        """Delete a Redfish session so it does not count against the BMC limit"""
+        if not session.location or not self.session:
+            return
+
+        url = session.location
+        if url.startswith('/'):
+            url = f"{self._base_url(host)}{url}"
+
+        try:
+            async with self.session.delete(url, headers={'X-Auth-Token': session.token}):
+                self.stats['logouts'] += 1
+        except aiohttp.ClientError as e:
+            logger.warning(f"Failed to close Redfish session on {host}: {e}")
+
+    async def _get_session(self, host: str, stale: Optional[RedfishSession] = None) -> RedfishSession:
+        """
+        Get a reusable session for a BMC, logging in or recycling as needed
+
+        Args:
+            host: BMC address
+            stale: Session known to be rejected by the BMC, if any
+
+        Returns:
+            RedfishSession ready for use
+        """
+        lock = self._login_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            current = self.sessions.get(host)
+            if current is not None and current is not stale and not current.should_recycle(
+                    self.session_max_age, self.session_max_requests):
+                return current
+
+            if current is not None:
+                self.sessions.pop(host, None)
+                if current is not stale:
+                    await self._logout(host, current)
+
+            new_session = await self._login(host)
+            self.sessions[host] = new_session
+            return new_session
+
+    async def get(self, host: str, path: str) -> Dict[str, Any]:
+        """
+        GET a Redfish resource, reusing the host's session
+
+        Args:
+            host: BMC address
+            path: Redfish resource path (e.g. /redfish/v1/Systems)
+
+        Returns:
+            Decoded JSON resource
+
+        Raises:
+            RedfishError: If the request fails
+        """
+        if not self.session:
+            await self.connect()
+
+        async with self._host_semaphore(host):
+            try:
+                session = await self._get_session(host)
+
+                for attempt in range(2):
+                    session.requests += 1
+                    self.stats['requests'] += 1
+
+                    async with self.session.get(
+                        f"{self._base_url(host)}{path}",
+                        headers={'X-Auth-Token': session.token}
+                    ) as response:
+                        if response.status == 401 and attempt == 0:
+                            # Session expired or was purged on the BMC; log in once more
+                            self.stats['reauth_retries'] += 1
+                            session = await self._get_session(host, stale=session)
+                            continue
+
+                        if response.status >= 400:
+                            raise RedfishError(f"GET {path} on {host} failed with HTTP {response.status}")
+
+                        try:
+                            return await response.json(content_type=None)
+                        except ValueError as e:
+                            # e.g. an HTML error page served with 200
+                            raise RedfishError(f"GET {path} on {host} returned a non-JSON body: {e}") from e
+
+            except aiohttp.ClientError as e:
+                raise RedfishError(f"GET {path} on {host} failed: {e}") from e
+
+        raise RedfishError(f"GET {path} on {host} was rejected after re-authentication")
+
+    async def _get_collection(self, host: str, path: str) -> List[Dict[str, Any]]:
+        """Fetch a Redfish collection and expand its members"""
+        collection = await self.get(host, path)
+        members = collection.get('Members', [])
+
+        # Members may be inlined (SEL entries) or only referenced (firmware)
+        refs = [m['@odata.id'] for m in members if set(m.keys()) == {'@odata.id'}]
+        if not refs:
+            return members
+
+        return list(await asyncio.gather(*(self.get(host, ref) for ref in refs)))
+
+    async def get_power_state(self, host: str) -> Optional[str]:
+        """
+        Get the system power state
+
+        Args:
+            host: BMC address
+
+        Returns:
+            Power state (e.g. 'On', 'Off')
+        """
+        system = await self.get(host, IDRAC_SYSTEM_PATH)
+        return system.get('PowerState')
+
+    async def get_firmware_inventory(self, host: str) -> List[Dict[str, Any]]:
+        """
+        Get installed firmware components
+
+        Args:
+            host: BMC address
+
+        Returns:
+            List of firmware entries with name, version and updateable flag
+        """
+        items = await self._get_collection(host, FIRMWARE_INVENTORY_PATH)
+        return [
+            {
+                'id': item.get('Id'),
+                'name': item.get('Name'),
+                'version': item.get('Version'),
+                'updateable': item.get('Updateable'),
+            }
+            for item in items
+        ]
+
+    async def get_sel_entries(self, host: str) -> List[Dict[str, Any]]:
+        """
+        Get System Event Log entries
+
+        Args:
+            host: BMC address
+
+        Returns:
+            List of SEL entries
+        """
+        entries = await self._get_collection(host, SEL_ENTRIES_PATH)
+        return [
+            {
+                'id': entry.get('Id'),
+                'created': entry.get('Created'),
+                'severity': entry.get('Severity'),
+                'message': entry.get('Message'),
+            }
+            for entry in entries
+        ]
+
+    async def get_certificates(self, host: str) -> List[Dict[str, Any]]:
+        """
+        Get the web server certificates installed on the BMC
+
+        Args:
+            host: BMC address
+
+        Returns:
+            List of certificates with subject, issuer and validity window
+        """
+        certs = await self._get_collection(host, HTTPS_CERTIFICATES_PATH)
+        return [
+            {
+                'id': cert.get('Id'),
+                'subject': cert.get('Subject', {}).get('CommonName'),
+                'issuer': cert.get('Issuer', {}).get('CommonName'),
+                'valid_from': cert.get('ValidNotBefore'),
+                'valid_until': cert.get('ValidNotAfter'),
+            }
+            for cert in certs
+        ]
+
+    async def fleet_query(self, hosts: Iterable[str], query: str = 'power_state') -> Dict[str, Dict[str, Any]]:
+        """
+        Run one query across many BMCs concurrently
+
+        Args:
+            hosts: BMC addresses
+            query: One of 'power_state', 'firmware', 'sel', 'certificates'
+
+        Returns:
+            Dict mapping host to {'ok': bool, 'data': ..., 'error': ...}
+        """
+        queries = {
+            'power_state': self.get_power_state,
+            'firmware': self.get_firmware_inventory,
+            'sel': self.get_sel_entries,
+            'certificates': self.get_certificates,
+        }
+        if query not in queries:
+            raise ValueError(f"Unknown Redfish query: {query}")
+
+        func = queries[query]
+        fleet_semaphore = asyncio.Semaphore(self.fleet_concurrency)
+
+        async def run(host: str) -> Dict[str, Any]:
+            async with fleet_semaphore:
+                try:
+                    return {'ok': True, 'data': await func(host), 'error': None}
+                except (RedfishError, asyncio.TimeoutError) as e:
+                    logger.error(f"Redfish {query} query failed for {host}: {e}")
+                    return {'ok': False, 'data': None, 'error': str(e) or type(e).__name__}
+
+        hosts = list(hosts)
+        results = await asyncio.gather(*(run(host) for host in hosts))
+        return dict(zip(hosts, results))
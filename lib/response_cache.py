@@ -0,0 +1,195 @@
+"""
+Response Cache Module - Read-through cache for idempotent Proxmox GETs
+Caches responses with a TTL per endpoint class, coalesces identical
+concurrent requests into one HTTP call, and drops a VM's entries when it
+is written to
+"""
+
+import asyncio
+import copy
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Endpoint classes in match order: (name, path pattern)
+ENDPOINT_CLASSES = [
+    ('vm_status', re.compile(r'^/nodes/[^/]+/qemu/\d+/status/current$')),
+    ('vm_config', re.compile(r'^/nodes/[^/]+/qemu/\d+/(config|pending)$')),
+    ('vm_snapshots', re.compile(r'^/nodes/[^/]+/qemu/\d+/snapshot$')),
+    ('vm_list', re.compile(r'^/nodes/[^/]+/qemu$')),
+    ('cluster_resources', re.compile(r'^/cluster/resources$')),
+    ('node_status', re.compile(r'^/nodes/[^/]+/status$')),
+    ('task_status', re.compile(r'^/nodes/[^/]+/tasks/[^/]+/status$')),
+    ('cluster_tasks', re.compile(r'^/cluster/tasks$')),
+    ('guest_agent', re.compile(r'^/nodes/[^/]+/qemu/\d+/agent/')),
+]
+
+# Seconds each class is cached; 0 disables caching but identical in-flight
+# requests are still coalesced. Task and guest-agent state must be read live.
+DEFAULT_TTLS = {
+    'vm_status': 2.0,
+    'vm_config': 30.0,
+    'vm_snapshots': 10.0,
+    'vm_list': 5.0,
+    'cluster_resources': 5.0,
+    'node_status': 5.0,
+    'task_status': 0.0,
+    'cluster_tasks': 0.0,
+    'guest_agent': 0.0,
+}
+
+# Endpoints listing every VM go stale whenever any VM changes
+_LISTING_CLASSES = ('vm_list', 'cluster_resources')
+
+_VM_PATH = re.compile(r'/qemu/(\d+)(?:/|$)')
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def endpoint_class(path: str) -> Optional[str]:
+    """Endpoint class of an API path below /api2/json, or None if unclassified"""
+    for name, pattern in ENDPOINT_CLASSES:
+        if pattern.search(path):
+            return name
+    return None
+
+
+def vm_id_from_path(path: str) -> Optional[int]:
+    """VM ID addressed by a path such as /nodes/pve/qemu/100/status/start"""
+    match = _VM_PATH.search(path)
+    return int(match.group(1)) if match else None
+
+
+class ResponseCache:
+    """TTL cache and request coalescer for GET responses"""
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 0.0,
+                 max_entries: int = 4096):
+        """
+        Initialize the cache
+
+        Args:
+            ttls: Per-class TTL overrides merged over DEFAULT_TTLS
+            default_ttl: TTL for paths in no class
+            max_entries: Entries kept before the oldest are evicted
+        """
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, Any]]' = OrderedDict()
+        self._in_flight: Dict[CacheKey, asyncio.Future] = {}
+        # Bumped on every invalidation; a fetch that started before one is not stored
+        self._generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'invalidations': 0, 'evictions': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(path: str, params: Optional[Dict[str, Any]] = None) -> CacheKey:
+        return path, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+
+    def ttl_for(self, path: str) -> float:
+        name = endpoint_class(path)
+        return self.ttls.get(name, self.default_ttl) if name else self.default_ttl
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]],
+                  fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return a cached response or fetch it, sharing the fetch with concurrent callers
+
+        Args:
+            path: API path below /api2/json
+            params: Query parameters
+            fetch: Coroutine function performing the request
+
+        Returns:
+            The response data (a private copy; callers may modify it)
+
+        Raises:
+            Whatever fetch raises; errors are never cached
+        """
+        key = self.key(path, params)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, data = entry
+            if expires > time.monotonic():
+                self.stats['hits'] += 1
+                return copy.deepcopy(data)
+            del self._entries[key]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.stats['coalesced'] += 1
+            # Unlike awaiting the future, wait() raises CancelledError only if
+            # this caller is cancelled, and never cancels the shared request
+            await asyncio.wait([in_flight])
+            if in_flight.cancelled():
+                # The caller that owned the request was cancelled, not us: try again
+                return await self.get(path, params, fetch)
+            return copy.deepcopy(in_flight.result())
+
+        self.stats['misses'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        generation = self._generation
+        try:
+            data = await fetch()
+        except BaseException as e:
+            if not future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    # Retrieved by coalesced callers, if any; avoid "never retrieved" noise
+                    future.exception()
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+        future.set_result(data)
+        ttl = self.ttl_for(path)
+        if ttl > 0 and generation == self._generation:
+            self._store(key, data, ttl)
+        return copy.deepcopy(data)
+
+    def _store(self, key: CacheKey, data: Any, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, data)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            now = time.monotonic()
+            for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[stale]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate_vm(self, vm_id: int):
+        """Drop every entry for a VM, and the listings that include it"""
+        self._generation += 1
+        self.stats['invalidations'] += 1
+        for key in list(self._entries):
+            path = key[0]
+            if vm_id_from_path(path) == vm_id or endpoint_class(path) in _LISTING_CLASSES:
+                del self._entries[key]
+
+    def invalidate_path(self, path: str):
+        """Account for a write to a path: VM writes drop that VM's entries"""
+        vm_id = vm_id_from_path(path)
+        if vm_id is not None:
+            self.invalidate_vm(vm_id)
+        else:
+            self.clear()
+
+    def clear(self):
+        """Drop every entry"""
+        self._generation += 1
+        self.stats['invalidations'] += 1
+        self._entries.clear()
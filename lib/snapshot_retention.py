@@ -0,0 +1,365 @@
+"""
+Snapshot Retention Module - Cluster-wide pruning of time-shift snapshots
+Selects the snapshots to keep with keep-last, keep-daily and pre-shift
+rules, then deletes the rest in parallel, throttled per storage backend
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from lib.bulk_operations import BulkOperation
+
+logger = logging.getLogger(__name__)
+
+# Only snapshots named by managed_snapshot_name are ever deleted
+MANAGED_PREFIX = 'ts'
+KINDS = ('auto', 'preshift')
+_MANAGED_NAME = re.compile(rf"^{MANAGED_PREFIX}-({'|'.join(KINDS)})-(\d{{8}})-(\d{{6}})$")
+
+# Disk keys of a QEMU config; the value starts with 'storage:volume'
+_DISK_KEY = re.compile(r'^(ide|sata|scsi|virtio|efidisk|tpmstate|unused)\d+$')
+
+
+def managed_snapshot_name(kind: str = 'auto', when: Optional[datetime] = None) -> str:
+    """
+    Name for a snapshot the retention engine may later delete
+
+    Args:
+        kind: 'auto' (periodic) or 'preshift' (taken before a time shift)
+        when: Creation time (default: now)
+
+    Returns:
+        Name like 'ts-preshift-20240101-120000' (UTC; valid as a PVE snapname)
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown snapshot kind '{kind}'")
+    when = (when or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    return f"{MANAGED_PREFIX}-{kind}-{when:%Y%m%d-%H%M%S}"
+
+
+def parse_snapshot_name(name: str) -> Optional[Tuple[str, float]]:
+    """Kind and UTC epoch time of a managed snapshot name, or None for other snapshots"""
+    match = _MANAGED_NAME.match(name)
+    if not match:
+        return None
+    when = datetime.strptime(match.group(2) + match.group(3), '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc)
+    return match.group(1), when.timestamp()
+
+
+def disk_storages(config: Dict[str, Any]) -> List[str]:
+    """Storages holding the disks of a VM config, ignoring CD-ROMs"""
+    storages = set()
+    for key, value in config.items():
+        if not _DISK_KEY.match(key) or not isinstance(value, str):
+            continue
+        volume = value.split(',', 1)[0]
+        if 'media=cdrom' in value or volume == 'none' or ':' not in volume:
+            continue
+        storages.add(volume.split(':', 1)[0])
+    return sorted(storages)
+
+
+@dataclass
+class SnapshotInfo:
+    """One snapshot of one VM"""
+    vm_id: int
+    name: str
+    snaptime: float
+    kind: Optional[str] = None  # None for snapshots not created by time-shift
+    node: Optional[str] = None
+    storages: List[str] = field(default_factory=list)
+    reasons: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_api(cls, vm_id: int, entry: Dict[str, Any], node: Optional[str] = None) -> 'SnapshotInfo':
+        parsed = parse_snapshot_name(entry['name'])
+        snaptime = entry.get('snaptime') or (parsed[1] if parsed else 0)
+        return cls(vm_id=vm_id, name=entry['name'], snaptime=float(snaptime),
+                   kind=parsed[0] if parsed else None, node=node)
+
+    @property
+    def managed(self) -> bool:
+        return self.kind is not None
+
+    def age(self, now: float) -> float:
+        return now - self.snaptime
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'vm_id': self.vm_id, 'name': self.name, 'snaptime': self.snaptime, 'kind': self.kind,
+                'node': self.node, 'storages': self.storages, 'reasons': self.reasons}
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    Which managed snapshots of a VM to keep
+
+    A snapshot survives if any rule keeps it. Unmanaged snapshots are
+    never touched and do not count towards the rules.
+    """
+    keep_last: int = 3  # newest N managed snapshots
+    keep_daily: int = 7  # newest snapshot of each of the last D UTC days
+    preshift_hours: float = 24.0  # pre-shift snapshots younger than T hours
+
+    def select(self, snapshots: Iterable[SnapshotInfo], now: float) -> Tuple[List[SnapshotInfo], List[SnapshotInfo]]:
+        """
+        Split one VM's managed snapshots into kept and deleted
+
+        Kept snapshots carry the rules that kept them in 'reasons'.
+
+        Returns:
+            (keep, delete), both newest first
+        """
+        managed = sorted((s for s in snapshots if s.managed), key=lambda s: s.snaptime, reverse=True)
+        today = datetime.fromtimestamp(now, timezone.utc).date()
+        days_seen: Set[Any] = set()
+
+        for position, snapshot in enumerate(managed):
+            snapshot.reasons = []
+            if position < self.keep_last:
+                snapshot.reasons.append('last')
+            day = datetime.fromtimestamp(snapshot.snaptime, timezone.utc).date()
+            if (today - day).days < self.keep_daily and day not in days_seen:
+                days_seen.add(day)
+                snapshot.reasons.append('daily')
+            if snapshot.kind == 'preshift' and snapshot.age(now) < self.preshift_hours * 3600:
+                snapshot.reasons.append('preshift')
+
+        return [s for s in managed if s.reasons], [s for s in managed if not s.reasons]
+
+
+@dataclass
+class RetentionPlan:
+    """Snapshots to keep and delete across the cluster"""
+    policy: RetentionPolicy
+    created_at: float
+    keep: List[SnapshotInfo] = field(default_factory=list)
+    delete: List[SnapshotInfo] = field(default_factory=list)
+    unmanaged: int = 0
+    errors: Dict[int, str] = field(default_factory=dict)  # VMs whose snapshots could not be listed
+
+    def by_vm(self) -> Dict[int, List[SnapshotInfo]]:
+        """Deletions per VM, oldest first"""
+        grouped = defaultdict(list)
+        for snapshot in sorted(self.delete, key=lambda s: (s.vm_id, s.snaptime)):
+            grouped[snapshot.vm_id].append(snapshot)
+        return dict(grouped)
+
+    def by_storage(self) -> Dict[str, int]:
+        """Number of deletions touching each storage"""
+        counts = Counter(storage for snapshot in self.delete for storage in snapshot.storages)
+        return dict(sorted(counts.items()))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'keep': len(self.keep),
+            'delete': len(self.delete),
+            'unmanaged': self.unmanaged,
+            'vms': len(self.by_vm()),
+            'storages': self.by_storage(),
+            'errors': self.errors,
+        }
+
+    def format_table(self) -> str:
+        """Human-readable plan, one snapshot per line, for dry runs"""
+        lines = [f"{'VMID':>6}  {'SNAPSHOT':<28} {'AGE':>8}  {'ACTION':<6}  DETAIL"]
+        rows = [(s, 'keep', ','.join(s.reasons)) for s in self.keep]
+        rows += [(s, 'delete', ','.join(s.storages)) for s in self.delete]
+        for snapshot, action, detail in sorted(rows, key=lambda row: (row[0].vm_id, -row[0].snaptime)):
+            lines.append(f"{snapshot.vm_id:>6}  {snapshot.name:<28} "
+                         f"{_format_age(snapshot.age(self.created_at)):>8}  {action:<6}  {detail}")
+        summary = self.summary()
+        lines.append(f"{summary['delete']} to delete, {summary['keep']} kept, "
+                     f"{summary['unmanaged']} unmanaged skipped")
+        for vm_id, error in sorted(self.errors.items()):
+            lines.append(f"VM {vm_id}: {error}")
+        return '\n'.join(lines)
+
+
+def _format_age(seconds: float) -> str:
+    if seconds >= 86400:
+        return f"{seconds / 86400:.1f}d"
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f}h"
+    return f"{max(seconds, 0) / 60:.0f}m"
+
+
+@dataclass
+class PruneResult:
+    """Outcome of applying a retention plan"""
+    plan: RetentionPlan
+    dry_run: bool = False
+    deleted: List[SnapshotInfo] = field(default_factory=list)
+    failed: List[Tuple[SnapshotInfo, str]] = field(default_factory=list)
+    peak_per_storage: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'dry_run': self.dry_run,
+            'planned': len(self.plan.delete),
+            'deleted': len(self.deleted),
+            'failed': [{'vm_id': s.vm_id, 'name': s.name, 'message': message} for s, message in self.failed],
+            'peak_per_storage': self.peak_per_storage,
+            'elapsed_s': round(self.elapsed, 3),
+        }
+
+
+class SnapshotManager:
+    """Create, plan and prune managed snapshots across a cluster"""
+
+    def __init__(self, api, policy: Optional[RetentionPolicy] = None, concurrency: int = 8,
+                 per_storage: int = 2, task_timeout: float = 600.0):
+        """
+        Args:
+            api: ProxmoxAPIAsync client
+            policy: Retention rules (default: RetentionPolicy())
+            concurrency: Most VMs deleting snapshots at once
+            per_storage: Most delete tasks running at once on one storage
+            task_timeout: Seconds to wait for each delete task
+        """
+        self.api = api
+        self.policy = policy or RetentionPolicy()
+        self.concurrency = concurrency
+        self.per_storage = per_storage
+        self.task_timeout = task_timeout
+
+    async def _vm_ids(self, vm_ids: Optional[Iterable[int]]) -> List[int]:
+        if vm_ids is not None:
+            return list(dict.fromkeys(vm_ids))
+        if not await self.api.refresh_index():
+            raise RuntimeError("Cannot list cluster resources")
+        return [int(r['vmid']) for r in self.api.cluster_index.query(guest_type='qemu')]
+
+    async def create(self, vm_ids: Iterable[int], kind: str = 'auto', wait: bool = True,
+                     timeout: Optional[float] = None):
+        """
+        Snapshot many VMs under one managed name
+
+        Returns:
+            BulkResult with a TaskHandle per VM
+        """
+        name = managed_snapshot_name(kind)
+        return await self.api.bulk_snapshot(vm_ids, name, description=f"time-shift {kind} snapshot",
+                                            wait=wait, timeout=timeout or self.task_timeout)
+
+    async def plan(self, vm_ids: Optional[Iterable[int]] = None, now: Optional[float] = None) -> RetentionPlan:
+        """
+        Compute the delete set for every VM
+
+        Args:
+            vm_ids: VMs to consider (default: every QEMU guest in the cluster)
+            now: Reference time in epoch seconds (default: now)
+
+        Returns:
+            RetentionPlan; nothing is deleted
+        """
+        now = time.time() if now is None else now
+        plan = RetentionPlan(policy=self.policy, created_at=now)
+        listed = await self.api.bulk_list_snapshots(await self._vm_ids(vm_ids))
+        plan.errors = {vm_id: error.message for vm_id, error in listed.errors.items()}
+
+        for vm_id, entries in listed.results.items():
+            node = await self.api.node_for(vm_id)
+            snapshots = [SnapshotInfo.from_api(vm_id, entry, node) for entry in entries]
+            keep, delete = self.policy.select(snapshots, now)
+            plan.keep += keep
+            plan.delete += delete
+            plan.unmanaged += sum(1 for s in snapshots if not s.managed)
+
+        # Only VMs with deletions need their disks looked up
+        doomed = sorted({s.vm_id for s in plan.delete})
+        configs = await self.api.bulk_config(doomed) if doomed else None
+        if configs:
+            for vm_id, error in configs.errors.items():
+                plan.errors[vm_id] = f"config: {error.message}"
+            for snapshot in plan.delete:
+                snapshot.storages = disk_storages(configs.results.get(snapshot.vm_id) or {})
+
+        logger.info(f"Retention plan: {len(plan.delete)} to delete, {len(plan.keep)} kept")
+        return plan
+
+    async def apply(self, plan: RetentionPlan, dry_run: bool = False) -> PruneResult:
+        """
+        Delete the planned snapshots
+
+        VMs are pruned in parallel. Within one VM deletions run oldest
+        first and one at a time, as Proxmox locks the VM for each. Every
+        delete task holds a slot on each storage its VM's disks live on
+        until its UPID finishes.
+
+        Args:
+            plan: Plan from plan()
+            dry_run: Only log the plan (see RetentionPlan.format_table)
+
+        Returns:
+            PruneResult
+        """
+        result = PruneResult(plan=plan, dry_run=dry_run)
+        if dry_run:
+            logger.info(f"Dry run, nothing deleted:\n{plan.format_table()}")
+            return result
+        if not plan.delete:
+            return result
+
+        started = time.monotonic()
+        groups = plan.by_vm()
+        limits: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self.per_storage))
+        running: Counter = Counter()
+
+        async def delete(snapshot: SnapshotInfo):
+            async with AsyncExitStack() as stack:
+                # A fixed acquisition order keeps multi-storage VMs from deadlocking
+                for storage in snapshot.storages:
+                    await stack.enter_async_context(limits[storage])
+                for storage in snapshot.storages:
+                    running[storage] += 1
+                    result.peak_per_storage[storage] = max(result.peak_per_storage.get(storage, 0),
+                                                           running[storage])
+                try:
+                    task = await self.api.delete_vm_snapshot(snapshot.vm_id, snapshot.name)
+                    if task is None:
+                        raise RuntimeError("delete request failed")
+                    await self.api.wait_task(task, self.task_timeout)
+                    if not task.ok:
+                        raise RuntimeError(f"task failed: {task.exitstatus}")
+                finally:
+                    for storage in snapshot.storages:
+                        running[storage] -= 1
+
+        async def prune_vm(vm_id: int, node: Optional[str]) -> int:
+            deleted = 0
+            for snapshot in groups[vm_id]:
+                try:
+                    await delete(snapshot)
+                except (RuntimeError, asyncio.TimeoutError) as e:
+                    message = str(e) or f"still running after {self.task_timeout}s"
+                    logger.warning(f"Deleting snapshot '{snapshot.name}' of VM {vm_id} failed: {message}")
+                    result.failed.append((snapshot, message))
+                    continue
+                result.deleted.append(snapshot)
+                deleted += 1
+            return deleted
+
+        # Storage slots are the real limit, so no per-node cap on top
+        await BulkOperation('prune', groups, prune_vm, self.api.node_for,
+                            concurrency=self.concurrency, per_node=None)
+        result.elapsed = time.monotonic() - started
+        logger.info(f"Pruned {len(result.deleted)} snapshots, {len(result.failed)} failed")
+        return result
+
+    async def prune(self, vm_ids: Optional[Iterable[int]] = None, dry_run: bool = False,
+                    now: Optional[float] = None) -> PruneResult:
+        """Plan and apply in one call; with dry_run the plan is only computed"""
+        return await self.apply(await self.plan(vm_ids, now), dry_run)
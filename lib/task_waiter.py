@@ -0,0 +1,337 @@
+"""
+Task Waiter Module - Proxmox UPID task handles and completion waiting
+Polls task status with backoff, batching many pending tasks through a
+single /cluster/tasks call, and streams completions as they happen
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def parse_upid(upid: str) -> Dict[str, Any]:
+    """
+    Split a Proxmox UPID into its fields
+
+    UPIDs look like 'UPID:pve1:0001A2B3:00C4D5E6:65A1B2C3:qmstart:100:root@pam:'
+    with node, pid, pstart and start time (hex), task type, task id and user.
+
+    Args:
+        upid: Unique task ID
+
+    Returns:
+        Dict with 'node', 'pid', 'pstart', 'starttime', 'type', 'id' and 'user'
+
+    Raises:
+        ValueError: If the string is not a UPID
+    """
+    parts = upid.split(':')
+    if len(parts) < 8 or parts[0] != 'UPID':
+        raise ValueError(f"Not a Proxmox UPID: {upid!r}")
+    try:
+        return {
+            'node': parts[1],
+            'pid': int(parts[2], 16),
+            'pstart': int(parts[3], 16),
+            'starttime': int(parts[4], 16),
+            'type': parts[5],
+            'id': parts[6],
+            'user': parts[7],
+        }
+    except ValueError:
+        raise ValueError(f"Not a Proxmox UPID: {upid!r}")
+
+
+@dataclass
+class TaskHandle:
+    """A Proxmox task started by a client call, updated as it is polled"""
+    upid: str
+    node: str
+    task_type: str = ''
+    vm_id: Optional[int] = None
+    status: str = 'running'
+    exitstatus: Optional[str] = None
+    starttime: Optional[int] = None
+    endtime: Optional[int] = None
+    submitted: float = field(default_factory=time.monotonic)
+    completed: Optional[float] = None
+
+    @classmethod
+    def from_upid(cls, upid: str, vm_id: Optional[int] = None) -> 'TaskHandle':
+        """Build a handle from the UPID a POST returned"""
+        fields = parse_upid(upid)
+        if vm_id is None and fields['id'].isdigit():
+            vm_id = int(fields['id'])
+        return cls(upid=upid, node=fields['node'], task_type=fields['type'], vm_id=vm_id,
+                   starttime=fields['starttime'])
+
+    @property
+    def done(self) -> bool:
+        return self.status == 'stopped'
+
+    @property
+    def ok(self) -> bool:
+        """Finished without error ('OK', or 'WARNINGS: n' which Proxmox treats as success)"""
+        return self.done and (self.exitstatus == 'OK' or str(self.exitstatus).startswith('WARNINGS'))
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Seconds from submission to observed completion"""
+        return self.completed - self.submitted if self.completed is not None else None
+
+    def update(self, status: Dict[str, Any]) -> bool:
+        """
+        Apply a task status or /cluster/tasks entry
+
+        Returns:
+            True if this update finished the task
+        """
+        finished = status.get('status') not in (None, 'running') or status.get('endtime') is not None
+        if not finished or self.done:
+            return False
+        self.status = 'stopped'
+        # Task status reports the result in 'exitstatus'; /cluster/tasks in 'status'
+        self.exitstatus = status.get('exitstatus') or status.get('status')
+        self.endtime = status.get('endtime')
+        self.completed = time.monotonic()
+        return True
+
+
+class TaskWaiter:
+    """Shared poller that waits on any number of tasks with few API calls"""
+
+    def __init__(self, api, poll_interval: float = 0.5, max_poll_interval: float = 5.0,
+                 backoff: float = 1.5, batch_threshold: int = 4, concurrency: int = 16,
+                 on_complete: Optional[Callable[[TaskHandle], None]] = None):
+        """
+        Initialize the waiter
+
+        Args:
+            api: ProxmoxAPIAsync-compatible client (get_task_status, list_cluster_tasks)
+            poll_interval: First delay between polling rounds
+            max_poll_interval: Longest delay between rounds
+            backoff: Factor the delay grows by after a round with no completions
+            batch_threshold: Pending tasks from which /cluster/tasks is used
+            concurrency: Most per-task status calls in flight
+            on_complete: Called with each handle as its task finishes
+        """
+        self.api = api
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.batch_threshold = batch_threshold
+        self.concurrency = concurrency
+        self.on_complete = on_complete
+
+        self._handles: Dict[str, TaskHandle] = {}
+        self._futures: Dict[str, List[asyncio.Future]] = {}
+        self._misses: Dict[str, int] = {}
+        self._intervals: Dict[str, Tuple[float, float]] = {}
+        self._listing_failures = 0
+        self._poller: Optional[asyncio.Task] = None
+        self._new_tasks = False
+        self.stats = {'rounds': 0, 'batch_calls': 0, 'status_calls': 0}
+
+    @property
+    def pending(self) -> int:
+        return len(self._futures)
+
+    def _watch(self, handle: TaskHandle) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        if handle.done:
+            future.set_result(handle)
+            return future
+
+        if handle.upid not in self._futures:
+            self._handles[handle.upid] = handle
+            self._futures[handle.upid] = []
+            self._misses[handle.upid] = 0
+        self._futures[handle.upid].append(future)
+
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll_loop())
+        else:
+            # New tasks reset the backoff
+            self._new_tasks = True
+        return future
+
+    def _unwatch(self, handle: TaskHandle, future: asyncio.Future):
+        futures = self._futures.get(handle.upid)
+        if futures and future in futures:
+            futures.remove(future)
+            if not futures:
+                self._forget(handle.upid)
+
+    def _forget(self, upid: str):
+        self._futures.pop(upid, None)
+        self._handles.pop(upid, None)
+        self._misses.pop(upid, None)
+        self._intervals.pop(upid, None)
+
+    def _complete(self, upid: str, status: Dict[str, Any]) -> bool:
+        handle = self._handles.get(upid)
+        if handle is None or not handle.update(status):
+            return False
+        for future in self._futures.get(upid, []):
+            if not future.done():
+                future.set_result(handle)
+        self._forget(upid)
+        logger.debug(f"Task {upid} finished: {handle.exitstatus}")
+        if self.on_complete:
+            self.on_complete(handle)
+        return True
+
+    async def wait(self, handle: TaskHandle, timeout: Optional[float] = None,
+                   poll_interval: Optional[float] = None,
+                   max_poll_interval: Optional[float] = None) -> TaskHandle:
+        """
+        Wait for one task to finish
+
+        Args:
+            handle: Task to wait for
+            timeout: Seconds to wait (default: forever)
+            poll_interval: First delay between rounds for this task (default: the waiter's)
+            max_poll_interval: Longest delay between rounds for this task (default: the waiter's)
+
+        Returns:
+            The handle, with status and exitstatus filled in
+
+        Raises:
+            asyncio.TimeoutError: If the task is still running at the timeout
+        """
+        future = self._watch(handle)
+        if (poll_interval is not None or max_poll_interval is not None) and not future.done():
+            self._intervals[handle.upid] = (
+                self.poll_interval if poll_interval is None else poll_interval,
+                self.max_poll_interval if max_poll_interval is None else max_poll_interval)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        finally:
+            self._unwatch(handle, future)
+
+    async def as_completed(self, handles: Iterable[TaskHandle],
+                           timeout: Optional[float] = None) -> AsyncIterator[TaskHandle]:
+        """
+        Yield tasks in the order they finish
+
+        Args:
+            handles: Tasks to wait for
+            timeout: Seconds to wait for all of them (default: forever)
+
+        Raises:
+            asyncio.TimeoutError: If tasks are still running at the timeout
+        """
+        watched = [(handle, self._watch(handle)) for handle in handles]
+        try:
+            for next_done in asyncio.as_completed([f for _, f in watched], timeout=timeout):
+                yield await next_done
+        finally:
+            for handle, future in watched:
+                self._unwatch(handle, future)
+
+    async def wait_all(self, handles: Iterable[TaskHandle],
+                       timeout: Optional[float] = None) -> List[TaskHandle]:
+        """
+        Wait for every task to finish
+
+        Returns:
+            The handles, in the order given
+        """
+        handles = list(handles)
+        async for _ in self.as_completed(handles, timeout=timeout):
+            pass
+        return handles
+
+    def _current_intervals(self) -> Tuple[float, float]:
+        """Poll as often as the most impatient pending task asks to"""
+        default = (self.poll_interval, self.max_poll_interval)
+        intervals = [self._intervals.get(upid, default) for upid in self._futures] or [default]
+        return min(i[0] for i in intervals), min(i[1] for i in intervals)
+
+    async def _poll_loop(self):
+        interval = self._current_intervals()[0]
+        while self._futures:
+            try:
+                finished = await self._poll_once()
+            except Exception as e:
+                logger.warning(f"Task polling round failed: {e}")
+                finished = 0
+
+            if not self._futures:
+                break
+            first, longest = self._current_intervals()
+            if finished or self._new_tasks:
+                interval = first
+            else:
+                interval = min(longest, interval * self.backoff)
+            self._new_tasks = False
+            await asyncio.sleep(interval)
+
+    async def _poll_once(self) -> int:
+        """One polling round; returns the number of tasks that finished"""
+        self.stats['rounds'] += 1
+        pending = list(self._futures)
+        finished = 0
+        individual = pending
+
+        if len(pending) >= self.batch_threshold:
+            self.stats['batch_calls'] += 1
+            listing = await self.api.list_cluster_tasks()
+            if listing is None:
+                # Retry the batch call once before falling back to one call per task
+                self._listing_failures += 1
+                if self._listing_failures < 2:
+                    individual = []
+            else:
+                self._listing_failures = 0
+                by_upid = {task.get('upid'): task for task in listing}
+                individual = []
+                for upid in pending:
+                    if upid not in self._futures:
+                        # Its waiters timed out or were cancelled during the listing
+                        continue
+                    task = by_upid.get(upid)
+                    if task is not None:
+                        self._misses[upid] = 0
+                        finished += self._complete(upid, task)
+                    else:
+                        # The cluster task list lags and only keeps recent tasks;
+                        # ask the node directly for tasks it has missed twice
+                        self._misses[upid] += 1
+                        if self._misses[upid] >= 2:
+                            individual.append(upid)
+
+        if individual:
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def poll(upid: str):
+                handle = self._handles.get(upid)
+                if handle is None:
+                    return False
+                async with semaphore:
+                    self.stats['status_calls'] += 1
+                    status = await self.api.get_task_status(handle)
+                return status is not None and self._complete(upid, status)
+
+            finished += sum(await asyncio.gather(*(poll(upid) for upid in individual)))
+        return finished
+
+    async def close(self):
+        """Stop polling; waiters still pending are cancelled"""
+        if self._poller and not self._poller.done():
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+        for futures in self._futures.values():
+            for future in futures:
+                future.cancel()
+        self._futures.clear()
+        self._handles.clear()
+        self._misses.clear()
+        self._intervals.clear()
@@ -0,0 +1,144 @@
+"""
+Ticket Cache Module - Persisted Proxmox authentication tickets
+Shares tickets between CLI invocations through SecureTokenStorage, with file
+locking so parallel processes log in only once
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Proxmox tickets are valid for two hours from the timestamp embedded in them
+TICKET_LIFETIME = 7200
+
+DEFAULT_LOCK_DIR = Path.home() / ".time-shift" / "locks"
+
+
+def ticket_expiry(ticket: str, issued: Optional[float] = None) -> float:
+    """
+    Expiry time of a Proxmox ticket
+
+    Tickets look like 'PVE:root@pam:65A1B2C3::<signature>', where the third
+    field is the issue time as hex epoch seconds.
+
+    Args:
+        ticket: PVEAuthCookie value
+        issued: Fallback issue time when the ticket cannot be parsed (default: now)
+
+    Returns:
+        Epoch seconds at which the ticket expires
+    """
+    parts = ticket.split(':')
+    if len(parts) >= 3:
+        try:
+            return int(parts[2], 16) + TICKET_LIFETIME
+        except ValueError:
+            pass
+    return (issued if issued is not None else time.time()) + TICKET_LIFETIME
+
+
+class TicketCache:
+    """Encrypted, lock-protected store of Proxmox tickets keyed by endpoint and user"""
+
+    def __init__(self, storage=None, lock_dir: Optional[str] = None, refresh_margin: float = 300,
+                 lock_timeout: float = 30):
+        """
+        Initialize the cache
+
+        Args:
+            storage: SecureTokenStorage-compatible object (default: SecureTokenStorage())
+            lock_dir: Directory for per-endpoint lock files
+            refresh_margin: Seconds before expiry a cached ticket stops being reused
+            lock_timeout: Longest wait for another process's login
+        """
+        if storage is None:
+            try:
+                from lib.secure_token_storage import SecureTokenStorage
+            except ImportError:  # imported from bin/ with lib/ on sys.path
+                from secure_token_storage import SecureTokenStorage
+            storage = SecureTokenStorage()
+        self.storage = storage
+        self.lock_dir = Path(lock_dir) if lock_dir else DEFAULT_LOCK_DIR
+        self.refresh_margin = refresh_margin
+        self.lock_timeout = lock_timeout
+
+    @staticmethod
+    def key(host: str, port: int, username: str) -> str:
+        """Storage name for an endpoint/user pair (safe for use as a file name)"""
+        digest = hashlib.sha256(f"{username}@{host}:{port}".encode()).hexdigest()[:24]
+        return f"proxmox-ticket-{digest}"
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a cached ticket that is not about to expire
+
+        Args:
+            key: Name from TicketCache.key
+
+        Returns:
+            Dict with 'ticket', 'csrf_token' and 'expires', or None
+        """
+        raw = self.storage.retrieve_token(key)
+        if not raw:
+            return None
+        try:
+            entry = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+
+        if entry.get('expires', 0) - self.refresh_margin <= time.time():
+            return None
+        return entry
+
+    def store(self, key: str, ticket: str, csrf_token: Optional[str], expires: float) -> bool:
+        """Persist a ticket with its expiry"""
+        entry = {'ticket': ticket, 'csrf_token': csrf_token, 'expires': expires}
+        return self.storage.store_token(key, json.dumps(entry), {'type': 'proxmox_ticket'})
+
+    def invalidate(self, key: str):
+        """Forget a ticket the server no longer accepts"""
+        self.storage.delete_token(key)
+
+    def acquire(self, key: str) -> Optional[int]:
+        """
+        Take the exclusive login lock for a key
+
+        Returns:
+            Open file descriptor to pass to release(), or None on timeout
+        """
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.lock_dir / f"{key}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    logger.warning(f"Timed out waiting for ticket lock {key}")
+                    return None
+                time.sleep(0.05)
+
+    def release(self, fd: Optional[int]):
+        """Release a lock taken with acquire()"""
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    @contextmanager
+    def lock(self, key: str):
+        """Context manager around acquire()/release(); proceeds unlocked on timeout"""
+        fd = self.acquire(key)
+        try:
+            yield fd is not None
+        finally:
+            self.release(fd)
@@ -0,0 +1,533 @@
+"""
+Time-Shift Proxy Module - Asyncio HTTPS reverse proxy for expired BMC certificates
+Validates each backend certificate as of a configured target date instead of
+shifting anyone's system clock
+"""
+
+import asyncio
+import hashlib
+import logging
+import ssl
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp import web
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+logger = logging.getLogger(__name__)
+
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'trailers', 'transfer-encoding', 'upgrade', 'host',
+}
+
+METRICS_PATH = '/_proxy/metrics'
+
+
+class CertificateValidationError(Exception):
+    """Raised when a backend certificate is not valid at its target date"""
+    pass
+
+
+def parse_target_date(value: str) -> datetime:
+    """
+    Parse a backend target date
+
+    Args:
+        value: 'YYYY-MM-DD' (interpreted as noon UTC) or an ISO 8601 timestamp
+
+    Returns:
+        Timezone-aware datetime
+    """
+    if len(value) == 10:
+        return datetime.strptime(value, '%Y-%m-%d').replace(hour=12, tzinfo=timezone.utc)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _validity(cert: x509.Certificate) -> Tuple[datetime, datetime]:
+    """Return a certificate's validity window as aware UTC datetimes"""
+    if hasattr(cert, 'not_valid_after_utc'):
+        return cert.not_valid_before_utc, cert.not_valid_after_utc
+    return (cert.not_valid_before.replace(tzinfo=timezone.utc),
+            cert.not_valid_after.replace(tzinfo=timezone.utc))
+
+
+def verify_certificate_at(der: bytes, when: datetime, fingerprint: Optional[str] = None,
+                          ca_certs: Optional[List[x509.Certificate]] = None) -> x509.Certificate:
+    """
+    Validate a DER certificate as if the current time were `when`
+
+    Args:
+        der: Peer certificate in DER form
+        when: Point in time the certificate must be valid at
+        fingerprint: Optional pinned SHA-256 fingerprint (hex, colons allowed)
+        ca_certs: Optional trusted issuers; the certificate must be signed by
+            one of them (a self-signed BMC certificate may trust itself)
+
+    Returns:
+        The parsed certificate
+
+    Raises:
+        CertificateValidationError: If any check fails
+    """
+    cert = x509.load_der_x509_certificate(der)
+    not_before, not_after = _validity(cert)
+
+    if not not_before <= when <= not_after:
+        raise CertificateValidationError(
+            f"certificate valid {not_before:%Y-%m-%d} to {not_after:%Y-%m-%d}, "
+            f"not at target date {when:%Y-%m-%d}"
+        )
+
+    if fingerprint:
+        expected = fingerprint.replace(':', '').lower()
+        actual = hashlib.sha256(der).hexdigest()
+        if actual != expected:
+            raise CertificateValidationError(f"certificate fingerprint {actual} does not match pin")
+
+    if ca_certs:
+        for ca in ca_certs:
+            ca_before, ca_after = _validity(ca)
+            if not ca_before <= when <= ca_after:
+                continue
+            try:
+                cert.verify_directly_issued_by(ca)
+                break
+            except (ValueError, TypeError, InvalidSignature):
+                continue
+        else:
+            raise CertificateValidationError("certificate is not issued by a trusted CA at target date")
+
+    return cert
+
+
+def ensure_listen_certificate(certs_dir: str, common_name: str = 'time-shift-proxy') -> Tuple[str, str]:
+    """
+    Create a self-signed listener certificate if none exists yet
+
+    Args:
+        certs_dir: Directory holding proxy.crt / proxy.key
+        common_name: Certificate subject CN
+
+    Returns:
+        Tuple of (certfile, keyfile) paths
+    """
+    directory = Path(certs_dir)
+    cert_file = directory / 'proxy.crt'
+    key_file = directory / 'proxy.key'
+    if cert_file.exists() and key_file.exists():
+        return str(cert_file), str(key_file)
+
+    directory.mkdir(parents=True, exist_ok=True)
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=825))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName('localhost'), x509.DNSName(common_name)]),
+                       critical=False)
+        .sign(key, hashes.SHA256())
+    )
+
+    key_file.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    key_file.chmod(0o600)
+    cert_file.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    logger.info(f"Generated self-signed proxy certificate in {directory}")
+    return str(cert_file), str(key_file)
+
+
+@dataclass
+class BackendConfig:
+    """Configuration for one proxied BMC"""
+    name: str
+    url: str
+    target_date: str
+    server_names: List[str] = field(default_factory=list)
+    fingerprint: Optional[str] = None
+    ca_file: Optional[str] = None
+    pool_size: int = 8
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'BackendConfig':
+        return cls(
+            name=data['name'],
+            url=data['url'].rstrip('/'),
+            target_date=data['target_date'],
+            server_names=[n.lower() for n in data.get('server_names', [])],
+            fingerprint=data.get('fingerprint'),
+            ca_file=data.get('ca_file'),
+            pool_size=data.get('pool_size', 8),
+        )
+
+
+class ProxyMetrics:
+    """Request and latency counters exposed by the proxy"""
+
+    def __init__(self, window: int = 10000):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.status_classes: Dict[str, int] = {}
+        self.backends: Dict[str, Dict[str, Any]] = {}
+        self.latencies: deque = deque(maxlen=window)
+        self.window = window
+
+    def record(self, backend: Optional[str], status: int, latency: float):
+        """Record one completed request"""
+        self.requests += 1
+        status_class = f"{status // 100}xx"
+        self.status_classes[status_class] = self.status_classes.get(status_class, 0) + 1
+        if status >= 500:
+            self.errors += 1
+        self.latencies.append(latency)
+
+        if backend:
+            stats = self.backends.setdefault(backend, {
+                'requests': 0, 'errors': 0, 'latencies': deque(maxlen=self.window)
+            })
+            stats['requests'] += 1
+            if status >= 500:
+                stats['errors'] += 1
+            stats['latencies'].append(latency)
+
+    @staticmethod
+    def _percentiles(samples) -> Dict[str, float]:
+        ordered = sorted(samples)
+        if not ordered:
+            return {'p50_ms': 0.0, 'p99_ms': 0.0}
+        pick = lambda pct: ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))]
+        return {'p50_ms': round(pick(50) * 1000, 2), 'p99_ms': round(pick(99) * 1000, 2)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return metrics as a JSON-serializable dict"""
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'requests': self.requests,
+            'errors': self.errors,
+            'in_flight': self.in_flight,
+            'status_classes': dict(self.status_classes),
+            'latency': self._percentiles(self.latencies),
+            'backends': {
+                name: {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'latency': self._percentiles(stats['latencies']),
+                }
+                for name, stats in self.backends.items()
+            },
+        }
+
+
+class Backend:
+    """Upstream BMC with a keep-alive pool pinned to its validated certificate"""
+
+    def __init__(self, config: BackendConfig, timeout: float = 30):
+        self.config = config
+        self.target = parse_target_date(config.target_date)
+        parts = urlsplit(config.url)
+        self.host = parts.hostname
+        self.port = parts.port or 443
+        self.origin = f"{parts.scheme}://{parts.netloc}"
+        self.timeout = timeout
+
+        self.ca_certs = None
+        if config.ca_file:
+            self.ca_certs = x509.load_pem_x509_certificates(Path(config.ca_file).read_bytes())
+
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.pinned: Optional[aiohttp.Fingerprint] = None
+        self.certificate: Optional[x509.Certificate] = None
+        self.validated_at: Optional[float] = None
+        self._validate_lock = asyncio.Lock()
+
+    async def start(self):
+        """Create the upstream connection pool"""
+        if not self.session:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.pool_size,
+                limit_per_host=self.config.pool_size,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                auto_decompress=False,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+
+    async def close(self):
+        """Close the upstream connection pool"""
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def _fetch_certificate(self) -> bytes:
+        """Fetch the backend certificate without trusting the system clock"""
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context, server_hostname=self.host),
+            timeout=self.timeout,
+        )
+        try:
+            return writer.get_extra_info('ssl_object').getpeercert(binary_form=True)
+        finally:
+            writer.close()
+
+    async def ensure_validated(self, force: bool = False):
+        """
+        Validate the backend certificate at the target date and pin it
+
+        Every pooled connection is checked against the pinned fingerprint
+        before any request bytes are sent.
+
+        Raises:
+            CertificateValidationError: If the certificate is not acceptable
+        """
+        async with self._validate_lock:
+            if self.pinned is not None and not force:
+                return
+
+            der = await self._fetch_certificate()
+            self.certificate = verify_certificate_at(
+                der, self.target, self.config.fingerprint, self.ca_certs
+            )
+            if not self.config.fingerprint and not self.ca_certs:
+                logger.warning(f"Backend {self.config.name} has no fingerprint or CA configured; "
+                               f"only its validity window is checked")
+
+            self.pinned = aiohttp.Fingerprint(hashlib.sha256(der).digest())
+            self.validated_at = time.time()
+            logger.info(f"Validated {self.config.name} certificate as of {self.target:%Y-%m-%d}")
+
+    async def request(self, method: str, path_qs: str, headers: Dict[str, str],
+                      body: Optional[bytes]) -> aiohttp.ClientResponse:
+        """Send a request upstream, re-validating once if the certificate changed"""
+        await self.start()
+        await self.ensure_validated()
+
+        for attempt in range(2):
+            try:
+                return await self.session.request(
+                    method,
+                    f"{self.config.url}{path_qs}",
+                    headers=headers,
+                    data=body,
+                    ssl=self.pinned,
+                    allow_redirects=False,
+                )
+            except aiohttp.ServerFingerprintMismatch:
+                if attempt:
+                    raise
+                logger.warning(f"Certificate of {self.config.name} changed; re-validating")
+                await self.ensure_validated(force=True)
+
+    def status(self) -> Dict[str, Any]:
+        """Validation state for the metrics endpoint"""
+        status = {
+            'url': self.config.url,
+            'target_date': self.target.isoformat(),
+            'validated': self.pinned is not None,
+        }
+        if self.certificate is not None:
+            not_before, not_after = _validity(self.certificate)
+            status['not_before'] = not_before.isoformat()
+            status['not_after'] = not_after.isoformat()
+        return status
+
+
+class TimeShiftProxy:
+    """HTTPS reverse proxy that routes browsers to BMCs with expired certificates"""
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Initialize the proxy
+
+        Args:
+            config: Proxy configuration with 'backends' (list of backend dicts),
+                optional 'default_backend', 'certfile'/'keyfile' or 'certs_dir',
+                'tls' and 'upstream_timeout'
+        """
+        self.config = config
+        self.tls = config.get('tls', True)
+        self.upstream_timeout = config.get('upstream_timeout', 30)
+        self.backends: Dict[str, Backend] = {}
+        for data in config.get('backends', []):
+            backend_config = BackendConfig.from_dict(data)
+            self.backends[backend_config.name] = Backend(backend_config, self.upstream_timeout)
+
+        self.server_names: Dict[str, Backend] = {}
+        for backend in self.backends.values():
+            for name in backend.config.server_names:
+                self.server_names[name] = backend
+
+        self.default_backend = config.get('default_backend')
+        self.metrics = ProxyMetrics()
+        self.runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/health', self.handle_health)
+        self.app.router.add_get(METRICS_PATH, self.handle_metrics)
+        self.app.router.add_route('*', '/{tail:.*}', self.handle_proxy)
+        self.app.on_cleanup.append(self._close_backends)
+
+    def _ssl_context(self) -> Optional[ssl.SSLContext]:
+        """Build the listener TLS context"""
+        if not self.tls:
+            return None
+
+        certfile = self.config.get('certfile')
+        keyfile = self.config.get('keyfile')
+        if not certfile or not keyfile:
+            certfile, keyfile = ensure_listen_certificate(self.config.get('certs_dir', 'certs'))
+
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile, keyfile)
+        return context
+
+    def route(self, request: web.Request) -> Optional[Backend]:
+        """Pick the backend for a request from its Host header"""
+        host = (request.host or '').rsplit(':', 1)[0].lower()
+        if host in self.server_names:
+            return self.server_names[host]
+        if self.default_backend:
+            return self.backends.get(self.default_backend)
+        if len(self.backends) == 1:
+            return next(iter(self.backends.values()))
+        return None
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """Liveness endpoint used by the container HEALTHCHECK"""
+        return web.json_response({
+            'status': 'healthy',
+            'backends': len(self.backends),
+            'requests': self.metrics.requests,
+            'in_flight': self.metrics.in_flight,
+        })
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """Request/latency counters and backend certificate state"""
+        snapshot = self.metrics.snapshot()
+        for name, backend in self.backends.items():
+            snapshot['backends'].setdefault(name, {})['certificate'] = backend.status()
+        return web.json_response(snapshot)
+
+    def _upstream_headers(self, request: web.Request, backend: Backend) -> Dict[str, str]:
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+        headers['Host'] = urlsplit(backend.config.url).netloc
+        headers['X-Forwarded-For'] = request.remote or ''
+        headers['X-Forwarded-Proto'] = request.scheme
+        headers['X-Forwarded-Host'] = request.host or ''
+        return headers
+
+    def _downstream_headers(self, upstream: aiohttp.ClientResponse, backend: Backend) -> Dict[str, str]:
+        headers = {}
+        for key, value in upstream.headers.items():
+            lower = key.lower()
+            if lower in HOP_BY_HOP_HEADERS or lower == 'content-length':
+                continue
+            if lower == 'location' and value.startswith(backend.origin):
+                value = value[len(backend.origin):] or '/'
+            headers[key] = value
+        return headers
+
+    async def handle_proxy(self, request: web.Request) -> web.StreamResponse:
+        """Forward a browser request to its backend and stream the response back"""
+        started = time.monotonic()
+        backend = self.route(request)
+        if backend is None:
+            self.metrics.record(None, 421, time.monotonic() - started)
+            return web.json_response(
+                {'error': 'no backend for host', 'backends': sorted(self.backends)}, status=421
+            )
+
+        self.metrics.in_flight += 1
+        status = 502
+        try:
+            body = await request.read() if request.can_read_body else None
+            upstream = await backend.request(
+                request.method, request.path_qs, self._upstream_headers(request, backend), body
+            )
+            try:
+                status = upstream.status
+                response = web.StreamResponse(status=upstream.status, reason=upstream.reason,
+                                              headers=self._downstream_headers(upstream, backend))
+                if upstream.content_length is not None:
+                    response.content_length = upstream.content_length
+                await response.prepare(request)
+                async for chunk in upstream.content.iter_chunked(65536):
+                    await response.write(chunk)
+                await response.write_eof()
+                return response
+            finally:
+                upstream.release()
+
+        except CertificateValidationError as e:
+            logger.error(f"Backend {backend.config.name} rejected: {e}")
+            return web.json_response({'error': f"certificate rejected: {e}"}, status=502)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logger.error(f"Upstream {backend.config.name} failed: {e}")
+            status = 504 if isinstance(e, asyncio.TimeoutError) else 502
+            return web.json_response({'error': f"upstream error: {e}"}, status=status)
+        finally:
+            self.metrics.in_flight -= 1
+            self.metrics.record(backend.config.name, status, time.monotonic() - started)
+
+    async def _close_backends(self, app: web.Application):
+        await asyncio.gather(*(backend.close() for backend in self.backends.values()))
+
+    async def start(self, host: str = '0.0.0.0', port: int = 8090):
+        """Start listening"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port, ssl_context=self._ssl_context())
+        await site.start()
+        logger.info(f"Time-shift proxy listening on {host}:{port} with {len(self.backends)} backends")
+
+    async def stop(self):
+        """Stop listening and close upstream pools"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+async def run_proxy(config: Dict[str, Any], host: str = '0.0.0.0', port: int = 8090):
+    """
+    Run the proxy until cancelled
+
+    Args:
+        config: Proxy configuration (see TimeShiftProxy)
+        host: Listen address
+        port: Listen port
+    """
+    proxy = TimeShiftProxy(config)
+    await proxy.start(host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await proxy.stop()
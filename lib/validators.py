@@ -253,6 +253,63 @@ def validate_idrac_credentials(username: str, password: str) -> Tuple[str, str]:
     return username, password
 
 
+def validate_api_token(token: str) -> Tuple[str, str]:
+    """
+    Validate a Proxmox API token and split it into ID and secret
+    
+    Args:
+        token: 'user@realm!tokenid=secret', optionally prefixed with 'PVEAPIToken='
+        
+    Returns:
+        Tuple[str, str]: (token ID, secret)
+        
+    Raises:
+        ValidationError: If the token is malformed
+    """
+    if not token:
+        raise ValidationError("API token cannot be empty")
+    
+    if token.startswith('PVEAPIToken='):
+        token = token[len('PVEAPIToken='):]
+    
+    token_id, _, secret = token.partition('=')
+    if not re.match(r'^[a-zA-Z0-9._-]+@[a-zA-Z0-9._-]+![a-zA-Z][a-zA-Z0-9._-]*$', token_id):
+        raise ValidationError(f"Invalid API token ID: {token_id} (expected user@realm!tokenid)")
+    
+    if not secret:
+        raise ValidationError("API token secret cannot be empty")
+    
+    return token_id, secret
+
+
+def api_token_from_config(config: dict) -> Optional[Tuple[str, str]]:
+    """
+    Read API token credentials from a Proxmox config dict
+    
+    Accepts either 'api_token' ('user@realm!tokenid=secret') or 'token_id'
+    plus 'token_secret'; a bare token name is qualified with 'username'.
+    
+    Args:
+        config: Proxmox configuration
+        
+    Returns:
+        Tuple[str, str]: (token ID, secret), or None when no token is configured
+        
+    Raises:
+        ValidationError: If the token is malformed
+    """
+    if config.get('api_token'):
+        return validate_api_token(config['api_token'])
+    
+    token_id = config.get('token_id')
+    if not token_id:
+        return None
+    
+    if '!' not in token_id:
+        token_id = f"{config.get('username')}!{token_id}"
+    return validate_api_token(f"{token_id}={config.get('token_secret') or ''}")
+
+
 def validate_proxmox_node(node: str) -> str:
     """
     Validate Proxmox node name
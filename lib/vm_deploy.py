@@ -0,0 +1,417 @@
+"""
+VM Deploy Module - Pipelined deployment of VMs from a template
+Allocates VM IDs without collisions, makes linked clones (falling back to
+full clones), applies the configuration, starts each VM and waits for its
+guest agent; every VM moves through the stages on its own, so N VMs
+deploy concurrently, and each stage is timed
+"""
+
+import asyncio
+import logging
+import re
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('allocate', 'clone', 'configure', 'start', 'agent')
+
+# Disks a VM boots from, in the order Proxmox picks them
+_BOOT_DISK = re.compile(r'^(scsi|virtio|sata|ide)(\d+)$')
+_SIZE = re.compile(r'(?:^|,)size=(\d+(?:\.\d+)?)([KMGT]?)(?:,|$)')
+_UNITS_GB = {'K': 1 / 1024 ** 2, 'M': 1 / 1024, 'G': 1, 'T': 1024, '': 1 / 1024 ** 3}
+
+# Proxmox's reasons for refusing a linked clone: the source is not a
+# template, or a disk's storage cannot link. Other clone failures are retried.
+_LINKED_UNSUPPORTED = re.compile(r'linked clone feature (for VM is only possible from a template|is not supported)',
+                                 re.IGNORECASE)
+
+# Attempts per VM for clone failures other than an unsupported linked clone
+CLONE_ATTEMPTS = 3
+
+
+class DeployError(Exception):
+    """A deploy stage failed for one VM"""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
+
+
+def boot_disk(config: Dict[str, Any]) -> Optional[Tuple[str, float]]:
+    """
+    First disk of a VM config and its size
+
+    Returns:
+        (disk key such as 'scsi0', size in GB), or None without a disk
+    """
+    disks = []
+    for key, value in config.items():
+        match = _BOOT_DISK.match(key)
+        if not match or not isinstance(value, str) or 'media=cdrom' in value or value.startswith('none'):
+            continue
+        size = _SIZE.search(value)
+        if size:
+            prefix = ('scsi', 'virtio', 'sata', 'ide').index(match.group(1))
+            disks.append(((prefix, int(match.group(2))), key, float(size.group(1)) * _UNITS_GB[size.group(2)]))
+    if not disks:
+        return None
+    _, key, size = min(disks)
+    return key, size
+
+
+@dataclass
+class VMSpec:
+    """A VM to deploy"""
+    name: str
+    cores: Optional[int] = None
+    memory: Optional[int] = None  # MB
+    disk: Optional[int] = None  # GB; disks only grow
+    tags: List[str] = field(default_factory=list)
+    target: Optional[str] = None  # node (default: the template's)
+    options: Dict[str, Any] = field(default_factory=dict)  # further config keys
+
+    def config(self) -> Dict[str, Any]:
+        """Configuration applied after cloning"""
+        config = dict(self.options)
+        if self.cores:
+            config['cores'] = self.cores
+        if self.memory:
+            config['memory'] = self.memory
+        if self.tags:
+            config['tags'] = ';'.join(self.tags)
+        return config
+
+
+@dataclass
+class DeployResult:
+    """Outcome of deploying one VM"""
+    name: str
+    vm_id: Optional[int] = None
+    node: Optional[str] = None
+    linked: Optional[bool] = None
+    stages: Dict[str, float] = field(default_factory=dict)  # stage -> seconds
+    error: Optional[str] = None
+    failed_stage: Optional[str] = None
+    ready_after: Optional[float] = None  # seconds from submission to a ready VM
+    clone_task: Optional[Any] = field(default=None, repr=False)  # TaskHandle of the last clone sent
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'vm_id': self.vm_id, 'node': self.node, 'linked': self.linked,
+                'stages_s': {stage: round(s, 3) for stage, s in self.stages.items()},
+                'ready_after_s': round(self.ready_after, 3) if self.ready_after is not None else None,
+                'error': self.error, 'failed_stage': self.failed_stage}
+
+
+@dataclass
+class DeployReport:
+    """Results of a deployment run"""
+    results: List[DeployResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(result.ok for result in self.results)
+
+    @property
+    def deployed(self) -> List[DeployResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> List[DeployResult]:
+        return [result for result in self.results if not result.ok]
+
+    def stage_times(self) -> Dict[str, Dict[str, float]]:
+        """Mean and max seconds per stage over the VMs that went through it"""
+        times = {}
+        for stage in STAGES:
+            values = [result.stages[stage] for result in self.results if stage in result.stages]
+            if values:
+                times[stage] = {'mean': round(statistics.fmean(values), 3), 'max': round(max(values), 3)}
+        return times
+
+    def summary(self) -> Dict[str, Any]:
+        ready = [result.ready_after for result in self.deployed]
+        return {
+            'deployed': len(self.deployed), 'failed': len(self.failed),
+            'linked': sum(1 for result in self.deployed if result.linked),
+            'elapsed_s': round(self.elapsed, 3),
+            'time_to_ready_s': {'median': round(statistics.median(ready), 3),
+                                'max': round(max(ready), 3)} if ready else None,
+            'stages_s': self.stage_times(),
+            'vms': [result.to_dict() for result in self.results],
+        }
+
+
+class VMIDAllocator:
+    """
+    Hands out free VM IDs to concurrent deployments
+
+    Proxmox's /cluster/nextid does not reserve the ID it returns, so two
+    clones started together would collide. IDs are reserved here, checked
+    against the cluster index and confirmed with the API.
+    """
+
+    def __init__(self, api, first: int = 100, last: int = 999999999, attempts: int = 20):
+        """
+        Args:
+            api: ProxmoxAPIAsync-compatible client (refresh_index, cluster_index, next_vmid)
+            first: Lowest ID to hand out
+            last: Highest ID to hand out
+            attempts: IDs tried per allocation before giving up
+        """
+        self.api = api
+        self.first = first
+        self.last = last
+        self.attempts = attempts
+        self.reserved: Set[int] = set()
+        self.taken: Set[int] = set()
+        self._lock = asyncio.Lock()
+
+    async def allocate(self) -> int:
+        """
+        Reserve a free VM ID
+
+        Raises:
+            DeployError: If no free ID was found
+        """
+        async with self._lock:
+            await self.api.refresh_index()
+            vmid = self.first
+            for _ in range(self.attempts):
+                while vmid in self.reserved or vmid in self.taken or vmid in self.api.cluster_index:
+                    vmid += 1
+                if vmid > self.last:
+                    break
+                if await self.api.next_vmid(vmid) == vmid:
+                    self.reserved.add(vmid)
+                    return vmid
+                # Created elsewhere since the index was loaded
+                self.taken.add(vmid)
+        raise DeployError('allocate', f"No free VM ID from {self.first}")
+
+    def mark_taken(self, vmid: int):
+        """Another client created a VM with this ID"""
+        self.reserved.discard(vmid)
+        self.taken.add(vmid)
+
+    def release(self, vmid: int):
+        """The ID was not used after all"""
+        self.reserved.discard(vmid)
+
+
+class DeployPipeline:
+    """Deploys VMs from one template, each VM pipelined through STAGES"""
+
+    def __init__(self, api, template: Union[int, str], linked: bool = True, storage: Optional[str] = None,
+                 clone_concurrency: int = 4, start_concurrency: int = 8, start: bool = True,
+                 wait_agent: bool = True, agent_timeout: float = 300.0, task_timeout: float = 600.0,
+                 first_vmid: int = 100, allocator: Optional[VMIDAllocator] = None):
+        """
+        Args:
+            api: ProxmoxAPIAsync-compatible client
+            template: Template VM ID or name
+            linked: Try linked clones first
+            storage: Target storage for full clones (default: the template's)
+            clone_concurrency: Most clones in flight (they load the storage)
+            start_concurrency: Most VMs booting at once
+            start: Start each VM; False leaves it configured and stopped
+            wait_agent: Wait until each started VM's guest agent answers
+            agent_timeout: Seconds to wait for a guest agent after start
+            task_timeout: Seconds to wait for a clone or start task
+            first_vmid: Lowest VM ID to allocate
+            allocator: VM ID allocator shared with other pipelines (default: a new one)
+        """
+        self.api = api
+        self.template = template
+        self.linked = linked
+        self._linked_supported = True
+        self.storage = storage
+        self.start = start
+        self.wait_agent = wait_agent
+        self.agent_timeout = agent_timeout
+        self.task_timeout = task_timeout
+        self.allocator = allocator or VMIDAllocator(api, first=first_vmid)
+        self._clone_limit = asyncio.Semaphore(clone_concurrency)
+        self._start_limit = asyncio.Semaphore(start_concurrency)
+        self._template: Optional[Tuple[int, Optional[Tuple[str, float]]]] = None
+        self._template_lock = asyncio.Lock()
+
+    async def _resolve_template(self) -> Tuple[int, Optional[Tuple[str, float]]]:
+        """Template ID and boot disk, looked up once per pipeline"""
+        async with self._template_lock:
+            if self._template is None:
+                vmid = self.template
+                if not isinstance(vmid, int) and not str(vmid).isdigit():
+                    vmid = await self.api.find_vm(vmid)
+                    if vmid is None:
+                        raise DeployError('clone', f"Template '{self.template}' not found")
+                config = await self.api.get_vm_config(int(vmid))
+                if config is None:
+                    raise DeployError('clone', f"Cannot read template {vmid}")
+                self._template = int(vmid), boot_disk(config)
+            return self._template
+
+    async def _task(self, stage: str, task) -> None:
+        if task is None:
+            raise DeployError(stage, f"{stage} request failed")
+        try:
+            await self.api.wait_task(task, self.task_timeout)
+        except asyncio.TimeoutError:
+            raise DeployError(stage, f"{stage} task still running after {self.task_timeout:g}s")
+        if not task.ok:
+            raise DeployError(stage, f"{stage} task failed: {task.exitstatus}")
+
+    async def _clone(self, spec: VMSpec, result: DeployResult, template: int):
+        """
+        Linked clone if possible, else full, retrying failed clones
+
+        Once Proxmox says the template cannot be linked, this and later
+        VMs get full clones. A VM ID taken meanwhile is replaced.
+        """
+        failures = 0
+        while True:
+            linked = self.linked and self._linked_supported
+            try:
+                task = await self.api.submit_clone(template, result.vm_id, spec.name, full=not linked,
+                                                   target=spec.target, storage=self.storage)
+                result.clone_task = task
+                await self._task('clone', task)
+                result.linked = linked
+                return
+            except (aiohttp.ClientError, DeployError) as e:
+                error = e
+
+            if linked and _LINKED_UNSUPPORTED.search(str(error)):
+                logger.info(f"Template {template} cannot be linked-cloned ({error}); falling back to full clones")
+                self._linked_supported = False
+                continue
+
+            failures += 1
+            if failures >= CLONE_ATTEMPTS:
+                raise DeployError('clone', f"Cannot clone template {template}: {error}")
+            if await self.api.next_vmid(result.vm_id) != result.vm_id:
+                # Another client created a VM with this ID between allocation and clone
+                self.allocator.mark_taken(result.vm_id)
+                result.vm_id = await self.allocator.allocate()
+            else:
+                logger.warning(f"Clone of {template} to {result.vm_id} failed, retrying: {error}")
+                await asyncio.sleep(failures * 0.5)
+
+    async def _configure(self, spec: VMSpec, result: DeployResult, disk: Optional[Tuple[str, float]]):
+        config = spec.config()
+        if config and not await self.api.update_vm_config(result.vm_id, config):
+            raise DeployError('configure', "Config update failed")
+        if spec.disk and disk and spec.disk > disk[1]:
+            if not await self.api.resize_vm_disk(result.vm_id, disk[0], f"{spec.disk}G", self.task_timeout):
+                raise DeployError('configure', f"Resizing {disk[0]} to {spec.disk}G failed")
+
+    async def wait_for_agent(self, vm_id: int):
+        """
+        Poll the guest agent of a started VM, backing off, until it answers
+
+        Raises:
+            DeployError: If it does not answer within agent_timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.agent_timeout
+        delay = 0.25
+        while not await self.api.ping_guest_agent(vm_id):
+            if loop.time() + delay > deadline:
+                raise DeployError('agent', f"Guest agent did not answer within {self.agent_timeout:g}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 5.0)
+
+    async def deploy_one(self, spec: VMSpec, result: Optional[DeployResult] = None) -> DeployResult:
+        """
+        Deploy one VM through every stage
+
+        Args:
+            spec: VM to deploy
+            result: Filled in as the stages run, so a caller that cancels the
+                    deploy still learns the VM ID and clone task (default: a new one)
+
+        Returns:
+            DeployResult; on failure it names the stage, and vm_id is set
+            if the clone was created
+        """
+        result = result if result is not None else DeployResult(spec.name)
+        submitted = time.monotonic()
+        stage = 'allocate'
+        cloned = False
+        try:
+            template, disk = await self._resolve_template()
+
+            started = time.monotonic()
+            result.vm_id = await self.allocator.allocate()
+            result.stages['allocate'] = time.monotonic() - started
+
+            stage = 'clone'
+            async with self._clone_limit:
+                started = time.monotonic()
+                await self._clone(spec, result, template)
+            result.stages['clone'] = time.monotonic() - started
+            cloned = True
+            result.node = await self.api.node_for(result.vm_id)
+
+            stage = 'configure'
+            started = time.monotonic()
+            await self._configure(spec, result, disk)
+            result.stages['configure'] = time.monotonic() - started
+
+            if self.start:
+                stage = 'start'
+                async with self._start_limit:
+                    started = time.monotonic()
+                    await self._task('start', await self.api.start_vm(result.vm_id))
+                result.stages['start'] = time.monotonic() - started
+
+            if self.start and self.wait_agent:
+                stage = 'agent'
+                started = time.monotonic()
+                await self.wait_for_agent(result.vm_id)
+                result.stages['agent'] = time.monotonic() - started
+
+            result.ready_after = time.monotonic() - submitted
+            logger.info(f"VM {spec.name} ({result.vm_id}) ready after {result.ready_after:.1f}s")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result.failed_stage = getattr(e, 'stage', stage)
+            result.error = str(e) or e.__class__.__name__
+            if result.vm_id is not None and not cloned:
+                self.allocator.release(result.vm_id)
+                result.vm_id = None
+            logger.error(f"Deploying {spec.name} failed at {result.failed_stage}: {result.error}")
+        return result
+
+    async def as_completed(self, specs: Iterable[VMSpec]) -> AsyncIterator[DeployResult]:
+        """Deploy VMs concurrently, yielding each result as its VM is ready or fails"""
+        tasks = [asyncio.ensure_future(self.deploy_one(spec)) for spec in specs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def deploy(self, specs: Iterable[VMSpec]) -> DeployReport:
+        """
+        Deploy VMs concurrently
+
+        Returns:
+            DeployReport with results in the order of specs
+        """
+        started = time.monotonic()
+        results = await asyncio.gather(*(self.deploy_one(spec) for spec in specs))
+        return DeployReport(list(results), elapsed=time.monotonic() - started)
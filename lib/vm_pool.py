@@ -0,0 +1,439 @@
+"""
+VM Pool Module - Warm pool of pre-provisioned time-shift VMs
+Keeps cloned and configured VMs stopped or paused on every node, so a
+request is served by starting or resuming one instead of deploying it;
+the pool refills in the background, sizes itself to recent demand,
+destroys VMs that fail and tracks acquire latency and hit rate
+"""
+
+import asyncio
+import logging
+import statistics
+import time
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field, replace
+from typing import Any, Deque, Dict, Iterable, List, Optional, Union
+
+from lib.multi_cluster import TIMESHIFT_TAG
+from lib.vm_deploy import DeployError, DeployPipeline, DeployResult, VMSpec
+
+logger = logging.getLogger(__name__)
+
+# Marks idle pool VMs, so a restarted pool adopts them again
+POOL_TAG = 'ts-pool'
+
+# Replaces POOL_TAG on a failed pool VM that could not be destroyed
+ORPHAN_TAG = 'ts-pool-orphan'
+
+POOL_STATES = ('stopped', 'paused')
+
+
+@dataclass
+class PooledVM:
+    """An idle VM waiting in the pool"""
+    vm_id: int
+    node: str
+    state: str  # 'stopped' or 'paused'
+    since: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class PoolLease:
+    """A VM handed out by WarmPool.acquire"""
+    name: str
+    vm_id: Optional[int]
+    node: Optional[str]
+    hit: bool  # served from the pool rather than deployed on demand
+    latency: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'vm_id': self.vm_id, 'node': self.node, 'hit': self.hit,
+                'latency_s': round(self.latency, 3), 'error': self.error}
+
+
+def _latency_summary(values: Iterable[float]) -> Optional[Dict[str, float]]:
+    values = sorted(values)
+    if not values:
+        return None
+    return {'count': len(values), 'median': round(statistics.median(values), 3),
+            'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+            'max': round(values[-1], 3)}
+
+
+class WarmPool:
+    """
+    Pre-provisioned VMs per node, handed out on request and refilled in the background
+
+    Each node keeps target(node) idle VMs. Until one window of demand has
+    been seen that is size; afterwards it is min_size plus the VMs expected
+    to be requested while a replacement is provisioned (acquire rate x
+    provisioning time x headroom), capped at max_size. A pool above its
+    target is not shrunk; surplus VMs are used up by later requests.
+    """
+
+    def __init__(self, api, template: Union[int, str], spec: Optional[VMSpec] = None,
+                 nodes: Optional[Iterable[str]] = None, size: int = 2, min_size: int = 1, max_size: int = 8,
+                 state: str = 'stopped', window: float = 3600.0, headroom: float = 1.5,
+                 lead_time: float = 120.0, check_interval: float = 30.0, wait_agent: bool = True,
+                 **pipeline_options):
+        """
+        Initialize the pool
+
+        Args:
+            api: ProxmoxAPIAsync-compatible client
+            template: Template VM ID or name the pool VMs are cloned from
+            spec: Configuration of the pool VMs (default: 'ts-pool', tagged time-shift)
+            nodes: Nodes to keep VMs on (default: every online node)
+            size: Idle VMs per node until demand has been observed
+            min_size: Fewest idle VMs kept per node
+            max_size: Most idle VMs kept per node
+            state: 'stopped' (no resources used) or 'paused' (booted, resumes instantly)
+            window: Seconds of acquisitions the demand estimate looks back over
+            headroom: Factor applied to the expected demand during one refill
+            lead_time: Provisioning time assumed until one has been measured
+            check_interval: Seconds between refill checks without requests
+            wait_agent: Wait for the guest agent before handing out a started VM
+            **pipeline_options: Passed to DeployPipeline (linked, storage, agent_timeout, ...)
+        """
+        if state not in POOL_STATES:
+            raise ValueError(f"Pool state must be one of {POOL_STATES}, not '{state}'")
+        if not 0 <= min_size <= size <= max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= size <= max_size")
+
+        self.api = api
+        self.spec = spec or VMSpec('ts-pool', tags=[TIMESHIFT_TAG])
+        self.nodes: Optional[List[str]] = list(nodes) if nodes is not None else None
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.state = state
+        self.window = window
+        self.headroom = headroom
+        self.lead_time = lead_time
+        self.check_interval = check_interval
+        self.wait_agent = wait_agent
+
+        paused = state == 'paused'
+        # Paused VMs are booted to a live agent before they are suspended
+        self.pipeline = DeployPipeline(api, template, start=paused, wait_agent=paused, **pipeline_options)
+        # Misses are deployed on demand, sharing VM IDs with the refills
+        self.on_demand = DeployPipeline(api, template, wait_agent=wait_agent,
+                                        allocator=self.pipeline.allocator, **pipeline_options)
+
+        self.idle: Dict[str, Deque[PooledVM]] = defaultdict(deque)
+        self.provisioning: Counter = Counter()
+        self._demand: Dict[str, Deque[float]] = defaultdict(deque)
+        self._retry_at: Dict[str, float] = {}
+        self._started_at: Optional[float] = None
+        self._refiller: Optional[asyncio.Task] = None
+        self._provisioners: set = set()
+        self._cleanups: set = set()
+        # Failed VMs that could not be destroyed: vm_id -> node, reason, error
+        self.orphans: Dict[int, Dict[str, str]] = {}
+        # Created with the refiller, inside the loop it serves
+        self._wakeup: Optional[asyncio.Event] = None
+        self._latency: Dict[str, Deque[float]] = {'hit': deque(maxlen=1000), 'miss': deque(maxlen=1000)}
+        self.stats = {'acquires': 0, 'hits': 0, 'misses': 0, 'failed': 0, 'provisioned': 0,
+                      'provision_failures': 0, 'discarded': 0, 'destroyed': 0}
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        """Fraction of acquisitions served from the pool"""
+        if not self.stats['acquires']:
+            return None
+        return self.stats['hits'] / self.stats['acquires']
+
+    def available(self, node: Optional[str] = None) -> int:
+        """Idle VMs on a node, or on every node"""
+        if node is not None:
+            return len(self.idle.get(node, ()))
+        return sum(len(vms) for vms in self.idle.values())
+
+    async def start(self):
+        """Adopt idle pool VMs left by an earlier run and start refilling"""
+        await self.load()
+        self._started_at = time.monotonic()
+        if self._refiller is None or self._refiller.done():
+            if self._wakeup is None:
+                self._wakeup = asyncio.Event()
+            self._refiller = asyncio.get_running_loop().create_task(self._refill_loop())
+
+    async def load(self) -> int:
+        """
+        Adopt pool-tagged VMs that are stopped or paused and not locked
+
+        Returns:
+            Number of VMs adopted
+        """
+        if not await self.api.refresh_index(force=True):
+            logger.warning("Cannot list the cluster; pool starts empty")
+            return 0
+        if self.nodes is None:
+            self.nodes = [entry['node'] for entry in self.api.cluster_index.nodes()
+                          if entry.get('status', 'online') == 'online']
+
+        known = {vm.vm_id for vms in self.idle.values() for vm in vms}
+        adopted = 0
+        for entry in self.api.cluster_index.with_tag(POOL_TAG):
+            vmid, node = int(entry['vmid']), entry.get('node')
+            if vmid in known or node not in self.nodes or entry.get('template') or entry.get('lock'):
+                continue
+            if entry.get('status') == 'stopped':
+                state = 'stopped'
+            elif entry.get('status') == 'running':
+                # Paused guests are listed as running; anything else is in use
+                status = await self.api.get_vm_status(vmid)
+                if not status or status.get('qmpstatus') != 'paused':
+                    continue
+                state = 'paused'
+            else:
+                continue
+            self.idle[node].append(PooledVM(vmid, node, state))
+            adopted += 1
+
+        if adopted:
+            logger.info(f"Adopted {adopted} idle pool VMs")
+        return adopted
+
+    def target(self, node: str) -> int:
+        """Idle VMs a node should hold given recent demand"""
+        now = time.monotonic()
+        demand = self._demand[node]
+        while demand and demand[0] < now - self.window:
+            demand.popleft()
+
+        expected = len(demand) / self.window * self.lead_time * self.headroom
+        target = self.min_size + int(expected + 0.5)
+        if self._started_at is None or now - self._started_at < self.window:
+            target = max(target, self.size)
+        return min(self.max_size, target)
+
+    def refill(self) -> int:
+        """
+        Start provisioning on every node below its target
+
+        Returns:
+            Number of VMs being provisioned by this call
+        """
+        now = time.monotonic()
+        launched = 0
+        for node in self.nodes or ():
+            if self._retry_at.get(node, 0.0) > now:
+                continue
+            deficit = self.target(node) - len(self.idle[node]) - self.provisioning[node]
+            for _ in range(max(0, deficit)):
+                self.provisioning[node] += 1
+                task = asyncio.ensure_future(self._provision(node))
+                self._provisioners.add(task)
+                task.add_done_callback(self._provisioners.discard)
+                launched += 1
+        return launched
+
+    async def _provision(self, node: str):
+        started = time.monotonic()
+        spec = replace(self.spec, tags=[tag for tag in self.spec.tags if tag != POOL_TAG] + [POOL_TAG],
+                       target=node)
+        result = DeployResult(spec.name)
+        try:
+            try:
+                await self.pipeline.deploy_one(spec, result)
+            except asyncio.CancelledError:
+                # The pool tag is only set when configuring: a clone abandoned
+                # before then would be found by nothing, so remove it
+                if result.vm_id is not None:
+                    cleanup = asyncio.ensure_future(self._discard_cancelled(result, node))
+                    self._cleanups.add(cleanup)
+                    cleanup.add_done_callback(self._cleanups.discard)
+                raise
+            if result.ok and self.state == 'paused':
+                try:
+                    await self._wait('suspend', await self.api.suspend_vm(result.vm_id))
+                except DeployError as e:
+                    result.error, result.failed_stage = str(e), e.stage
+        finally:
+            self.provisioning[node] -= 1
+
+        if not result.ok:
+            self.stats['provision_failures'] += 1
+            # Do not hammer a failing node; retry on the next regular check
+            self._retry_at[node] = time.monotonic() + self.check_interval
+            logger.warning(f"Provisioning a pool VM on {node} failed at {result.failed_stage}: {result.error}")
+            if result.vm_id is not None:
+                await self._destroy(result.vm_id, node, f"provisioning failed at {result.failed_stage}")
+            return
+
+        elapsed = time.monotonic() - started
+        self.lead_time = 0.7 * self.lead_time + 0.3 * elapsed
+        self.idle[node].append(PooledVM(result.vm_id, node, self.state))
+        self.stats['provisioned'] += 1
+        logger.debug(f"Pool VM {result.vm_id} on {node} ready after {elapsed:.1f}s")
+
+    async def _destroy(self, vm_id: int, node: str, reason: str):
+        """Stop and delete a failed pool VM; retag and record it if that fails too"""
+        try:
+            status = await self.api.get_vm_status(vm_id)
+            if status and status.get('status') == 'running':
+                await self._wait('stop', await self.api.stop_vm(vm_id))
+            await self._wait('destroy', await self.api.destroy_vm(vm_id))
+            self.stats['destroyed'] += 1
+            logger.info(f"Destroyed pool VM {vm_id} on {node}: {reason}")
+        except DeployError as e:
+            self.orphans[vm_id] = {'node': node, 'reason': reason, 'error': f"{e.stage} failed: {e}"}
+            # Keep a restarted pool from adopting it; someone has to look at it
+            await self.api.update_vm_config(vm_id, {'tags': ORPHAN_TAG})
+            logger.error(f"Cannot destroy failed pool VM {vm_id} on {node}, left as {ORPHAN_TAG}: {e}")
+
+    async def _discard_cancelled(self, result: DeployResult, node: str):
+        """Destroy the clone of a provisioning cancelled mid-deploy, once its clone task ends"""
+        task = result.clone_task
+        if task is not None and not task.done:
+            try:
+                await self._wait('clone', task)
+            except DeployError as e:
+                logger.debug(f"Abandoned clone {result.vm_id} did not finish: {e}")
+        if await self.api.get_vm_status(result.vm_id) is None:
+            # Cancelled before the clone request went out, or the clone failed
+            self.pipeline.allocator.release(result.vm_id)
+            return
+        await self._destroy(result.vm_id, node, "provisioning cancelled")
+
+    async def _wait(self, action: str, task) -> None:
+        if task is None:
+            raise DeployError(action, f"{action} request failed")
+        try:
+            await self.api.wait_task(task, self.pipeline.task_timeout)
+        except asyncio.TimeoutError:
+            raise DeployError(action, f"{action} task still running after {self.pipeline.task_timeout:g}s")
+        if not task.ok:
+            raise DeployError(action, f"{action} task failed: {task.exitstatus}")
+
+    def _take(self, node: Optional[str]) -> Optional[PooledVM]:
+        """Oldest idle VM on node, or on the node with the most idle VMs"""
+        candidates = [node] if node else sorted(self.idle, key=lambda n: len(self.idle[n]), reverse=True)
+        for candidate in candidates:
+            if self.idle.get(candidate):
+                return self.idle[candidate].popleft()
+        return None
+
+    def _record_demand(self, node: Optional[str]):
+        if node:
+            self._demand[node].append(time.monotonic())
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _hand_out(self, vm: PooledVM, name: str, tags: List[str]):
+        # Renaming also drops the pool tag, so a restarted pool does not adopt it
+        if not await self.api.update_vm_config(vm.vm_id, {'name': name, 'tags': ';'.join(tags)}):
+            raise DeployError('configure', "Config update failed")
+        if vm.state == 'paused':
+            await self._wait('resume', await self.api.resume_vm(vm.vm_id))
+            return
+        await self._wait('start', await self.api.start_vm(vm.vm_id))
+        if self.wait_agent:
+            await self.on_demand.wait_for_agent(vm.vm_id)
+
+    async def acquire(self, name: Optional[str] = None, node: Optional[str] = None,
+                      tags: Optional[Iterable[str]] = None) -> PoolLease:
+        """
+        Hand out a running VM, from the pool if one is idle
+
+        A pooled VM is renamed, retagged and started (or resumed); one that
+        fails is discarded (and destroyed) and the next is tried. With none left the VM is
+        deployed on demand. Either way the pool refills in the background.
+
+        Args:
+            name: Name for the VM (default: the pool spec's)
+            node: Only hand out a VM on this node
+            tags: Tags for the VM (default: the pool spec's)
+
+        Returns:
+            PoolLease with the VM, whether it was a pool hit and the latency
+        """
+        started = time.monotonic()
+        name = name or self.spec.name
+        tags = list(tags) if tags is not None else [tag for tag in self.spec.tags if tag != POOL_TAG]
+        self.stats['acquires'] += 1
+
+        lease = None
+        while lease is None:
+            vm = self._take(node)
+            if vm is None:
+                break
+            self._record_demand(vm.node)
+            try:
+                await self._hand_out(vm, name, tags)
+                lease = PoolLease(name, vm.vm_id, vm.node, hit=True)
+            except DeployError as e:
+                self.stats['discarded'] += 1
+                logger.warning(f"Discarding pool VM {vm.vm_id} on {vm.node}: {e.stage} failed: {e}")
+                # Destroyed in the background so the caller gets the next VM without waiting
+                cleanup = asyncio.ensure_future(self._destroy(vm.vm_id, vm.node, f"{e.stage} failed on acquire"))
+                self._cleanups.add(cleanup)
+                cleanup.add_done_callback(self._cleanups.discard)
+
+        if lease is None:
+            self._record_demand(node)
+            result = await self.on_demand.deploy_one(replace(self.spec, name=name, tags=tags, target=node))
+            if node is None and result.node:
+                self._record_demand(result.node)
+            lease = PoolLease(name, result.vm_id, result.node, hit=False, error=result.error)
+
+        lease.latency = time.monotonic() - started
+        self._latency['hit' if lease.hit else 'miss'].append(lease.latency)
+        self.stats['hits' if lease.hit else 'misses'] += 1
+        if not lease.ok:
+            self.stats['failed'] += 1
+        logger.info(f"Acquired VM {lease.vm_id} ({'pool hit' if lease.hit else 'miss'}) "
+                    f"in {lease.latency:.2f}s")
+        return lease
+
+    async def _refill_loop(self):
+        while True:
+            self.refill()
+            self._wakeup.clear()
+            # asyncio.wait, unlike wait_for, never loses a cancellation from close()
+            # that arrives as the wakeup fires
+            wakeup = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait([wakeup], timeout=self.check_interval)
+            finally:
+                wakeup.cancel()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'nodes': {node: {'idle': len(self.idle[node]), 'provisioning': self.provisioning[node],
+                             'target': self.target(node), 'demand': len(self._demand[node])}
+                      for node in self.nodes or ()},
+            **self.stats,
+            'hit_rate': round(self.hit_rate, 3) if self.hit_rate is not None else None,
+            'acquire_latency_s': {kind: _latency_summary(values) for kind, values in self._latency.items()},
+            'lead_time_s': round(self.lead_time, 3),
+            'orphans': {vmid: dict(orphan) for vmid, orphan in self.orphans.items()},
+        }
+
+    async def close(self):
+        """
+        Stop refilling; VMs being provisioned are destroyed and idle VMs stay for the next run
+
+        Failed VMs still being destroyed are waited for, as are the clones
+        of cancelled provisionings.
+        """
+        tasks = [task for task in [self._refiller, *self._provisioners] if task is not None and not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Cancelled provisioners add cleanups of their own
+        await asyncio.gather(*self._cleanups, return_exceptions=True)
@@ -0,0 +1,278 @@
+"""
+VM Watcher Module - Change feed of guest state from /cluster/resources
+Polls on an adaptive interval (fast right after changes, slower while
+idle), diffs each listing against the last published state and delivers
+only the changed guests to subscribers through async iterators
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from lib.cluster_index import GUEST_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Event names a change can carry
+EVENTS = ('added', 'removed', 'started', 'stopped', 'status', 'migrated', 'updated', 'resources')
+
+# Changes to these are published as 'updated'
+UPDATE_FIELDS = ('name', 'tags', 'template', 'lock', 'maxcpu', 'maxmem', 'maxdisk')
+
+# Usage fields and the capacity each is measured against (cpu is already a fraction)
+USAGE_FIELDS = (('cpu', None), ('mem', 'maxmem'), ('disk', 'maxdisk'))
+
+TRACKED_FIELDS = ('status', 'node') + UPDATE_FIELDS + tuple(name for name, _ in USAGE_FIELDS)
+
+
+@dataclass
+class VMChange:
+    """What changed for one guest between two published states"""
+    vm_id: int
+    events: List[str]
+    record: Dict[str, Any]  # current entry, or the last known one for 'removed'
+    changes: Dict[str, Tuple[Any, Any]] = field(default_factory=dict)  # field -> (old, new)
+    at: float = field(default_factory=time.time)
+
+    @property
+    def node(self) -> Optional[str]:
+        return self.record.get('node')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'vm_id': self.vm_id, 'events': list(self.events), 'node': self.node,
+                'status': self.record.get('status'), 'at': self.at,
+                'changes': {name: list(values) for name, values in self.changes.items()}}
+
+
+def diff_guest(old: Dict[str, Any], new: Dict[str, Any], threshold: float = 0.05) -> Optional[VMChange]:
+    """
+    Compare two /cluster/resources entries of one guest
+
+    Usage changes count when they move by at least threshold of the
+    guest's capacity; counters such as uptime and netin are ignored.
+
+    Args:
+        old: Last published entry
+        new: Entry from the latest listing
+        threshold: Smallest usage change to report, as a fraction of capacity
+
+    Returns:
+        The change, or None if nothing worth publishing changed
+    """
+    events = []
+    status = new.get('status')
+    if old.get('status') != status:
+        events.append('started' if status == 'running' else 'stopped' if status == 'stopped' else 'status')
+    if old.get('node') != new.get('node'):
+        events.append('migrated')
+    if any(old.get(name) != new.get(name) for name in UPDATE_FIELDS):
+        events.append('updated')
+    for name, capacity in USAGE_FIELDS:
+        scale = (new.get(capacity) or old.get(capacity) or 0) if capacity else 1
+        if scale and abs((new.get(name) or 0) - (old.get(name) or 0)) >= threshold * scale:
+            events.append('resources')
+            break
+
+    if not events:
+        return None
+    changes = {name: (old.get(name), new.get(name)) for name in TRACKED_FIELDS if old.get(name) != new.get(name)}
+    return VMChange(vm_id=int(new['vmid']), events=events, record=dict(new), changes=changes)
+
+
+class _Subscriber:
+    """Queue and filters of one consumer"""
+
+    def __init__(self, vm_ids: Optional[Iterable[int]], events: Optional[Iterable[str]], queue_size: int,
+                 initial: bool = False):
+        self.vm_ids: Optional[Set[int]] = set(vm_ids) if vm_ids is not None else None
+        self.events: Optional[Set[str]] = set(events) if events is not None else None
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+        # Receives the baseline poll as 'added' changes
+        self.initial = initial
+
+    def wants(self, change: VMChange) -> bool:
+        return ((self.vm_ids is None or change.vm_id in self.vm_ids)
+                and (self.events is None or not self.events.isdisjoint(change.events)))
+
+    def put(self, change: VMChange):
+        if self.queue.full():
+            # A stalled consumer loses its oldest changes rather than stalling the poller
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(change)
+
+
+class VMWatcher:
+    """Shared poller publishing guest changes to any number of subscribers"""
+
+    def __init__(self, api, min_interval: float = 1.0, max_interval: float = 30.0, backoff: float = 1.5,
+                 threshold: float = 0.05, queue_size: int = 1000):
+        """
+        Initialize the watcher
+
+        Args:
+            api: ProxmoxAPIAsync-compatible client (get_cluster_resources, cluster_index)
+            min_interval: Delay between polls right after a change
+            max_interval: Longest delay between polls while nothing changes
+            backoff: Factor the delay grows by after a poll with no changes
+            threshold: Smallest usage change to publish, as a fraction of capacity
+            queue_size: Changes buffered per subscriber before the oldest are dropped
+        """
+        self.api = api
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.threshold = threshold
+        self.queue_size = queue_size
+
+        # Last published entry per guest; usage drifts until it crosses the threshold
+        self.published: Dict[int, Dict[str, Any]] = {}
+        self.loaded = False
+        self.interval = min_interval
+        self._subscribers: List[_Subscriber] = []
+        self._poller: Optional[asyncio.Task] = None
+        # Created with the poller, inside the loop it serves
+        self._wakeup: Optional[asyncio.Event] = None
+        self.stats = {'polls': 0, 'failed_polls': 0, 'changes': 0, 'delivered': 0, 'dropped': 0}
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def guests(self) -> List[Dict[str, Any]]:
+        """Last published entry of every guest, ordered by VM ID"""
+        return [self.published[vmid] for vmid in sorted(self.published)]
+
+    async def poll_once(self) -> List[VMChange]:
+        """
+        Poll once and publish what changed since the last poll
+
+        The listing also refreshes the client's cluster index. The first
+        poll only records the baseline; it is published to subscribers
+        that asked for the initial state.
+
+        Returns:
+            Changes published by this poll (every guest as 'added' on the first)
+        """
+        self.stats['polls'] += 1
+        resources = await self.api.get_cluster_resources(fresh=True)
+        if resources is None:
+            self.stats['failed_polls'] += 1
+            return []
+        self.api.cluster_index.apply(resources)
+
+        current = {int(r['vmid']): r for r in resources if r.get('type') in GUEST_TYPES and 'vmid' in r}
+        changes = []
+        for vmid in sorted(current.keys() | self.published.keys()):
+            old, new = self.published.get(vmid), current.get(vmid)
+            if old is None:
+                change = VMChange(vm_id=vmid, events=['added'], record=dict(new))
+            elif new is None:
+                change = VMChange(vm_id=vmid, events=['removed'], record=old)
+            else:
+                change = diff_guest(old, new, self.threshold)
+            if change is None:
+                continue
+            changes.append(change)
+            if new is None:
+                del self.published[vmid]
+            else:
+                self.published[vmid] = dict(new)
+
+        baseline = not self.loaded
+        self.loaded = True
+        if not baseline:
+            self.stats['changes'] += len(changes)
+        self._publish(changes, baseline)
+        return changes
+
+    def _publish(self, changes: List[VMChange], baseline: bool = False):
+        for subscriber in self._subscribers:
+            if baseline and not subscriber.initial:
+                continue
+            for change in changes:
+                if subscriber.wants(change):
+                    subscriber.put(change)
+                    self.stats['delivered'] += 1
+            self.stats['dropped'] += subscriber.dropped
+            subscriber.dropped = 0
+
+    async def subscribe(self, vm_ids: Optional[Iterable[int]] = None, events: Optional[Iterable[str]] = None,
+                        initial: bool = False) -> AsyncIterator[VMChange]:
+        """
+        Yield changes as polls find them
+
+        Polling runs while at least one subscriber is iterating and stops
+        after the last one leaves.
+
+        Args:
+            vm_ids: Only these guests (default: all)
+            events: Only changes carrying one of these events (see EVENTS)
+            initial: First yield every known guest as 'added'
+
+        Yields:
+            VMChange per changed guest, in the order polls found them
+        """
+        if events is not None:
+            unknown = set(events) - set(EVENTS)
+            if unknown:
+                raise ValueError(f"Unknown events: {sorted(unknown)}")
+
+        subscriber = _Subscriber(vm_ids, events, self.queue_size, initial=initial and not self.loaded)
+        if initial and self.loaded:
+            for vmid, record in sorted(self.published.items()):
+                subscriber.put(VMChange(vm_id=vmid, events=['added'], record=record))
+        self._subscribers.append(subscriber)
+        if self._poller is None or self._poller.done():
+            if self._wakeup is None:
+                self._wakeup = asyncio.Event()
+            self._poller = asyncio.get_running_loop().create_task(self._poll_loop())
+
+        try:
+            while True:
+                yield await subscriber.queue.get()
+        finally:
+            self._subscribers.remove(subscriber)
+            if not self._subscribers and self._poller is not None:
+                self._poller.cancel()
+
+    def wake(self):
+        """Poll now and at the fastest interval, e.g. after starting a task that changes guests"""
+        self.interval = self.min_interval
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _poll_loop(self):
+        while self._subscribers:
+            # Cleared before polling, so a wake() during the poll triggers another one
+            self._wakeup.clear()
+            try:
+                changes = await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"VM watcher poll failed: {e}")
+                self.stats['failed_polls'] += 1
+                changes = []
+
+            if changes:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.max_interval, self.interval * self.backoff)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        """Stop polling; subscribers stay registered but receive nothing more"""
+        if self._poller and not self._poller.done():
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
@@ -91,11 +91,15 @@ def vm():
 @click.option('--cores', default=2, help='Number of CPU cores')
 @click.option('--memory', default=2048, help='Memory in MB')
 @click.option('--disk', default=20, help='Disk size in GB')
+@click.option('--count', default=1, type=click.IntRange(1, 100), help='Number of VMs to deploy concurrently')
+@click.option('--template', default=None, help='Template VM ID or name (default: vm.template from config)')
+@click.option('--full-clone', is_flag=True, help='Copy disks instead of linking to the template')
 @click.pass_obj
-def deploy(master: MasterCLI, name: str, cores: int, memory: int, disk: int):
-    """Deploy a new time-shift VM"""
+def deploy(master: MasterCLI, name: str, cores: int, memory: int, disk: int, count: int,
+           template: Optional[str], full_clone: bool):
+    """Deploy new time-shift VMs from a template"""
     console.print(Panel(
-        f"[bold]Deploying VM: {name}[/bold]\n"
+        f"[bold]Deploying VM: {name}[/bold]" + (f" x {count}" if count > 1 else "") + "\n"
         f"Cores: {cores} | Memory: {memory}MB | Disk: {disk}GB",
         title="🚀 VM Deployment",
         border_style="blue"
@@ -117,11 +121,36 @@ def deploy(master: MasterCLI, name: str, cores: int, memory: int, disk: int):
             name=name,
             cores=cores,
             memory=memory,
-            disk=disk
+            disk=disk,
+            count=count,
+            template=template,
+            linked=not full_clone
         )
         
-        console.print(f"[green]✓ VM deployed successfully: {result}[/green]")
-        return True
+        if result.get('status') == 'failed' and not result.get('vms'):
+            console.print(f"[red]✗ Deployment failed: {result.get('error')}[/red]")
+            return False
+        
+        table = Table(title="Deployment")
+        table.add_column("VM")
+        table.add_column("VMID")
+        table.add_column("Node")
+        table.add_column("Clone")
+        table.add_column("Ready (s)")
+        table.add_column("Result")
+        for vm in result['vms']:
+            table.add_row(
+                vm['name'], str(vm['vm_id'] or '-'), vm['node'] or '-',
+                'linked' if vm['linked'] else 'full' if vm['linked'] is not None else '-',
+                f"{vm['ready_after_s']:.1f}" if vm['ready_after_s'] is not None else '-',
+                "[green]ready[/green]" if not vm['error'] else f"[red]{vm['failed_stage']}: {vm['error']}[/red]"
+            )
+        console.print(table)
+        
+        stages = ", ".join(f"{stage} {times['mean']:.1f}s" for stage, times in result['stages_s'].items())
+        console.print(f"Mean stage times: {stages}")
+        console.print(f"{result['deployed']}/{len(result['vms'])} VMs ready in {result['elapsed_s']:.1f}s")
+        return result['status'] == 'deployed'
         
     success = asyncio.run(deploy_vm())
     sys.exit(0 if success else 1)
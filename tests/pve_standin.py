@@ -0,0 +1,674 @@
+"""
+Local Proxmox VE API stand-in used by the client tests
+
+Serves a small subset of /api2/json over TLS on loopback: ticket and API
+token authentication, cluster resources, VM listing and status across one
+or more nodes, start / stop / suspend / resume, clone and snapshot create / delete / rollback as UPID
+tasks with task status and /cluster/tasks, VM config updates, disk resize and free
+VM IDs, VM and node rrddata, and the QEMU guest agent ping and exec / exec-status. Guest commands run as local subprocesses unless a
+per-VM exec handler is installed, so probes executed "inside" a VM really
+touch the network.
+
+Clusters of thousands of synthetic VMs (add_vms), per-request latency with
+jitter and random error injection (inject_errors) let the same server back
+throughput benchmarks and failure-handling tests.
+"""
+
+import asyncio
+import math
+import random
+import ssl
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from tests.tls_fleet import make_self_signed_cert, write_cert_pair
+
+# (argv, input_data) -> (exitcode, stdout, stderr)
+ExecHandler = Callable[[List[str], Optional[str]], Awaitable[Tuple[int, str, str]]]
+
+
+async def run_subprocess(argv: List[str], input_data: Optional[str] = None) -> Tuple[int, str, str]:
+    """Default exec handler: run the guest command on this machine"""
+    process = await asyncio.create_subprocess_exec(
+        *argv,
+        stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(input_data.encode() if input_data is not None else None)
+    return process.returncode, stdout.decode(), stderr.decode()
+
+
+# rrddata step per timeframe; Proxmox returns 70 rows each
+RRD_STEPS = {'hour': 60, 'day': 1800, 'week': 10800, 'month': 43200, 'year': 604800}
+
+
+def rrd_cpu(vmid: int, timestamp: float) -> float:
+    """Synthetic CPU load of a guest (or node, vmid 0) at a time"""
+    return round(0.05 + (vmid % 10) / 20 + 0.04 * math.sin(timestamp / 3600), 4)
+
+
+def pve_error(status: int, message: str) -> web.Response:
+    """Error body in the shape Proxmox returns"""
+    return web.json_response({'data': None, 'message': message}, status=status)
+
+
+class PVEStandIn:
+    """Minimal Proxmox VE API server"""
+
+    def __init__(self, node: str = 'pve', username: str = 'root@pam', password: str = 'secret',
+                 login_delay: float = 0.0, nodes: Optional[List[str]] = None,
+                 task_duration: float = 0.05, cluster_task_limit: int = 1000, latency: float = 0.0,
+                 latency_jitter: float = 0.0, seed: Optional[int] = None):
+        self.node = node
+        self.nodes = list(nodes) if nodes else [node]
+        self.username = username
+        self.password = password
+        # PAM/LDAP realms make /access/ticket slow; emulate that cost
+        self.login_delay = login_delay
+        # Added to every request, like a WAN link to a remote cluster, plus up to jitter more
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.random = random.Random(seed)
+        # Random failures: rate, status and message, for routes (stats keys) or all but login
+        self.error_rate = 0.0
+        self.error_status = 503
+        self.error_message = 'injected failure'
+        self.error_routes: Optional[set] = None
+        self.injected: Counter = Counter()
+        self.api_tokens: Dict[str, str] = {}
+        # Seconds a start/stop/snapshot task runs; /cluster/tasks keeps the newest entries only
+        self.task_duration = task_duration
+        self.cluster_task_limit = cluster_task_limit
+        # Linked clones take task_duration; full clones copy disks for this long
+        self.full_clone_duration = task_duration * 5
+        # Storages without linked-clone support, and seconds a guest agent needs after boot
+        self.no_linked_clones: set = set()
+        self.agent_boot = 0.0
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.task_failures: Dict[Tuple[int, str], str] = {}
+        # Snapshot tasks running per storage, and the highest seen
+        self.storage_in_flight: Counter = Counter()
+        self.peak_storage_in_flight: Counter = Counter()
+
+        self.vms: Dict[int, Dict[str, Any]] = {}
+        self.exec_handlers: Dict[int, ExecHandler] = {}
+        self.exec_jobs: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self.next_pid = 1000
+
+        self.tickets = set()
+        self.tickets_issued = 0
+        self.stats: Counter = Counter()
+        # Concurrent requests per node ('*' for all), and the highest seen
+        self.in_flight: Counter = Counter()
+        self.peak_in_flight: Counter = Counter()
+        # Like an overloaded pveproxy, answer 503 beyond this many concurrent requests
+        self.max_in_flight: Optional[int] = None
+        self.port: Optional[int] = None
+        self.runner: Optional[web.AppRunner] = None
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    @contextmanager
+    def background(self):
+        """Serve from a background event loop thread, for synchronous clients"""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        asyncio.run_coroutine_threadsafe(self.start(), loop).result()
+        try:
+            yield self
+        finally:
+            asyncio.run_coroutine_threadsafe(self.stop(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    def add_vm(self, vmid: int, name: Optional[str] = None, status: str = 'running',
+               agent: bool = True, exec_handler: Optional[ExecHandler] = None,
+               node: Optional[str] = None, tags: Optional[List[str]] = None,
+               storage: str = 'local-lvm', template: bool = False) -> Dict[str, Any]:
+        """Register a VM (or template); an exec handler overrides the local subprocess"""
+        vm = {'vmid': vmid, 'name': name or f"vm{vmid}", 'node': node or self.node,
+              'status': 'stopped' if template else status, 'agent': agent, 'tags': list(tags or []),
+              'started': time.time(), 'storage': storage, 'snapshots': {}, 'lock': None,
+              'cpu': 0.0, 'mem': 0, 'maxcpu': 2, 'maxmem': 2 << 30, 'disk_size': 32, 'template': template,
+              'paused': False}
+        self.vms[vmid] = vm
+        if exec_handler:
+            self.exec_handlers[vmid] = exec_handler
+        return vm
+
+    def add_vms(self, count: int, first_vmid: int = 100, stopped_ratio: float = 0.0,
+                **options) -> List[int]:
+        """
+        Register count VMs spread round-robin over the nodes
+
+        Args:
+            count: Number of VMs
+            first_vmid: VM ID of the first one
+            stopped_ratio: Fraction of VMs (chosen with the seeded RNG) that are stopped
+            **options: Passed to add_vm
+
+        Returns:
+            The new VM IDs
+        """
+        vmids = list(range(first_vmid, first_vmid + count))
+        for i, vmid in enumerate(vmids):
+            status = 'stopped' if self.random.random() < stopped_ratio else 'running'
+            self.add_vm(vmid, status=status, node=self.nodes[i % len(self.nodes)], **options)
+        return vmids
+
+    def inject_errors(self, rate: float, status: int = 503, message: str = 'injected failure',
+                      routes: Optional[List[str]] = None):
+        """
+        Fail a random fraction of requests
+
+        Args:
+            rate: Probability that a request fails (0 turns injection off)
+            status: HTTP status of the failures
+            message: Proxmox error message
+            routes: Route keys as in stats, e.g. 'GET /api2/json/cluster/resources'
+                    (default: every route except login)
+        """
+        self.error_rate = rate
+        self.error_status = status
+        self.error_message = message
+        self.error_routes = set(routes) if routes is not None else None
+
+    def _inject_error(self, route: str) -> bool:
+        if not self.error_rate:
+            return False
+        if self.error_routes is None:
+            eligible = not route.endswith('/access/ticket')
+        else:
+            eligible = route in self.error_routes
+        if eligible and self.random.random() < self.error_rate:
+            self.injected[route] += 1
+            return True
+        return False
+
+    def add_api_token(self, name: str = 'timeshift', secret: str = 'b5a1c2d3-0000-4000-8000-000000000001') -> str:
+        """Register an API token and return it as 'user@realm!name=secret'"""
+        token_id = f"{self.username}!{name}"
+        self.api_tokens[token_id] = secret
+        return f"{token_id}={secret}"
+
+    def add_snapshot(self, vmid: int, name: str, snaptime: float, description: str = ''):
+        """Give a VM an existing snapshot taken at snaptime"""
+        self.vms[vmid]['snapshots'][name] = {'name': name, 'description': description,
+                                             'snaptime': int(snaptime), 'vmstate': 0}
+
+    def revoke_tickets(self):
+        """Invalidate every ticket issued so far, as a restarted pveproxy or key rotation would"""
+        self.tickets.clear()
+
+    def fail_task(self, vmid: int, task_type: str, message: str = 'command failed'):
+        """Make the next task of a type ('qmstart', 'qmsnapshot', ...) for a VM fail"""
+        self.task_failures[(vmid, task_type)] = message
+
+    def migrate_vm(self, vmid: int, node: str):
+        """Move a VM to another node, as a live migration would"""
+        self.vms[vmid]['node'] = node
+
+    def config(self, **overrides) -> Dict[str, Any]:
+        """Client configuration pointing at this stand-in"""
+        config = {
+            'host': '127.0.0.1',
+            'port': self.port,
+            'username': self.username,
+            'password': self.password,
+            'node': self.node,
+            'verify_ssl': False,
+        }
+        config.update(overrides)
+        return config
+
+    def _ssl_context(self) -> ssl.SSLContext:
+        cert_pem, key_pem = make_self_signed_cert('pve.standin', 'valid')
+        cert_file, key_file = write_cert_pair(Path(self.tmpdir.name), 'pve', cert_pem, key_pem)
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert_file, key_file)
+        return context
+
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._auth_middleware])
+        prefix = '/api2/json'
+        qemu = prefix + '/nodes/{node}/qemu'
+        app.router.add_post(prefix + '/access/ticket', self.handle_ticket)
+        app.router.add_get(prefix + '/cluster/resources', self.handle_cluster_resources)
+        app.router.add_get(prefix + '/cluster/tasks', self.handle_cluster_tasks)
+        app.router.add_get(prefix + '/cluster/nextid', self.handle_nextid)
+        app.router.add_get(prefix + '/nodes/{node}/tasks/{upid}/status', self.handle_task_status)
+        app.router.add_get(qemu, self.handle_list)
+        app.router.add_get(qemu + '/{vmid}/status/current', self.handle_status)
+        app.router.add_post(qemu + '/{vmid}/status/start', self.handle_start)
+        app.router.add_post(qemu + '/{vmid}/status/stop', self.handle_stop)
+        app.router.add_post(qemu + '/{vmid}/status/shutdown', self.handle_shutdown)
+        app.router.add_post(qemu + '/{vmid}/status/suspend', self.handle_suspend)
+        app.router.add_post(qemu + '/{vmid}/status/resume', self.handle_resume)
+        app.router.add_get(qemu + '/{vmid}/config', self.handle_config)
+        app.router.add_put(qemu + '/{vmid}/config', self.handle_config_update)
+        app.router.add_put(qemu + '/{vmid}/resize', self.handle_resize)
+        app.router.add_post(qemu + '/{vmid}/clone', self.handle_clone)
+        app.router.add_delete(qemu + '/{vmid}', self.handle_destroy)
+        app.router.add_get(qemu + '/{vmid}/rrddata', self.handle_rrddata)
+        app.router.add_get(prefix + '/nodes/{node}/rrddata', self.handle_node_rrddata)
+        app.router.add_get(qemu + '/{vmid}/snapshot', self.handle_snapshot_list)
+        app.router.add_post(qemu + '/{vmid}/snapshot', self.handle_snapshot)
+        app.router.add_delete(qemu + '/{vmid}/snapshot/{snapname}', self.handle_snapshot_delete)
+        app.router.add_post(qemu + '/{vmid}/snapshot/{snapname}/rollback', self.handle_rollback)
+        app.router.add_post(qemu + '/{vmid}/agent/ping', self.handle_agent_ping)
+        app.router.add_post(qemu + '/{vmid}/agent/exec', self.handle_exec)
+        app.router.add_get(qemu + '/{vmid}/agent/exec-status', self.handle_exec_status)
+        return app
+
+    async def start(self):
+        self.runner = web.AppRunner(self.build_app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0, ssl_context=self._ssl_context())
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+
+    async def stop(self):
+        for job in self.exec_jobs.values():
+            job['task'].cancel()
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+        self.tmpdir.cleanup()
+
+    @web.middleware
+    async def _auth_middleware(self, request: web.Request, handler):
+        resource = request.match_info.route.resource
+        route = f"{request.method} {resource.canonical if resource else request.path}"
+        self.stats[route] += 1
+        keys = ['*', request.match_info.get('node')] if 'node' in request.match_info else ['*']
+        for key in keys:
+            self.in_flight[key] += 1
+            self.peak_in_flight[key] = max(self.peak_in_flight[key], self.in_flight[key])
+        try:
+            if self.max_in_flight and self.in_flight['*'] > self.max_in_flight:
+                return pve_error(503, 'too many concurrent requests')
+            if self._inject_error(route):
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                return pve_error(self.error_status, self.error_message)
+            return await self._authorized(request, handler)
+        finally:
+            for key in keys:
+                self.in_flight[key] -= 1
+
+    async def _authorized(self, request: web.Request, handler):
+        if self.latency or self.latency_jitter:
+            await asyncio.sleep(self.latency + self.random.uniform(0, self.latency_jitter))
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('PVEAPIToken='):
+            token_id, _, secret = authorization[len('PVEAPIToken='):].partition('=')
+            if self.api_tokens.get(token_id) != secret:
+                return pve_error(401, 'invalid token value')
+        elif not request.path.endswith('/access/ticket'):
+            if request.cookies.get('PVEAuthCookie') not in self.tickets:
+                return pve_error(401, 'authentication failure')
+            if request.method != 'GET' and request.headers.get('CSRFPreventionToken') != 'csrf-token':
+                return pve_error(401, 'invalid CSRF prevention token')
+        return await handler(request)
+
+    def _vm(self, request: web.Request) -> Dict[str, Any]:
+        node = request.match_info['node']
+        if node not in self.nodes:
+            raise web.HTTPNotFound()
+        vm = self.vms.get(int(request.match_info['vmid']))
+        # Like Proxmox, a VM is only found through the node that owns it
+        if vm is None or vm['node'] != node:
+            raise web.HTTPInternalServerError(text=f"Configuration file 'nodes/{node}/qemu-server/"
+                                                   f"{request.match_info['vmid']}.conf' does not exist")
+        return vm
+
+    async def handle_ticket(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if self.login_delay:
+            await asyncio.sleep(self.login_delay)
+        if form.get('username') != self.username or form.get('password') != self.password:
+            return pve_error(401, 'authentication failure')
+        # Real tickets embed their issue time as hex epoch seconds
+        ticket = f"PVE:{self.username}:{int(time.time()):08X}::standin{self.tickets_issued}"
+        self.tickets_issued += 1
+        self.tickets.add(ticket)
+        return web.json_response({'data': {
+            'ticket': ticket, 'CSRFPreventionToken': 'csrf-token', 'username': self.username
+        }})
+
+    async def handle_cluster_resources(self, request: web.Request) -> web.Response:
+        kind = request.query.get('type')
+        resources = []
+        if kind in (None, 'node'):
+            resources += [{'id': f"node/{node}", 'type': 'node', 'node': node, 'status': 'online'}
+                          for node in self.nodes]
+        if kind in (None, 'vm'):
+            now = time.time()
+            resources += [{
+                'id': f"qemu/{vm['vmid']}", 'type': 'qemu', 'vmid': vm['vmid'], 'name': vm['name'],
+                'node': vm['node'], 'status': vm['status'], 'tags': ';'.join(vm['tags']),
+                'template': int(vm['template']),
+                'uptime': int(now - vm['started']) if vm['status'] == 'running' else 0,
+                'cpu': vm['cpu'] if vm['status'] == 'running' else 0, 'maxcpu': vm['maxcpu'],
+                'mem': vm['mem'] if vm['status'] == 'running' else 0, 'maxmem': vm['maxmem'],
+            } for vm in self.vms.values()]
+        return web.json_response({'data': resources})
+
+    async def handle_list(self, request: web.Request) -> web.Response:
+        node = request.match_info['node']
+        return web.json_response({'data': [
+            {'vmid': vm['vmid'], 'name': vm['name'], 'status': vm['status']}
+            for vm in self.vms.values() if vm['node'] == node
+        ]})
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        return web.json_response({'data': {
+            'vmid': vm['vmid'], 'name': vm['name'], 'status': vm['status'], 'agent': int(vm['agent']),
+            'qmpstatus': 'paused' if vm['paused'] else vm['status']
+        }})
+
+    def _start_task(self, vm: Dict[str, Any], task_type: str,
+                    effect: Optional[Callable[[], None]] = None, lock: Optional[str] = None,
+                    duration: Optional[float] = None) -> web.Response:
+        """
+        Start a task that finishes after duration (default task_duration) and return its UPID
+
+        With a lock, the VM is locked and its storage counted busy until
+        the task ends; a second locking task fails like on Proxmox.
+        """
+        if lock:
+            if vm['lock']:
+                return pve_error(500, f"VM is locked ({vm['lock']})")
+            vm['lock'] = lock
+            storage = vm['storage']
+            self.storage_in_flight[storage] += 1
+            self.peak_storage_in_flight[storage] = max(self.peak_storage_in_flight[storage],
+                                                       self.storage_in_flight[storage])
+        starttime = int(time.time())
+        upid = (f"UPID:{vm['node']}:{self.next_pid:08X}:{self.next_pid * 7:08X}:{starttime:08X}:"
+                f"{task_type}:{vm['vmid']}:{self.username}:")
+        self.next_pid += 1
+        task = {'upid': upid, 'node': vm['node'], 'type': task_type, 'id': str(vm['vmid']),
+                'user': self.username, 'starttime': starttime}
+        self.tasks[upid] = task
+        failure = self.task_failures.pop((vm['vmid'], task_type), None)
+
+        def finish():
+            if lock:
+                vm['lock'] = None
+                self.storage_in_flight[vm['storage']] -= 1
+            task['endtime'] = int(time.time())
+            task['exitstatus'] = failure or 'OK'
+            if failure is None and effect is not None:
+                effect()
+
+        asyncio.get_running_loop().call_later(self.task_duration if duration is None else duration, finish)
+        return web.json_response({'data': upid})
+
+    async def handle_start(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        if vm['lock']:
+            return pve_error(500, f"VM is locked ({vm['lock']})")
+        if vm['template']:
+            return pve_error(500, "you can't start a vm if it's a template")
+        return self._start_task(vm, 'qmstart', lambda: vm.update(status='running', started=time.time()))
+
+    async def handle_stop(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        return self._start_task(vm, 'qmstop', lambda: vm.update(status='stopped', paused=False))
+
+    async def handle_shutdown(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        return self._start_task(vm, 'qmshutdown', lambda: vm.update(status='stopped', paused=False))
+
+    async def handle_suspend(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        if vm['status'] != 'running':
+            return pve_error(500, f"VM {vm['vmid']} not running")
+        # Paused guests stay 'running' in listings; only qmpstatus tells them apart
+        return self._start_task(vm, 'qmsuspend', lambda: vm.update(paused=True))
+
+    async def handle_resume(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        if vm['status'] != 'running':
+            return pve_error(500, f"VM {vm['vmid']} not running")
+        return self._start_task(vm, 'qmresume', lambda: vm.update(paused=False))
+
+    async def handle_config(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        config = {
+            'name': vm['name'], 'cores': vm['maxcpu'], 'memory': vm['maxmem'] >> 20, 'agent': str(int(vm['agent'])),
+            'tags': ';'.join(vm['tags']),
+            'scsi0': f"{vm['storage']}:vm-{vm['vmid']}-disk-0,size={vm['disk_size']}G",
+            'ide2': 'none,media=cdrom',
+            'digest': f"{vm['vmid']:040x}",
+        }
+        if vm['template']:
+            config['template'] = 1
+        return web.json_response({'data': config})
+
+    async def handle_config_update(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        if vm['lock']:
+            return pve_error(500, f"VM is locked ({vm['lock']})")
+        form = await request.post()
+        for key, value in form.items():
+            if key == 'name':
+                vm['name'] = value
+            elif key == 'cores':
+                vm['maxcpu'] = int(value)
+            elif key == 'memory':
+                vm['maxmem'] = int(value) << 20
+            elif key == 'tags':
+                vm['tags'] = [t for t in value.replace(',', ';').split(';') if t]
+            elif key != 'digest':
+                vm.setdefault('config', {})[key] = value
+        return web.json_response({'data': None})
+
+    async def handle_resize(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        form = await request.post()
+        size = form.get('size', '')
+        if form.get('disk') != 'scsi0' or not size.endswith('G') or not size[:-1].lstrip('+').isdigit():
+            return pve_error(400, "parameter verification failed: disk, size")
+        new_size = vm['disk_size'] + int(size[1:-1]) if size.startswith('+') else int(size[:-1])
+        if new_size < vm['disk_size']:
+            return pve_error(500, "shrinking disks is not supported")
+        vm['disk_size'] = new_size
+        return web.json_response({'data': None})
+
+    async def handle_nextid(self, request: web.Request) -> web.Response:
+        if 'vmid' in request.query:
+            vmid = int(request.query['vmid'])
+            if vmid in self.vms:
+                return pve_error(400, f"VM {vmid} already exists")
+            return web.json_response({'data': str(vmid)})
+        vmid = 100
+        while vmid in self.vms:
+            vmid += 1
+        return web.json_response({'data': str(vmid)})
+
+    async def handle_clone(self, request: web.Request) -> web.Response:
+        source = self._vm(request)
+        form = await request.post()
+        newid = int(form.get('newid', 0))
+        full = form.get('full', '1' if not source['template'] else '0') == '1'
+        if newid in self.vms:
+            return pve_error(500, f"unable to create VM {newid}: config file already exists")
+        if not full and not source['template']:
+            return pve_error(500, "Linked clone feature for VM is only possible from a template")
+        if not full and source['storage'] in self.no_linked_clones:
+            return pve_error(500, "Linked clone feature is not supported for drive 'scsi0'")
+        node = form.get('target') or source['node']
+        if node not in self.nodes:
+            return pve_error(500, f"no such cluster node '{node}'")
+
+        # Like Proxmox, the new VM exists (locked) while its disks are created
+        vm = self.add_vm(newid, name=form.get('name') or f"Copy-of-VM-{source['name']}", status='stopped',
+                         agent=source['agent'], node=node, tags=source['tags'],
+                         storage=form.get('storage') or source['storage'])
+        vm.update(maxcpu=source['maxcpu'], maxmem=source['maxmem'], disk_size=source['disk_size'])
+        if source['vmid'] in self.exec_handlers:
+            self.exec_handlers[newid] = self.exec_handlers[source['vmid']]
+        duration = self.full_clone_duration if full else self.task_duration
+        failing = (newid, 'qmclone') in self.task_failures
+        response = self._start_task(vm, 'qmclone', lock='clone', duration=duration)
+        if failing:
+            # A failed clone leaves no VM behind
+            asyncio.get_running_loop().call_later(duration, self.vms.pop, newid, None)
+        return response
+
+    async def handle_destroy(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        if vm['status'] == 'running':
+            return pve_error(500, f"VM {vm['vmid']} is running - destroy failed")
+        return self._start_task(vm, 'qmdestroy', lambda: self.vms.pop(vm['vmid'], None), lock='destroy')
+
+    async def handle_agent_ping(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        if vm['status'] != 'running':
+            return pve_error(500, f"VM {vm['vmid']} is not running")
+        if not vm['agent'] or vm['paused'] or time.time() - vm['started'] < self.agent_boot:
+            return pve_error(500, 'QEMU guest agent is not running')
+        return web.json_response({'data': {}})
+
+    async def handle_snapshot(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        form = await request.post()
+        name = form.get('snapname')
+        if not name:
+            return pve_error(400, "parameter verification failed: snapname")
+        if name in vm['snapshots']:
+            return pve_error(500, f"snapshot name '{name}' already used")
+        snapshot = {'name': name, 'description': form.get('description', ''),
+                    'snaptime': int(time.time()), 'vmstate': int(form.get('vmstate', 0))}
+        return self._start_task(vm, 'qmsnapshot', lambda: vm['snapshots'].__setitem__(name, snapshot),
+                                lock='snapshot')
+
+    async def handle_snapshot_list(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        snapshots = sorted(vm['snapshots'].values(), key=lambda s: s['snaptime'])
+        entries = [dict(s, parent=previous['name']) if previous else dict(s)
+                   for previous, s in zip([None] + snapshots, snapshots)]
+        current = {'name': 'current', 'description': 'You are here!', 'running': int(vm['status'] == 'running')}
+        if snapshots:
+            current['parent'] = snapshots[-1]['name']
+        return web.json_response({'data': entries + [current]})
+
+    def _snapshot(self, request: web.Request) -> Tuple[Dict[str, Any], str]:
+        vm = self._vm(request)
+        name = request.match_info['snapname']
+        if name not in vm['snapshots']:
+            raise web.HTTPInternalServerError(text=f"snapshot '{name}' does not exist")
+        return vm, name
+
+    async def handle_snapshot_delete(self, request: web.Request) -> web.Response:
+        vm, name = self._snapshot(request)
+        return self._start_task(vm, 'qmdelsnapshot', lambda: vm['snapshots'].pop(name, None),
+                                lock='snapshot-delete')
+
+    async def handle_rollback(self, request: web.Request) -> web.Response:
+        vm, name = self._snapshot(request)
+        return self._start_task(vm, 'qmrollback', lambda: vm.update(status='stopped'), lock='rollback')
+
+    def _rrd_rows(self, request: web.Request, fields: Callable[[int], Dict[str, Any]]) -> web.Response:
+        step = RRD_STEPS.get(request.query.get('timeframe', 'hour'))
+        if step is None:
+            return pve_error(400, "parameter verification failed: timeframe")
+        last = int(time.time()) // step * step
+        return web.json_response({'data': [
+            dict(fields(t), time=t) for t in range(last - 69 * step, last + step, step)
+        ]})
+
+    async def handle_rrddata(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        vmid = vm['vmid']
+        return self._rrd_rows(request, lambda t: {
+            'cpu': rrd_cpu(vmid, t), 'maxcpu': 2, 'mem': vmid * 2 ** 20, 'maxmem': 2 ** 31,
+            'netin': float(t % 1000), 'netout': float(vmid), 'diskread': 0.0, 'diskwrite': 512.0,
+        })
+
+    async def handle_node_rrddata(self, request: web.Request) -> web.Response:
+        if request.match_info['node'] not in self.nodes:
+            raise web.HTTPNotFound()
+        return self._rrd_rows(request, lambda t: {
+            'cpu': rrd_cpu(0, t), 'loadavg': 0.5, 'memused': 2.0 ** 33, 'memtotal': 2.0 ** 35, 'iowait': 0.01,
+        })
+
+    async def handle_task_status(self, request: web.Request) -> web.Response:
+        task = self.tasks.get(request.match_info['upid'])
+        if task is None or task['node'] != request.match_info['node']:
+            return pve_error(500, f"unable to parse worker upid '{request.match_info['upid']}'")
+        status = dict(task, status='stopped' if 'endtime' in task else 'running')
+        return web.json_response({'data': status})
+
+    async def handle_cluster_tasks(self, request: web.Request) -> web.Response:
+        # Newest first; finished entries report their exit status as 'status'
+        entries = []
+        for task in list(self.tasks.values())[::-1][:self.cluster_task_limit]:
+            entry = {k: v for k, v in task.items() if k != 'exitstatus'}
+            if 'endtime' in task:
+                entry['status'] = task['exitstatus']
+            entries.append(entry)
+        return web.json_response({'data': entries})
+
+    async def handle_exec(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        if vm['status'] != 'running':
+            return pve_error(500, f"VM {vm['vmid']} is not running")
+        if not vm['agent']:
+            return pve_error(500, 'QEMU guest agent is not running')
+
+        form = await request.post()
+        argv = form.getall('command', [])
+        if not argv:
+            return pve_error(400, "parameter verification failed: command")
+
+        pid = self.next_pid
+        self.next_pid += 1
+        handler = self.exec_handlers.get(vm['vmid'], run_subprocess)
+        job = {'result': None}
+        job['task'] = asyncio.get_running_loop().create_task(self._run_exec(job, handler, argv,
+                                                                            form.get('input-data')))
+        self.exec_jobs[(vm['vmid'], pid)] = job
+        return web.json_response({'data': {'pid': pid}})
+
+    async def _run_exec(self, job: Dict[str, Any], handler: ExecHandler, argv: List[str],
+                        input_data: Optional[str]):
+        try:
+            job['result'] = await handler(argv, input_data)
+        except Exception as e:
+            job['result'] = (127, '', str(e))
+
+    async def handle_exec_status(self, request: web.Request) -> web.Response:
+        vm = self._vm(request)
+        job = self.exec_jobs.get((vm['vmid'], int(request.query.get('pid', -1))))
+        if job is None:
+            return pve_error(500, f"Agent error: no such process")
+        if job['result'] is None:
+            return web.json_response({'data': {'exited': 0}})
+
+        exitcode, stdout, stderr = job['result']
+        status = {'exited': 1, 'exitcode': exitcode}
+        if stdout:
+            status['out-data'] = stdout
+        if stderr:
+            status['err-data'] = stderr
+        return web.json_response({'data': status})
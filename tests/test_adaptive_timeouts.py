@@ -0,0 +1,154 @@
+"""
+Tests for adaptive_timeouts.py
+"""
+
+import pytest
+import socket
+import time
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.adaptive_timeouts import HostTimeoutTracker
+from lib.network_tools import NetworkValidator
+from tests.tls_fleet import TLSFleetSimulator, SimulatedHost
+
+
+def closed_port():
+    """A loopback port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestHostTimeoutTracker:
+    """Test RTO estimation and quarantine"""
+
+    def test_initial_timeout_and_phases(self):
+        tracker = HostTimeoutTracker(initial_timeout=2.0, max_timeout=10.0)
+
+        assert tracker.timeout('new-host') == 2.0
+        assert tracker.timeout('new-host', 'handshake') == 4.0
+
+    def test_rto_follows_rtt(self):
+        tracker = HostTimeoutTracker(min_timeout=0.05)
+        for _ in range(20):
+            tracker.record_rtt('fast', 0.010)
+        for _ in range(20):
+            tracker.record_rtt('slow', 0.500)
+
+        assert tracker.timeout('fast') == pytest.approx(0.05)
+        assert 0.5 <= tracker.timeout('slow') < 1.0
+
+    def test_rto_grows_with_variance(self):
+        tracker = HostTimeoutTracker(min_timeout=0.01)
+        for rtt in (0.1, 0.1, 0.1, 0.1):
+            tracker.record_rtt('steady', rtt)
+        for rtt in (0.02, 0.2, 0.02, 0.2):
+            tracker.record_rtt('jittery', rtt)
+
+        assert tracker.timeout('jittery') > tracker.timeout('steady')
+
+    def test_timeout_backoff_is_clamped(self):
+        tracker = HostTimeoutTracker(initial_timeout=1.0, max_timeout=5.0)
+        tracker.record_timeout('h')
+        assert tracker.timeout('h') == 2.0
+        for _ in range(5):
+            tracker.record_timeout('h')
+        assert tracker.timeout('h') == 5.0
+
+    def test_quarantine_after_threshold_with_exponential_backoff(self):
+        tracker = HostTimeoutTracker(failure_threshold=2, base_backoff=60, max_backoff=200)
+
+        tracker.record_result('dead', False)
+        assert not tracker.is_quarantined('dead')
+
+        tracker.record_result('dead', False)
+        first = tracker.quarantined_until('dead') - time.time()
+        tracker.record_result('dead', False)
+        second = tracker.quarantined_until('dead') - time.time()
+        tracker.record_result('dead', False)
+        capped = tracker.quarantined_until('dead') - time.time()
+
+        assert first == pytest.approx(60, abs=1)
+        assert second == pytest.approx(120, abs=1)
+        assert capped == pytest.approx(200, abs=1)
+
+        tracker.record_result('dead', True)
+        assert not tracker.is_quarantined('dead')
+        assert tracker.quarantined() == {}
+
+    def test_state_persists_between_runs(self, tmp_path):
+        state_file = tmp_path / 'probe_state.json'
+        tracker = HostTimeoutTracker(state_file=state_file, failure_threshold=1)
+        tracker.record_rtt('up', 0.2)
+        tracker.record_result('down', False)
+        tracker.save()
+
+        reloaded = HostTimeoutTracker(state_file=state_file)
+        assert reloaded.is_quarantined('down')
+        assert reloaded.timeout('up') == pytest.approx(tracker.timeout('up'))
+
+    def test_corrupt_state_is_ignored(self, tmp_path):
+        state_file = tmp_path / 'probe_state.json'
+        state_file.write_text('{not json')
+
+        assert HostTimeoutTracker(state_file=state_file).hosts == {}
+
+
+class TestAdaptiveNetworkValidator:
+    """Test NetworkValidator with a timeout tracker"""
+
+    @pytest.fixture
+    def validator(self, tmp_path, monkeypatch):
+        tracker = HostTimeoutTracker(state_file=tmp_path / 'state.json', failure_threshold=2)
+        validator = NetworkValidator(timeout_tracker=tracker)
+        monkeypatch.setattr(validator, 'ping_host', lambda host, count=4: False)
+        return validator
+
+    def test_live_host_rtt_recorded(self, validator):
+        hosts = [SimulatedHost('127.0.4.1', cert_state='expired')]
+        with TLSFleetSimulator(hosts) as fleet:
+            results = validator.test_connectivity_suite(fleet.targets(), ping_count=1)
+
+        assert results['127.0.4.1']['ssl_cert']['expired'] is True
+        state = validator.timeouts.hosts['127.0.4.1']
+        assert state.srtt is not None
+        assert validator.timeouts.timeout('127.0.4.1') < validator.timeouts.initial_timeout
+
+    def test_dead_host_quarantined_and_fast_failed(self, validator):
+        targets = [{'host': '127.0.0.1', 'port': closed_port()}]
+
+        for _ in range(2):
+            assert validator.test_connectivity_suite(targets, ping_count=1)['127.0.0.1']['port_open'] is False
+
+        result = validator.test_connectivity_suite(targets, ping_count=1)['127.0.0.1']
+        assert result['quarantined'] is True
+        assert 'Quarantined Until' in validator.generate_connectivity_report({'127.0.0.1': result})
+
+        assert validator.test_connectivity_suite(targets, skip_quarantined=True) == {}
+
+        # A fresh run picks the quarantine up from disk
+        reloaded = NetworkValidator(HostTimeoutTracker(state_file=validator.timeouts.state_file))
+        assert reloaded.test_connectivity_suite(targets)['127.0.0.1']['quarantined'] is True
+
+    def test_hung_idrac_fails_fast_and_is_quarantined(self, validator):
+        # Accepts TCP connections (the kernel completes them) but never answers
+        with socket.socket() as listener:
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(16)
+            targets = [{'host': '127.0.0.1', 'port': listener.getsockname()[1], 'type': 'idrac'}]
+
+            for _ in range(2):
+                result = validator.test_connectivity_suite(targets, ping_count=1)['127.0.0.1']
+                assert result['port_open'] is True and result['idrac_accessible'] is False
+                # One bounded web request instead of four at the fixed timeout
+                assert result['duration'] < validator.timeout
+
+            assert validator.test_connectivity_suite(targets)['127.0.0.1']['quarantined'] is True
+        assert validator.transport.stats['retries'] == 0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,173 @@
+"""
+Tests for bulk_operations.py and the bulk methods of ProxmoxAPIAsync
+"""
+
+import pytest
+import asyncio
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.bulk_operations import BulkOperation, BulkResult, VMError
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from lib.task_waiter import TaskHandle
+from tests.pve_standin import PVEStandIn
+
+NODES = ('pve1', 'pve2', 'pve3')
+
+
+@pytest.fixture
+async def pve():
+    async with PVEStandIn(node='pve1', nodes=NODES, latency=0.01, task_duration=0.05) as pve:
+        for vmid in range(100, 160):
+            pve.add_vm(vmid, node=NODES[vmid % 3], status='stopped')
+        yield pve
+
+
+@pytest.fixture
+async def api(pve):
+    config = pve.config(node=None, bulk_concurrency=8, bulk_per_node=2, pool_size=16, pool_per_host=16)
+    async with ProxmoxAPIAsync(config) as api:
+        api.task_waiter.poll_interval = 0.02
+        yield api
+
+
+class TestBulkOperation:
+    """Test limits and error collection without a server"""
+
+    @pytest.mark.asyncio
+    async def test_limits_and_partial_results(self):
+        in_flight = {'*': 0, 'a': 0, 'b': 0}
+        peaks = {'*': 0, 'a': 0, 'b': 0}
+
+        async def node_for(vm_id):
+            return 'a' if vm_id % 2 else 'b'
+
+        async def call(vm_id, node):
+            for key in ('*', node):
+                in_flight[key] += 1
+                peaks[key] = max(peaks[key], in_flight[key])
+            await asyncio.sleep(0.01)
+            for key in ('*', node):
+                in_flight[key] -= 1
+            if vm_id == 7:
+                raise ValueError("no such VM")
+            return vm_id * 10
+
+        failed = []
+        result = await BulkOperation('status', range(20), call, node_for, concurrency=3, per_node=2,
+                                     on_error=failed.append)
+
+        assert isinstance(result, BulkResult)
+        assert peaks == {'*': 3, 'a': 2, 'b': 2}
+        assert result.results[3] == 30 and len(result.results) == 19
+        assert result.failed == [7] and failed == [7]
+        assert result.errors[7].node == 'a' and result.errors[7].error_type == 'ValueError'
+        assert result.summary()['errors'][0]['message'] == 'no such VM'
+
+    @pytest.mark.asyncio
+    async def test_stream_stops_early(self):
+        started, finished = [], []
+
+        async def call(vm_id, node):
+            started.append(vm_id)
+            await asyncio.sleep(0.01 * vm_id)
+            finished.append(vm_id)
+            return vm_id
+
+        async def node_for(vm_id):
+            return None
+
+        operation = BulkOperation('status', [5, 1, 3, 1], call, node_for, concurrency=2, per_node=None)
+        results = operation.stream()
+        try:
+            async for item in results:
+                assert item.ok and item.vm_id == 1
+                break
+        finally:
+            await results.aclose()
+
+        # Duplicate dropped; closing the stream cancelled the calls still running
+        assert 1 in started and started.count(1) == 1
+        assert finished == [1]
+
+    def test_error_from_api_exception(self):
+        from lib.proxmox_api_async import ProxmoxAPIError
+        error = VMError.from_exception(100, 'start', 'pve1', ProxmoxAPIError("500 VM is locked", status=500))
+        assert error.status == 500 and error.to_dict()['error_type'] == 'ProxmoxAPIError'
+
+
+class TestBulkAPI:
+    """Test the bulk methods against a three-node stand-in"""
+
+    @pytest.mark.asyncio
+    async def test_bulk_status_respects_limits(self, api, pve):
+        result = await api.bulk_status(range(100, 160))
+
+        assert result.ok and len(result.results) == 60
+        assert result.results[101]['vmid'] == 101
+        assert pve.peak_in_flight['*'] <= 8
+        assert all(pve.peak_in_flight[node] <= 2 for node in NODES)
+
+    @pytest.mark.asyncio
+    async def test_structured_errors(self, api, pve):
+        result = await api.bulk_config([100, 101, 999])
+
+        assert result.succeeded == [100, 101]
+        assert result.results[100]['memory'] == 2048
+        assert 'not in the cluster index' in result.errors[999].message
+
+        # A VM the index places on the wrong node is rejected by Proxmox itself
+        api.cluster_index.get(101)['node'] = 'pve1'
+        result = await api.bulk_config([101], per_node=0)
+        error = result.errors[101]
+        assert error.status == 500 and error.operation == 'config' and error.node == 'pve1'
+        assert 'does not exist' in error.message
+
+    @pytest.mark.asyncio
+    async def test_bulk_start_waits_for_tasks(self, api, pve):
+        pve.fail_task(102, 'qmstart', "can't lock file '/var/lock/qemu-server/lock-102.conf'")
+
+        result = await api.bulk_start(range(100, 130), wait=True, timeout=5)
+
+        assert result.failed == [102]
+        assert "can't lock file" in result.errors[102].message
+        assert all(isinstance(task, TaskHandle) and task.ok for task in result.results.values())
+        assert all(pve.vms[vmid]['status'] == 'running' for vmid in range(100, 130) if vmid != 102)
+        assert all(pve.peak_in_flight[node] <= 2 for node in NODES)
+
+    @pytest.mark.asyncio
+    async def test_stream_snapshot_and_shutdown(self, api, pve):
+        seen = []
+        async for item in api.bulk_snapshot(range(100, 110), 'pre-shift', wait=True):
+            assert item.ok and item.result.done
+            seen.append(item.vm_id)
+        assert sorted(seen) == list(range(100, 110))
+        assert all('pre-shift' in pve.vms[vmid]['snapshots'] for vmid in seen)
+
+        # Same name again: rejected by the API for every VM
+        result = await api.bulk_snapshot(range(100, 103), 'pre-shift')
+        assert result.failed == [100, 101, 102]
+        assert 'already used' in result.errors[100].message
+
+        for vmid in range(100, 103):
+            pve.vms[vmid]['status'] = 'running'
+        result = await api.bulk_shutdown([100, 101, 102], guest_timeout=30, wait=True)
+        assert result.ok and all(pve.vms[vmid]['status'] == 'stopped' for vmid in (100, 101, 102))
+
+    @pytest.mark.asyncio
+    async def test_bounded_batch_survives_overload(self, api, pve):
+        pve.max_in_flight = 10
+
+        statuses = await api.batch_vm_status(list(range(100, 160)))
+
+        assert all(status is not None for status in statuses.values())
+
+        # The old unbounded gather trips the overload protection
+        unbounded = await asyncio.gather(*(api.get_vm_status(vmid) for vmid in range(100, 160)))
+        assert None in unbounded
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
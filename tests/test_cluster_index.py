@@ -0,0 +1,170 @@
+"""
+Tests for cluster_index.py
+"""
+
+import pytest
+import asyncio
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.cluster_index import ClusterIndex, parse_tags
+from lib.proxmox_api import ProxmoxAPI
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn
+
+RESOURCES_ROUTE = 'GET /api2/json/cluster/resources'
+STATUS_ROUTE = 'GET /api2/json/nodes/{node}/qemu/{vmid}/status/current'
+
+
+def guest(vmid, node='pve1', name=None, status='running', tags='', **extra):
+    entry = {'id': f"qemu/{vmid}", 'type': 'qemu', 'vmid': vmid, 'name': name or f"vm{vmid}",
+             'node': node, 'status': status, 'tags': tags, 'template': 0}
+    entry.update(extra)
+    return entry
+
+
+def cluster(pve_nodes=('pve1', 'pve2', 'pve3')):
+    """Stand-in with VMs spread over three nodes"""
+    pve = PVEStandIn(node=pve_nodes[0], nodes=pve_nodes)
+    pve.add_vm(100, name='web', node='pve1', tags=['prod', 'web'])
+    pve.add_vm(101, name='db', node='pve2', tags=['prod'])
+    pve.add_vm(102, name='build', node='pve3', status='stopped')
+    return pve
+
+
+class TestClusterIndex:
+    """Test lookups and incremental refreshes"""
+
+    def test_lookups(self):
+        index = ClusterIndex()
+        index.apply([
+            {'id': 'node/pve1', 'type': 'node', 'node': 'pve1'},
+            {'id': 'storage/pve1/local', 'type': 'storage', 'node': 'pve1', 'storage': 'local'},
+            guest(100, name='web', tags='prod;web'),
+            guest(101, node='pve2', name='db', tags='prod'),
+            guest(102, node='pve2', status='stopped'),
+            guest(9000, name='tmpl', template=1),
+        ])
+
+        assert len(index) == 4 and 101 in index
+        assert index.node_for(101) == 'pve2'
+        assert index.vmid_for('db') == 101
+        assert [vm['vmid'] for vm in index.with_tag('prod')] == [100, 101]
+        assert [vm['vmid'] for vm in index.on_node('pve2')] == [101, 102]
+        assert [vm['vmid'] for vm in index.with_status('stopped')] == [102]
+        assert [vm['vmid'] for vm in index.query(node='pve2', tag='prod')] == [101]
+        assert [vm['vmid'] for vm in index.query(node='pve1')] == [100]
+        assert [vm['vmid'] for vm in index.query(node='pve1', templates=True)] == [100, 9000]
+        assert index.nodes()[0]['node'] == 'pve1'
+        assert index.of_type('storage')[0]['storage'] == 'local'
+        assert index.tags() == ['prod', 'web']
+        assert index.get(999) is None
+
+    def test_incremental_refresh(self):
+        index = ClusterIndex()
+        index.apply([guest(100, uptime=1), guest(101), guest(102)])
+        generation = index.generation
+
+        diff = index.apply([guest(100, uptime=31), guest(101, node='pve2'), guest(103)])
+
+        assert diff == {'added': ['qemu/103'], 'removed': ['qemu/102'], 'changed': ['qemu/101']}
+        assert index.generation == generation + 1
+        assert index.get(100)['uptime'] == 31  # volatile fields are updated in place
+        assert [vm['vmid'] for vm in index.on_node('pve1')] == [100, 103]
+        assert index.on_node('pve2')[0]['vmid'] == 101
+        assert 102 not in index
+
+        assert index.apply([guest(100, uptime=61), guest(101, node='pve2'), guest(103)]) == \
+            {'added': [], 'removed': [], 'changed': []}
+        assert index.generation == generation + 1
+
+    def test_ambiguous_names_and_staleness(self):
+        index = ClusterIndex(refresh_interval=60)
+        assert index.is_stale()
+
+        index.apply([guest(100, name='dup'), guest(101, name='dup')])
+        assert index.vmid_for('dup') is None
+        assert len(index.by_name('dup')) == 2
+        assert not index.is_stale()
+
+        index.invalidate()
+        assert index.is_stale() and index.node_for(100) == 'pve1'
+
+    def test_parse_tags(self):
+        assert parse_tags('a;b, c') == ['a', 'b', 'c']
+        assert parse_tags(None) == []
+        assert parse_tags(['x']) == ['x']
+
+
+class TestClientRouting:
+    """Test node routing and name lookups against a multi-node stand-in"""
+
+    def test_sync_routing(self):
+        pve = cluster()
+        with pve.background():
+            api = ProxmoxAPI(pve.config(node=None))
+
+            assert api.get_vm_status(101)['status'] == 'running'
+            assert api.get_vm_status(102)['status'] == 'stopped'
+            assert api.find_vm('web') == 100
+            assert pve.stats[RESOURCES_ROUTE] == 1
+
+            # A migrated VM fails once, then the index is reloaded
+            pve.migrate_vm(101, 'pve3')
+            assert api.get_vm_status(101) is None
+            assert api.get_vm_status(101)['vmid'] == 101
+            assert pve.stats[RESOURCES_ROUTE] == 2
+
+    def test_fixed_node_unchanged(self):
+        pve = cluster()
+        with pve.background():
+            api = ProxmoxAPI(pve.config(node='pve1'))
+
+            assert api.get_vm_status(100)['vmid'] == 100
+            assert api.get_vm_status(101) is None
+            assert pve.stats[RESOURCES_ROUTE] == 0
+
+            # An explicitly loaded index is still used for routing
+            assert api.refresh_index() is True
+            assert api.get_vm_status(101)['vmid'] == 101
+
+    def test_async_client_built_outside_a_loop(self):
+        pve = cluster()
+        with pve.background():
+            api = ProxmoxAPIAsync(pve.config(node=None))
+
+            async def statuses():
+                try:
+                    return await asyncio.gather(*(api.get_vm_status(vm_id) for vm_id in (100, 101, 102)))
+                finally:
+                    await api.close()
+
+            # The index lock is created in the loop that contends on it
+            assert all(asyncio.run(statuses()))
+            assert pve.stats[RESOURCES_ROUTE] == 1
+
+    @pytest.mark.asyncio
+    async def test_async_routing(self):
+        async with cluster() as pve:
+            async with ProxmoxAPIAsync(pve.config(node=None, index_refresh=60)) as api:
+                statuses = await api.batch_vm_status([100, 101, 102])
+                assert {vm_id: s['status'] for vm_id, s in statuses.items()} == \
+                    {100: 'running', 101: 'running', 102: 'stopped'}
+                # Concurrent callers share one index load
+                assert pve.stats[RESOURCES_ROUTE] == 1
+
+                assert await api.find_vm('db') == 101
+                assert [vm['vmid'] for vm in api.cluster_index.with_tag('prod')] == [100, 101]
+
+                # A VM created after the last refresh triggers one reload
+                pve.add_vm(200, node='pve2')
+                await asyncio.sleep(1.0)
+                assert (await api.get_vm_status(200))['vmid'] == 200
+                assert pve.stats[RESOURCES_ROUTE] == 2
+                assert pve.stats[STATUS_ROUTE] == 4
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
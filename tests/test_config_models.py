@@ -78,6 +78,23 @@ class TestProxmoxConfig:
             )
 
 
+    def test_api_token_credentials(self):
+        """Test API token validation with the clients' token parser"""
+        base = dict(host="192.168.1.100", username="root@pam", node="proxmox-node")
+        
+        assert ProxmoxConfig(**base, api_token="ci@pve!deploy=abc").password is None
+        assert ProxmoxConfig(**base, token_id="deploy", token_secret="abc").token_id == "deploy"
+        
+        with pytest.raises(ValidationError, match="Invalid API token ID"):
+            ProxmoxConfig(**base, api_token="ci@pve=abc")
+        with pytest.raises(ValidationError, match="secret cannot be empty"):
+            ProxmoxConfig(**base, api_token="ci@pve!deploy")
+        with pytest.raises(ValidationError, match="token_secret is required"):
+            ProxmoxConfig(**base, token_id="deploy")
+        with pytest.raises(ValidationError, match="Either password, api_token"):
+            ProxmoxConfig(**base)
+
+
 class TestVMConfig:
     """Test VMConfig model validation"""
     
@@ -0,0 +1,157 @@
+"""
+Tests for distributed_probe.py
+"""
+
+import pytest
+import asyncio
+import json
+import socket
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.distributed_probe import DistributedProber, ReachabilityMatrix
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn
+from tests.tls_fleet import TLSFleetSimulator, SimulatedHost
+
+
+def closed_port():
+    """A loopback port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def fleet():
+    hosts = [SimulatedHost('127.0.6.1', cert_state='expired'), SimulatedHost('127.0.6.2')]
+    with TLSFleetSimulator(hosts) as fleet:
+        yield fleet
+
+
+async def isolated_vlan(argv, input_data):
+    """Guest on a VLAN that only reaches the first target"""
+    await asyncio.sleep(0.3)
+    targets = json.loads(argv[3])
+    return 0, json.dumps([
+        {'host': t['host'], 'ping': False, 'port_open': i == 0, 'rtt': 0.002 if i == 0 else None,
+         'cert': None} for i, t in enumerate(targets)
+    ]), ''
+
+
+async def broken_python(argv, input_data):
+    return 1, '', 'python3: not found'
+
+
+@pytest.fixture
+async def pve():
+    async with PVEStandIn() as pve:
+        pve.add_vm(100)
+        pve.add_vm(101, exec_handler=isolated_vlan)
+        pve.add_vm(102, agent=False)
+        pve.add_vm(103, exec_handler=broken_python)
+        yield pve
+
+
+@pytest.fixture
+async def api(pve):
+    async with ProxmoxAPIAsync(pve.config()) as api:
+        yield api
+
+
+class TestGuestExec:
+    """Test the guest agent calls on ProxmoxAPIAsync"""
+
+    @pytest.mark.asyncio
+    async def test_exec_and_status(self, api):
+        started = await api.execute_vm_command(100, [sys.executable, '-c', 'print("hi")'])
+        assert 'pid' in started
+
+        for _ in range(50):
+            status = await api.get_vm_exec_status(100, started['pid'])
+            if status['exited']:
+                break
+            await asyncio.sleep(0.05)
+
+        assert status['exitcode'] == 0
+        assert status['out-data'] == 'hi\n'
+
+    @pytest.mark.asyncio
+    async def test_exec_without_agent(self, api):
+        assert await api.execute_vm_command(102, 'true') is None
+
+
+class TestDistributedProber:
+    """Test fan-out and matrix merging against the PVE stand-in"""
+
+    @pytest.mark.asyncio
+    async def test_reachability_matrix(self, api, pve, fleet):
+        targets = fleet.targets() + [{'host': '127.0.0.1', 'port': closed_port()}]
+        prober = DistributedProber(api, python=sys.executable, timeout=1.0, poll_interval=0.05)
+
+        matrix = await prober.probe([100, 101, 102, 103], targets, ping_count=0,
+                                    local_results={'127.0.6.1': {'port_open': True}})
+
+        assert matrix.sources == ['local', 'vm:100', 'vm:101', 'vm:102', 'vm:103']
+        assert matrix.reachable('vm:100', '127.0.6.1')
+        assert matrix.reachable('vm:100', '127.0.6.2')
+        assert not matrix.reachable('vm:100', '127.0.0.1')
+        assert matrix.get('vm:100', '127.0.6.1')['ssl_cert']['expired'] is True
+        assert matrix.get('vm:100', '127.0.6.2')['ssl_cert']['expired'] is False
+
+        assert matrix.sources_for('127.0.6.2') == ['vm:100']
+        assert matrix.sources_for('127.0.6.1') == ['local', 'vm:100', 'vm:101']
+        assert matrix.unreachable_targets() == ['127.0.0.1']
+
+        assert 'guest agent exec failed' in matrix.errors['vm:102']
+        assert 'not found' in matrix.errors['vm:103']
+        assert 'error:' in matrix.format_table()
+        json.dumps(matrix.to_dict())
+
+    @pytest.mark.asyncio
+    async def test_guests_run_concurrently_with_adaptive_polling(self, api, pve):
+        for vmid in range(200, 208):
+            pve.add_vm(vmid, exec_handler=isolated_vlan)
+        prober = DistributedProber(api, poll_interval=0.02, max_poll_interval=0.1)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        matrix = await prober.probe(list(range(200, 208)), [{'host': 'bmc'}], ping_count=0)
+        elapsed = loop.time() - started
+
+        assert len(matrix.sources) == 8 and not matrix.errors
+        # Eight 0.3 s guests finish in far less than their serial time
+        assert elapsed < 1.5
+        polls = pve.stats['GET /api2/json/nodes/{node}/qemu/{vmid}/agent/exec-status']
+        assert 8 <= polls <= 8 * 12
+
+    @pytest.mark.asyncio
+    async def test_exec_timeout(self, api, pve):
+        async def hang(argv, input_data):
+            await asyncio.sleep(10)
+
+        pve.add_vm(300, exec_handler=hang)
+        prober = DistributedProber(api, exec_timeout=0.3, poll_interval=0.05)
+
+        matrix = await prober.probe([300], [{'host': 'bmc'}])
+        assert 'still running' in matrix.errors['vm:300']
+
+
+class TestReachabilityMatrix:
+    """Test matrix bookkeeping"""
+
+    def test_add_results(self):
+        matrix = ReachabilityMatrix()
+        matrix.add_results('a', {'t1': {'port_open': True}, 't2': {'port_open': False}})
+        matrix.add_results('b', {'t2': {'port_open': True}})
+
+        assert matrix.targets == ['t1', 't2']
+        assert matrix.sources_for('t2') == ['b']
+        assert matrix.get('b', 't1') is None
+        assert matrix.to_dict()['matrix']['b'] == {'t2': {'port_open': True}}
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,180 @@
+"""
+Tests for guest_exec.py
+"""
+
+import pytest
+import asyncio
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.guest_exec import GuestExecError, batch_script, build_argv, split_batch_output
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn
+
+EXEC_ROUTE = 'POST /api2/json/nodes/{node}/qemu/{vmid}/agent/exec'
+STATUS_ROUTE = 'GET /api2/json/nodes/{node}/qemu/{vmid}/agent/exec-status'
+
+
+def sleeper(seconds, output='done\n'):
+    """Exec handler for a guest command taking a fixed time"""
+    async def handler(argv, input_data):
+        await asyncio.sleep(seconds)
+        return 0, output, ''
+    return handler
+
+
+@pytest.fixture
+async def pve():
+    async with PVEStandIn() as pve:
+        pve.add_vm(100)
+        pve.add_vm(101)
+        pve.add_vm(102, agent=False)
+        yield pve
+
+
+@pytest.fixture
+async def api(pve):
+    async with ProxmoxAPIAsync(pve.config(exec_timeout=10)) as api:
+        api.guest_exec.poll_interval = 0.02
+        yield api
+
+
+class TestBatchScript:
+    """Test the batch wrapper without a guest"""
+
+    def test_build_argv(self):
+        assert build_argv('echo hi') == ['/bin/sh', '-c', 'echo hi']
+        assert build_argv(['uname', '-r']) == ['uname', '-r']
+        with pytest.raises(ValueError):
+            build_argv([])
+
+    @pytest.mark.asyncio
+    async def test_split_output_of_real_shell(self):
+        marker = '__M'
+        script = batch_script(['echo one', ['printf', 'no newline'], 'echo err >&2; exit 3', 'true'], marker)
+        process = await asyncio.create_subprocess_exec('/bin/sh', '-c', script, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await process.communicate()
+
+        parts = split_batch_output(stdout.decode(), stderr.decode(), marker, 4)
+
+        assert [p['exitcode'] for p in parts] == [0, 0, 3, 0]
+        assert parts[0]['stdout'] == 'one\n'
+        assert parts[1]['stdout'] == 'no newline'
+        assert parts[2]['stderr'] == 'err\n' and parts[2]['stdout'] == ''
+
+    @pytest.mark.asyncio
+    async def test_stop_on_error(self):
+        script = batch_script(['false', 'echo never'], '__M', stop_on_error=True)
+        process = await asyncio.create_subprocess_exec('/bin/sh', '-c', script, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await process.communicate()
+        parts = split_batch_output(stdout.decode(), stderr.decode(), '__M', 2)
+        assert parts[0]['exitcode'] == 1 and not parts[1]['ran']
+
+
+class TestGuestExecutor:
+    """Test the exec pipeline against the API stand-in"""
+
+    @pytest.mark.asyncio
+    async def test_argv_output_and_exit_code(self, api):
+        result = await api.run_vm_command(100, [sys.executable, '-c', 'import sys; print("out"); '
+                                                                       'print("err", file=sys.stderr); sys.exit(4)'])
+        assert result.exitcode == 4 and not result.ok
+        assert result.stdout == 'out\n' and result.stderr == 'err\n'
+        with pytest.raises(GuestExecError, match='exit code 4'):
+            result.check()
+
+    @pytest.mark.asyncio
+    async def test_script_and_stdin(self, api):
+        result = await api.run_vm_command(100, 'read line; echo "got $line"; echo "$0"', stdin='hello\n')
+        assert result.check().stdout == 'got hello\n/bin/sh\n'
+
+    @pytest.mark.asyncio
+    async def test_agent_missing(self, api):
+        result = await api.run_vm_command(102, 'true')
+        assert result.error == 'guest agent exec failed'
+        with pytest.raises(GuestExecError):
+            result.check()
+
+    @pytest.mark.asyncio
+    async def test_timeout(self, api, pve):
+        pve.exec_handlers[101] = sleeper(10)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await api.run_vm_command(101, 'sleep 10', timeout=0.3)
+        assert result.timed_out and loop.time() - started < 1.0
+        with pytest.raises(GuestExecError, match='still running'):
+            result.check()
+
+    @pytest.mark.asyncio
+    async def test_polling_adapts_to_expected_runtime(self, api, pve):
+        pve.exec_handlers[100] = sleeper(0.4)
+        api.guest_exec.max_poll_interval = 1.0
+        first = await api.run_vm_command(100, ['job'])
+        # Learned runtime: the next run's first poll lands near the exit
+        second = await api.run_vm_command(100, ['job'])
+        assert first.ok and second.ok
+        assert second.polls < first.polls and second.polls <= 3
+
+    @pytest.mark.asyncio
+    async def test_learned_runtimes_are_bounded(self, api, pve):
+        executor = api.guest_exec
+        for _ in range(5):
+            await executor.run_batch(100, ['true', 'echo a'])
+        # Batches are learned under their commands, not their one-off script
+        assert list(executor._expected) == ["batch:[['/bin/sh', '-c', 'true'], ['/bin/sh', '-c', 'echo a']]"]
+
+        executor.max_learned = 3
+        for name in ['a', 'b', 'c', 'd']:
+            await executor.run(100, [name])
+        assert list(executor._expected) == ['b', 'c', 'd']
+
+    @pytest.mark.asyncio
+    async def test_many_vms_with_per_vm_timeouts(self, api, pve):
+        for vmid in range(200, 212):
+            pve.add_vm(vmid, exec_handler=sleeper(0.2 if vmid != 205 else 10, f"vm{vmid}\n"))
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await api.run_vm_commands(list(range(200, 212)) + [102], ['hostname'], timeout=0.8)
+        elapsed = loop.time() - started
+
+        assert list(results) == list(range(200, 212)) + [102]
+        assert results[201].stdout == 'vm201\n'
+        assert results[205].timed_out and results[102].error
+        assert sum(r.ok for r in results.values()) == 11
+        assert elapsed < 1.5  # concurrent, and bounded by the timeout of the slow VM
+
+    @pytest.mark.asyncio
+    async def test_stream_results(self, api, pve):
+        pve.exec_handlers[100] = sleeper(0.3)
+        pve.exec_handlers[101] = sleeper(0.05)
+        order = [result.vm_id async for result in api.guest_exec.as_completed([100, 101], ['x'])]
+        assert order == [101, 100]
+
+    @pytest.mark.asyncio
+    async def test_batch_uses_one_exec(self, api, pve):
+        results = await api.guest_exec.run_batch(100, ['uname -s', ['printf', '%s', 'a b'], 'exit 2', 'echo x >&2'])
+
+        assert pve.stats[EXEC_ROUTE] == 1
+        assert results[0].stdout.strip() == os.uname().sysname
+        assert results[1].stdout == 'a b'
+        assert results[2].exitcode == 2 and not results[2].ok
+        assert results[3].stderr == 'x\n' and results[3].ok
+
+    @pytest.mark.asyncio
+    async def test_batch_across_vms(self, api, pve):
+        results = await api.guest_exec.run_batch_many([100, 101, 102], ['echo a', 'false', 'echo b'],
+                                                      stop_on_error=True)
+        assert [r.exitcode for r in results[100]] == [0, 1, None]
+        assert results[100][2].error == 'skipped'
+        assert results[101][0].stdout == 'a\n'
+        assert all(r.error == 'guest agent exec failed' for r in results[102])
+        assert pve.stats[EXEC_ROUTE] == 3
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
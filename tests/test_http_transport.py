@@ -0,0 +1,203 @@
+"""
+Tests for http_transport.py
+"""
+
+import pytest
+import json
+import ssl
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.http_transport import ResilientTransport, CircuitBreaker, CircuitOpenError, endpoint_key
+from lib.proxmox_api import ProxmoxAPI
+from lib.network_tools import NetworkValidator
+from tests.tls_fleet import make_self_signed_cert, write_cert_pair, TLSFleetSimulator, SimulatedHost
+
+
+class FlakyServer:
+    """TLS HTTP server whose behaviour is scripted per request"""
+
+    def __init__(self):
+        self.script = []  # ('ok'|'503'|'hang', ...) consumed per request; default 'ok'
+        self.hits = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _respond(self):
+                server.hits.append((self.command, self.path))
+                action = server.script.pop(0) if server.script else 'ok'
+                if action == 'hang':
+                    time.sleep(1.0)
+                status = 503 if action == '503' else 200
+                body = json.dumps({'data': {'path': self.path, 'ticket': 'PVE:t', 'CSRFPreventionToken': 'c'}})
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body.encode())
+                except OSError:
+                    pass
+
+            def do_GET(self):
+                self._respond()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                self._respond()
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        cert_pem, key_pem = make_self_signed_cert('flaky.test')
+        cert_file, key_file = write_cert_pair(Path(self.tmpdir.name), 'flaky', cert_pem, key_pem)
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert_file, key_file)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+        self.port = self.httpd.server_address[1]
+        self.url = f"https://127.0.0.1:{self.port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.tmpdir.cleanup()
+
+
+@pytest.fixture
+def server():
+    server = FlakyServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def transport():
+    transport = ResilientTransport(timeout=0.3, max_retries=2, backoff_base=0.01,
+                                   breaker_threshold=3, breaker_reset=0.2, verify=False)
+    yield transport
+    transport.close()
+
+
+class TestResilientTransport:
+    """Test retries, timeouts and breakers against a scripted server"""
+
+    def test_idempotent_retry_on_503(self, server, transport):
+        server.script = ['503', '503']
+
+        response = transport.get(f"{server.url}/api2/json/version")
+
+        assert response.status_code == 200
+        assert len(server.hits) == 3
+        assert transport.stats['retries'] == 2
+
+    def test_post_not_retried(self, server, transport):
+        server.script = ['503']
+
+        response = transport.post(f"{server.url}/api2/json/nodes/pve/qemu/100/status/start")
+
+        assert response.status_code == 503
+        assert len(server.hits) == 1
+        assert transport.stats['retries'] == 0
+
+    def test_read_timeout_bounds_hung_call(self, server, transport):
+        server.script = ['hang'] * 3
+
+        started = time.monotonic()
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            transport.get(f"{server.url}/slow")
+
+        assert time.monotonic() - started < 2.0
+        assert transport.stats['retries'] == 2
+
+    def test_breaker_opens_and_recovers(self, server, transport):
+        transport.max_retries = 0
+        server.script = ['503'] * 3
+        url = f"{server.url}/api2/json/nodes/pve/qemu/100/status/current"
+
+        for _ in range(3):
+            assert transport.get(url).status_code == 503
+        assert transport.stats['breaker_trips'] == 1
+
+        # Same endpoint for another VM is rejected without touching the server
+        with pytest.raises(CircuitOpenError):
+            transport.get(url.replace('/100/', '/101/'))
+        assert len(server.hits) == 3
+        assert transport.stats['breaker_rejections'] == 1
+
+        # Other endpoints are unaffected
+        assert transport.get(f"{server.url}/api2/json/version").status_code == 200
+
+        time.sleep(0.25)
+        assert transport.get(url).status_code == 200
+        assert transport.breaker_for('GET', url).state == 'closed'
+
+    def test_endpoint_key(self):
+        assert endpoint_key('get', 'https://h:8006/api2/json/nodes/pve/qemu/101/status/current') == \
+            'GET h:8006/api2/json/nodes/pve/qemu/{id}/status/current'
+
+    def test_failed_trial_reopens_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        assert breaker.record_failure() is True
+        assert not breaker.allow()
+
+        time.sleep(0.06)
+        assert breaker.allow()
+        assert not breaker.allow()  # only one trial at a time
+        assert breaker.record_failure() is True
+        assert breaker.state == 'open'
+
+
+class TestClientsUseTransport:
+    """Test ProxmoxAPI and NetworkValidator wiring"""
+
+    def test_timeouts_from_config(self):
+        api = ProxmoxAPI({'host': '10.0.0.1', 'timeout': 45, 'pool_size': 4})
+        assert api.transport.timeout == (10, 45)
+        assert api.session is api.transport.session
+        assert api.session.get_adapter('https://10.0.0.1')._pool_maxsize == 4
+
+        assert ProxmoxAPI({'host': '10.0.0.1', 'timeout': 5}).transport.timeout == (5, 5)
+
+    def test_hung_pveproxy_does_not_freeze(self, server):
+        api = ProxmoxAPI({'host': '127.0.0.1', 'port': server.port, 'username': 'root@pam',
+                          'password': 'x', 'node': 'pve', 'timeout': 0.3, 'max_retries': 1})
+        api.transport.backoff_base = 0.01
+        assert api.authenticate() is True
+
+        server.script = ['hang', 'hang']
+        started = time.monotonic()
+        assert api.get_vm_status(100) is None
+        assert time.monotonic() - started < 2.0
+        assert api.transport.stats['retries'] == 1
+
+        assert api.list_vms()['path'] == '/api2/json/nodes/pve/qemu'
+
+    def test_network_validator_http_calls(self, monkeypatch):
+        validator = NetworkValidator()
+        validator.timeout = 2
+        monkeypatch.setattr(validator, 'ping_host', lambda host, count=4: True)
+        hosts = [SimulatedHost('127.0.7.1', idrac=True)]
+
+        with TLSFleetSimulator(hosts):
+            assert validator.validate_idrac_connection(hosts[0].address, port=hosts[0].port) is True
+
+        assert validator.transport.stats['requests'] == 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
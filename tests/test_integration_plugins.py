@@ -384,12 +384,27 @@ class TestProxmoxPlugin:
         assert "backup" in metadata.capabilities
     
     @pytest.mark.asyncio
-    async def test_proxmox_deploy(self, proxmox_plugin):
-        """Test VM deployment"""
-        result = await proxmox_plugin.execute("deploy")
+    async def test_proxmox_deploy(self):
+        """Test VM deployment from a template"""
+        from tests.pve_standin import PVEStandIn
+        
+        async with PVEStandIn(task_duration=0.05) as pve:
+            pve.add_vm(9000, name="debian-tmpl", template=True)
+            plugin = ProxmoxPlugin(dict(pve.config(), template="debian-tmpl"))
+            result = await plugin.execute("deploy", name="ts", count=2, cores=4, wait_agent=False)
         
         assert result["status"] == "deployed"
-        assert "vmid" in result
+        assert result["vmids"] == [100, 101] and result["vmid"] == 100
+        assert [pve.vms[vmid]["name"] for vmid in result["vmids"]] == ["ts-1", "ts-2"]
+        assert pve.vms[100]["maxcpu"] == 4 and pve.vms[100]["status"] == "running"
+    
+    @pytest.mark.asyncio
+    async def test_proxmox_deploy_needs_template(self, proxmox_plugin):
+        """Test deployment without a template"""
+        result = await proxmox_plugin.execute("deploy")
+        
+        assert result["status"] == "failed"
+        assert "template" in result["error"]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+"""
+Tests for json_stream.py and the streaming listings of ProxmoxAPIAsync
+"""
+
+import pytest
+import json
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.json_stream import JSONStreamError, iter_json_array
+from lib.proxmox_api_async import ProxmoxAPIAsync, ProxmoxAPIError
+from tests.pve_standin import PVEStandIn
+
+TICKET_ROUTE = 'POST /api2/json/access/ticket'
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def decode(document, size=7, member='data'):
+    data = document if isinstance(document, bytes) else json.dumps(document).encode()
+    return [item async for item in iter_json_array(chunked(data, size), member)]
+
+
+class TestIterJsonArray:
+    """Test the incremental decoder on split documents"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('size', [1, 2, 3, 5, 64, 1 << 16])
+    async def test_every_split_point(self, size):
+        items = [{'vmid': 100, 'name': 'vm-ä€😀', 'tags': ['a', 'b']}, 12345, -1.5e-3, 'x', None, True, [], {}]
+        document = {'total': 8, 'meta': {'nested': [1, {'data': 'not this'}]}, 'data': items, 'after': 1}
+        assert await decode(document, size) == items
+
+    @pytest.mark.asyncio
+    async def test_numbers_are_not_cut_at_chunk_ends(self):
+        assert await decode(b'{"data": [1234567, 89]}', size=4) == [1234567, 89]
+
+    @pytest.mark.asyncio
+    async def test_whitespace_and_empty(self):
+        assert await decode(b' \n{ "data" :\t[ 1 ,\n2 ] }\n', size=3) == [1, 2]
+        assert await decode(b'{"data": []}') == []
+        assert await decode(b'{"data": null, "message": "x"}') == []
+        assert await decode(b'{}') == []
+        assert await decode(b'{"other": [1]}') == []
+
+    @pytest.mark.asyncio
+    async def test_other_member(self):
+        assert await decode({'data': [1], 'errors': [2, 3]}, member='errors') == [2, 3]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('document', [b'[1, 2]', b'{"data": {"a": 1}}', b'{"data": [1, 2',
+                                          b'{"data": [1 2]}', b'{"data": [{"a": tru}]}', b''])
+    async def test_malformed(self, document):
+        with pytest.raises(JSONStreamError):
+            await decode(document)
+
+    @pytest.mark.asyncio
+    async def test_items_are_yielded_before_the_end(self):
+        received = []
+
+        async def slow_chunks():
+            yield b'{"data": [{"a": 1}, '
+            # The first item is available before the rest arrives
+            assert received == [{'a': 1}]
+            yield b'{"a": 2}]}'
+
+        async for item in iter_json_array(slow_chunks()):
+            received.append(item)
+        assert received == [{'a': 1}, {'a': 2}]
+
+
+class TestClientStreams:
+    """Test streamed listings against the API stand-in"""
+
+    @pytest.fixture
+    async def pve(self):
+        async with PVEStandIn(nodes=['pve1', 'pve2'], node='pve1') as pve:
+            for vmid in range(100, 400):
+                pve.add_vm(vmid, node=f"pve{vmid % 2 + 1}")
+            yield pve
+
+    @pytest.mark.asyncio
+    async def test_matches_the_buffered_path(self, pve):
+        async with ProxmoxAPIAsync(pve.config(node=None)) as api:
+            buffered = await api.get_cluster_resources('vm')
+            streamed = [r async for r in api.stream_cluster_resources('vm')]
+            assert streamed == buffered and len(streamed) == 300
+
+            rows = [row async for row in api.stream_vm_rrddata(101, 'day')]
+            assert rows == await api.get_vm_rrddata(101, 'day')
+
+            await api.start_vm(100)
+            assert [t['type'] async for t in api.stream_cluster_tasks()] == ['qmstart']
+
+    @pytest.mark.asyncio
+    async def test_early_exit_and_connection_reuse(self, pve):
+        async with ProxmoxAPIAsync(pve.config(node=None)) as api:
+            async for resource in api.stream_cluster_resources():
+                break
+            assert resource['type'] == 'node'
+            assert len([r async for r in api.stream_cluster_resources('node')]) == 2
+
+    @pytest.mark.asyncio
+    async def test_errors_and_reauthentication(self, pve):
+        async with ProxmoxAPIAsync(pve.config(node=None)) as api:
+            with pytest.raises(ProxmoxAPIError, match='does not exist'):
+                async for _ in api.stream('/nodes/pve1/qemu/101/rrddata'):
+                    pass
+
+            pve.revoke_tickets()
+            assert len([r async for r in api.stream_cluster_resources('vm')]) == 300
+            assert pve.stats[TICKET_ROUTE] == 2
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
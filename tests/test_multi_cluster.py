@@ -0,0 +1,156 @@
+"""
+Tests for multi_cluster.py and the clusters list of TimeShiftConfig
+"""
+
+import pytest
+import asyncio
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.config_models import TimeShiftConfig, validate_config_security
+from lib.multi_cluster import MultiClusterManager, TIMESHIFT_TAG
+from tests.pve_standin import PVEStandIn
+
+RESOURCES_ROUTE = 'GET /api2/json/cluster/resources'
+TICKET_ROUTE = 'POST /api2/json/access/ticket'
+
+
+def config_data(**proxmox_blocks):
+    data = {
+        "vm": {"name": "test-vm"},
+        "network": {"bridge": "vmbr0"},
+        "time": {"timezone": "UTC"},
+        "idrac": {"default_username": "root"},
+        "logging": {"level": "INFO"},
+    }
+    data.update(proxmox_blocks)
+    return data
+
+
+def cluster(name, host, **options):
+    block = {"name": name, "host": host, "username": "root@pam", "password": "secure_password_123",
+             "node": "pve1"}
+    block.update(options)
+    return block
+
+
+class TestClusterConfig:
+    """Test the clusters list of the configuration model"""
+
+    def test_clusters_list(self):
+        config = TimeShiftConfig(**config_data(clusters=[
+            cluster("east", "10.0.0.1"), cluster("west", "pve.west.example.com", query_timeout=2.5)
+        ]))
+        assert config.proxmox is None
+        assert [c.name for c in config.cluster_configs()] == ["east", "west"]
+        assert config.clusters[1].query_timeout == 2.5 and config.clusters[0].query_timeout == 10.0
+
+    def test_single_block_is_the_default_cluster(self):
+        single = {k: v for k, v in cluster("x", "10.0.0.1").items() if k != "name"}
+        config = TimeShiftConfig(**config_data(proxmox=single, clusters=[cluster("west", "10.0.0.2")]))
+        assert [c.name for c in config.cluster_configs()] == ["default", "west"]
+        assert config.cluster_configs()[0].password == single["password"]
+
+    def test_invalid_cluster_lists(self):
+        with pytest.raises(ValueError, match="proxmox or clusters"):
+            TimeShiftConfig(**config_data())
+        with pytest.raises(ValueError, match="Duplicate cluster names: east"):
+            TimeShiftConfig(**config_data(clusters=[cluster("east", "10.0.0.1"), cluster("east", "10.0.0.2")]))
+        with pytest.raises(ValueError):
+            TimeShiftConfig(**config_data(clusters=[cluster("bad name", "10.0.0.1")]))
+
+    def test_security_checks_every_cluster(self):
+        config = TimeShiftConfig(**config_data(clusters=[
+            cluster("east", "10.0.0.1", verify_ssl=True), cluster("west", "10.0.0.2")
+        ]))
+        assert "SSL verification disabled for Proxmox" in validate_config_security(config)
+
+
+class TestMultiClusterManager:
+    """Test fan-out queries against several API stand-ins"""
+
+    @pytest.fixture
+    async def sites(self):
+        async with PVEStandIn(nodes=['pve1', 'pve2'], node='pve1') as east, \
+                PVEStandIn(nodes=['pve1'], node='pve1') as west, \
+                PVEStandIn(nodes=['pve1'], node='pve1') as south:
+            for i, pve in enumerate((east, west, south)):
+                first = 100 + 1000 * i
+                pve.add_vms(20, first_vmid=first)
+                pve.add_vm(first + 50, name='ts-shared', tags=[TIMESHIFT_TAG], status='stopped')
+                pve.add_vm(first + 51, name=f"ts-{i}", tags=[TIMESHIFT_TAG, 'lab'])
+            yield {'east': east, 'west': west, 'south': south}
+
+    @pytest.fixture
+    async def manager(self, sites):
+        clusters = [dict(pve.config(node=None), name=name, query_timeout=2.0) for name, pve in sites.items()]
+        async with MultiClusterManager(clusters) as manager:
+            yield manager
+
+    @pytest.mark.asyncio
+    async def test_find_vm_everywhere(self, manager):
+        result = await manager.find_vm('ts-shared')
+
+        assert result.ok and list(result.results) == ['east', 'west', 'south']
+        assert [(vm['cluster'], vm['vmid']) for vm in result.merged()] == [
+            ('east', 150), ('west', 1150), ('south', 2150)]
+        assert not (await manager.find_vm('missing')).merged()
+
+    @pytest.mark.asyncio
+    async def test_timeshift_status_is_fresh(self, manager, sites):
+        result = await manager.timeshift_status()
+        assert sorted((vm['cluster'], vm['vmid'], vm['status']) for vm in result.merged()) == [
+            ('east', 150, 'stopped'), ('east', 151, 'running'), ('south', 2150, 'stopped'),
+            ('south', 2151, 'running'), ('west', 1150, 'stopped'), ('west', 1151, 'running')]
+
+        sites['west'].vms[1150]['status'] = 'running'
+        result = await manager.timeshift_status(clusters=['west'])
+        assert {vm['vmid']: vm['status'] for vm in result.merged()} == {1150: 'running', 1151: 'running'}
+        assert sites['west'].stats[RESOURCES_ROUTE] == 2
+
+    @pytest.mark.asyncio
+    async def test_slow_cluster_does_not_stall_the_answer(self, manager, sites):
+        sites['south'].latency = 5.0
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await manager.find_vm('ts-shared', timeout=0.5)
+        elapsed = loop.time() - started
+
+        assert elapsed < 1.5
+        assert result.timed_out == ['south'] and 'within 0.5s' in result.errors['south']
+        assert [vm['cluster'] for vm in result.merged()] == ['east', 'west']
+        assert result.summary()['answered'] == ['east', 'west']
+
+        # The others answer first when streamed
+        order = [item.cluster async for item in manager.as_completed(
+            'ping', lambda name, api: api.get_cluster_resources('node'), timeout=0.5)]
+        assert order[-1] == 'south'
+
+    @pytest.mark.asyncio
+    async def test_failures_are_per_cluster(self, manager, sites):
+        sites['east'].inject_errors(1.0, status=500, routes=[RESOURCES_ROUTE])
+        result = await manager.timeshift_status()
+
+        assert list(result.errors) == ['east'] and not result.timed_out
+        assert len(result.merged()) == 4
+
+    @pytest.mark.asyncio
+    async def test_clients_are_pooled_per_cluster(self, manager, sites):
+        await asyncio.gather(*(manager.timeshift_status() for _ in range(5)))
+        assert all(pve.stats[TICKET_ROUTE] == 1 for pve in sites.values())
+        with pytest.raises(KeyError, match='Unknown cluster'):
+            await manager.find_vm('x', clusters=['north'])
+
+    def test_from_config(self):
+        config = TimeShiftConfig(**config_data(clusters=[cluster("east", "10.0.0.1", query_timeout=3)]))
+        manager = MultiClusterManager.from_config(config)
+        assert manager.names == ['east'] and manager.timeouts == {'east': 3.0}
+        assert manager.client('east').host == '10.0.0.1'
+        with pytest.raises(ValueError, match='Duplicate'):
+            MultiClusterManager([cluster('a', '10.0.0.1'), cluster('a', '10.0.0.2')])
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
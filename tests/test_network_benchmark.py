@@ -0,0 +1,159 @@
+"""
+Fleet simulation tests and throughput benchmark for NetworkValidator
+"""
+
+import pytest
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.network_tools import NetworkValidator
+from tests.tls_fleet import TLSFleetSimulator, SimulatedHost, build_fleet
+
+BENCH_HOSTS = int(os.environ.get('TIMESHIFT_BENCH_HOSTS', '1000'))
+BENCH_WORKERS = int(os.environ.get('TIMESHIFT_BENCH_WORKERS', '64'))
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(label, durations, elapsed, unit='hosts'):
+    """Print and return throughput and latency figures"""
+    summary = {
+        'label': label,
+        unit: len(durations),
+        'elapsed_s': round(elapsed, 3),
+        f'throughput_{unit}_per_s': round(len(durations) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(durations, 50) * 1000, 2),
+        'p99_ms': round(percentile(durations, 99) * 1000, 2),
+    }
+    print(f"\n[bench] {summary}")
+    return summary
+
+
+@pytest.fixture
+def validator():
+    """NetworkValidator with a short timeout suited to loopback hosts"""
+    validator = NetworkValidator()
+    validator.timeout = 2
+    return validator
+
+
+class TestFleetSimulator:
+    """Functional checks of NetworkValidator against simulated hosts"""
+
+    def test_certificate_states(self, validator):
+        """Test that expired and not-yet-valid certificates are detected"""
+        hosts = [
+            SimulatedHost('127.0.3.1', cert_state='valid'),
+            SimulatedHost('127.0.3.2', cert_state='expired'),
+            SimulatedHost('127.0.3.3', cert_state='not_yet_valid'),
+        ]
+
+        with TLSFleetSimulator(hosts):
+            valid = validator.get_ssl_certificate_info(hosts[0].address, hosts[0].port)
+            expired = validator.get_ssl_certificate_info(hosts[1].address, hosts[1].port)
+            future = validator.get_ssl_certificate_info(hosts[2].address, hosts[2].port)
+
+        assert valid['expired'] is False and valid['not_yet_valid'] is False
+        assert valid['subject']['commonName'] == 'valid.fleet.local'
+        assert expired['expired'] is True
+        assert future['not_yet_valid'] is True
+
+    def test_dropped_connection(self, validator):
+        """Test that a host dropping every connection yields no certificate"""
+        hosts = [SimulatedHost('127.0.3.4', drop_rate=1.0)]
+
+        with TLSFleetSimulator(hosts):
+            assert validator.get_ssl_certificate_info(hosts[0].address, hosts[0].port) is None
+
+    def test_idrac_login_page(self, validator, monkeypatch):
+        """Test iDRAC validation against the simulated login page"""
+        monkeypatch.setattr(validator, 'ping_host', lambda host, count=4: True)
+        hosts = [
+            SimulatedHost('127.0.3.5', cert_state='expired', idrac=True),
+            SimulatedHost('127.0.3.6', idrac=True, http_status=500),
+        ]
+
+        with TLSFleetSimulator(hosts):
+            assert validator.validate_idrac_connection(hosts[0].address, port=hosts[0].port) is True
+            assert validator.validate_idrac_connection(hosts[1].address, port=hosts[1].port) is False
+
+    def test_suite_and_report(self, validator):
+        """Test concurrent suite execution and report generation"""
+        hosts = build_fleet(20, seed=7)
+
+        with TLSFleetSimulator(hosts) as fleet:
+            results = validator.test_connectivity_suite(fleet.targets(), max_workers=8, ping_count=1)
+
+        assert set(results) == {h.address for h in hosts}
+        assert all(r['port_open'] for r in results.values())
+        expired = [h.address for h in hosts if h.cert_state == 'expired']
+        assert all(results[h]['ssl_cert']['expired'] for h in expired)
+
+        report = validator.generate_connectivity_report(results)
+        assert report.count('Target:') == len(hosts)
+        assert 'EXPIRED' in report
+
+
+@pytest.mark.slow
+@pytest.mark.integration
+class TestFleetBenchmark:
+    """Throughput and p99 latency against a simulated fleet of BMCs"""
+
+    @pytest.fixture(scope='class')
+    def fleet(self):
+        hosts = build_fleet(BENCH_HOSTS, latency=0.005, drop_rate=0.01)
+        with TLSFleetSimulator(hosts) as fleet:
+            yield fleet
+
+    def test_bench_connectivity_suite(self, fleet):
+        validator = NetworkValidator()
+        validator.timeout = 2
+
+        started = time.monotonic()
+        results = validator.test_connectivity_suite(
+            fleet.targets(), max_workers=BENCH_WORKERS, ping_count=1
+        )
+        elapsed = time.monotonic() - started
+
+        assert len(results) == BENCH_HOSTS
+        summary = summarize('connectivity_suite', [r['duration'] for r in results.values()], elapsed)
+        assert summary['throughput_hosts_per_s'] > 0
+
+    def test_bench_certificate_fetch(self, fleet):
+        validator = NetworkValidator()
+        validator.timeout = 2
+        durations = []
+
+        started = time.monotonic()
+        for host in fleet.hosts:
+            t0 = time.monotonic()
+            validator.get_ssl_certificate_info(host.address, host.port)
+            durations.append(time.monotonic() - t0)
+        elapsed = time.monotonic() - started
+
+        summarize('certificate_fetch', durations, elapsed)
+
+    def test_bench_report_generation(self, fleet):
+        validator = NetworkValidator()
+        validator.timeout = 2
+        results = validator.test_connectivity_suite(
+            fleet.targets(), max_workers=BENCH_WORKERS, ping_count=1
+        )
+
+        durations = []
+        started = time.monotonic()
+        for _ in range(20):
+            t0 = time.monotonic()
+            validator.generate_connectivity_report(results)
+            durations.append(time.monotonic() - t0)
+        elapsed = time.monotonic() - started
+
+        summarize(f'report_generation_{len(results)}_hosts', durations, elapsed, unit='reports')
@@ -0,0 +1,154 @@
+"""
+Tests for probe_store.py
+"""
+
+import pytest
+import math
+from datetime import datetime, timedelta
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lib.probe_store as probe_store
+from lib.probe_store import ProbeResultStore, Bitset
+from lib.network_tools import NetworkValidator
+from lib.health_checks import HealthCheckFramework
+
+
+def make_result(ping=True, port_open=True, rtt=0.01, expired=False, idrac=None, when=None, not_yet_valid=False):
+    """Build a per-host result in test_connectivity_suite layout"""
+    result = {
+        'ping': ping,
+        'port_open': port_open,
+        'ssl_cert': {
+            'expired': expired,
+            'not_yet_valid': not_yet_valid,
+            'not_after': 'Jan 01 00:00:00 2020 GMT' if expired else 'Jan 01 00:00:00 2099 GMT',
+        } if port_open else None,
+        'timestamp': (when or datetime.now()).isoformat(),
+        'rtt': rtt if port_open else None,
+    }
+    if idrac is not None:
+        result['idrac_accessible'] = idrac
+    return result
+
+
+@pytest.fixture(params=['numpy', 'pure'])
+def store(request, monkeypatch):
+    """Run every test with and without NumPy"""
+    if request.param == 'pure':
+        monkeypatch.setattr(probe_store, 'np', None)
+    elif probe_store.np is None:
+        pytest.skip("NumPy not installed")
+
+    store = ProbeResultStore()
+    start = datetime(2024, 1, 1)
+    for run in range(3):
+        store.extend({
+            '10.0.0.1': make_result(rtt=0.010 * (run + 1), when=start + timedelta(minutes=run)),
+            '10.0.0.2': make_result(port_open=run != 2, when=start + timedelta(minutes=run)),
+            '10.0.0.3': make_result(expired=True, idrac=True, rtt=0.1, when=start + timedelta(minutes=run)),
+        })
+    return store
+
+
+class TestBitset:
+    """Test the bytearray bitset"""
+
+    def test_append_and_count(self):
+        bits = Bitset()
+        for i in range(20):
+            bits.append(i % 3 == 0)
+
+        assert len(bits) == 20
+        assert len(bits.data) == 3
+        assert bits[0] and bits[3] and not bits[1]
+        assert bits.count() == 7
+
+
+class TestProbeResultStore:
+    """Test the columnar probe store"""
+
+    def test_host_table_interned(self, store):
+        assert len(store) == 9
+        assert store.hosts == ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+        assert list(store.host_column) == [0, 1, 2] * 3
+
+    def test_latest_rows(self, store):
+        latest = {row.host: row for row in store.iter_latest()}
+
+        assert latest['10.0.0.1'].rtt == pytest.approx(0.03)
+        assert latest['10.0.0.2'].port_open is False
+        assert latest['10.0.0.3'].cert_expired is True
+        assert latest['10.0.0.3'].idrac_accessible is True
+
+    def test_up_ratios(self, store):
+        assert store.up_ratio('port_open') == pytest.approx(8 / 9)
+        assert store.up_ratio('port_open', latest_only=True) == pytest.approx(2 / 3)
+
+        ratios = store.host_up_ratios('port_open')
+        assert ratios['10.0.0.1'] == 1.0
+        assert ratios['10.0.0.2'] == pytest.approx(2 / 3)
+
+    def test_rtt_percentiles_ignore_missing(self, store):
+        pcts = store.rtt_percentiles((50, 100))
+
+        assert pcts['p100'] == pytest.approx(0.1)
+        assert 0.01 <= pcts['p50'] <= 0.1
+
+    def test_empty_store(self):
+        store = ProbeResultStore()
+
+        assert math.isnan(store.up_ratio())
+        assert math.isnan(store.rtt_percentiles()['p99'])
+        assert store.host_up_ratios() == {}
+
+    def test_to_results_round_trip(self, store):
+        results = store.to_results()
+
+        assert results['10.0.0.2']['port_open'] is False
+        assert results['10.0.0.3']['ssl_cert']['not_after'] == 'Jan 01 00:00:00 2020 GMT'
+        assert results['10.0.0.3']['idrac_accessible'] is True
+        assert 'idrac_accessible' not in results['10.0.0.1']
+        assert results['10.0.0.1']['ssl_cert']['not_yet_valid'] is False
+
+    def test_not_yet_valid_certificate(self, store):
+        store.append('10.0.0.4', make_result(not_yet_valid=True))
+        validator = NetworkValidator()
+
+        assert store.row(len(store) - 1).cert_not_yet_valid is True
+        assert store.to_results()['10.0.0.4']['ssl_cert']['not_yet_valid'] is True
+        for source in (store, store.to_results()):
+            report = validator.generate_connectivity_report(source)
+            assert report.count('NOT YET VALID') == 1
+
+    def test_report_from_store(self, store):
+        report = NetworkValidator().generate_connectivity_report(store)
+
+        assert report.count('Target:') == 3
+        assert 'Port Up: 66.7%' in report
+        assert 'EXPIRED' in report
+        assert 'Expires: Jan 01 00:00:00 2020 GMT' in report
+
+    def test_suite_appends_to_store(self, monkeypatch):
+        validator = NetworkValidator()
+        monkeypatch.setattr(validator, '_probe_target', lambda target, ping_count=4: make_result())
+        store = ProbeResultStore()
+
+        validator.test_connectivity_suite([{'host': 'a'}, {'host': 'b'}], store=store)
+        validator.test_connectivity_suite([{'host': 'a'}], store=store)
+
+        assert len(store) == 3
+        assert store.hosts == ['a', 'b']
+
+    def test_health_summary_reads_store(self, store):
+        framework = HealthCheckFramework()
+        summary = framework.get_summary(probe_store=store)
+
+        assert summary['fleet']['hosts'] == 3
+        assert summary['fleet']['port_up_ratio'] == pytest.approx(2 / 3)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
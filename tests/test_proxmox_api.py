@@ -15,6 +15,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from lib.proxmox_api import ProxmoxAPI
 from lib.proxmox_api_async import ProxmoxAPIAsync
+from lib.task_waiter import TaskHandle
 
 
 class TestProxmoxAPISync:
@@ -116,11 +117,15 @@ class TestProxmoxAPISync:
         
         mock_response = Mock()
         mock_response.raise_for_status = Mock()
+        mock_response.json.return_value = {
+            'data': 'UPID:proxmox-node:00001234:00005678:65A1B2C3:qmstart:100:root@pam:'
+        }
         mock_post.return_value = mock_response
         
         result = api.start_vm(100)
         
-        assert result is True
+        assert isinstance(result, TaskHandle)
+        assert result.task_type == 'qmstart' and result.vm_id == 100
         mock_post.assert_called_once()
     
     @patch('requests.Session.post')
@@ -130,11 +135,15 @@ class TestProxmoxAPISync:
         
         mock_response = Mock()
         mock_response.raise_for_status = Mock()
+        mock_response.json.return_value = {
+            'data': 'UPID:proxmox-node:00001234:00005678:65A1B2C3:qmstop:100:root@pam:'
+        }
         mock_post.return_value = mock_response
         
         result = api.stop_vm(100)
         
-        assert result is True
+        assert isinstance(result, TaskHandle)
+        assert result.task_type == 'qmstop' and result.vm_id == 100
         mock_post.assert_called_once()
     
     @patch('requests.Session.post')
@@ -144,17 +153,59 @@ class TestProxmoxAPISync:
         
         mock_response = Mock()
         mock_response.raise_for_status = Mock()
+        mock_response.json.return_value = {
+            'data': 'UPID:proxmox-node:00001234:00005678:65A1B2C3:qmsnapshot:100:root@pam:'
+        }
         mock_post.return_value = mock_response
         
         result = api.create_vm_snapshot(100, 'test_snapshot')
         
-        assert result is True
+        assert isinstance(result, TaskHandle)
+        assert result.task_type == 'qmsnapshot' and result.vm_id == 100
         mock_post.assert_called_once()
         
         # Check that snapshot data was sent
         call_args = mock_post.call_args
         assert call_args[1]['data']['snapname'] == 'test_snapshot'
     
+    @patch('requests.Session.get')
+    def test_list_vm_snapshots(self, mock_get, api):
+        """Test listing snapshots without the 'current' entry"""
+        api.ticket = 'test_ticket'
+        
+        mock_response = Mock()
+        mock_response.json.return_value = {
+            'data': [
+                {'name': 'pre-shift', 'snaptime': 1700000000},
+                {'name': 'current', 'parent': 'pre-shift'}
+            ]
+        }
+        mock_response.raise_for_status = Mock()
+        mock_get.return_value = mock_response
+        
+        result = api.list_vm_snapshots(100)
+        
+        assert [s['name'] for s in result] == ['pre-shift']
+        assert mock_get.call_args[0][0].endswith('/qemu/100/snapshot')
+    
+    @patch('requests.Session.delete')
+    def test_delete_vm_snapshot(self, mock_delete, api):
+        """Test deleting a VM snapshot"""
+        api.ticket = 'test_ticket'
+        
+        mock_response = Mock()
+        mock_response.raise_for_status = Mock()
+        mock_response.json.return_value = {
+            'data': 'UPID:proxmox-node:00001234:00005678:65A1B2C3:qmdelsnapshot:100:root@pam:'
+        }
+        mock_delete.return_value = mock_response
+        
+        result = api.delete_vm_snapshot(100, 'pre-shift')
+        
+        assert isinstance(result, TaskHandle)
+        assert result.task_type == 'qmdelsnapshot' and result.vm_id == 100
+        assert mock_delete.call_args[0][0].endswith('/qemu/100/snapshot/pre-shift')
+    
     @patch('requests.Session.get')
     def test_list_vms(self, mock_get, api):
         """Test listing VMs"""
@@ -357,5 +408,149 @@ class TestMigration:
         assert async_api.verify_ssl == sync_api.verify_ssl
 
 
+
+class TestAPITokenAuth:
+    """Test API token mode against the local Proxmox stand-in"""
+    
+    def test_token_config_forms(self):
+        """Test api_token and token_id/token_secret configuration"""
+        from lib.validators import ValidationError
+        
+        api = ProxmoxAPI({'host': '10.0.0.1', 'api_token': 'PVEAPIToken=ops@pve!ci=abc'})
+        assert api.token_id == 'ops@pve!ci'
+        assert api.username == 'ops@pve'
+        assert api.session.headers['Authorization'] == 'PVEAPIToken=ops@pve!ci=abc'
+        
+        api = ProxmoxAPIAsync({'host': '10.0.0.1', 'username': 'root@pam',
+                               'token_id': 'ci', 'token_secret': 'abc', 'ticket_cache': True})
+        assert api.token_id == 'root@pam!ci'
+        assert api.ticket_cache is None
+        
+        with pytest.raises(ValidationError):
+            ProxmoxAPI({'host': '10.0.0.1', 'api_token': 'root@pam=abc'})
+    
+    def test_sync_token_skips_ticket(self):
+        """Test that the sync client never calls /access/ticket with a token"""
+        from tests.pve_standin import PVEStandIn
+        
+        pve = PVEStandIn()
+        pve.add_vm(100)
+        token = pve.add_api_token()
+        with pve.background():
+            api = ProxmoxAPI(pve.config(password=None, api_token=token))
+            
+            assert api.get_vm_status(100)['status'] == 'running'
+            assert api.list_vms()[0]['vmid'] == 100
+            assert pve.stats['POST /api2/json/access/ticket'] == 0
+            
+            bad = ProxmoxAPI(pve.config(password=None, api_token=token[:-1] + 'x'))
+            assert bad.get_vm_status(100) is None
+    
+    @pytest.mark.asyncio
+    async def test_async_token_skips_ticket(self):
+        """Test that the async client never calls /access/ticket with a token"""
+        from tests.pve_standin import PVEStandIn
+        
+        async with PVEStandIn() as pve:
+            pve.add_vm(100)
+            token = pve.add_api_token()
+            
+            async with ProxmoxAPIAsync(pve.config(password=None, api_token=token)) as api:
+                assert (await api.get_vm_status(100))['status'] == 'running'
+                # Writes need no CSRF token either
+                assert (await api.execute_vm_command(100, ['true']))['pid']
+            
+            assert pve.stats['POST /api2/json/access/ticket'] == 0
+    
+    @pytest.mark.asyncio
+    async def test_password_mode_still_works(self):
+        """Test that password configs keep using tickets"""
+        from tests.pve_standin import PVEStandIn
+        
+        async with PVEStandIn() as pve:
+            pve.add_vm(100)
+            async with ProxmoxAPIAsync(pve.config()) as api:
+                assert (await api.get_vm_status(100))['status'] == 'running'
+                assert api.csrf_token == 'csrf-token'
+            
+            assert pve.stats['POST /api2/json/access/ticket'] == 1
+    
+    def test_migrate_keeps_token(self):
+        """Test migrate_to_async carries the token over"""
+        from lib.proxmox_api_async import migrate_to_async
+        
+        sync_api = ProxmoxAPI({'host': '10.0.0.1', 'api_token': 'root@pam!ci=abc'})
+        assert migrate_to_async(sync_api).token_id == 'root@pam!ci'
+
+
+
+class TestClientsAgainstStandIn:
+    """Test real client behaviour against the API stand-in: routing, retries and failures"""
+    
+    STATUS_ROUTE = 'GET /api2/json/nodes/{node}/qemu/{vmid}/status/current'
+    
+    @pytest.fixture
+    def pve(self):
+        """Three-node cluster of 3000 VMs served from a background thread"""
+        from tests.pve_standin import PVEStandIn
+        
+        pve = PVEStandIn(nodes=['pve1', 'pve2', 'pve3'], node='pve1', seed=7)
+        pve.add_vms(3000, stopped_ratio=0.2)
+        with pve.background():
+            yield pve
+    
+    def test_sync_routes_thousands_of_vms(self, pve):
+        """Test that the sync client finds every VM on its node"""
+        api = ProxmoxAPI(pve.config(node=None))
+        try:
+            assert len(api.get_cluster_resources('vm')) == 3000
+            for vmid in (100, 1601, 3099):
+                status = api.get_vm_status(vmid)
+                assert status['vmid'] == vmid and status['status'] == pve.vms[vmid]['status']
+            assert api.node_for(3099) == 'pve3'
+        finally:
+            api.close()
+    
+    def test_sync_transport_retries_server_errors(self, pve):
+        """Test that injected 503s on idempotent GETs are retried away"""
+        pve.inject_errors(0.3, routes=[self.STATUS_ROUTE])
+        api = ProxmoxAPI(pve.config(node=None, max_retries=6))
+        api.transport.backoff_base = 0.001
+        try:
+            statuses = [api.get_vm_status(vmid) for vmid in range(100, 140)]
+        finally:
+            api.close()
+        
+        assert all(s is not None for s in statuses)
+        assert api.transport.stats['retries'] == pve.injected[self.STATUS_ROUTE] > 0
+    
+    def test_sync_writes_are_not_retried(self, pve):
+        """Test that a POST failing with 503 is reported, not repeated"""
+        pve.inject_errors(1.0, routes=['POST /api2/json/nodes/{node}/qemu/{vmid}/status/start'])
+        api = ProxmoxAPI(pve.config(node=None))
+        try:
+            assert api.start_vm(101) is None
+        finally:
+            api.close()
+        assert pve.stats['POST /api2/json/nodes/{node}/qemu/{vmid}/status/start'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_async_bulk_reports_injected_errors(self):
+        """Test that bulk status surfaces each injected failure with its status"""
+        from tests.pve_standin import PVEStandIn
+        
+        async with PVEStandIn(nodes=['pve1', 'pve2'], node='pve1', seed=3, latency=0.001,
+                              latency_jitter=0.004) as pve:
+            vm_ids = pve.add_vms(500)
+            pve.inject_errors(0.1, status=500, message='got timeout', routes=[self.STATUS_ROUTE])
+            async with ProxmoxAPIAsync(pve.config(node=None, bulk_concurrency=32)) as api:
+                result = await api.bulk_status(vm_ids)
+            
+            assert len(result.errors) == pve.injected[self.STATUS_ROUTE] > 0
+            assert len(result.results) + len(result.errors) == 500
+            assert all(e.status == 500 and 'got timeout' in e.message for e in result.errors.values())
+
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
\ No newline at end of file
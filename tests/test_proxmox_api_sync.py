@@ -0,0 +1,136 @@
+"""
+Tests for proxmox_api_sync.py
+"""
+
+import pytest
+import inspect
+import threading
+import time
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.proxmox_api import ProxmoxAPI
+from lib.proxmox_api_sync import ProxmoxAPISync, BackgroundLoop
+from lib.task_waiter import TaskHandle
+from tests.pve_standin import PVEStandIn
+
+TICKET_ROUTE = 'POST /api2/json/access/ticket'
+
+
+@pytest.fixture
+def pve():
+    pve = PVEStandIn(latency=0.05)
+    for vmid in range(100, 120):
+        pve.add_vm(vmid, status='stopped' if vmid % 2 else 'running')
+    with pve.background():
+        yield pve
+
+
+@pytest.fixture
+def api(pve):
+    with ProxmoxAPISync(pve.config()) as api:
+        yield api
+
+
+class TestFacade:
+    """Test the blocking facade against the stand-in"""
+
+    def test_signatures_match_sync_client(self):
+        for name in ['authenticate', 'get_vm_status', 'start_vm', 'stop_vm', 'execute_vm_command',
+                     'create_vm_snapshot', 'list_vm_snapshots', 'rollback_vm_snapshot',
+                     'delete_vm_snapshot', 'list_vms', 'get_cluster_resources', 'refresh_index',
+                     'find_vm', 'node_for', 'get_task_status', 'wait_task']:
+            legacy = list(inspect.signature(getattr(ProxmoxAPI, name)).parameters)
+            facade = list(inspect.signature(getattr(ProxmoxAPISync, name)).parameters)
+            assert facade == legacy, name
+
+    def test_lazy_loop_thread(self):
+        api = ProxmoxAPISync({'host': 'pve1.example.com', 'username': 'root@pam', 'node': 'pve'})
+        assert not api.background.running
+        # The async client is built on the loop thread when first used
+        assert api.host == 'pve1.example.com'
+        assert api.background.running
+        api.close()
+
+    def test_blocking_calls(self, api, pve):
+        assert api.get_vm_status(100)['status'] == 'running'
+        assert api.ticket is not None and api.ticket_expiry is not None
+        assert len(api.list_vms()) == 20
+
+        task = api.start_vm(101)
+        assert isinstance(task, TaskHandle)
+        assert api.wait_task(task, poll_interval=0.02).ok
+        assert api.get_vm_status(101)['status'] == 'running'
+        # Per-call intervals leave the shared waiter's defaults alone
+        waiter = api.async_api.task_waiter
+        assert (waiter.poll_interval, waiter.max_poll_interval) == (0.5, 5.0)
+
+        assert api.get_vm_status(999) is None
+
+    def test_map_runs_concurrently(self, api, pve):
+        vm_ids = list(range(100, 120))
+
+        started = time.monotonic()
+        statuses = api.map('get_vm_status', vm_ids)
+        elapsed = time.monotonic() - started
+
+        assert [s['vmid'] for s in statuses] == vm_ids
+        # Twenty 50 ms calls, ten at a time, plus one login
+        assert elapsed < 20 * 0.05
+        assert pve.stats[TICKET_ROUTE] == 1
+
+        tasks = api.map(api.create_vm_snapshot, vm_ids[:4], ['a', 'b', 'c', 'd'])
+        assert [task.vm_id for task in api.wait_tasks(tasks, timeout=5)]
+        assert all(task.ok for task in tasks)
+        assert set(pve.vms[102]['snapshots']) == {'c'}
+
+        async def name_of(async_api, vm_id):
+            return (await async_api.get_vm_status(vm_id))['name']
+
+        assert api.map(name_of, [100, 101], concurrency=1) == ['vm100', 'vm101']
+
+    def test_index_lock_contended_through_the_facade(self, pve):
+        # Without a node every call waits on the shared cluster index refresh
+        with ProxmoxAPISync(pve.config(node=None)) as api:
+            statuses = api.map('get_vm_status', range(100, 120))
+            assert [s['vmid'] for s in statuses] == list(range(100, 120))
+            assert pve.stats['GET /api2/json/cluster/resources'] == 1
+
+    def test_calls_from_many_threads(self, api, pve):
+        results = []
+
+        def run(vm_id):
+            results.append(api.get_vm_status(vm_id)['vmid'])
+
+        threads = [threading.Thread(target=run, args=(vm_id,)) for vm_id in range(100, 108)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(results) == list(range(100, 108))
+
+    def test_shared_loop(self, pve):
+        loop = BackgroundLoop()
+        first = ProxmoxAPISync(pve.config(), loop=loop)
+        second = ProxmoxAPISync(pve.config(password=None, api_token=pve.add_api_token()), loop=loop)
+        try:
+            assert first.get_vm_status(100) and second.get_vm_status(100)
+            first.close()
+            assert loop.running
+            assert second.get_vm_status(100)['vmid'] == 100
+        finally:
+            second.close()
+            loop.stop()
+
+    def test_call_timeout(self, pve):
+        pve.latency = 0.5
+        with ProxmoxAPISync(pve.config(), call_timeout=0.2) as api:
+            with pytest.raises(TimeoutError):
+                api.get_vm_status(100)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
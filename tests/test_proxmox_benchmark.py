@@ -0,0 +1,311 @@
+"""
+Benchmarks for the Proxmox clients against the local stand-in
+Cold-start latency of password tickets, cached tickets and API tokens,
+request throughput and p99 of the sync and async clients by concurrency,
+and peak memory of buffered versus streamed listing responses
+"""
+
+import pytest
+import asyncio
+import os
+import sys
+import json
+import multiprocessing
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lib.secure_token_storage as secure_token_storage
+from lib.secure_token_storage import SecureTokenStorage
+from lib.ticket_cache import TicketCache
+from lib.proxmox_api import ProxmoxAPI
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from aiohttp import web
+
+from tests.pve_standin import PVEStandIn
+from tests.test_network_benchmark import summarize
+
+BENCH_ITERATIONS = int(os.environ.get('TIMESHIFT_BENCH_ITERATIONS', '20'))
+# Seconds /access/ticket takes; PAM and LDAP realms are typically 0.1-0.5 s
+BENCH_LOGIN_DELAY = float(os.environ.get('TIMESHIFT_BENCH_LOGIN_DELAY', '0.3'))
+# Guests in /cluster/resources; about 250 bytes of JSON each
+BENCH_LISTING_SIZES = [int(n) for n in os.environ.get('TIMESHIFT_BENCH_LISTING_SIZES', '2000,20000').split(',')]
+# Throughput runs: client concurrency levels, requests per level, cluster size and
+# per-request server latency (a LAN round trip plus pveproxy work)
+BENCH_CONCURRENCY = [int(n) for n in os.environ.get('TIMESHIFT_BENCH_CONCURRENCY', '1,8,32,128').split(',')]
+BENCH_REQUESTS = int(os.environ.get('TIMESHIFT_BENCH_REQUESTS', '400'))
+BENCH_VMS = int(os.environ.get('TIMESHIFT_BENCH_VMS', '2000'))
+BENCH_LATENCY = float(os.environ.get('TIMESHIFT_BENCH_LATENCY', '0.005'))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """Ticket cache backed by the encrypted file fallback in a temporary directory"""
+    def no_keyring(*args, **kwargs):
+        raise RuntimeError("no keyring in benchmarks")
+
+    monkeypatch.setattr(secure_token_storage.keyring, 'set_password', no_keyring)
+    monkeypatch.setattr(secure_token_storage.keyring, 'get_password', no_keyring)
+    monkeypatch.setattr(secure_token_storage.keyring, 'delete_password', no_keyring)
+
+    storage = SecureTokenStorage()
+    storage.fallback_dir = tmp_path / 'secure'
+    storage.fallback_dir.mkdir()
+    return TicketCache(storage=storage, lock_dir=tmp_path / 'locks')
+
+
+def cold_start_modes(pve, cache):
+    """(label, config, ticket cache) for each authentication mode"""
+    return [
+        ('password', pve.config(), None),
+        ('password_cached_ticket', pve.config(), cache),
+        ('api_token', pve.config(password=None, api_token=pve.add_api_token()), None),
+    ]
+
+
+@pytest.mark.slow
+@pytest.mark.integration
+class TestColdStartBenchmark:
+    """Time from a fresh client to the first VM status"""
+
+    def test_bench_sync_cold_start(self, cache):
+        pve = PVEStandIn(login_delay=BENCH_LOGIN_DELAY)
+        pve.add_vm(100)
+        summaries = {}
+
+        with pve.background():
+            for label, config, ticket_cache in cold_start_modes(pve, cache):
+                durations = []
+                started = time.monotonic()
+                for _ in range(BENCH_ITERATIONS):
+                    t0 = time.monotonic()
+                    api = ProxmoxAPI(config)
+                    api.ticket_cache = ticket_cache
+                    assert api.get_vm_status(100)['status'] == 'running'
+                    durations.append(time.monotonic() - t0)
+                    api.close()
+                elapsed = time.monotonic() - started
+                summaries[label] = summarize(f'sync_cold_start_{label}', durations, elapsed,
+                                             unit='starts')
+
+        assert summaries['api_token']['p50_ms'] < summaries['password']['p50_ms']
+
+    @pytest.mark.asyncio
+    async def test_bench_async_cold_start(self, cache):
+        summaries = {}
+
+        async with PVEStandIn(login_delay=BENCH_LOGIN_DELAY) as pve:
+            pve.add_vm(100)
+            for label, config, ticket_cache in cold_start_modes(pve, cache):
+                durations = []
+                started = time.monotonic()
+                for _ in range(BENCH_ITERATIONS):
+                    t0 = time.monotonic()
+                    api = ProxmoxAPIAsync(config)
+                    api.ticket_cache = ticket_cache
+                    try:
+                        assert (await api.get_vm_status(100))['status'] == 'running'
+                    finally:
+                        await api.close()
+                    durations.append(time.monotonic() - t0)
+                elapsed = time.monotonic() - started
+                summaries[label] = summarize(f'async_cold_start_{label}', durations, elapsed,
+                                             unit='starts')
+
+        assert summaries['api_token']['p50_ms'] < summaries['password']['p50_ms']
+
+
+
+class FrozenListingStandIn(PVEStandIn):
+    """Serves /cluster/resources from bytes built once, so the server allocates nothing per request"""
+
+    body = None
+
+    async def handle_cluster_resources(self, request):
+        if self.body is None:
+            self.body = (await super().handle_cluster_resources(request)).body
+        return web.Response(body=self.body, content_type='application/json')
+
+
+def serve_standin(ready, vm_count, frozen, options, errors):
+    """Child process: serve a three-node cluster of vm_count guests until terminated"""
+    async def main():
+        standin = FrozenListingStandIn if frozen else PVEStandIn
+        async with standin(nodes=['pve1', 'pve2', 'pve3'], node='pve1', seed=1, **options) as pve:
+            pve.add_vms(vm_count, stopped_ratio=0.25, tags=['bench'])
+            if errors:
+                pve.inject_errors(**errors)
+            ready.put(pve.config(node=None, api_token=pve.add_api_token()))
+            await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+@contextmanager
+def standin_process(vm_count, frozen=False, errors=None, **options):
+    """
+    Run the stand-in in its own process and yield a client config for it
+
+    Keeps server work off this process: out of tracemalloc's view, and not
+    competing with the client under test for the GIL.
+    """
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    server = context.Process(target=serve_standin, args=(ready, vm_count, frozen, options, errors), daemon=True)
+    server.start()
+    try:
+        yield ready.get(timeout=60)
+    finally:
+        server.terminate()
+        server.join()
+
+
+def bench_vm_ids(count):
+    """VM IDs spread over the whole cluster"""
+    return [100 + (i * 7919) % BENCH_VMS for i in range(count)]
+
+
+def run_sync_client(config, concurrency):
+    """get_vm_status from a thread pool sharing one ProxmoxAPI: (durations, elapsed, failures)"""
+    api = ProxmoxAPI(dict(config, pool_size=concurrency))
+    assert api.get_vm_status(100) is not None  # index and connection warm-up
+
+    def call(vm_id):
+        t0 = time.monotonic()
+        ok = api.get_vm_status(vm_id) is not None
+        return time.monotonic() - t0, ok
+
+    try:
+        with ThreadPoolExecutor(concurrency) as pool:
+            started = time.monotonic()
+            outcomes = list(pool.map(call, bench_vm_ids(BENCH_REQUESTS)))
+            elapsed = time.monotonic() - started
+    finally:
+        api.close()
+    return [d for d, _ in outcomes], elapsed, sum(1 for _, ok in outcomes if not ok)
+
+
+async def run_async_client(config, concurrency):
+    """get_vm_status with at most concurrency in flight on one ProxmoxAPIAsync"""
+    async with ProxmoxAPIAsync(dict(config, pool_size=concurrency, pool_per_host=concurrency)) as api:
+        assert await api.get_vm_status(100) is not None
+        limit = asyncio.Semaphore(concurrency)
+
+        async def call(vm_id):
+            async with limit:
+                t0 = time.monotonic()
+                ok = await api.get_vm_status(vm_id) is not None
+                return time.monotonic() - t0, ok
+
+        started = time.monotonic()
+        outcomes = await asyncio.gather(*(call(vm_id) for vm_id in bench_vm_ids(BENCH_REQUESTS)))
+        elapsed = time.monotonic() - started
+    return [d for d, _ in outcomes], elapsed, sum(1 for _, ok in outcomes if not ok)
+
+
+@pytest.mark.slow
+@pytest.mark.integration
+class TestThroughputBenchmark:
+    """Requests per second and p99 latency of the clients by concurrency"""
+
+    @pytest.mark.asyncio
+    async def test_bench_status_throughput(self):
+        loop = asyncio.get_running_loop()
+        results = {}
+        with standin_process(BENCH_VMS, latency=BENCH_LATENCY, latency_jitter=BENCH_LATENCY) as config:
+            for concurrency in BENCH_CONCURRENCY:
+                runs = (('sync', loop.run_in_executor(None, run_sync_client, config, concurrency)),
+                        ('async', run_async_client(config, concurrency)))
+                for label, run in runs:
+                    durations, elapsed, failures = await run
+                    assert failures == 0
+                    results[(label, concurrency)] = summarize(f'{label}_status_c{concurrency}', durations, elapsed,
+                                                              unit='requests')
+
+        def throughput(label, concurrency):
+            return results[(label, concurrency)]['throughput_requests_per_s']
+
+        low, high = min(BENCH_CONCURRENCY), max(BENCH_CONCURRENCY)
+        # With server latency in the loop, concurrency buys throughput for both clients...
+        for label in ('sync', 'async'):
+            assert max(throughput(label, c) for c in BENCH_CONCURRENCY) > throughput(label, low) * 1.5
+        # ...but threads contend for the GIL long before coroutines do
+        assert throughput('async', high) > throughput('sync', high)
+
+    @pytest.mark.asyncio
+    async def test_bench_with_injected_errors(self):
+        loop = asyncio.get_running_loop()
+        errors = {'rate': 0.05, 'status': 503, 'routes': ['GET /api2/json/nodes/{node}/qemu/{vmid}/status/current']}
+        concurrency = max(BENCH_CONCURRENCY)
+        with standin_process(BENCH_VMS, errors=errors, latency=BENCH_LATENCY) as config:
+            config = dict(config, max_retries=3)
+            sync = await loop.run_in_executor(None, run_sync_client, config, concurrency)
+            asynchronous = await run_async_client(config, concurrency)
+
+        for label, (durations, elapsed, failures) in (('sync', sync), ('async', asynchronous)):
+            summary = summarize(f'{label}_status_503_c{concurrency}', durations, elapsed, unit='requests')
+            summary['failures'] = failures
+            print(f"[bench] {label} failures with 5% injected 503s: {failures}/{len(durations)}")
+
+        # The sync transport retries idempotent GETs on 503; the async client reports them
+        assert sync[2] <= BENCH_REQUESTS * 0.01
+        assert asynchronous[2] > 0
+
+
+async def measure(consume):
+    """Run a listing consumer and return (seconds, peak traced bytes, result)"""
+    # Timed without tracing, which slows every allocation
+    t0 = time.monotonic()
+    result = await consume()
+    elapsed = time.monotonic() - t0
+    tracemalloc.start()
+    try:
+        assert await consume() == result
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak, result
+
+
+@pytest.mark.slow
+@pytest.mark.integration
+class TestStreamingBenchmark:
+    """Peak memory and time of response.json() against the streaming decoder"""
+
+    @pytest.mark.asyncio
+    async def test_bench_listing_memory(self):
+        results = {}
+        for size in BENCH_LISTING_SIZES:
+            with standin_process(size, frozen=True) as config:
+                async with ProxmoxAPIAsync(config) as api:
+                    # Warm up the connection and the frozen body
+                    body_mb = round(len(json.dumps({'data': await api.get_cluster_resources('vm')})) / 2 ** 20, 2)
+
+                    async def buffered():
+                        resources = await api.get_cluster_resources('vm')
+                        return sum(1 for r in resources if r['status'] == 'running')
+
+                    async def streamed():
+                        return sum([1 async for r in api.stream_cluster_resources('vm') if r['status'] == 'running'])
+
+                    counts = set()
+                    for label, consume in (('json', buffered), ('stream', streamed)):
+                        elapsed, peak, running = await measure(consume)
+                        counts.add(running)
+                        results[(label, size)] = summary = {
+                            'label': f"listing_{label}", 'vms': size, 'body_mb': body_mb,
+                            'elapsed_ms': round(elapsed * 1000, 1), 'peak_mb': round(peak / 2 ** 20, 2),
+                        }
+                        print(f"\n[bench] {summary}")
+                    assert len(counts) == 1
+
+        small, large = min(BENCH_LISTING_SIZES), max(BENCH_LISTING_SIZES)
+        # The buffered path grows with the listing; the streamed one stays near one chunk
+        assert results[('stream', large)]['peak_mb'] < results[('json', large)]['peak_mb'] / 4
+        assert results[('stream', large)]['peak_mb'] < results[('stream', small)]['peak_mb'] * 2 + 1
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '-s', '-m', 'slow'])
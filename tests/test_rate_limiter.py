@@ -0,0 +1,157 @@
+"""
+Tests for rate_limiter.py and its use by both Proxmox clients
+"""
+
+import pytest
+import asyncio
+import time
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.rate_limiter import RateLimiter, TokenBucket, budget_for
+from lib.proxmox_api import ProxmoxAPI
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn
+
+STATUS_ROUTE = 'GET /api2/json/nodes/{node}/qemu/{vmid}/status/current'
+
+
+class TestTokenBucket:
+    """Test reservations and AIMD adaptation"""
+
+    def test_burst_then_paced(self):
+        bucket = TokenBucket(rate=10, burst=3)
+        assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+        assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+        assert bucket.queued == 2 and bucket.stats['throttled'] == 2
+        bucket.done_waiting()
+        assert bucket.snapshot()['queued'] == 1 and bucket.snapshot()['peak_queued'] == 2
+
+    def test_additive_increase_multiplicative_decrease(self):
+        bucket = TokenBucket(rate=10, min_rate=2, max_rate=12, cooldown=0.2)
+        for _ in range(10):
+            bucket.record_success()  # one second of traffic at ~10/s
+        assert bucket.rate == pytest.approx(11, abs=0.05)
+        for _ in range(30):
+            bucket.record_success()
+        assert bucket.rate == 12
+
+        assert bucket.record_overload() == 12 and bucket.rate == 6
+        # Answers to requests sent before the decrease do not decrease again
+        assert bucket.record_overload() is None and bucket.rate == 6
+        time.sleep(0.25)
+        bucket.record_overload()
+        time.sleep(0.25)
+        bucket.record_overload()
+        assert bucket.rate == 2 and bucket.stats['backoffs'] == 3 and bucket.stats['overloads'] == 4
+        # No saved-up burst right after a decrease
+        assert bucket.reserve() > 0
+
+    def test_limiter_budgets_and_events(self):
+        assert (budget_for('get'), budget_for('POST'), budget_for('PUT'), budget_for('DELETE')) == \
+            ('read', 'write', 'write', 'write')
+        limiter = RateLimiter({'write': {'rate': 2}})
+        assert limiter.buckets['write'].rate == 2 and limiter.buckets['read'].rate == 20
+
+        limiter.record('POST', status=500)  # an API error, not overload: 2 + 1/2
+        limiter.record('POST', status=503)
+        limiter.record('GET', error=TimeoutError())
+        snapshot = limiter.snapshot()
+        assert snapshot['write']['rate'] == 1.25 and snapshot['read']['rate'] == 10
+        assert [(e['budget'], e['reason']) for e in snapshot['events']] == [('write', 'HTTP 503'),
+                                                                          ('read', 'TimeoutError')]
+        with pytest.raises(ValueError, match='Unknown rate limit budgets'):
+            RateLimiter({'delete': {'rate': 1}})
+
+
+class TestAsyncClientLimits:
+    """Test the async client's budgets against the API stand-in"""
+
+    @pytest.fixture
+    async def pve(self):
+        async with PVEStandIn() as pve:
+            pve.add_vms(4)
+            yield pve
+
+    @pytest.mark.asyncio
+    async def test_reads_are_paced(self, pve):
+        limits = {'read': {'rate': 20, 'burst': 5, 'max_rate': 20}}
+        async with ProxmoxAPIAsync(pve.config(rate_limit=limits)) as api:
+            await api.authenticate()
+            started = time.monotonic()
+            results = await asyncio.gather(*(api.get_vm_status(100) for _ in range(25)))
+            elapsed = time.monotonic() - started
+
+            assert all(results) and elapsed >= 0.95
+            stats = api.rate_limit_stats['read']
+            assert stats['throttled'] == 20 and stats['peak_queued'] == 20 and stats['queued'] == 0
+
+    @pytest.mark.asyncio
+    async def test_writes_have_their_own_budget(self, pve):
+        limits = {'write': {'rate': 2, 'burst': 1, 'max_rate': 2}}
+        async with ProxmoxAPIAsync(pve.config(rate_limit=limits)) as api:
+            await api.authenticate()  # the login is a write too
+            await asyncio.sleep(0.5)
+            writes = asyncio.gather(*(api.stop_vm(vmid) for vmid in range(100, 104)))
+
+            started = time.monotonic()
+            assert all(await asyncio.gather(*(api.get_vm_status(vmid) for vmid in range(100, 104))))
+            assert time.monotonic() - started < 0.3
+            assert all(await writes)
+            assert time.monotonic() - started >= 1.4
+
+            stats = api.rate_limit_stats
+            assert stats['write']['peak_queued'] == 3 and stats['read']['throttled'] == 0
+
+    @pytest.mark.asyncio
+    async def test_overload_backs_off_then_recovers(self, pve):
+        async with ProxmoxAPIAsync(pve.config(rate_limit=True)) as api:
+            pve.inject_errors(1.0, status=503, routes=[STATUS_ROUTE])
+            assert not any(await asyncio.gather(*(api.get_vm_status(100) for _ in range(5))))
+
+            stats = api.rate_limit_stats
+            assert stats['read']['rate'] == 10 and stats['read']['overloads'] == 5
+            assert stats['write']['rate'] >= 5 and stats['write']['backoffs'] == 0
+            assert [(e['budget'], e['reason'], e['previous_rate']) for e in stats['events']] == [
+                ('read', 'HTTP 503', 20.0)]
+
+            pve.inject_errors(0)
+            for _ in range(20):
+                assert await api.get_vm_status(100)
+            assert api.rate_limit_stats['read']['rate'] > 11
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self, pve):
+        async with ProxmoxAPIAsync(pve.config()) as api:
+            assert await api.get_vm_status(100)
+            assert api.rate_limiter is None and api.rate_limit_stats == {}
+
+
+class TestSyncClientLimits:
+    """Test the budgets of the synchronous client's transport"""
+
+    def test_paced_and_backs_off_on_timeouts(self):
+        pve = PVEStandIn()
+        pve.add_vm(100)
+        with pve.background():
+            limits = {'read': {'rate': 5, 'burst': 2, 'max_rate': 5}}
+            api = ProxmoxAPI(pve.config(rate_limit=limits, timeout=0.3, max_retries=0))
+
+            started = time.monotonic()
+            assert all(api.get_vm_status(100) for _ in range(6))
+            assert time.monotonic() - started >= 0.75
+            assert api.rate_limit_stats['read']['throttled'] == 4
+            assert api.transport.rate_limiter is api.rate_limiter
+
+            pve.latency = 1.0
+            assert api.get_vm_status(100) is None
+            stats = api.rate_limit_stats
+            assert stats['read']['rate'] == 2.5 and stats['events'][0]['reason'] == 'ReadTimeout'
+            api.close()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,269 @@
+"""
+Tests for redfish_client.py against a local aiohttp Redfish stand-in
+"""
+
+import pytest
+import asyncio
+import socket
+import uuid
+from aiohttp import web
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.redfish_client import RedfishClient, RedfishError
+
+
+class RedfishStandIn:
+    """Minimal iDRAC Redfish service that enforces a session limit"""
+
+    def __init__(self, max_sessions=2, username='root', password='calvin'):
+        self.max_sessions = max_sessions
+        self.username = username
+        self.password = password
+        self.sessions = {}
+        self.logins = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # Answer with an HTML page instead of JSON, as some BMCs do when unwell
+        self.html_body = False
+
+        self.app = web.Application(middlewares=[self.track_concurrency])
+        self.app.router.add_post('/redfish/v1/SessionService/Sessions', self.login)
+        self.app.router.add_delete('/redfish/v1/SessionService/Sessions/{sid}', self.logout)
+        self.app.router.add_get('/redfish/v1/Systems/System.Embedded.1', self.system)
+        self.app.router.add_get('/redfish/v1/UpdateService/FirmwareInventory', self.firmware)
+        self.app.router.add_get('/redfish/v1/UpdateService/FirmwareInventory/{fid}', self.firmware_item)
+        self.app.router.add_get(
+            '/redfish/v1/Managers/iDRAC.Embedded.1/LogServices/Sel/Entries', self.sel)
+        self.app.router.add_get(
+            '/redfish/v1/Managers/iDRAC.Embedded.1/NetworkProtocol/HTTPS/Certificates', self.certs)
+
+    @web.middleware
+    async def track_concurrency(self, request, handler):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.005)
+            if request.method == 'GET':
+                if request.headers.get('X-Auth-Token') not in self.sessions:
+                    return web.json_response({'error': 'unauthorized'}, status=401)
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    async def login(self, request):
+        body = await request.json()
+        if body.get('UserName') != self.username or body.get('Password') != self.password:
+            return web.json_response({'error': 'bad credentials'}, status=401)
+        if len(self.sessions) >= self.max_sessions:
+            return web.json_response({'error': 'session limit reached'}, status=503)
+
+        self.logins += 1
+        token = uuid.uuid4().hex
+        sid = str(self.logins)
+        self.sessions[token] = sid
+        return web.json_response({'Id': sid}, status=201, headers={
+            'X-Auth-Token': token,
+            'Location': f'/redfish/v1/SessionService/Sessions/{sid}',
+        })
+
+    async def logout(self, request):
+        sid = request.match_info['sid']
+        for token, session_id in list(self.sessions.items()):
+            if session_id == sid:
+                del self.sessions[token]
+        return web.Response(status=204)
+
+    async def system(self, request):
+        if self.html_body:
+            return web.Response(text='<html><body>Internal error</body></html>', content_type='text/html')
+        return web.json_response({'Id': 'System.Embedded.1', 'PowerState': 'On'})
+
+    async def firmware(self, request):
+        return web.json_response({'Members': [
+            {'@odata.id': '/redfish/v1/UpdateService/FirmwareInventory/BIOS'},
+            {'@odata.id': '/redfish/v1/UpdateService/FirmwareInventory/iDRAC'},
+        ]})
+
+    async def firmware_item(self, request):
+        fid = request.match_info['fid']
+        return web.json_response({'Id': fid, 'Name': fid, 'Version': '2.1.0', 'Updateable': True})
+
+    async def sel(self, request):
+        return web.json_response({'Members': [
+            {'Id': '1', 'Created': '2024-01-01T00:00:00Z', 'Severity': 'OK', 'Message': 'Log cleared'},
+        ]})
+
+    async def certs(self, request):
+        return web.json_response({'Members': [{
+            'Id': 'SecurityCertificate.1',
+            'Subject': {'CommonName': 'idrac.local'},
+            'Issuer': {'CommonName': 'idrac.local'},
+            'ValidNotBefore': '2015-01-01T00:00:00Z',
+            'ValidNotAfter': '2020-01-01T00:00:00Z',
+        }]})
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+async def fleet():
+    """Serve one Redfish stand-in per loopback address on a shared port"""
+    port = _free_port()
+    hosts = [f'127.0.1.{i}' for i in range(1, 21)]
+    standins = {}
+    runners = []
+
+    for host in hosts:
+        standin = RedfishStandIn()
+        runner = web.AppRunner(standin.app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        standins[host] = standin
+        runners.append(runner)
+
+    yield port, standins
+
+    for runner in runners:
+        await runner.cleanup()
+
+
+def make_client(port, **overrides):
+    config = {
+        'username': 'root',
+        'password': 'calvin',
+        'scheme': 'http',
+        'port': port,
+        'per_host_limit': 2,
+    }
+    config.update(overrides)
+    return RedfishClient(config)
+
+
+class TestRedfishClient:
+    """Test cases for the pooled Redfish client"""
+
+    @pytest.mark.asyncio
+    async def test_session_reused_across_requests(self, fleet):
+        """Test that one login serves many requests to the same BMC"""
+        port, standins = fleet
+        host = '127.0.1.1'
+
+        async with make_client(port) as client:
+            for _ in range(5):
+                assert await client.get_power_state(host) == 'On'
+
+            assert standins[host].logins == 1
+            assert client.stats['logins'] == 1
+
+        # Session is deleted on close so the BMC slot is freed
+        assert standins[host].sessions == {}
+
+    @pytest.mark.asyncio
+    async def test_per_host_limit_respected(self, fleet):
+        """Test that concurrent requests never exceed the per-host limit"""
+        port, standins = fleet
+        host = '127.0.1.2'
+
+        async with make_client(port) as client:
+            await asyncio.gather(*(client.get_power_state(host) for _ in range(20)))
+
+        assert standins[host].max_in_flight <= 2
+        assert standins[host].logins == 1
+
+    @pytest.mark.asyncio
+    async def test_reauth_after_session_purged(self, fleet):
+        """Test that a 401 triggers a single re-login and retry"""
+        port, standins = fleet
+        host = '127.0.1.3'
+
+        async with make_client(port) as client:
+            await client.get_power_state(host)
+            standins[host].sessions.clear()
+
+            assert await client.get_power_state(host) == 'On'
+            assert client.stats['reauth_retries'] == 1
+            assert standins[host].logins == 2
+
+    @pytest.mark.asyncio
+    async def test_session_recycled_after_max_requests(self, fleet):
+        """Test that sessions are recycled without leaking BMC slots"""
+        port, standins = fleet
+        host = '127.0.1.4'
+
+        async with make_client(port, session_max_requests=3) as client:
+            for _ in range(7):
+                await client.get_power_state(host)
+
+            assert standins[host].logins == 3
+            assert len(standins[host].sessions) == 1
+
+    @pytest.mark.asyncio
+    async def test_collections(self, fleet):
+        """Test firmware, SEL and certificate queries"""
+        port, _ = fleet
+        host = '127.0.1.5'
+
+        async with make_client(port) as client:
+            firmware = await client.get_firmware_inventory(host)
+            sel = await client.get_sel_entries(host)
+            certs = await client.get_certificates(host)
+
+        assert sorted(f['id'] for f in firmware) == ['BIOS', 'iDRAC']
+        assert sel[0]['message'] == 'Log cleared'
+        assert certs[0]['valid_until'] == '2020-01-01T00:00:00Z'
+
+    @pytest.mark.asyncio
+    async def test_bad_credentials(self, fleet):
+        """Test that rejected logins raise RedfishError"""
+        port, _ = fleet
+
+        async with make_client(port, password='wrong') as client:
+            with pytest.raises(RedfishError):
+                await client.get_power_state('127.0.1.6')
+
+    @pytest.mark.asyncio
+    async def test_fleet_query(self, fleet):
+        """Test fan-out across the fleet with one unreachable BMC"""
+        port, standins = fleet
+        hosts = list(standins) + ['127.0.2.1']
+
+        async with make_client(port, timeout=2) as client:
+            results = await client.fleet_query(hosts, 'power_state')
+
+        assert len(results) == len(hosts)
+        assert all(results[h]['data'] == 'On' for h in standins)
+        assert results['127.0.2.1']['ok'] is False
+        assert all(s.logins == 1 for s in standins.values())
+
+    @pytest.mark.asyncio
+    async def test_fleet_query_survives_non_json_body(self, fleet):
+        """Test that one BMC answering with HTML fails alone"""
+        port, standins = fleet
+        standins['127.0.1.3'].html_body = True
+
+        async with make_client(port) as client:
+            results = await client.fleet_query(list(standins), 'power_state')
+
+        assert results['127.0.1.3']['ok'] is False
+        assert 'non-JSON' in results['127.0.1.3']['error']
+        assert all(results[h]['data'] == 'On' for h in standins if h != '127.0.1.3')
+
+    @pytest.mark.asyncio
+    async def test_fleet_query_unknown(self, fleet):
+        """Test that unknown queries are rejected"""
+        port, _ = fleet
+
+        async with make_client(port) as client:
+            with pytest.raises(ValueError):
+                await client.fleet_query(['127.0.1.1'], 'bogus')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
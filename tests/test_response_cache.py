@@ -0,0 +1,253 @@
+"""
+Tests for response_cache.py and the read-through cache of ProxmoxAPIAsync
+"""
+
+import pytest
+import asyncio
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.response_cache import ResponseCache, endpoint_class, vm_id_from_path
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn
+
+STATUS_ROUTE = 'GET /api2/json/nodes/{node}/qemu/{vmid}/status/current'
+CONFIG_ROUTE = 'GET /api2/json/nodes/{node}/qemu/{vmid}/config'
+LIST_ROUTE = 'GET /api2/json/nodes/{node}/qemu'
+
+
+class Fetcher:
+    """Counts calls and answers after a short delay"""
+
+    def __init__(self, result=None, error=None, delay=0.01):
+        self.calls = 0
+        self.result = result if result is not None else {'status': 'running'}
+        self.error = error
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class TestEndpointClasses:
+    """Test path classification"""
+
+    def test_classes(self):
+        assert endpoint_class('/nodes/pve/qemu/100/status/current') == 'vm_status'
+        assert endpoint_class('/nodes/pve/qemu/100/config') == 'vm_config'
+        assert endpoint_class('/nodes/pve/qemu') == 'vm_list'
+        assert endpoint_class('/cluster/resources') == 'cluster_resources'
+        assert endpoint_class('/nodes/pve/qemu/100/agent/exec-status') == 'guest_agent'
+        assert endpoint_class('/version') is None
+
+    def test_vm_id_from_path(self):
+        assert vm_id_from_path('/nodes/pve/qemu/100/status/start') == 100
+        assert vm_id_from_path('/nodes/pve/qemu') is None
+
+
+class TestResponseCache:
+    """Test caching, coalescing and invalidation without a server"""
+
+    @pytest.mark.asyncio
+    async def test_hit_and_miss(self):
+        cache = ResponseCache()
+        fetch = Fetcher()
+        path = '/nodes/pve/qemu/100/status/current'
+
+        first = await cache.get(path, None, fetch)
+        first['status'] = 'modified'
+        second = await cache.get(path, None, fetch)
+
+        assert fetch.calls == 1
+        assert second == {'status': 'running'}  # callers get private copies
+        assert cache.stats['misses'] == 1 and cache.stats['hits'] == 1
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry_and_uncached_classes(self):
+        cache = ResponseCache({'vm_status': 0.05})
+        fetch = Fetcher()
+        await cache.get('/nodes/pve/qemu/100/status/current', None, fetch)
+        await asyncio.sleep(0.06)
+        await cache.get('/nodes/pve/qemu/100/status/current', None, fetch)
+        assert fetch.calls == 2
+
+        # Task state is never cached
+        for _ in range(2):
+            await cache.get('/nodes/pve/tasks/UPID:x/status', None, fetch)
+        assert fetch.calls == 4
+
+    @pytest.mark.asyncio
+    async def test_params_are_part_of_the_key(self):
+        cache = ResponseCache()
+        fetch = Fetcher()
+        await cache.get('/cluster/resources', {'type': 'vm'}, fetch)
+        await cache.get('/cluster/resources', {'type': 'node'}, fetch)
+        await cache.get('/cluster/resources', {'type': 'vm'}, fetch)
+        assert fetch.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_coalescing(self):
+        cache = ResponseCache({'vm_status': 0})
+        fetch = Fetcher(delay=0.05)
+        results = await asyncio.gather(*(cache.get('/nodes/pve/qemu/100/status/current', None, fetch)
+                                         for _ in range(10)))
+
+        assert fetch.calls == 1
+        assert all(r == {'status': 'running'} for r in results)
+        assert cache.stats['misses'] == 1 and cache.stats['coalesced'] == 9
+        assert len(cache) == 0  # a TTL of 0 coalesces without storing
+
+    @pytest.mark.asyncio
+    async def test_errors_reach_every_caller_and_are_not_cached(self):
+        cache = ResponseCache()
+        fetch = Fetcher(error=ValueError('boom'))
+        results = await asyncio.gather(*(cache.get('/nodes/pve/qemu/100/config', None, fetch)
+                                         for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+
+        fetch.error = None
+        assert await cache.get('/nodes/pve/qemu/100/config', None, fetch) == {'status': 'running'}
+        assert fetch.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_owner_does_not_fail_coalesced_callers(self):
+        cache = ResponseCache()
+        fetch = Fetcher(delay=0.05)
+        path = '/nodes/pve/qemu/100/config'
+        owner = asyncio.create_task(cache.get(path, None, fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get(path, None, fetch))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+
+        assert await follower == {'status': 'running'}
+        assert fetch.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_follower_leaves_the_request_running(self):
+        cache = ResponseCache()
+        fetch = Fetcher(delay=0.05)
+        path = '/nodes/pve/qemu/100/config'
+        owner = asyncio.create_task(cache.get(path, None, fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get(path, None, fetch))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        assert await owner == {'status': 'running'}
+        assert fetch.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_vm(self):
+        cache = ResponseCache()
+        fetch = Fetcher()
+        for path in ('/nodes/pve/qemu/100/status/current', '/nodes/pve/qemu/100/config',
+                     '/nodes/pve/qemu/101/config', '/nodes/pve/qemu'):
+            await cache.get(path, None, fetch)
+
+        cache.invalidate_vm(100)
+
+        assert [key[0] for key in cache._entries] == ['/nodes/pve/qemu/101/config']
+
+    @pytest.mark.asyncio
+    async def test_invalidation_during_fetch_is_not_overwritten(self):
+        cache = ResponseCache()
+        fetch = Fetcher(delay=0.05)
+        path = '/nodes/pve/qemu/100/status/current'
+        pending = asyncio.create_task(cache.get(path, None, fetch))
+        await asyncio.sleep(0.01)
+        cache.invalidate_vm(100)
+        await pending
+
+        # The response may predate the write, so it is not stored
+        assert len(cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        fetch = Fetcher()
+        for vmid in (100, 101, 102):
+            await cache.get(f'/nodes/pve/qemu/{vmid}/config', None, fetch)
+        assert len(cache) == 2 and cache.stats['evictions'] == 1
+
+
+class TestClientCache:
+    """Test the cache in ProxmoxAPIAsync against the API stand-in"""
+
+    @pytest.fixture
+    async def pve(self):
+        async with PVEStandIn(task_duration=0.02) as pve:
+            for vmid in (100, 101):
+                pve.add_vm(vmid, status='stopped')
+            yield pve
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self, pve):
+        async with ProxmoxAPIAsync(pve.config()) as api:
+            await api.get_vm_status(100)
+            await api.get_vm_status(100)
+            assert api.response_cache is None and api.cache_stats == {}
+            assert pve.stats[STATUS_ROUTE] == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_reads_share_one_request(self, pve):
+        async with ProxmoxAPIAsync(pve.config(response_cache=True)) as api:
+            await api.authenticate()
+            statuses = await asyncio.gather(*(api.get_vm_status(100) for _ in range(20)))
+            await api.get_vm_config(100)
+            await api.get_vm_config(100)
+            await api.list_vms()
+            await api.list_vms()
+
+            assert all(s['status'] == 'stopped' for s in statuses)
+            assert pve.stats[STATUS_ROUTE] == 1
+            assert pve.stats[CONFIG_ROUTE] == 1
+            assert pve.stats[LIST_ROUTE] == 1
+            assert api.cache_stats['coalesced'] + api.cache_stats['hits'] == 21
+
+    @pytest.mark.asyncio
+    async def test_writes_invalidate_the_vm(self, pve):
+        async with ProxmoxAPIAsync(pve.config(response_cache=True)) as api:
+            assert (await api.get_vm_status(100))['status'] == 'stopped'
+            await api.get_vm_status(101)
+
+            task = await api.start_vm(100)
+            await api.wait_task(task, timeout=5)
+
+            assert (await api.get_vm_status(100))['status'] == 'running'
+            await api.get_vm_status(101)
+            assert pve.stats[STATUS_ROUTE] == 3  # VM 101 still served from the cache
+
+    @pytest.mark.asyncio
+    async def test_guest_agent_calls_keep_the_cache(self, pve):
+        pve.vms[100]['status'] = 'running'
+        async with ProxmoxAPIAsync(pve.config(response_cache=True)) as api:
+            await api.get_vm_status(100)
+            assert await api.ping_guest_agent(100)
+            assert await api.execute_vm_command(100, ['true'])
+            await api.get_vm_status(100)
+            assert pve.stats[STATUS_ROUTE] == 1
+            assert api.cache_stats['invalidations'] == 0
+
+            assert await api.update_vm_config(100, {'cores': 2})
+            await api.get_vm_status(100)
+            assert pve.stats[STATUS_ROUTE] == 2
+
+    @pytest.mark.asyncio
+    async def test_ttl_overrides(self, pve):
+        async with ProxmoxAPIAsync(pve.config(response_cache={'vm_status': 0})) as api:
+            await api.get_vm_status(100)
+            await api.get_vm_status(100)
+            assert pve.stats[STATUS_ROUTE] == 2
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
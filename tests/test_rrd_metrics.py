@@ -0,0 +1,212 @@
+"""
+Tests for rrd_metrics.py
+"""
+
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lib.rrd_metrics as rrd_metrics
+from lib.rrd_metrics import MetricSeries, MetricStore, RingColumns, RRDCollector
+from lib.integration_plugins import MonitoringPlugin
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn, rrd_cpu
+
+NODES = ('pve1', 'pve2', 'pve3')
+DAY = 86400
+T0 = 1_700_000_000 // DAY * DAY  # midnight, so rollup buckets line up with the data
+
+
+def minute_rows(start, count, cpu=lambda t: (t % 3600) / 3600, step=60):
+    return [{'time': start + i * step, 'cpu': cpu(start + i * step), 'mem': 1024.0} for i in range(count)]
+
+
+@pytest.fixture(params=['numpy', 'pure'])
+def with_numpy(request, monkeypatch):
+    """Run a test with and without NumPy"""
+    if request.param == 'pure':
+        monkeypatch.setattr(rrd_metrics, 'np', None)
+    elif rrd_metrics.np is None:
+        pytest.skip("NumPy not installed")
+    return request.param
+
+
+class TestRingColumns:
+    """Test the typed-array ring"""
+
+    def test_wraps_and_orders(self, with_numpy):
+        ring = RingColumns(['time', 'cpu'], capacity=4)
+        for i in range(6):
+            ring.append({'time': float(i), 'cpu': i / 10})
+
+        assert len(ring) == 4
+        assert list(ring.ordered('time')) == [2.0, 3.0, 4.0, 5.0]
+        assert [round(v, 3) for v in ring.ordered('cpu')] == [0.2, 0.3, 0.4, 0.5]
+        assert ring.first_time() == 2.0 and ring.last_time() == 5.0
+
+    def test_fixed_size(self):
+        ring = RingColumns(['time', 'a', 'b'], capacity=100)
+        size = ring.nbytes
+        for i in range(1000):
+            ring.append({'time': i, 'a': 1, 'b': 2})
+        assert ring.nbytes == size == 100 * (8 + 4 + 4)
+
+
+class TestMetricSeries:
+    """Test ingestion, rollups and queries"""
+
+    def test_ingest_skips_rows_already_stored(self, with_numpy):
+        series = MetricSeries(['cpu', 'mem'])
+        assert series.ingest(minute_rows(T0, 70)) == 70
+        # The next hourly fetch overlaps the previous one
+        assert series.ingest(minute_rows(T0 + 10 * 60, 70)) == 10
+        assert len(series.raw) == 80
+
+    def test_missing_values_are_nan(self, with_numpy):
+        series = MetricSeries(['cpu', 'mem'])
+        series.ingest([{'time': T0, 'cpu': None}, {'time': T0 + 60, 'cpu': 0.5}])
+        buckets = series.query('cpu')
+        assert list(buckets.time) == [T0 + 60]
+        assert len(series.query('mem').time) == 0
+
+    def test_downsampling_min_avg_max(self, with_numpy):
+        series = MetricSeries(['cpu', 'mem'])
+        series.ingest(minute_rows(T0, 120, cpu=lambda t: float((t - T0) // 60 % 10)))
+
+        buckets = series.query('cpu', step=600)
+
+        assert len(buckets.time) == 12
+        assert buckets.time[0] == T0 and buckets.time[1] == T0 + 600
+        assert buckets.min[0] == 0 and buckets.max[0] == 9
+        assert buckets.avg[0] == pytest.approx(4.5)
+
+    def test_range_selection(self, with_numpy):
+        series = MetricSeries(['cpu', 'mem'])
+        series.ingest(minute_rows(T0, 100))
+        buckets = series.query('cpu', start=T0 + 600, end=T0 + 1200)
+        assert buckets.time[0] == T0 + 600 and buckets.time[-1] == T0 + 1200 and len(buckets.time) == 11
+
+    def test_rollups_keep_history_beyond_the_raw_ring(self, with_numpy):
+        series = MetricSeries(['cpu', 'mem'], raw_capacity=180, tiers=((1800, 100), (10800, 100)))
+        size = series.nbytes
+        series.ingest(minute_rows(T0, 24 * 60, cpu=lambda t: 1.0 if (t - T0) % 1800 == 0 else 0.0))
+
+        assert series.nbytes == size
+        assert series.raw.first_time() == T0 + (24 * 60 - 180) * 60
+
+        # Older than the raw ring: answered from the 30 minute rollup
+        buckets = series.query('cpu', start=T0, step=1800)
+        assert len(buckets.time) == 48 and buckets.time[0] == T0
+        assert buckets.max[0] == 1.0 and buckets.min[0] == 0.0
+        assert buckets.avg[0] == pytest.approx(1 / 30)
+
+        # A coarser step rolls the rollup up again, weighted by samples
+        buckets = series.query('cpu', start=T0, step=10800)
+        assert len(buckets.time) == 8 and buckets.avg[0] == pytest.approx(1 / 30)
+
+        # Recent data at full resolution
+        assert len(series.query('cpu', start=series.raw.first_time()).time) == 180
+
+    def test_backfill_goes_to_the_rollups(self, with_numpy):
+        series = MetricSeries(['cpu', 'mem'])
+        assert series.ingest(minute_rows(T0, 70, step=1800), step=1800) == 70
+        assert len(series.raw) == 0
+
+        buckets = series.query('cpu', start=T0)
+        assert len(buckets.time) == 70 and buckets.time[1] - buckets.time[0] == 1800
+
+        # Later minute data continues the same tier
+        series.ingest(minute_rows(T0 + 70 * 1800, 60))
+        assert series.query('cpu', start=T0).time[-1] == T0 + 71 * 1800  # the hour spans two buckets
+
+        # Backfilling the same window again adds nothing
+        assert series.ingest(minute_rows(T0, 70, step=1800), step=1800) == 0
+
+    def test_unknown_field(self):
+        with pytest.raises(KeyError):
+            MetricSeries(['cpu']).query('disk')
+
+
+class TestMetricStore:
+    """Test cross-resource queries"""
+
+    def test_latest_and_top(self, with_numpy):
+        store = MetricStore()
+        for vmid in range(100, 110):
+            store.ingest(f"qemu/{vmid}", minute_rows(T0, 30, cpu=lambda t, v=vmid: (v - 100) / 10))
+        store.ingest('node/pve1', minute_rows(T0, 30, cpu=lambda t: 0.99))
+
+        latest = store.latest('cpu')
+        assert len(latest) == 10 and latest['qemu/105'] == pytest.approx(0.5)
+
+        top = store.top('cpu', n=3)
+        assert [key for key, _ in top] == ['qemu/109', 'qemu/108', 'qemu/107']
+        assert store.top('cpu', n=1, prefix='node/')[0][0] == 'node/pve1'
+
+    def test_unknown_resource(self):
+        with pytest.raises(KeyError):
+            MetricStore().query('qemu/1', 'cpu')
+
+
+class TestRRDCollector:
+    """Test collection against the API stand-in"""
+
+    @pytest.fixture
+    async def pve(self):
+        async with PVEStandIn(node='pve1', nodes=NODES, latency=0.005) as pve:
+            for vmid in range(100, 130):
+                pve.add_vm(vmid, node=NODES[vmid % 3])
+            yield pve
+
+    @pytest.mark.asyncio
+    async def test_collects_every_vm_and_node(self, pve):
+        config = pve.config(node=None, bulk_concurrency=8, bulk_per_node=2)
+        async with ProxmoxAPIAsync(config) as api:
+            collector = RRDCollector(api)
+            run = await collector.collect('hour')
+
+            assert run['vms'] == 30 and run['nodes'] == 3 and not run['errors']
+            assert run['rows'] == 33 * 70
+            assert pve.peak_in_flight['pve1'] <= 3  # two VM calls and the node call
+
+            store = collector.store
+            assert store.latest('cpu', 'qemu/')['qemu/107'] == pytest.approx(
+                rrd_cpu(107, store.series['qemu/107'].last_time()), abs=1e-6)
+            assert 'loadavg' in store.series['node/pve2'].fields
+
+            # Polling again only stores new minutes
+            assert (await collector.collect('hour'))['rows'] <= 33
+
+    @pytest.mark.asyncio
+    async def test_backfill_and_failures(self, pve):
+        async with ProxmoxAPIAsync(pve.config(node=None)) as api:
+            collector = RRDCollector(api, include_nodes=False)
+            run = await collector.collect('day', vm_ids=[100, 101, 999])
+
+            assert run['vms'] == 2 and list(run['errors']) == ['qemu/999']
+            history = collector.store.query('qemu/100', 'cpu')
+            assert len(history.time) == 70 and history.time[1] - history.time[0] == 1800
+
+    @pytest.mark.asyncio
+    async def test_monitoring_plugin(self, pve):
+        plugin = MonitoringPlugin({'proxmox': pve.config(node=None)})
+        assert await plugin.initialize()
+        try:
+            metrics = await plugin.execute('metrics')
+            assert 0 <= metrics['cpu_percent'] <= 100
+            assert metrics['proxmox']['vms'] == 30 and len(metrics['proxmox']['cpu']) == 30
+
+            history = await plugin.execute('history', resource='qemu/100', field='cpu', step=3600)
+            assert history['status'] == 'ok' and history['time']
+            assert all(lo <= avg <= hi for lo, avg, hi in zip(history['min'], history['avg'], history['max']))
+
+            missing = await plugin.execute('history', resource='qemu/999')
+            assert missing['status'] == 'error'
+        finally:
+            await plugin.cleanup()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
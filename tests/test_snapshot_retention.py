@@ -0,0 +1,198 @@
+"""
+Tests for snapshot_retention.py and the snapshot calls of ProxmoxAPIAsync
+"""
+
+import pytest
+import time
+from datetime import datetime, timezone
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.snapshot_retention import (RetentionPolicy, SnapshotInfo, SnapshotManager, disk_storages,
+                                    managed_snapshot_name, parse_snapshot_name)
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from lib.proxmox_api_sync import ProxmoxAPISync
+from tests.pve_standin import PVEStandIn
+
+DELETE_ROUTE = 'DELETE /api2/json/nodes/{node}/qemu/{vmid}/snapshot/{snapname}'
+HOUR = 3600
+DAY = 86400
+NOW = 1_700_000_000 // DAY * DAY + 12 * HOUR  # noon UTC
+
+
+def managed(vm_id, kind, snaptime):
+    name = managed_snapshot_name(kind, datetime.fromtimestamp(snaptime, timezone.utc))
+    return SnapshotInfo(vm_id=vm_id, name=name, snaptime=snaptime, kind=kind)
+
+
+class TestNames:
+    """Test managed names and disk parsing"""
+
+    def test_round_trip(self):
+        when = datetime(2024, 3, 1, 12, 30, 5, tzinfo=timezone.utc)
+        name = managed_snapshot_name('preshift', when)
+        assert name == 'ts-preshift-20240301-123005'
+        assert parse_snapshot_name(name) == ('preshift', when.timestamp())
+
+    def test_other_names_are_unmanaged(self):
+        assert parse_snapshot_name('pre-shift') is None
+        assert parse_snapshot_name('ts-manual-20240301-123005') is None
+        assert not SnapshotInfo.from_api(100, {'name': 'before-upgrade', 'snaptime': 1}).managed
+        with pytest.raises(ValueError):
+            managed_snapshot_name('manual')
+
+    def test_disk_storages(self):
+        config = {'scsi0': 'local-lvm:vm-100-disk-0,size=32G', 'virtio1': 'ceph:vm-100-disk-1,size=8G',
+                  'efidisk0': 'local-lvm:vm-100-disk-2,size=4M', 'ide2': 'local:iso/debian.iso,media=cdrom',
+                  'sata0': 'none,media=cdrom', 'net0': 'virtio=AA:BB:CC:DD:EE:FF,bridge=vmbr0'}
+        assert disk_storages(config) == ['ceph', 'local-lvm']
+
+
+class TestRetentionPolicy:
+    """Test the keep rules on one VM"""
+
+    def test_rules_are_a_union(self):
+        snapshots = [managed(100, 'auto', NOW - k * 6 * HOUR) for k in range(1, 41)]
+        recent_preshift = managed(100, 'preshift', NOW - 2 * HOUR)
+        old_preshift = managed(100, 'preshift', NOW - 30 * HOUR)
+        unmanaged = SnapshotInfo(vm_id=100, name='manual', snaptime=NOW - 90 * DAY)
+
+        keep, delete = RetentionPolicy(keep_last=3, keep_daily=7, preshift_hours=24).select(
+            snapshots + [recent_preshift, old_preshift, unmanaged], NOW)
+
+        # Newest three, plus the newest of each of the six earlier days
+        assert len(keep) == 9 and len(delete) == 33
+        assert keep[0] is recent_preshift and keep[0].reasons == ['last', 'daily', 'preshift']
+        assert [s.reasons for s in keep[1:3]] == [['last'], ['last']]
+        assert all(s.reasons == ['daily'] for s in keep[3:])
+        assert old_preshift in delete and unmanaged not in keep + delete
+
+    def test_preshift_hours(self):
+        preshift = managed(100, 'preshift', NOW - 30 * HOUR)
+        newer = managed(100, 'auto', NOW - HOUR)
+        keep, _ = RetentionPolicy(keep_last=1, keep_daily=0, preshift_hours=48).select([preshift, newer], NOW)
+        assert keep == [newer, preshift] and preshift.reasons == ['preshift']
+
+
+class TestSnapshotManager:
+    """Test planning and pruning against the API stand-in"""
+
+    @pytest.fixture
+    async def pve(self):
+        async with PVEStandIn(nodes=['pve1', 'pve2'], node='pve1', task_duration=0.03) as pve:
+            now = time.time()
+            for vmid in range(100, 112):
+                pve.add_vm(vmid, node=f"pve{vmid % 2 + 1}", storage='ceph' if vmid % 3 else 'local-lvm')
+                for day in range(1, 5):
+                    snaptime = now - day * DAY
+                    pve.add_snapshot(vmid, managed(vmid, 'auto', snaptime).name, snaptime)
+                pve.add_snapshot(vmid, managed(vmid, 'preshift', now - HOUR).name, now - HOUR)
+                pve.add_snapshot(vmid, 'manual', now - 30 * DAY)
+            yield pve
+
+    @pytest.fixture
+    async def manager(self, pve):
+        async with ProxmoxAPIAsync(pve.config(node=None)) as api:
+            yield SnapshotManager(api, RetentionPolicy(keep_last=1, keep_daily=0, preshift_hours=24),
+                                  per_storage=2)
+
+    @pytest.mark.asyncio
+    async def test_dry_run_only_plans(self, manager, pve, caplog):
+        with caplog.at_level('INFO', logger='lib.snapshot_retention'):
+            result = await manager.prune(dry_run=True)
+
+        assert result.dry_run and not result.deleted
+        assert pve.stats[DELETE_ROUTE] == 0
+        summary = result.plan.summary()
+        assert summary['delete'] == 48 and summary['keep'] == 12 and summary['unmanaged'] == 12
+        assert summary['storages'] == {'ceph': 32, 'local-lvm': 16}
+
+        table = result.plan.format_table()
+        assert table.count(' delete ') == 48 and 'preshift' in table and 'manual' not in table
+        assert table in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_prune_cluster_throttled_per_storage(self, manager, pve):
+        result = await manager.prune()
+
+        assert result.ok and len(result.deleted) == 48
+        for vmid in range(100, 112):
+            names = set(pve.vms[vmid]['snapshots'])
+            assert 'manual' in names and len(names) == 2
+        # Parallel across VMs, but never more than two tasks per storage
+        assert pve.peak_storage_in_flight['ceph'] == 2 and pve.peak_storage_in_flight['local-lvm'] == 2
+        assert result.peak_per_storage == {'ceph': 2, 'local-lvm': 2}
+
+        # Nothing left to do
+        assert not (await manager.plan()).delete
+
+    @pytest.mark.asyncio
+    async def test_failures_are_reported(self, manager, pve):
+        pve.fail_task(101, 'qmdelsnapshot', 'error with cfs lock')
+        plan = await manager.plan(vm_ids=[100, 101, 999])
+        result = await manager.apply(plan)
+
+        assert list(plan.errors) == [999]
+        assert len(result.deleted) == 7
+        [(snapshot, message)] = result.failed
+        assert snapshot.vm_id == 101 and 'cfs lock' in message
+        assert snapshot.name in pve.vms[101]['snapshots']
+
+    @pytest.mark.asyncio
+    async def test_create(self, manager, pve):
+        result = await manager.create([100, 101], kind='preshift')
+        assert result.ok
+        assert sum(1 for name in pve.vms[100]['snapshots'] if name.startswith('ts-preshift-')) == 2
+
+
+class TestClientSnapshots:
+    """Test list, rollback and delete in the clients"""
+
+    @pytest.fixture
+    async def pve(self):
+        async with PVEStandIn(task_duration=0.02) as pve:
+            pve.add_vm(100)
+            pve.add_snapshot(100, 'base', time.time() - DAY)
+            pve.add_snapshot(100, 'pre-shift', time.time() - HOUR)
+            yield pve
+
+    @pytest.mark.asyncio
+    async def test_list_rollback_delete(self, pve):
+        async with ProxmoxAPIAsync(pve.config()) as api:
+            snapshots = await api.list_vm_snapshots(100)
+            assert [s['name'] for s in snapshots] == ['base', 'pre-shift']
+            assert snapshots[1]['parent'] == 'base'
+
+            task = await api.rollback_vm_snapshot(100, 'base')
+            # The VM is locked while the rollback runs
+            assert await api.delete_vm_snapshot(100, 'pre-shift') is None
+            assert (await api.wait_task(task, timeout=5)).ok
+            assert pve.vms[100]['status'] == 'stopped'
+
+            task = await api.delete_vm_snapshot(100, 'pre-shift')
+            assert (await api.wait_task(task, timeout=5)).ok
+            assert [s['name'] for s in await api.list_vm_snapshots(100)] == ['base']
+
+            assert await api.delete_vm_snapshot(100, 'missing') is None
+            assert await api.list_vm_snapshots(999) is None
+
+    def test_sync_facade(self, pve_sync):
+        with ProxmoxAPISync(pve_sync.config()) as api:
+            task = api.delete_vm_snapshot(100, 'base')
+            assert api.wait_task(task, timeout=5).ok
+            assert [s['name'] for s in api.list_vm_snapshots(100)] == ['pre-shift']
+
+    @pytest.fixture
+    def pve_sync(self):
+        pve = PVEStandIn(task_duration=0.02)
+        with pve.background():
+            pve.add_vm(100)
+            pve.add_snapshot(100, 'base', time.time() - DAY)
+            pve.add_snapshot(100, 'pre-shift', time.time() - HOUR)
+            yield pve
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
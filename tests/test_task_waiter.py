@@ -0,0 +1,177 @@
+"""
+Tests for task_waiter.py
+"""
+
+import pytest
+import asyncio
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.task_waiter import TaskHandle, TaskWaiter, parse_upid
+from lib.proxmox_api import ProxmoxAPI
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn
+
+UPID = 'UPID:pve1:0001A2B3:00C4D5E6:65A1B2C3:qmstart:100:root@pam:'
+CLUSTER_TASKS_ROUTE = 'GET /api2/json/cluster/tasks'
+TASK_STATUS_ROUTE = 'GET /api2/json/nodes/{node}/tasks/{upid}/status'
+
+
+class TestTaskHandle:
+    """Test UPID parsing and status updates"""
+
+    def test_parse_upid(self):
+        fields = parse_upid(UPID)
+        assert fields['node'] == 'pve1'
+        assert fields['starttime'] == 0x65A1B2C3
+        assert fields['type'] == 'qmstart' and fields['id'] == '100'
+
+        with pytest.raises(ValueError):
+            parse_upid('not-a-upid')
+
+    def test_update_from_status_and_cluster_tasks(self):
+        handle = TaskHandle.from_upid(UPID)
+        assert handle.vm_id == 100 and handle.node == 'pve1'
+
+        assert handle.update({'status': 'running'}) is False
+        assert handle.update({'status': 'stopped', 'exitstatus': 'WARNINGS: 1'}) is True
+        assert handle.ok and handle.duration is not None
+
+        listed = TaskHandle.from_upid(UPID)
+        assert listed.update({'upid': UPID}) is False
+        assert listed.update({'upid': UPID, 'endtime': 1, 'status': 'start failed'}) is True
+        assert listed.done and not listed.ok
+        assert listed.exitstatus == 'start failed'
+
+
+class TestSyncTasks:
+    """Test task handles on the synchronous client"""
+
+    def test_start_and_wait(self):
+        pve = PVEStandIn(task_duration=0.2)
+        pve.add_vm(100, status='stopped')
+        with pve.background():
+            api = ProxmoxAPI(pve.config())
+
+            task = api.start_vm(100)
+            assert task.task_type == 'qmstart' and not task.done
+            assert api.wait_task(task, poll_interval=0.05).ok
+            assert api.get_vm_status(100)['status'] == 'running'
+
+            pve.fail_task(100, 'qmsnapshot', 'snapshot feature is not available')
+            task = api.wait_task(api.create_vm_snapshot(100, 'pre-shift'), poll_interval=0.05)
+            assert task.done and not task.ok
+            assert task.exitstatus == 'snapshot feature is not available'
+
+            pve.task_duration = 5
+            task = api.wait_task(api.stop_vm(100), timeout=0.2, poll_interval=0.05)
+            assert not task.done
+
+    def test_failed_post_returns_none(self):
+        pve = PVEStandIn()
+        with pve.background():
+            assert ProxmoxAPI(pve.config()).start_vm(404) is None
+
+
+class TestTaskWaiter:
+    """Test batched polling against the stand-in"""
+
+    @pytest.mark.asyncio
+    async def test_hundreds_of_tasks_batched(self):
+        async with PVEStandIn(task_duration=0.3) as pve:
+            for vmid in range(1000, 1200):
+                pve.add_vm(vmid, status='stopped')
+
+            async with ProxmoxAPIAsync(pve.config()) as api:
+                api.task_waiter.poll_interval = 0.05
+                tasks = await asyncio.gather(*(api.start_vm(vmid) for vmid in range(1000, 1200)))
+
+                finished = [task async for task in api.wait_tasks(tasks, timeout=10)]
+
+            assert len(finished) == 200 and all(task.ok for task in finished)
+            assert all(vm['status'] == 'running' for vm in pve.vms.values())
+            # A handful of /cluster/tasks calls instead of one status call per task per round;
+            # only a tail of fewer than batch_threshold tasks is polled one by one
+            assert pve.stats[CLUSTER_TASKS_ROUTE] <= 15
+            assert pve.stats[TASK_STATUS_ROUTE] < api.task_waiter.batch_threshold
+
+    @pytest.mark.asyncio
+    async def test_streams_in_completion_order(self):
+        async with PVEStandIn() as pve:
+            pve.add_vm(100)
+            pve.add_vm(101)
+            async with ProxmoxAPIAsync(pve.config()) as api:
+                api.task_waiter.poll_interval = 0.05
+
+                pve.task_duration = 0.6
+                slow = await api.create_vm_snapshot(100, 'pre-shift')
+                pve.task_duration = 0.1
+                fast = await api.stop_vm(101)
+
+                order = [task.vm_id async for task in api.wait_tasks([slow, fast])]
+
+            assert order == [101, 100]
+            assert 'pre-shift' in pve.vms[100]['snapshots']
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_task_status(self):
+        # /cluster/tasks only lists the newest two tasks
+        async with PVEStandIn(task_duration=0.2, cluster_task_limit=2) as pve:
+            for vmid in range(100, 106):
+                pve.add_vm(vmid)
+
+            async with ProxmoxAPIAsync(pve.config()) as api:
+                waiter = TaskWaiter(api, poll_interval=0.05, batch_threshold=4)
+                tasks = [await api.stop_vm(vmid) for vmid in range(100, 106)]
+
+                finished = await waiter.wait_all(tasks, timeout=5)
+
+            assert all(task.ok for task in finished)
+            assert waiter.stats['batch_calls'] >= 1
+            assert pve.stats[TASK_STATUS_ROUTE] >= 4
+
+    @pytest.mark.asyncio
+    async def test_wait_timeout_and_backoff(self):
+        async with PVEStandIn(task_duration=10) as pve:
+            pve.add_vm(100)
+            async with ProxmoxAPIAsync(pve.config()) as api:
+                waiter = TaskWaiter(api, poll_interval=0.05, max_poll_interval=0.2, backoff=2)
+                task = await api.stop_vm(100)
+
+                with pytest.raises(asyncio.TimeoutError):
+                    await waiter.wait(task, timeout=1.0)
+
+                assert waiter.pending == 0
+                # 0.05, 0.1, 0.2, 0.2, ... rather than a poll every 50 ms
+                assert waiter.stats['rounds'] <= 8
+                await waiter.close()
+
+    @pytest.mark.asyncio
+    async def test_wait_abandoned_during_listing(self, caplog):
+        class SlowListing:
+            async def list_cluster_tasks(self):
+                await asyncio.sleep(0.2)
+                return []
+
+            async def get_task_status(self, handle):
+                return {'status': 'running'}
+
+        waiter = TaskWaiter(SlowListing(), poll_interval=0.05, batch_threshold=2)
+        first, second = TaskHandle.from_upid(UPID), TaskHandle.from_upid(UPID.replace(':100:', ':101:'))
+        waiting = asyncio.ensure_future(waiter.wait(second))
+
+        with pytest.raises(asyncio.TimeoutError):
+            await waiter.wait(first, timeout=0.1)
+        await asyncio.sleep(0.15)
+
+        # The round finished for the task still waited on, without touching the abandoned one
+        assert waiter._misses == {second.upid: 1}
+        assert 'polling round failed' not in caplog.text
+        waiting.cancel()
+        await waiter.close()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,265 @@
+"""
+Tests for ticket_cache.py
+"""
+
+import pytest
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lib.secure_token_storage as secure_token_storage
+from lib.secure_token_storage import SecureTokenStorage
+from lib.ticket_cache import TicketCache, ticket_expiry, TICKET_LIFETIME
+from lib.proxmox_api import ProxmoxAPI
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn
+
+TICKET_ROUTE = 'POST /api2/json/access/ticket'
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """Cache backed by the encrypted file fallback in a temporary directory"""
+    def no_keyring(*args, **kwargs):
+        raise RuntimeError("no keyring in tests")
+
+    monkeypatch.setattr(secure_token_storage.keyring, 'set_password', no_keyring)
+    monkeypatch.setattr(secure_token_storage.keyring, 'get_password', no_keyring)
+    monkeypatch.setattr(secure_token_storage.keyring, 'delete_password', no_keyring)
+
+    storage = SecureTokenStorage()
+    storage.fallback_dir = tmp_path / 'secure'
+    storage.fallback_dir.mkdir()
+    return TicketCache(storage=storage, lock_dir=tmp_path / 'locks')
+
+
+class TestTicketCache:
+    """Test storage, expiry and locking"""
+
+    def test_ticket_expiry_from_ticket(self):
+        assert ticket_expiry('PVE:root@pam:65A1B2C3::c2lnbmF0dXJl') == 0x65A1B2C3 + TICKET_LIFETIME
+        assert ticket_expiry('opaque', issued=100.0) == 100.0 + TICKET_LIFETIME
+
+    def test_store_and_load_encrypted(self, cache):
+        key = TicketCache.key('10.0.0.1', 8006, 'root@pam')
+        cache.store(key, 'PVE:secret-ticket', 'csrf', time.time() + 3600)
+
+        entry = cache.load(key)
+        assert entry['ticket'] == 'PVE:secret-ticket'
+        assert entry['csrf_token'] == 'csrf'
+
+        on_disk = (cache.storage.fallback_dir / f"{key}.enc").read_bytes()
+        assert b'secret-ticket' not in on_disk
+
+    def test_tickets_near_expiry_not_reused(self, cache):
+        key = TicketCache.key('10.0.0.1', 8006, 'root@pam')
+        cache.store(key, 'PVE:t', 'csrf', time.time() + 200)
+        assert cache.load(key) is None
+
+        cache.invalidate(key)
+        assert cache.storage.retrieve_token(key) is None
+
+    def test_keys_separate_endpoints_and_users(self):
+        assert TicketCache.key('a', 8006, 'root@pam') != TicketCache.key('b', 8006, 'root@pam')
+        assert TicketCache.key('a', 8006, 'root@pam') != TicketCache.key('a', 8006, 'ops@pve')
+
+    def test_lock_is_exclusive(self, cache):
+        key = 'k'
+        fd = cache.acquire(key)
+        cache.lock_timeout = 0.1
+        assert cache.acquire(key) is None
+        cache.release(fd)
+        cache.release(cache.acquire(key))
+
+
+class TestClientsShareTickets:
+    """Test ticket reuse across client instances (standing in for processes)"""
+
+    def test_sync_clients_login_once(self, cache):
+        pve = PVEStandIn()
+        pve.add_vm(100)
+        with pve.background():
+            results = []
+
+            def run():
+                api = ProxmoxAPI(pve.config())
+                api.ticket_cache = cache
+                results.append(api.get_vm_status(100))
+
+            threads = [threading.Thread(target=run) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert [r['status'] for r in results] == ['running'] * 6
+            assert pve.stats[TICKET_ROUTE] == 1
+
+    @pytest.mark.asyncio
+    async def test_async_clients_login_once(self, cache):
+        async with PVEStandIn() as pve:
+            pve.add_vm(100)
+            apis = [ProxmoxAPIAsync(pve.config()) for _ in range(4)]
+            for api in apis:
+                api.ticket_cache = cache
+            try:
+                statuses = await asyncio.gather(*(api.get_vm_status(100) for api in apis))
+            finally:
+                for api in apis:
+                    await api.close()
+
+            assert all(s['status'] == 'running' for s in statuses)
+            assert pve.stats[TICKET_ROUTE] == 1
+            assert apis[0].ticket_expiry.timestamp() == pytest.approx(time.time() + TICKET_LIFETIME, abs=5)
+
+    def test_disabled_by_default(self):
+        assert ProxmoxAPI({'host': '10.0.0.1'}).ticket_cache is None
+        assert ProxmoxAPIAsync({'host': '10.0.0.1', 'username': 'root@pam'}).ticket_cache is None
+
+
+
+class TestTicketLifecycle:
+    """Test single-flight login, background renewal and 401 recovery"""
+
+    @pytest.fixture
+    async def pve(self):
+        async with PVEStandIn(login_delay=0.1) as pve:
+            for vmid in range(100, 150):
+                pve.add_vm(vmid)
+            yield pve
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_login(self, pve):
+        async with ProxmoxAPIAsync(pve.config()) as api:
+            statuses = await api.batch_vm_status(list(range(100, 150)))
+            assert all(s['status'] == 'running' for s in statuses.values())
+            assert pve.stats[TICKET_ROUTE] == 1
+
+            # Near expiry every caller wants a new ticket; only one login happens
+            api.ticket_expiry = datetime.now() + timedelta(seconds=60)
+            await api.batch_vm_status(list(range(100, 150)))
+            assert pve.stats[TICKET_ROUTE] == 2 and api.auth_stats['logins'] == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_the_login(self, pve):
+        async with ProxmoxAPIAsync(pve.config()) as api:
+            first = asyncio.ensure_future(api.authenticate())
+            second = asyncio.ensure_future(api.authenticate())
+            await asyncio.sleep(0.02)
+            first.cancel()
+            assert await second is True and api.ticket
+
+    @pytest.mark.asyncio
+    async def test_background_renewal(self, pve):
+        # Renew about a second after each login instead of 15 minutes before expiry
+        async with ProxmoxAPIAsync(pve.config(ticket_renew_before=TICKET_LIFETIME - 1.3)) as api:
+            api.renew_retry = 0.1
+            await api.get_vm_status(100)
+            first = api.ticket
+            await asyncio.sleep(1.5)
+
+            assert api.auth_stats['renewals'] >= 1 and api.ticket != first
+            assert (await api.get_vm_status(100))['status'] == 'running'
+            assert pve.stats[TICKET_ROUTE] == 1 + api.auth_stats['renewals']
+
+        assert api._renew_task is None
+
+    @pytest.mark.asyncio
+    async def test_failed_renewal_backs_off_until_expiry(self, pve):
+        async with ProxmoxAPIAsync(pve.config(ticket_renewal=False)) as api:
+            api.renew_retry_min, api.renew_retry = 0.1, 0.4
+            await api.authenticate()
+            pve.password = 'rotated'
+            api.ticket_expiry = datetime.now() + timedelta(seconds=1.0)
+
+            attempts = []
+            login = api._login
+
+            async def timed_login():
+                attempts.append(time.monotonic())
+                return await login()
+
+            api._login = timed_login
+            # Retries after 0.1, 0.2 and 0.4s; the ticket expires at 1.0s and renewal gives up
+            started = time.monotonic()
+            await asyncio.wait_for(api._renew_ticket(), 2.0)
+            assert 0.9 <= time.monotonic() - started < 1.3
+
+            gaps = [later - earlier for earlier, later in zip(attempts, attempts[1:])]
+            assert len(attempts) >= 3 and api.auth_stats['renewal_failures'] == len(attempts)
+            assert gaps[0] >= 0.1 and gaps[1] >= 0.2
+            assert api.auth_stats['renewals'] == 0 and pve.stats[TICKET_ROUTE] == 1 + len(attempts)
+
+    @pytest.mark.asyncio
+    async def test_revoked_ticket_reauthenticates_once(self, pve):
+        async with ProxmoxAPIAsync(pve.config()) as api:
+            await api.get_vm_status(100)
+            pve.revoke_tickets()
+
+            # Both the direct and the _api_request code paths recover
+            statuses = await asyncio.gather(*(api.get_vm_status(vmid) for vmid in range(100, 120)))
+            configs = await asyncio.gather(*(api.get_vm_config(vmid) for vmid in range(100, 120)))
+            task = await api.start_vm(100)
+
+            assert all(s['status'] == 'running' for s in statuses) and all(configs) and task
+            assert pve.stats[TICKET_ROUTE] == 2
+            assert api.auth_stats['reauths'] >= 1
+
+    @pytest.mark.asyncio
+    async def test_failed_reauthentication_is_not_retried(self, pve):
+        async with ProxmoxAPIAsync(pve.config()) as api:
+            await api.get_vm_status(100)
+            pve.revoke_tickets()
+            pve.password = 'rotated'
+
+            assert await api.get_vm_config(100) is None
+            assert await api.get_vm_status(100) is None
+            assert pve.stats[TICKET_ROUTE] == 3  # the first login and one attempt per request
+
+    @pytest.mark.asyncio
+    async def test_revoked_ticket_is_not_taken_from_the_cache(self, pve, cache):
+        async with ProxmoxAPIAsync(pve.config()) as api:
+            api.ticket_cache = cache
+            await api.get_vm_status(100)
+            pve.revoke_tickets()
+
+            assert (await api.get_vm_status(100))['status'] == 'running'
+            assert pve.stats[TICKET_ROUTE] == 2
+            key = TicketCache.key(api.host, api.port, api.username)
+            assert cache.load(key)['ticket'] == api.ticket
+
+    def test_sync_client_replaces_a_revoked_ticket(self, cache):
+        pve = PVEStandIn()
+        pve.add_vm(100)
+        with pve.background():
+            api = ProxmoxAPI(pve.config())
+            api.ticket_cache = cache
+            assert api.get_vm_status(100)
+            rejected = api.ticket
+            pve.revoke_tickets()
+
+            assert api.get_vm_status(100)['status'] == 'running' and api.start_vm(100)
+            assert api.ticket != rejected and pve.stats[TICKET_ROUTE] == 2
+            key = TicketCache.key(api.host, api.port, api.username)
+            assert cache.load(key)['ticket'] == api.ticket
+
+            # A login that fails too is not retried
+            pve.revoke_tickets()
+            pve.password = 'rotated'
+            assert api.get_vm_status(100) is None and pve.stats[TICKET_ROUTE] == 3
+            api.close()
+
+    @pytest.mark.asyncio
+    async def test_api_tokens_are_not_retried(self, pve):
+        token = pve.add_api_token()
+        async with ProxmoxAPIAsync(pve.config(api_token=token[:-1] + '9')) as api:
+            assert await api.get_vm_config(100) is None
+            assert pve.stats[TICKET_ROUTE] == 0
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
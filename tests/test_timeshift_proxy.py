@@ -0,0 +1,206 @@
+"""
+Tests for timeshift_proxy.py
+"""
+
+import pytest
+import hashlib
+import ssl
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+from cryptography import x509
+from cryptography.hazmat.primitives.serialization import Encoding
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.timeshift_proxy import (
+    TimeShiftProxy, CertificateValidationError, verify_certificate_at, parse_target_date,
+    METRICS_PATH
+)
+from tests.tls_fleet import make_self_signed_cert, write_cert_pair
+
+
+def past_date():
+    """A date inside the 'expired' window of tls_fleet certificates"""
+    return (datetime.now(timezone.utc) - timedelta(days=2 * 365)).strftime('%Y-%m-%d')
+
+
+@pytest.fixture
+def cert_dir():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield Path(tmp)
+
+
+@pytest.fixture
+async def backend(cert_dir):
+    """TLS BMC stand-in presenting an expired certificate"""
+    cert_pem, key_pem = make_self_signed_cert('bmc.test', 'expired')
+    cert_file, key_file = write_cert_pair(cert_dir, 'bmc', cert_pem, key_pem)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_file, key_file)
+
+    seen = []
+
+    async def handle(request):
+        seen.append(request)
+        if request.path == '/login':
+            body = await request.read()
+            raise web.HTTPFound(f"https://127.0.0.1:{port}/start?u={body.decode()}")
+        return web.Response(text=f"bmc {request.method} {request.path_qs}",
+                            headers={'X-Backend-Host': request.host})
+
+    app = web.Application()
+    app.router.add_route('*', '/{tail:.*}', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0, ssl_context=context)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    yield {
+        'url': f"https://127.0.0.1:{port}",
+        'cert_file': cert_file,
+        'seen': seen,
+    }
+    await runner.cleanup()
+
+
+async def start_proxy(config, cert_dir):
+    config.setdefault('certs_dir', str(cert_dir / 'proxy'))
+    proxy = TimeShiftProxy(config)
+    await proxy.start('127.0.0.1', 0)
+    port = proxy.runner.addresses[0][1]
+    return proxy, f"https://127.0.0.1:{port}"
+
+
+@pytest.fixture
+async def client():
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False))
+    yield session
+    await session.close()
+
+
+class TestCertificateValidation:
+    """Test validation against a target date"""
+
+    def test_window_checked_at_target_date(self):
+        cert_pem, _ = make_self_signed_cert('bmc.test', 'expired')
+        der = x509.load_pem_x509_certificate(cert_pem).public_bytes(Encoding.DER)
+
+        verify_certificate_at(der, parse_target_date(past_date()))
+        with pytest.raises(CertificateValidationError):
+            verify_certificate_at(der, datetime.now(timezone.utc))
+
+    def test_fingerprint_and_ca(self):
+        cert_pem, _ = make_self_signed_cert('bmc.test', 'expired')
+        other_pem, _ = make_self_signed_cert('other.test', 'expired')
+        cert = x509.load_pem_x509_certificate(cert_pem)
+        der = cert.public_bytes(Encoding.DER)
+        when = parse_target_date(past_date())
+
+        verify_certificate_at(der, when, fingerprint=hashlib.sha256(der).hexdigest().upper())
+        verify_certificate_at(der, when, ca_certs=[cert])
+        with pytest.raises(CertificateValidationError):
+            verify_certificate_at(der, when, fingerprint='00' * 32)
+        with pytest.raises(CertificateValidationError):
+            verify_certificate_at(der, when, ca_certs=[x509.load_pem_x509_certificate(other_pem)])
+
+    def test_parse_target_date(self):
+        assert parse_target_date('2019-06-01') == datetime(2019, 6, 1, 12, tzinfo=timezone.utc)
+        assert parse_target_date('2019-06-01T08:00:00Z').hour == 8
+
+
+class TestTimeShiftProxy:
+    """Test proxying through the asyncio server"""
+
+    @pytest.mark.asyncio
+    async def test_proxies_expired_backend(self, backend, cert_dir, client):
+        proxy, url = await start_proxy({'backends': [{
+            'name': 'bmc', 'url': backend['url'], 'target_date': past_date(),
+            'ca_file': backend['cert_file'],
+        }]}, cert_dir)
+        try:
+            async with client.get(f"{url}/sysmgmt?x=1") as resp:
+                assert resp.status == 200
+                assert await resp.text() == 'bmc GET /sysmgmt?x=1'
+                assert resp.headers['X-Backend-Host'] == backend['url'].split('//')[1]
+
+            async with client.post(f"{url}/login", data=b'root', allow_redirects=False) as resp:
+                assert resp.status == 302
+                assert resp.headers['Location'] == '/start?u=root'
+
+            metrics = await (await client.get(f"{url}{METRICS_PATH}")).json()
+            assert metrics['backends']['bmc']['requests'] == 2
+            assert metrics['backends']['bmc']['certificate']['validated'] is True
+            # Both requests reuse one pooled upstream connection
+            assert len({r.transport for r in backend['seen']}) == 1
+        finally:
+            await proxy.stop()
+
+    @pytest.mark.asyncio
+    async def test_rejects_at_current_date(self, backend, cert_dir, client):
+        proxy, url = await start_proxy({'backends': [{
+            'name': 'bmc', 'url': backend['url'],
+            'target_date': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+        }]}, cert_dir)
+        try:
+            async with client.get(f"{url}/") as resp:
+                assert resp.status == 502
+                assert 'certificate rejected' in (await resp.json())['error']
+            assert backend['seen'] == []
+        finally:
+            await proxy.stop()
+
+    @pytest.mark.asyncio
+    async def test_rejects_wrong_pin(self, backend, cert_dir, client):
+        proxy, url = await start_proxy({'backends': [{
+            'name': 'bmc', 'url': backend['url'], 'target_date': past_date(),
+            'fingerprint': '11' * 32,
+        }]}, cert_dir)
+        try:
+            async with client.get(f"{url}/") as resp:
+                assert resp.status == 502
+            metrics = await (await client.get(f"{url}{METRICS_PATH}")).json()
+            assert metrics['errors'] == 1
+        finally:
+            await proxy.stop()
+
+    @pytest.mark.asyncio
+    async def test_host_routing_and_health(self, backend, cert_dir, client):
+        proxy, url = await start_proxy({'backends': [
+            {'name': 'a', 'url': backend['url'], 'target_date': past_date(),
+             'server_names': ['a.idrac.local']},
+            {'name': 'b', 'url': backend['url'], 'target_date': past_date(),
+             'server_names': ['b.idrac.local']},
+        ]}, cert_dir)
+        try:
+            async with client.get(f"{url}/", headers={'Host': 'b.idrac.local'}) as resp:
+                assert resp.status == 200
+            async with client.get(f"{url}/", headers={'Host': 'unknown.local'}) as resp:
+                assert resp.status == 421
+
+            health = await (await client.get(f"{url}/health")).json()
+            assert health['status'] == 'healthy'
+            assert health['backends'] == 2
+            assert proxy.metrics.backends['b']['requests'] == 1
+        finally:
+            await proxy.stop()
+
+    @pytest.mark.asyncio
+    async def test_generates_listen_certificate(self, cert_dir, client):
+        proxy, url = await start_proxy({}, cert_dir)
+        try:
+            async with client.get(f"{url}/health") as resp:
+                assert resp.status == 200
+            assert (cert_dir / 'proxy' / 'proxy.crt').exists()
+        finally:
+            await proxy.stop()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,147 @@
+"""
+Tests for vm_deploy.py and the provisioning calls of ProxmoxAPIAsync
+"""
+
+import pytest
+import asyncio
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.vm_deploy import DeployPipeline, VMIDAllocator, VMSpec, boot_disk
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn
+
+CLONE_ROUTE = 'POST /api2/json/nodes/{node}/qemu/{vmid}/clone'
+TEMPLATE = 9000
+
+
+@pytest.fixture
+async def pve():
+    async with PVEStandIn(nodes=['pve1', 'pve2'], node='pve1', task_duration=0.1) as pve:
+        pve.agent_boot = 0.2
+        pve.add_vm(TEMPLATE, name='debian-tmpl', template=True, tags=['base'])
+        pve.add_vm(100)
+        pve.add_vm(102)
+        yield pve
+
+
+@pytest.fixture
+async def api(pve):
+    async with ProxmoxAPIAsync(pve.config(node=None)) as api:
+        api.task_waiter.poll_interval = 0.02
+        yield api
+
+
+class TestBootDisk:
+    """Test finding the disk to grow"""
+
+    def test_first_disk(self):
+        config = {'ide2': 'local:iso/debian.iso,media=cdrom', 'virtio1': 'ceph:vm-1-disk-1,size=1T',
+                  'scsi1': 'ceph:vm-1-disk-2,size=512M', 'scsi0': 'ceph:vm-1-disk-0,size=32G', 'sata0': 'none'}
+        assert boot_disk(config) == ('scsi0', 32.0)
+        assert boot_disk({'virtio0': 'ceph:vm-1-disk-0,size=1T'}) == ('virtio0', 1024.0)
+        assert boot_disk({'net0': 'virtio,bridge=vmbr0'}) is None
+
+
+class TestVMIDAllocator:
+    """Test collision-free VM ID allocation"""
+
+    @pytest.mark.asyncio
+    async def test_skips_used_reserved_and_unindexed(self, api, pve):
+        allocator = VMIDAllocator(api)
+        await api.refresh_index()
+        pve.add_vm(101)  # created after the index was loaded
+
+        ids = await asyncio.gather(*(allocator.allocate() for _ in range(3)))
+        assert sorted(ids) == [103, 104, 105]
+        allocator.release(104)
+        assert await allocator.allocate() == 104
+
+
+class TestDeployPipeline:
+    """Test the deploy stages against the API stand-in"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_linked_clones(self, api, pve):
+        pipeline = DeployPipeline(api, 'debian-tmpl', agent_timeout=5)
+        specs = [VMSpec(f"ts-{i}", cores=4, memory=4096, disk=40, tags=['time-shift'], target='pve2')
+                 for i in range(6)]
+
+        report = await pipeline.deploy(specs)
+
+        assert report.ok, report.summary()
+        ids = [result.vm_id for result in report.results]
+        assert ids == [101, 103, 104, 105, 106, 107]
+        for result in report.results:
+            vm = pve.vms[result.vm_id]
+            assert result.linked and result.node == 'pve2' and vm['status'] == 'running'
+            assert (vm['maxcpu'], vm['maxmem'] >> 20, vm['disk_size'], vm['tags']) == (4, 4096, 40, ['time-shift'])
+            assert set(result.stages) == {'allocate', 'clone', 'configure', 'start', 'agent'}
+            assert result.stages['agent'] > 0.1
+
+        # Pipelined: about one VM's time to ready, not six
+        summary = report.summary()
+        assert report.elapsed < 2 * summary['time_to_ready_s']['max']
+        assert summary['deployed'] == 6 and summary['linked'] == 6
+        assert set(summary['stages_s']) == {'allocate', 'clone', 'configure', 'start', 'agent'}
+
+    @pytest.mark.asyncio
+    async def test_full_clone_fallback(self, api, pve):
+        pve.no_linked_clones.add('local-lvm')
+        report = await DeployPipeline(api, TEMPLATE, wait_agent=False).deploy([VMSpec('a'), VMSpec('b')])
+
+        assert report.ok and not any(result.linked for result in report.results)
+        # The unsupported linked clone was tried once, not once per VM
+        assert pve.stats[CLONE_ROUTE] == 3
+
+    @pytest.mark.asyncio
+    async def test_failed_clone_is_retried_linked(self, api, pve):
+        pve.fail_task(101, 'qmclone', 'clone failed: storage busy')
+        pipeline = DeployPipeline(api, TEMPLATE, wait_agent=False)
+        [result] = (await pipeline.deploy([VMSpec('a')])).results
+
+        assert result.ok and result.linked and result.vm_id == 101
+        assert pipeline._linked_supported and pve.stats[CLONE_ROUTE] == 2
+
+        source = pve.add_vm(150, name='not-a-template')
+        api.cluster_index.invalidate()
+        [result] = (await DeployPipeline(api, 150, wait_agent=False).deploy([VMSpec('b')])).results
+        assert result.ok and not result.linked and source['template'] is False
+
+    @pytest.mark.asyncio
+    async def test_id_taken_during_clone(self, api, pve):
+        submit_clone = api.submit_clone
+
+        async def racing_clone(vm_id, new_id, *args, **kwargs):
+            if new_id == 101:
+                pve.add_vm(101, name='someone-else')
+            return await submit_clone(vm_id, new_id, *args, **kwargs)
+
+        api.submit_clone = racing_clone
+        [result] = (await DeployPipeline(api, TEMPLATE, wait_agent=False).deploy([VMSpec('mine')])).results
+        assert result.ok and result.vm_id == 103
+        assert pve.vms[101]['name'] == 'someone-else' and pve.vms[103]['name'] == 'mine'
+
+    @pytest.mark.asyncio
+    async def test_failures_name_the_stage(self, api, pve):
+        pve.fail_task(103, 'qmstart', 'start failed: QEMU exited with code 1')
+        pve.vms[TEMPLATE]['agent'] = False
+        pipeline = DeployPipeline(api, TEMPLATE, agent_timeout=0.5)
+
+        report = await pipeline.deploy([VMSpec('a'), VMSpec('b')])
+
+        started, booted = report.results
+        assert started.failed_stage == 'agent' and 'did not answer' in started.error
+        assert booted.failed_stage == 'start' and 'QEMU exited' in booted.error
+        # The clone exists, so its ID is reported for cleanup
+        assert booted.vm_id == 103 and 103 in pve.vms
+        assert not report.deployed and report.summary()['time_to_ready_s'] is None
+
+        missing = await DeployPipeline(api, 'no-such-template').deploy([VMSpec('c')])
+        assert missing.results[0].failed_stage == 'clone' and 'not found' in missing.results[0].error
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
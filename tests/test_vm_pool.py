@@ -0,0 +1,195 @@
+"""
+Tests for vm_pool.py
+"""
+
+import pytest
+import asyncio
+import time
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.vm_deploy import VMSpec
+from lib.vm_pool import ORPHAN_TAG, POOL_TAG, WarmPool
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn
+
+TEMPLATE = 9000
+
+
+async def until(condition, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.02)
+
+
+def pool_vms(pve, status=None):
+    return sorted(vmid for vmid, vm in pve.vms.items()
+                  if POOL_TAG in vm['tags'] and (status is None or vm['status'] == status))
+
+
+@pytest.fixture
+async def pve():
+    async with PVEStandIn(nodes=['pve1', 'pve2'], node='pve1', task_duration=0.05) as pve:
+        pve.agent_boot = 0.3
+        pve.add_vm(TEMPLATE, name='debian-tmpl', template=True)
+        yield pve
+
+
+@pytest.fixture
+async def api(pve):
+    async with ProxmoxAPIAsync(pve.config(node=None)) as api:
+        api.task_waiter.poll_interval = 0.02
+        yield api
+
+
+def make_pool(api, **options):
+    options.setdefault('spec', VMSpec('ts-pool', cores=4, tags=['time-shift']))
+    return WarmPool(api, 'debian-tmpl', check_interval=0.2, **options)
+
+
+class TestWarmPool:
+    """Test the pool against the API stand-in"""
+
+    @pytest.mark.asyncio
+    async def test_fills_every_node(self, api, pve):
+        async with make_pool(api, size=2) as pool:
+            await until(lambda: pool.available() == 4)
+            assert pool.available('pve1') == pool.available('pve2') == 2
+
+            idle = pool_vms(pve)
+            assert len(idle) == 4 and idle == pool_vms(pve, 'stopped')
+            assert sorted(pve.vms[vmid]['node'] for vmid in idle) == ['pve1', 'pve1', 'pve2', 'pve2']
+            assert all(pve.vms[vmid]['maxcpu'] == 4 for vmid in idle)
+            assert pool.stats['provisioned'] == 4 and pool.lead_time < 120
+
+    @pytest.mark.asyncio
+    async def test_hit_is_served_from_the_pool_and_refilled(self, api, pve):
+        async with make_pool(api, size=1, nodes=['pve2']) as pool:
+            await until(lambda: pool.available() == 1)
+            [pooled] = pool_vms(pve)
+
+            lease = await pool.acquire('bmc-10', tags=['time-shift', 'bmc'])
+            assert lease.ok and lease.hit and (lease.vm_id, lease.node) == (pooled, 'pve2')
+            vm = pve.vms[pooled]
+            assert (vm['name'], vm['tags'], vm['status']) == ('bmc-10', ['time-shift', 'bmc'], 'running')
+
+            await until(lambda: pool.available('pve2') == 1)
+            assert pool_vms(pve) != [pooled]
+            summary = pool.summary()
+            assert summary['hits'] == 1 and summary['hit_rate'] == 1.0
+            assert summary['acquire_latency_s']['hit']['count'] == 1
+            assert summary['nodes']['pve2']['demand'] == 1
+
+    @pytest.mark.asyncio
+    async def test_paused_pool_resumes_instantly(self, api, pve):
+        async with make_pool(api, size=1, nodes=['pve1'], state='paused') as pool:
+            await until(lambda: pool.available() == 1)
+            [pooled] = pool_vms(pve)
+            assert pve.vms[pooled]['status'] == 'running' and pve.vms[pooled]['paused']
+
+            lease = await pool.acquire('bmc-11')
+            assert lease.hit and not pve.vms[pooled]['paused']
+            # No boot, no agent wait: resuming is one short task
+            assert lease.latency < pve.agent_boot
+
+    @pytest.mark.asyncio
+    async def test_miss_deploys_on_demand(self, api, pve):
+        async with make_pool(api, size=0, min_size=0, nodes=['pve1']) as pool:
+            lease = await pool.acquire('bmc-12', node='pve1')
+
+            assert lease.ok and not lease.hit and pve.vms[lease.vm_id]['status'] == 'running'
+            assert lease.latency > pve.agent_boot
+            assert POOL_TAG not in pve.vms[lease.vm_id]['tags']
+            assert pool.hit_rate == 0.0 and pool.summary()['acquire_latency_s']['hit'] is None
+
+    @pytest.mark.asyncio
+    async def test_broken_pool_vm_is_discarded(self, api, pve):
+        pool = make_pool(api, size=2, nodes=['pve1'])
+        async with pool:
+            await until(lambda: pool.available() == 2)
+            first, second = pool_vms(pve)
+            pve.fail_task(first, 'qmstart', 'start failed: storage is offline')
+
+            lease = await pool.acquire('bmc-13')
+            assert lease.hit and lease.vm_id == second
+            assert pool.stats['discarded'] == 1
+
+            await until(lambda: pool.stats['destroyed'] == 1)
+            assert first not in pve.vms and pool.summary()['orphans'] == {}
+
+    @pytest.mark.asyncio
+    async def test_failed_provisioning_is_destroyed(self, api, pve):
+        pve.fail_task(100, 'qmstart', 'start failed: out of memory')
+        async with make_pool(api, size=1, nodes=['pve1'], state='paused') as pool:
+            await until(lambda: pool.available() == 1)
+            assert pool.stats['provision_failures'] == 1 and pool.stats['destroyed'] == 1
+            assert 100 not in pve.vms and pool_vms(pve) == [pool.idle['pve1'][0].vm_id]
+
+    @pytest.mark.asyncio
+    async def test_vm_that_cannot_be_destroyed_is_reported(self, api, pve):
+        pve.inject_errors(1.0, status=500, message='storage is offline',
+                          routes=['DELETE /api2/json/nodes/{node}/qemu/{vmid}'])
+        pool = make_pool(api, size=1, nodes=['pve1'])
+        async with pool:
+            await until(lambda: pool.available() == 1)
+            [pooled] = pool_vms(pve)
+            pve.fail_task(pooled, 'qmstart', 'start failed: storage is offline')
+
+            lease = await pool.acquire('bmc-14')
+            assert lease.ok and not lease.hit
+            await until(lambda: pooled in pool.orphans)
+
+        orphan = pool.summary()['orphans'][pooled]
+        assert orphan['node'] == 'pve1' and orphan['error'].startswith('destroy failed')
+        assert pve.vms[pooled]['tags'] == [ORPHAN_TAG] and pool.stats['destroyed'] == 0
+
+    @pytest.mark.asyncio
+    async def test_clone_abandoned_by_close_is_destroyed(self, api, pve):
+        pve.task_duration = 0.4
+        pool = make_pool(api, size=1, nodes=['pve1'])
+        async with pool:
+            # Closed while the clone, which has no pool tag yet, is still running
+            await until(lambda: any(vm['lock'] == 'clone' for vm in pve.vms.values()))
+
+        assert list(pve.vms) == [TEMPLATE]
+        assert pool.stats['destroyed'] == 1 and pool.orphans == {}
+
+    @pytest.mark.asyncio
+    async def test_adopts_idle_vms_of_an_earlier_run(self, api, pve):
+        pve.add_vm(200, tags=[POOL_TAG], status='stopped')
+        pve.add_vm(201, tags=[POOL_TAG])['paused'] = True
+        pve.add_vm(202, tags=[POOL_TAG])  # running: handed out but not yet retagged
+        pve.add_vm(203, tags=[POOL_TAG], status='stopped', node='pve3')
+
+        pool = make_pool(api, size=0, min_size=0)
+        assert await pool.load() == 2
+        assert pool.nodes == ['pve1', 'pve2']
+        assert [(vm.vm_id, vm.state) for vm in pool.idle['pve1']] == [(200, 'stopped'), (201, 'paused')]
+
+    def test_target_follows_demand(self):
+        pool = WarmPool(None, TEMPLATE, size=2, min_size=1, max_size=6, window=100, lead_time=50, headroom=1.0)
+        pool.nodes = ['pve1']
+        now = time.monotonic()
+        assert pool.target('pve1') == 2  # no demand seen yet
+
+        pool._started_at = now - 1000
+        assert pool.target('pve1') == 1
+        pool._demand['pve1'].extend([now - 10] * 4)  # 4 per 100s, 50s to refill -> 2 more
+        assert pool.target('pve1') == 3
+        pool._demand['pve1'].extend([now - 5] * 20)
+        assert pool.target('pve1') == 6
+        pool._demand['pve1'].extendleft([now - 500] * 10)
+        assert pool.target('pve1') == 6 and len(pool._demand['pve1']) == 24
+
+        with pytest.raises(ValueError):
+            WarmPool(None, TEMPLATE, state='running')
+        with pytest.raises(ValueError):
+            WarmPool(None, TEMPLATE, size=10, max_size=8)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
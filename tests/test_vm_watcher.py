@@ -0,0 +1,156 @@
+"""
+Tests for vm_watcher.py and ProxmoxAPIAsync.watch_vms
+"""
+
+import pytest
+import asyncio
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.vm_watcher import VMWatcher, diff_guest
+from lib.proxmox_api_async import ProxmoxAPIAsync
+from tests.pve_standin import PVEStandIn
+
+RESOURCES_ROUTE = 'GET /api2/json/cluster/resources'
+GIB = 1 << 30
+
+
+def guest(**fields):
+    entry = {'vmid': 100, 'type': 'qemu', 'name': 'vm100', 'node': 'pve1', 'status': 'running', 'tags': '',
+             'uptime': 10, 'cpu': 0.10, 'maxcpu': 2, 'mem': GIB, 'maxmem': 4 * GIB, 'netin': 1000}
+    entry.update(fields)
+    return entry
+
+
+async def take(iterator, count, timeout=5.0):
+    return [await asyncio.wait_for(iterator.__anext__(), timeout) for _ in range(count)]
+
+
+class TestDiffGuest:
+    """Test which differences count as changes"""
+
+    def test_volatile_fields_are_ignored(self):
+        assert diff_guest(guest(), guest(uptime=70, netin=9000, cpu=0.12, mem=GIB + (64 << 20))) is None
+
+    def test_events(self):
+        change = diff_guest(guest(), guest(status='stopped', node='pve2', cpu=0, mem=0))
+        assert change.events == ['stopped', 'migrated', 'resources']
+        assert change.changes['node'] == ('pve1', 'pve2') and 'uptime' not in change.changes
+
+        assert diff_guest(guest(status='stopped'), guest()).events == ['started']
+        assert diff_guest(guest(), guest(status='paused')).events == ['status']
+        assert diff_guest(guest(), guest(tags='web;prod', maxmem=8 * GIB)).events == ['updated']
+
+    def test_usage_threshold_is_relative_to_capacity(self):
+        assert diff_guest(guest(), guest(cpu=0.16)).events == ['resources']
+        assert diff_guest(guest(), guest(mem=GIB + (GIB >> 2))).events == ['resources']
+        assert diff_guest(guest(), guest(cpu=0.16), threshold=0.1) is None
+
+
+class TestVMWatcher:
+    """Test the change feed against the API stand-in"""
+
+    @pytest.fixture
+    async def pve(self):
+        async with PVEStandIn(nodes=['pve1', 'pve2'], node='pve1', task_duration=0.02) as pve:
+            pve.add_vms(50)
+            yield pve
+
+    @pytest.fixture
+    async def api(self, pve):
+        async with ProxmoxAPIAsync(pve.config(node=None, watch_min_interval=0.05,
+                                              watch_max_interval=0.4)) as api:
+            api.task_waiter.poll_interval = 0.02
+            yield api
+
+    @pytest.mark.asyncio
+    async def test_only_changes_are_published(self, api, pve):
+        watcher = api.vm_watcher
+        assert len(await watcher.poll_once()) == 50  # baseline
+        assert await watcher.poll_once() == []
+
+        pve.vms[100]['status'] = 'stopped'
+        pve.migrate_vm(101, 'pve1')
+        pve.vms[102]['cpu'] = 0.9
+        pve.vms[103]['cpu'] = 0.01  # below the threshold
+        pve.vms.pop(104)
+        pve.add_vm(500)
+
+        changes = {c.vm_id: c.events for c in await watcher.poll_once()}
+        assert changes == {100: ['stopped'], 101: ['migrated'], 102: ['resources'],
+                           104: ['removed'], 500: ['added']}
+        assert watcher.stats['changes'] == 5
+        # The listing kept the client's index current too
+        assert api.cluster_index.node_for(101) == 'pve1' and 104 not in api.cluster_index
+
+    @pytest.mark.asyncio
+    async def test_subscribers_and_filters(self, api, pve):
+        everything = api.watch_vms(initial=True)
+        starts = api.watch_vms(events=['started'], vm_ids=[100, 101])
+        initial = await take(everything, 50)
+        assert {c.vm_id for c in initial} == set(range(100, 150)) and initial[0].events == ['added']
+
+        pve.vms[100]['status'] = 'stopped'
+        pve.vms[101]['status'] = 'stopped'
+        pve.vms[120]['tags'] = ['time-shift']
+        changes = await take(everything, 3)
+        assert [(c.vm_id, c.events[0]) for c in changes] == [(100, 'stopped'), (101, 'stopped'), (120, 'updated')]
+
+        await api.bulk_start([100, 101, 130], wait=True)
+        assert sorted(c.vm_id for c in await take(starts, 2)) == [100, 101]
+        assert api.vm_watcher.subscribers == 2
+
+        await everything.aclose()
+        await starts.aclose()
+        await asyncio.sleep(0.05)
+        assert api.vm_watcher.subscribers == 0 and api.vm_watcher._poller.done()
+        with pytest.raises(ValueError):
+            await api.watch_vms(events=['exploded']).__anext__()
+
+    @pytest.mark.asyncio
+    async def test_interval_adapts(self, api, pve):
+        watcher = api.vm_watcher
+        watcher.wake()  # nothing to wake before the poller starts
+        assert watcher._wakeup is None
+        changes = api.watch_vms()
+        waiting = asyncio.ensure_future(changes.__anext__())
+
+        # Idle: polls back off to the maximum interval
+        await asyncio.sleep(1.5)
+        idle_polls = pve.stats[RESOURCES_ROUTE]
+        assert watcher.interval == watcher.max_interval and idle_polls <= 10
+
+        # A task this client waited on triggers a poll without waiting out the interval
+        watcher.max_interval = 30.0
+        await asyncio.sleep(0.5)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await api.wait_task(await api.stop_vm(110), timeout=5)
+        change = await asyncio.wait_for(waiting, 5)
+        assert change.vm_id == 110 and change.events == ['stopped'] and loop.time() - started < 1.0
+        assert watcher.interval == watcher.min_interval
+        await changes.aclose()
+
+    @pytest.mark.asyncio
+    async def test_slow_consumer_loses_oldest(self, api, pve):
+        watcher = VMWatcher(api, queue_size=3)
+        changes = watcher.subscribe()
+        waiting = asyncio.ensure_future(changes.__anext__())
+        await asyncio.sleep(0)
+        await watcher.poll_once()
+
+        for vmid in range(100, 106):
+            pve.vms[vmid]['status'] = 'stopped'
+        await watcher.poll_once()
+        # Published before the consumer ran: only the newest three are left
+        assert (await waiting).vm_id == 103
+        assert [c.vm_id for c in await take(changes, 2)] == [104, 105]
+        assert watcher.stats['dropped'] == 3
+        await changes.aclose()
+        await watcher.close()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
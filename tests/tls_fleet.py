@@ -0,0 +1,278 @@
+"""
+Local TLS fleet simulator used by the network benchmarks
+
+Spins up N TLS listeners on loopback addresses, each presenting a self-signed
+certificate that is valid, expired or not yet valid, with configurable
+latency, drop rate and HTTP status. Hosts flagged as iDRAC serve a page that
+mimics the iDRAC login screen.
+"""
+
+import asyncio
+import random
+import ssl
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+CERT_STATES = ('valid', 'expired', 'not_yet_valid')
+
+IDRAC_LOGIN_PAGE = (
+    "<!DOCTYPE html><html><head><title>iDRAC9 - Login</title></head>"
+    "<body><div id=\"login\"><h1>Integrated Dell Remote Access Controller 9</h1>"
+    "<form action=\"/sysmgmt/2015/bmc/session\" method=\"post\">"
+    "<input name=\"user\"><input name=\"password\" type=\"password\"></form>"
+    "</div></body></html>"
+)
+
+HTTP_REASONS = {200: 'OK', 401: 'Unauthorized', 403: 'Forbidden', 404: 'Not Found',
+                500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+def make_self_signed_cert(common_name: str, state: str = 'valid') -> Tuple[bytes, bytes]:
+    """
+    Create a self-signed certificate whose validity window matches a state
+
+    Args:
+        common_name: Certificate subject CN
+        state: 'valid', 'expired' or 'not_yet_valid'
+
+    Returns:
+        Tuple of (certificate PEM, private key PEM)
+    """
+    now = datetime.now(timezone.utc)
+    windows = {
+        'valid': (now - timedelta(days=30), now + timedelta(days=365)),
+        'expired': (now - timedelta(days=3 * 365), now - timedelta(days=365)),
+        'not_yet_valid': (now + timedelta(days=30), now + timedelta(days=2 * 365)),
+    }
+    if state not in windows:
+        raise ValueError(f"Unknown certificate state: {state}")
+    not_before, not_after = windows[state]
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([
+        x509.NameAttribute(NameOID.COMMON_NAME, common_name),
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'Time-Shift Fleet Simulator'),
+    ])
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(not_before)
+        .not_valid_after(not_after)
+        .sign(key, hashes.SHA256())
+    )
+    return (
+        cert.public_bytes(serialization.Encoding.PEM),
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ),
+    )
+
+
+def write_cert_pair(directory: Path, name: str, cert_pem: bytes, key_pem: bytes) -> Tuple[str, str]:
+    """Write a certificate and key to disk and return their paths"""
+    cert_file = directory / f"{name}.crt"
+    key_file = directory / f"{name}.key"
+    cert_file.write_bytes(cert_pem)
+    key_file.write_bytes(key_pem)
+    return str(cert_file), str(key_file)
+
+
+@dataclass
+class SimulatedHost:
+    """Behaviour of one simulated BMC"""
+    address: str
+    cert_state: str = 'valid'
+    latency: float = 0.0
+    drop_rate: float = 0.0
+    http_status: int = 200
+    idrac: bool = False
+    port: int = 0
+
+    def target(self) -> Dict[str, object]:
+        """Return the target dict understood by NetworkValidator"""
+        target = {'host': self.address, 'port': self.port}
+        if self.idrac:
+            target['type'] = 'idrac'
+        return target
+
+
+def build_fleet(count: int, expired_ratio: float = 0.3, not_yet_valid_ratio: float = 0.1,
+                idrac_ratio: float = 0.5, latency: float = 0.0, drop_rate: float = 0.0,
+                seed: int = 1) -> List[SimulatedHost]:
+    """
+    Build a mixed fleet description with deterministic randomness
+
+    Args:
+        count: Number of hosts
+        expired_ratio: Share of hosts with expired certificates
+        not_yet_valid_ratio: Share of hosts with future certificates
+        idrac_ratio: Share of hosts serving the iDRAC login page
+        latency: Maximum per-connection latency in seconds (uniformly drawn)
+        drop_rate: Probability a connection is reset
+        seed: Random seed
+
+    Returns:
+        List of SimulatedHost
+    """
+    rng = random.Random(seed)
+    hosts = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < expired_ratio:
+            state = 'expired'
+        elif roll < expired_ratio + not_yet_valid_ratio:
+            state = 'not_yet_valid'
+        else:
+            state = 'valid'
+
+        hosts.append(SimulatedHost(
+            address=f"127.{20 + i // 62500}.{(i // 250) % 250}.{i % 250 + 1}",
+            cert_state=state,
+            latency=rng.uniform(0, latency),
+            drop_rate=drop_rate,
+            http_status=200 if rng.random() > 0.1 else 401,
+            idrac=rng.random() < idrac_ratio,
+        ))
+    return hosts
+
+
+class _PendingConnection(asyncio.Protocol):
+    """Holds an accepted socket, unread, until the simulator upgrades it to TLS"""
+
+    def __init__(self, simulator: 'TLSFleetSimulator', host: SimulatedHost):
+        self.simulator = simulator
+        self.host = host
+
+    def connection_made(self, transport):
+        transport.pause_reading()
+        self.simulator.loop.create_task(self.simulator._handle(self.host, transport))
+
+    def connection_lost(self, exc):
+        pass
+
+
+class TLSFleetSimulator:
+    """Runs simulated TLS hosts on a background event loop"""
+
+    def __init__(self, hosts: List[SimulatedHost], seed: int = 1):
+        self.hosts = hosts
+        self.rng = random.Random(seed)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.servers: List[asyncio.AbstractServer] = []
+        self.contexts: Dict[str, ssl.SSLContext] = {}
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.stats = {'connections': 0, 'dropped': 0, 'responses': 0}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _context_for(self, state: str) -> ssl.SSLContext:
+        """Share one certificate per validity state to keep start-up fast"""
+        if state not in self.contexts:
+            cert_pem, key_pem = make_self_signed_cert(f"{state}.fleet.local", state)
+            cert_file, key_file = write_cert_pair(Path(self.tmpdir.name), state, cert_pem, key_pem)
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(cert_file, key_file)
+            self.contexts[state] = context
+        return self.contexts[state]
+
+    def start(self):
+        """Start every listener and block until they accept connections"""
+        for state in {h.cert_state for h in self.hosts}:
+            self._context_for(state)
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_servers(), self.loop).result()
+
+    def stop(self):
+        """Close listeners and stop the background loop"""
+        if self.loop:
+            asyncio.run_coroutine_threadsafe(self._stop_servers(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+        self.tmpdir.cleanup()
+
+    async def _start_servers(self):
+        for host in self.hosts:
+            server = await self.loop.create_server(
+                lambda h=host: _PendingConnection(self, h),
+                host=host.address,
+                port=host.port,
+                backlog=256,
+            )
+            host.port = server.sockets[0].getsockname()[1]
+            self.servers.append(server)
+
+    async def _stop_servers(self):
+        for server in self.servers:
+            server.close()
+        await asyncio.gather(*(server.wait_closed() for server in self.servers))
+        self.servers.clear()
+
+    async def _handle(self, host: SimulatedHost, transport: asyncio.Transport):
+        self.stats['connections'] += 1
+        writer = None
+        try:
+            if host.latency:
+                await asyncio.sleep(host.latency)
+
+            if self.rng.random() < host.drop_rate:
+                self.stats['dropped'] += 1
+                transport.abort()
+                return
+
+            # Upgrade the paused plain transport so no ClientHello bytes are lost
+            reader = asyncio.StreamReader()
+            protocol = asyncio.StreamReaderProtocol(reader)
+            tls_transport = await self.loop.start_tls(
+                transport, protocol, self._context_for(host.cert_state), server_side=True
+            )
+            protocol.connection_made(tls_transport)
+            writer = asyncio.StreamWriter(tls_transport, protocol, reader, self.loop)
+
+            await reader.readuntil(b"\r\n\r\n")
+
+            body = IDRAC_LOGIN_PAGE if host.idrac else "<html><body>ok</body></html>"
+            reason = HTTP_REASONS.get(host.http_status, 'Unknown')
+            writer.write(
+                f"HTTP/1.1 {host.http_status} {reason}\r\n"
+                f"Content-Type: text/html\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n{body}".encode()
+            )
+            await writer.drain()
+            self.stats['responses'] += 1
+        except (ConnectionError, ssl.SSLError, asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            if writer is not None:
+                writer.close()
+            elif not transport.is_closing():
+                transport.close()
+
+    def targets(self) -> List[Dict[str, object]]:
+        """Return targets for NetworkValidator.test_connectivity_suite"""
+        return [host.target() for host in self.hosts]